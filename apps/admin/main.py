@@ -2,14 +2,12 @@
 
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator
 from contextlib import asynccontextmanager, suppress
 from dataclasses import dataclass
 from typing import Any, Dict, Literal
 import random
 from datetime import datetime, timezone, timedelta
-import csv
-import io
 import base64
 import hashlib
 import hmac
@@ -26,7 +24,6 @@ import shutil
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.base import BaseHTTPMiddleware
@@ -34,7 +31,7 @@ from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 from starlette.requests import Request
 from starlette.responses import Response, RedirectResponse, PlainTextResponse
 from starlette.routing import NoMatchFound
-from fastapi.responses import ORJSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse, StreamingResponse
 from bs4 import BeautifulSoup
 
 from packages.utils.observability.logging import configure_logging, get_recent_logs
@@ -48,12 +45,25 @@ from apps.api import (
     _DEFAULT_KNOWLEDGE_PRIORITY,
     _KNOWN_KNOWLEDGE_SOURCES,
 )
+from packages.core.blobs import document_blob_id
 from packages.core.mongo import MongoClient, NotFound
+from packages.core.sessions import session_store_from_env
+from packages.core.retention import retention_worker_from_env
+from packages.core.stats_sink import stats_sink_from_env
+from packages.core.storage_usage import storage_reconciler_from_env
+from packages.utils.export import (
+    EXPORT_MEDIA_TYPES,
+    Column as ExportColumn,
+    available_formats as available_export_formats,
+    projection as export_projection,
+    select_columns as select_export_columns,
+    stream_rows as stream_export_rows,
+)
 from packages.core.models import BackupJob, BackupOperation, BackupStatus, Document, Project, OllamaServer
 from packages.core.settings import MongoSettings, Settings
 from packages.core.status import status_dict
 from packages.backend.settings import settings as base_settings
-from packages.backend.cache import _get_redis
+from packages.backend.cache import _get_redis, start_invalidation_listener
 from packages.core.build import get_build_info
 from packages.backend import llm_client
 from packages.backend.ollama import (
@@ -64,9 +74,9 @@ from packages.backend.ollama import (
 from packages.backend.ollama_cluster import init_cluster, reload_cluster, get_cluster_manager, shutdown_cluster
 from pymongo import MongoClient as SyncMongoClient
 from qdrant_client import QdrantClient
-from gridfs import GridFS
 from bson import ObjectId
 from packages.retrieval import search as retrieval_search
+from packages.retrieval.local_index import from_env as local_index_from_env
 from packages.knowledge.summary import generate_document_summary
 from packages.knowledge.tasks import queue_auto_description
 from packages.knowledge.text import (
@@ -682,38 +692,6 @@ def _build_token_preview(token: str | None) -> str | None:
     return f"{token[:4]}…{token[-2:]}" if len(token) > 6 else "***"
 
 
-async def _redis_project_usage() -> dict[str, dict[str, float | int]]:
-    redis = _get_redis()
-    usage: dict[str, dict[str, float | int]] = {}
-    try:
-        async for key in redis.scan_iter(match="crawler:progress:*"):
-            project_key = "__default__"
-            try:
-                project_value = await redis.hget(key, "project")
-                if project_value:
-                    decoded = project_value.decode().strip().lower()
-                    if decoded:
-                        project_key = decoded
-            except Exception:  # noqa: BLE001
-                pass
-            try:
-                size = await redis.memory_usage(key)
-            except Exception:  # noqa: BLE001
-                size = None
-            entry = usage.setdefault(
-                project_key,
-                {
-                    "redis_bytes": 0.0,
-                    "redis_keys": 0,
-                },
-            )
-            entry["redis_keys"] += 1
-            entry["redis_bytes"] += float(size or 0)
-    except Exception as exc:  # noqa: BLE001
-        logger.warning("redis_usage_failed", error=str(exc))
-    return usage
-
-
 def _project_telegram_payload(
     project: Project,
     controller: "TelegramHub | None" = None,
@@ -2455,7 +2433,14 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[dict[str, Any], None]:
     embeddings = None
 
     qdrant_client = QdrantClient(url=base_settings.qdrant_url)
-    retrieval_search.qdrant = qdrant_client
+    local_index = local_index_from_env()
+    if local_index is not None:
+        # Built-in ANN index replaces Qdrant for retrieval in small deployments
+        retrieval_search.local_index = local_index
+        retrieval_search.qdrant = None
+        logger.info("local_vector_index_enabled", path=str(local_index.path))
+    else:
+        retrieval_search.qdrant = qdrant_client
 
     mongo_cfg = MongoSettings()
     mongo_client = MongoClient(
@@ -2499,6 +2484,42 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[dict[str, Any], None]:
     )
     app.state.ollama_cluster = cluster
 
+    # Keep in-process cache tiers coherent with other replicas
+    cache_listener = start_invalidation_listener()
+
+    # Hot chat history in Redis, written behind to Mongo
+    session_store = session_store_from_env(mongo_client)
+    if session_store is not None:
+        session_store.start()
+    app.state.session_store = session_store
+
+    # Resume maintenance jobs interrupted by a restart (every step is idempotent)
+    try:
+        for job in await mongo_client.list_unfinished_maintenance_jobs("deduplicate"):
+            _start_deduplicate_job(mongo_client, job)
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("maintenance_jobs_resume_failed", error=str(exc))
+
+    # Request stats are queued and written with insert_many
+    stats_sink = stats_sink_from_env(mongo_client)
+    if stats_sink is not None:
+        mongo_client.stats_sink = stats_sink
+        stats_sink.start()
+
+    # Archive and expire old stats, contexts and unanswered questions
+    retention_worker = retention_worker_from_env(mongo_client)
+    if retention_worker is not None:
+        retention_worker.start()
+
+    # Recompute the per-project storage counters to correct drift
+    storage_reconciler = storage_reconciler_from_env(
+        mongo_client,
+        documents_collection=documents_collection,
+        contexts_collection=contexts_collection,
+    )
+    if storage_reconciler is not None:
+        storage_reconciler.start()
+
     # Warm-up runners based on stored configuration
     try:
         await telegram_hub.refresh()
@@ -2523,6 +2544,21 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[dict[str, Any], None]:
     }
 
     del llm
+    cache_listener.cancel()
+    with suppress(BaseException):
+        await cache_listener
+    if session_store is not None:
+        with suppress(Exception):
+            await session_store.close()
+    if stats_sink is not None:
+        with suppress(Exception):
+            await stats_sink.close()
+    if retention_worker is not None:
+        with suppress(Exception):
+            await retention_worker.close()
+    if storage_reconciler is not None:
+        with suppress(Exception):
+            await storage_reconciler.close()
     with suppress(Exception):
         await telegram_hub.stop_all()
     with suppress(Exception):
@@ -2535,6 +2571,7 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[dict[str, Any], None]:
     qdrant_client.close()
     with suppress(AttributeError):
         del app.state.mongo
+        del app.state.session_store
         del app.state.contexts_collection
         del app.state.context_presets_collection
         del app.state.documents_collection
@@ -2717,6 +2754,60 @@ def admin_logs(request: Request, limit: int = 200) -> ORJSONResponse:
 KNOWLEDGE_SERVICE_KEY = "knowledge_service"
 
 
+
+_MAINTENANCE_TASKS: dict[str, asyncio.Task] = {}
+
+
+async def _run_deduplicate_job(mongo_client: MongoClient, job: dict[str, Any]) -> None:
+    job_id = job["id"]
+    params = job.get("params") or {}
+
+    async def _progress(state: dict[str, Any]) -> None:
+        await mongo_client.update_maintenance_job(job_id, {"progress": state})
+
+    await mongo_client.update_maintenance_job(job_id, {"status": "running", "startedAt": time.time()})
+    try:
+        summary = await mongo_client.deduplicate_documents(
+            params.get("collection") or MongoSettings().documents,
+            params.get("project"),
+            progress=_progress,
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.error("knowledge_deduplicate_failed", job_id=job_id, error=str(exc))
+        await mongo_client.update_maintenance_job(
+            job_id, {"status": "failed", "error": str(exc), "finishedAt": time.time()}
+        )
+        return
+    summary.pop("removed_ids", None)
+    await mongo_client.update_maintenance_job(
+        job_id, {"status": "done", "result": summary, "finishedAt": time.time()}
+    )
+    logger.info("knowledge_deduplicated", job_id=job_id, **summary)
+
+
+def _start_deduplicate_job(mongo_client: MongoClient, job: dict[str, Any]) -> None:
+    """Run ``job`` in the background unless it already runs in this process."""
+
+    task = _MAINTENANCE_TASKS.get(job["id"])
+    if task is not None and not task.done():
+        return
+    task = asyncio.create_task(_run_deduplicate_job(mongo_client, job))
+    _MAINTENANCE_TASKS[job["id"]] = task
+    task.add_done_callback(lambda _: _MAINTENANCE_TASKS.pop(job["id"], None))
+
+
+DOCUMENT_STREAM_CHUNK_BYTES = int(os.getenv("DOCUMENT_STREAM_CHUNK_BYTES", str(256 * 1024)))
+
+
+async def _upload_chunks(file: UploadFile, first_chunk: bytes) -> AsyncIterator[bytes]:
+    """Yield ``first_chunk`` and the rest of ``file`` in bounded chunks."""
+
+    chunk = first_chunk
+    while chunk:
+        yield chunk
+        chunk = await file.read(DOCUMENT_STREAM_CHUNK_BYTES)
+
+
 class KnowledgeAdminHandlers:
     """Collection of knowledge base operations grouped into a service-style class."""
 
@@ -2917,11 +3008,10 @@ class KnowledgeAdminHandlers:
         if not filename:
             raise HTTPException(status_code=400, detail="File name is required")
 
-        payload = await file.read()
-        if not payload:
+        first_chunk = await file.read(DOCUMENT_STREAM_CHUNK_BYTES)
+        if not first_chunk:
             raise HTTPException(status_code=400, detail="File is empty")
 
-        content_type = (file.content_type or "").lower()
         description_input = (description or "").strip()
         auto_description_pending = False
         status_message = None
@@ -2935,7 +3025,7 @@ class KnowledgeAdminHandlers:
         try:
             file_id = await mongo_client.upload_document(
                 file_name=filename,
-                file=payload,
+                file=_upload_chunks(file, first_chunk),
                 documents_collection=collection,
                 description=description_value,
                 url=url,
@@ -3187,14 +3277,28 @@ class KnowledgeAdminHandlers:
         request: Request,
         payload: KnowledgeDeduplicate,
     ) -> ORJSONResponse:
+        """Start (or return the running) deduplication job for a project."""
+
         mongo_cfg = MongoSettings()
         collection = getattr(request.state, "documents_collection", mongo_cfg.documents)
-        project_name, _, _, _ = await _get_project_context(request, payload.project)
+        project_name, _, mongo_client, _ = await _get_project_context(request, payload.project)
         try:
-            summary = await request.state.mongo.deduplicate_documents(collection, project_name)
+            for job in await mongo_client.list_unfinished_maintenance_jobs("deduplicate"):
+                if job.get("params", {}).get("project") == project_name:
+                    return ORJSONResponse({"project": project_name, "job": job}, status_code=202)
+            job = await mongo_client.create_maintenance_job(
+                "deduplicate", {"project": project_name, "collection": collection}
+            )
         except Exception as exc:  # noqa: BLE001
             raise HTTPException(status_code=500, detail=str(exc)) from exc
-        return ORJSONResponse({"project": project_name, **summary})
+        _start_deduplicate_job(mongo_client, job)
+        return ORJSONResponse({"project": project_name, "job": job}, status_code=202)
+
+    async def deduplicate_status(self, request: Request, job_id: str) -> ORJSONResponse:
+        job = await _get_mongo_client(request).get_maintenance_job(job_id)
+        if not job or job.get("kind") != "deduplicate":
+            raise HTTPException(status_code=404, detail="job_not_found")
+        return ORJSONResponse({"job": job})
 
     async def queue_reindex(self, request: Request) -> ORJSONResponse:
         _require_super_admin(request)
@@ -3532,40 +3636,30 @@ class KnowledgeAdminHandlers:
         request: Request,
         project: str | None = None,
         limit: int = 1000,
+        format: str = "csv",
+        columns: str | None = None,
+        archived: bool = False,
     ) -> Response:
         try:
-            safe_limit = max(1, min(int(limit), 5000))
+            safe_limit = max(1, min(int(limit), UNANSWERED_EXPORT_MAX_ROWS))
         except Exception:
             safe_limit = 1000
+        selected = _export_columns(UNANSWERED_EXPORT_COLUMNS, format, columns)
 
         project_name, _, mongo_client, _ = await _get_project_context(request, project)
 
-        try:
-            items = await mongo_client.list_unanswered_questions(project_name, limit=safe_limit)
-        except Exception as exc:  # noqa: BLE001
-            logger.error("knowledge_unanswered_export_failed", project=project_name, error=str(exc))
-            raise HTTPException(status_code=500, detail="Failed to export unanswered questions") from exc
-
-        buffer = io.StringIO()
-        writer = csv.writer(buffer)
-        writer.writerow(["question", "hits", "updated_at", "project"])
-        for item in items:
-            updated_at = item.get("updated_at")
-            if isinstance(updated_at, (int, float)):
-                updated_iso = datetime.utcfromtimestamp(updated_at).isoformat()
-            else:
-                updated_iso = str(updated_at or "")
-            writer.writerow([
-                item.get("question", ""),
-                item.get("hits", 0),
-                updated_iso,
-                item.get("project") or (project_name or ""),
-            ])
+        async def _docs() -> AsyncIterator[dict[str, Any]]:
+            async for doc in mongo_client.iter_unanswered_questions(
+                project_name,
+                limit=safe_limit,
+                projection=export_projection(selected),
+                include_archive=archived,
+            ):
+                if "project" in doc and not doc["project"]:
+                    doc["project"] = project_name or ""
+                yield doc
 
-        filename = f"unanswered-{(project_name or 'all')}.csv"
-        content = buffer.getvalue().encode("utf-8")
-        headers = {"Content-Disposition": f"attachment; filename={filename}"}
-        return Response(content, media_type="text/csv", headers=headers)
+        return _export_response(_docs(), selected, format, f"unanswered-{(project_name or 'all')}")
 
 
 class FeedbackHandlers:
@@ -4073,6 +4167,9 @@ class ProjectCreate(BaseModel):
     llm_voice_model: str | None = None
     debug_enabled: bool | None = None
     debug_info_enabled: bool | None = None
+    qa_direct_enabled: bool | None = None
+    qa_direct_threshold: float | None = None
+    qa_direct_paraphrase: bool | None = None
     telegram_token: str | None = None
     telegram_auto_start: bool | None = None
     max_token: str | None = None
@@ -4159,6 +4256,11 @@ async def admin_deduplicate_knowledge(request: Request, payload: KnowledgeDedupl
     return await knowledge_admin.deduplicate(request=request, payload=payload)
 
 
+@app.get("/api/v1/admin/knowledge/deduplicate/{job_id}", response_class=ORJSONResponse)
+async def admin_deduplicate_knowledge_status(request: Request, job_id: str) -> ORJSONResponse:
+    return await knowledge_admin.deduplicate_status(request=request, job_id=job_id)
+
+
 @app.post("/api/v1/admin/knowledge/reindex", response_class=ORJSONResponse)
 async def admin_reindex_documents(request: Request) -> ORJSONResponse:
     return await knowledge_admin.queue_reindex(request=request)
@@ -4282,11 +4384,17 @@ async def admin_export_unanswered(
     request: Request,
     project: str | None = None,
     limit: int = 1000,
+    format: str = "csv",
+    columns: str | None = None,
+    archived: bool = False,
 ) -> Response:
     return await knowledge_admin.export_unanswered(
         request=request,
         project=project,
         limit=limit,
+        format=format,
+        columns=columns,
+        archived=archived,
     )
 
 
@@ -5379,7 +5487,10 @@ async def admin_request_stats(
     start: str | None = None,
     end: str | None = None,
     channel: str | None = None,
+    granularity: str = "day",
 ) -> ORJSONResponse:
+    if granularity not in {"day", "hour"}:
+        raise HTTPException(status_code=400, detail="granularity must be 'day' or 'hour'")
     project_name = _resolve_admin_project(request, project)
     start_dt = _parse_stats_date(start)
     end_dt = _parse_stats_date(end)
@@ -5391,10 +5502,66 @@ async def admin_request_stats(
         start=start_dt,
         end=end_dt,
         channel=channel,
+        granularity=granularity,
     )
     return ORJSONResponse({"stats": stats})
 
 
+REQUEST_STATS_EXPORT_COLUMNS = (
+    ExportColumn("timestamp", "ts", "datetime"),
+    ExportColumn("date", "date", "date"),
+    ExportColumn("project", "project"),
+    ExportColumn("channel", "channel"),
+    ExportColumn("question", "question"),
+    ExportColumn("response_chars", "response_chars", "int"),
+    ExportColumn("attachments", "attachments", "int"),
+    ExportColumn("prompt_chars", "prompt_chars", "int"),
+    ExportColumn("session_id", "session_id"),
+    ExportColumn("user_id", "user_id"),
+    ExportColumn("error", "error"),
+)
+
+UNANSWERED_EXPORT_MAX_ROWS = int(os.getenv("UNANSWERED_EXPORT_MAX_ROWS", "100000"))
+UNANSWERED_EXPORT_COLUMNS = (
+    ExportColumn("question", "question"),
+    ExportColumn("hits", "hits", "int"),
+    ExportColumn("updated_at", "updated_at", "epoch"),
+    ExportColumn("project", "project"),
+)
+
+
+def _export_response(
+    docs: AsyncIterator[dict[str, Any]],
+    columns: list[ExportColumn],
+    fmt: str,
+    filename: str,
+) -> StreamingResponse:
+    """Stream ``docs`` as an attachment encoded with ``fmt``."""
+
+    async def _body() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in stream_export_rows(docs, columns, fmt):
+                yield chunk
+        except Exception as exc:  # noqa: BLE001 - headers are already sent
+            logger.error("export_stream_failed", filename=filename, error=str(exc))
+            raise
+
+    headers = {"Content-Disposition": f"attachment; filename={filename}.{fmt}"}
+    return StreamingResponse(_body(), media_type=EXPORT_MEDIA_TYPES[fmt], headers=headers)
+
+
+def _export_columns(available: tuple[ExportColumn, ...], fmt: str, columns: str | None) -> list[ExportColumn]:
+    if fmt not in available_export_formats():
+        raise HTTPException(
+            status_code=400,
+            detail=f"format must be one of: {', '.join(available_export_formats())}",
+        )
+    try:
+        return select_export_columns(available, columns)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
 @app.get("/api/v1/admin/stats/requests/export")
 async def admin_request_stats_export(
     request: Request,
@@ -5402,72 +5569,27 @@ async def admin_request_stats_export(
     start: str | None = None,
     end: str | None = None,
     channel: str | None = None,
+    format: str = "csv",
+    columns: str | None = None,
+    archived: bool = True,
 ) -> StreamingResponse:
+    selected = _export_columns(REQUEST_STATS_EXPORT_COLUMNS, format, columns)
     project_name = _resolve_admin_project(request, project)
     start_dt = _parse_stats_date(start)
     end_dt = _parse_stats_date(end)
     if end_dt:
         end_dt = end_dt + timedelta(days=1)
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        "timestamp",
-        "date",
-        "project",
-        "channel",
-        "question",
-        "response_chars",
-        "attachments",
-        "prompt_chars",
-        "session_id",
-        "user_id",
-        "error",
-    ])
-
     mongo_client = _get_mongo_client(request)
-    async for item in mongo_client.iter_request_stats(
+    docs = mongo_client.iter_request_stats(
         project=project_name,
         start=start_dt,
         end=end_dt,
         channel=channel,
-    ):
-        ts = item.get("ts")
-        if isinstance(ts, datetime):
-            ts_str = ts.astimezone(timezone.utc).isoformat()
-        else:
-            ts_str = str(ts)
-        day = item.get("date")
-        if isinstance(day, datetime):
-            day_str = day.date().isoformat()
-        else:
-            day_str = str(day)
-        writer.writerow(
-            [
-                ts_str,
-                day_str,
-                item.get("project"),
-                item.get("channel"),
-                item.get("question"),
-                item.get("response_chars"),
-                item.get("attachments"),
-                item.get("prompt_chars"),
-                item.get("session_id"),
-                item.get("user_id"),
-                item.get("error"),
-            ]
-        )
-
-    output.seek(0)
-    filename = "request_stats.csv"
-    headers = {
-        "Content-Disposition": f"attachment; filename={filename}",
-    }
-    return StreamingResponse(
-        iter([output.getvalue().encode("utf-8")]),
-        media_type="text/csv",
-        headers=headers,
+        projection=export_projection(selected),
+        include_archive=archived,
     )
+    return _export_response(docs, selected, format, "request_stats")
 
 
 def _resolve_session_identifiers(request: Request, project: str | None, session_id: str | None) -> tuple[str | None, str]:
@@ -5499,31 +5621,22 @@ async def admin_projects(request: Request) -> ORJSONResponse:
 
 @app.get("/api/v1/admin/projects/storage", response_class=ORJSONResponse)
 async def admin_projects_storage(request: Request) -> ORJSONResponse:
-    """Return aggregated storage usage per project (Mongo/GridFS/Redis)."""
+    """Return storage usage per project (Mongo/GridFS/Redis).
 
-    identity = _require_admin(request)
-    mongo_cfg = MongoSettings()
-    documents_collection = getattr(request.state, "documents_collection", mongo_cfg.documents)
-    contexts_collection = getattr(request.state, "contexts_collection", mongo_cfg.contexts)
+    Reads the incrementally maintained counters; see
+    :mod:`packages.core.storage_usage`.
+    """
 
+    identity = _require_admin(request)
     mongo_client = _get_mongo_client(request)
-    storage = await mongo_client.aggregate_project_storage(documents_collection, contexts_collection)
-    redis_usage = await _redis_project_usage()
+    storage = await mongo_client.get_project_storage()
 
     if not identity.is_super:
         allowed = {proj.strip().lower() for proj in identity.projects if proj}
         storage = {key: value for key, value in storage.items() if key in allowed}
-        redis_usage = {key: value for key, value in redis_usage.items() if key in allowed}
-    else:
-        allowed = None
 
-    combined_keys = set(storage.keys()) | set(redis_usage.keys())
-    if allowed is not None:
-        combined_keys = {key for key in combined_keys if key in allowed}
     combined: dict[str, dict[str, float | int]] = {}
-    for key in combined_keys:
-        doc_stats = storage.get(key, {})
-        redis_stats = redis_usage.get(key, {})
+    for key, doc_stats in storage.items():
         documents_bytes = int(doc_stats.get("documents_bytes", 0) or 0)
         binary_bytes = int(doc_stats.get("binary_bytes", 0) or 0)
         text_bytes = max(documents_bytes - binary_bytes, 0)
@@ -5534,8 +5647,8 @@ async def admin_projects_storage(request: Request) -> ORJSONResponse:
             "document_count": int(doc_stats.get("document_count", 0)),
             "context_bytes": int(doc_stats.get("context_bytes", 0) or 0),
             "context_count": int(doc_stats.get("context_count", 0)),
-            "redis_bytes": float(redis_stats.get("redis_bytes", 0)),
-            "redis_keys": int(redis_stats.get("redis_keys", 0)),
+            "redis_bytes": float(doc_stats.get("redis_bytes", 0) or 0),
+            "redis_keys": int(doc_stats.get("redis_keys", 0) or 0),
         }
 
     return ORJSONResponse({"projects": combined})
@@ -5626,6 +5739,23 @@ async def admin_create_project(request: Request, payload: ProjectCreate) -> ORJS
         else:
             debug_info_value = True
 
+    if "qa_direct_enabled" in provided_fields:
+        qa_direct_value = bool(payload.qa_direct_enabled) if payload.qa_direct_enabled is not None else False
+    else:
+        qa_direct_value = bool(existing.qa_direct_enabled) if existing and existing.qa_direct_enabled is not None else False
+
+    if "qa_direct_threshold" in provided_fields:
+        qa_threshold_value = payload.qa_direct_threshold
+        if qa_threshold_value is not None and not 0.0 <= qa_threshold_value <= 1.0:
+            raise HTTPException(status_code=400, detail="qa_direct_threshold must be between 0 and 1")
+    else:
+        qa_threshold_value = existing.qa_direct_threshold if existing else None
+
+    if "qa_direct_paraphrase" in provided_fields:
+        qa_paraphrase_value = bool(payload.qa_direct_paraphrase) if payload.qa_direct_paraphrase is not None else False
+    else:
+        qa_paraphrase_value = bool(existing.qa_direct_paraphrase) if existing and existing.qa_direct_paraphrase is not None else False
+
     if "telegram_token" in provided_fields:
         if isinstance(payload.telegram_token, str):
             token_value = payload.telegram_token.strip() or None
@@ -5785,6 +5915,9 @@ async def admin_create_project(request: Request, payload: ProjectCreate) -> ORJS
         llm_voice_model=voice_model_value,
         debug_enabled=debug_value,
         debug_info_enabled=debug_info_value,
+        qa_direct_enabled=qa_direct_value,
+        qa_direct_threshold=qa_threshold_value,
+        qa_direct_paraphrase=qa_paraphrase_value,
         telegram_token=token_value,
         telegram_auto_start=auto_start_value,
         max_token=max_token_value,
@@ -6078,29 +6211,56 @@ async def admin_test_project(domain: str, request: Request) -> ORJSONResponse:
     )
 
 
+def _parse_byte_range(header: str | None, length: int) -> tuple[int, int] | None:
+    """Return the ``[start, stop)`` slice requested by a ``Range`` header.
+
+    Only a single ``bytes=`` range is honoured; anything else is ignored and
+    the whole file is sent.
+
+    Raises
+    ------
+    HTTPException
+        416 when the range lies outside the file.
+    """
+
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            stop = min(int(last) + 1, length) if last else length
+        elif last:
+            start, stop = max(length - int(last), 0), length
+        else:
+            return None
+    except ValueError:
+        return None
+    if start >= length or start >= stop:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"},
+        )
+    return start, stop
+
+
 @app.get("/api/v1/admin/knowledge/documents/{file_id}")
 async def admin_download_document(request: Request, file_id: str) -> Response:
-    """Return the raw contents of a document from GridFS."""
+    """Stream the raw contents of a document from GridFS.
+
+    Supports ``Range`` (single byte range), ``If-Range`` and
+    ``If-None-Match``; the ETag is the payload sha256 when known.
+    """
 
     identity = _require_admin(request)
     mongo_cfg = MongoSettings()
     collection = getattr(request.state, "documents_collection", mongo_cfg.documents)
+    mongo_client: MongoClient = request.state.mongo
 
-    def fetch_file() -> tuple[dict[str, Any], bytes]:
-        with SyncMongoClient(base_settings.mongo_uri, serverSelectionTimeoutMS=2000) as sync_client:
-            db = sync_client[mongo_cfg.database]
-            coll = db[collection]
-            doc = coll.find_one({"fileId": file_id}, {"_id": False})
-            if not doc:
-                raise HTTPException(status_code=404, detail="Document metadata not found")
-            fs = GridFS(db)
-            try:
-                data = fs.get(ObjectId(file_id)).read()
-            except Exception as exc:  # noqa: BLE001
-                raise HTTPException(status_code=404, detail="Failed to read document") from exc
-            return doc, data
-
-    doc_meta, payload = await run_in_threadpool(fetch_file)
+    doc_meta = await mongo_client.db[collection].find_one({"fileId": file_id}, {"_id": False})
+    if not doc_meta:
+        raise HTTPException(status_code=404, detail="Document metadata not found")
     if not identity.is_super:
         allowed = {proj.strip().lower() for proj in identity.projects if proj}
         doc_project_value = doc_meta.get("project")
@@ -6111,10 +6271,52 @@ async def admin_download_document(request: Request, file_id: str) -> Response:
             normalized_doc_project = domain_value.strip().lower() if isinstance(domain_value, str) and domain_value.strip() else None
         if not normalized_doc_project or normalized_doc_project not in allowed:
             raise HTTPException(status_code=403, detail="Access to document is forbidden")
+
+    blob_id = document_blob_id(doc_meta)
+    try:
+        grid_out = await mongo_client.open_gridfs_file(blob_id)
+    except Exception as exc:  # noqa: BLE001
+        raise HTTPException(status_code=404, detail="Failed to read document") from exc
+    metadata = grid_out.metadata or {}
+    length = int(metadata.get("raw_length") or grid_out.length) if metadata.get("codec") else int(grid_out.length)
+    etag = f'"{doc_meta.get("sha256") or metadata.get("sha256") or f"{blob_id}-{length}"}"'
+
     filename = doc_meta.get("name") or f"{file_id}.bin"
-    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+    }
     media_type = doc_meta.get("content_type") or "application/octet-stream"
-    return Response(content=payload, media_type=media_type, headers=headers)
+    if_none_match = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",") if tag.strip()}
+    if if_none_match & {"*", etag, f"W/{etag}"}:
+        grid_out.close()
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = _parse_byte_range(request.headers.get("range"), length)
+        except HTTPException:
+            grid_out.close()
+            raise
+    if byte_range is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            mongo_client.iter_gridfs_file(grid_out),
+            media_type=media_type,
+            headers=headers,
+        )
+    start, stop = byte_range
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{length}"
+    headers["Content-Length"] = str(stop - start)
+    return StreamingResponse(
+        mongo_client.iter_gridfs_file(grid_out, start=start, stop=stop),
+        status_code=206,
+        media_type=media_type,
+        headers=headers,
+    )
 
 
 @app.get("/", include_in_schema=False)
@@ -26,7 +26,7 @@ import asyncio
 import structlog
 
 from packages.backend import llm_client
-from packages.backend.cache import _get_redis
+from packages.backend.cache import _get_redis, current_project as cache_project
 from packages.backend.settings import settings as backend_settings
 from packages.backend.ollama import (
     list_installed_models,
@@ -61,7 +61,7 @@ from packages.core.models import (
     VoiceTrainingJob,
     VoiceTrainingStatus,
 )
-from packages.core.mongo import MongoClient, NotFound
+from packages.core.mongo import _DOCUMENT_PROJECTION, MongoClient, NotFound
 from pydantic import BaseModel, ConfigDict
 
 from packages.core.status import status_dict
@@ -98,6 +98,11 @@ READING_MODE_PROMPT = (
     " Если пользователь просит перейти к другой части, вежливо уточняй нужную страницу или главу."
 )
 
+QA_PARAPHRASE_PROMPT = (
+    "Перескажи ответ из базы частых вопросов своими словами как ответ на вопрос пользователя."
+    " Сохрани все факты, цифры, сроки и ссылки, ничего не добавляй от себя и не упоминай базу вопросов."
+)
+
 SOURCE_REQUEST_KEYWORDS = (
     "источ",
     "ссыл",
@@ -127,6 +132,14 @@ def _get_mongo_client(request: Request) -> MongoClient:
     return mongo_client
 
 
+def _get_session_store(request: Request, mongo_client: MongoClient):
+    """Return the Redis session store when enabled, else ``mongo_client``."""
+
+    app = request.scope.get("app")
+    store = getattr(getattr(app, "state", None), "session_store", None)
+    return store if store is not None else mongo_client
+
+
 def _resolve_session_identifiers(
     request: Request,
     project: str | None,
@@ -157,9 +170,14 @@ def _resolve_session_identifiers(
 
 
 _KNOWLEDGE_SNIPPET_CHARS = 640
+# Vector hits are passages; keep a few documents instead of one document's passages.
+_MAX_PASSAGES_PER_DOC = int(os.getenv("KNOWLEDGE_MAX_PASSAGES_PER_DOC", "2"))
+# Snippets only use the head of a document, so cap GridFS downloads.
+_KNOWLEDGE_CONTENT_MAX_BYTES = int(os.getenv("KNOWLEDGE_CONTENT_MAX_BYTES", "16384"))
 _MAX_DIALOG_TURNS = int(os.getenv("MAX_DIALOG_TURNS", "5"))
 _MAX_DIALOG_CHARS = int(os.getenv("MAX_DIALOG_CHARS", "8000"))
 _HISTORY_SUMMARY_MAX_CHARS = int(os.getenv("HISTORY_SUMMARY_MAX_CHARS", "900"))
+_QA_DIRECT_THRESHOLD = float(os.getenv("QA_DIRECT_THRESHOLD", "0.85"))
 _HISTORY_SUMMARY_PREFIX = "Earlier conversation summary:"  # keep neutral for multilingual chats
 _VOICE_MAX_TURNS = 3
 _VOICE_KNOWLEDGE_LIMIT = 2
@@ -684,12 +702,14 @@ async def _collect_knowledge_snippets(
             )
 
     try:
-        docs = await retrieval_search.hybrid_search(question, limit * 3)
+        docs = await retrieval_search.hybrid_search(question, limit * 3, project=project)
     except Exception as exc:  # noqa: BLE001
         logger.debug("knowledge_hybrid_failed", error=str(exc))
         docs = []
 
     vector_seen: set[str] = set()
+    # Documents already represented by a passage (``payload["doc_id"]``).
+    passage_docs: dict[str, int] = {}
     for doc in docs:
         payload = getattr(doc, "payload", None)
         text = _extract_payload_text(payload)
@@ -698,16 +718,22 @@ async def _collect_knowledge_snippets(
         doc_id = str(getattr(doc, "id", "")) or None
         if doc_id and doc_id in vector_seen:
             continue
-        buckets["qdrant"].append(
-            {
-                "id": doc_id,
-                "name": _extract_payload_name(payload, default=doc_id),
-                "text": text,
-                "score": getattr(doc, "score", None),
-                "url": _extract_payload_url(payload),
-                "source": "qdrant",
-            }
-        )
+        parent_id = payload.get("doc_id") if isinstance(payload, dict) else None
+        if parent_id:
+            if passage_docs.get(parent_id, 0) >= _MAX_PASSAGES_PER_DOC:
+                continue
+            passage_docs[parent_id] = passage_docs.get(parent_id, 0) + 1
+        entry = {
+            "id": doc_id,
+            "name": _extract_payload_name(payload, default=doc_id),
+            "text": text,
+            "score": getattr(doc, "score", None),
+            "url": _extract_payload_url(payload),
+            "source": "qdrant",
+        }
+        if parent_id:
+            entry["metadata"] = {"doc_id": parent_id, "offset": payload.get("offset")}
+        buckets["qdrant"].append(entry)
         if doc_id:
             vector_seen.add(doc_id)
         if len(buckets["qdrant"]) >= limit:
@@ -729,7 +755,7 @@ async def _collect_knowledge_snippets(
                     query["project"] = project
                 cursor = (
                     mongo_client.db[collection]
-                    .find(query, {"_id": False})
+                    .find(query, _DOCUMENT_PROJECTION)
                     .sort("ts", -1)
                     .limit(limit * 3)
                 )
@@ -738,27 +764,44 @@ async def _collect_knowledge_snippets(
                 logger.debug("knowledge_mongo_fallback_failed", error=str(exc))
                 candidates = []
 
+        candidates = candidates[: limit * 3]
+        contents: dict[str, tuple[dict, bytes]] = {}
+        # The matching passage beats the head of the same document.
+        candidates = [doc for doc in candidates if getattr(doc, "fileId", None) not in passage_docs]
+        content_ids = [
+            doc.fileId
+            for doc in candidates
+            if getattr(doc, "fileId", None) and not _is_attachment_doc(vars(doc))
+        ]
+        if content_ids and hasattr(mongo_client, "get_documents_with_content"):
+            try:
+                contents = await mongo_client.get_documents_with_content(
+                    collection,
+                    content_ids,
+                    max_bytes=_KNOWLEDGE_CONTENT_MAX_BYTES,
+                    excerpt_field="excerpt",
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.debug("knowledge_content_fetch_failed", files=len(content_ids), error=str(exc))
+
         mongo_seen: set[str] = set()
         for doc in candidates:
             file_id = getattr(doc, "fileId", None)
             if file_id and file_id in mongo_seen:
                 continue
             attachment_meta: dict[str, Any] | None = None
-            doc_meta = doc.model_dump()
+            # Field values without a ``model_dump`` copy per candidate.
+            doc_meta = vars(doc)
             text = ""
             doc_url = doc.url
-            try:
-                if file_id and _is_attachment_doc(doc_meta):
-                    text = doc.description or ""
-                else:
-                    _meta, payload = await mongo_client.get_document_with_content(
-                        collection, doc.fileId
-                    )
-                    text = payload.decode("utf-8", errors="ignore")
-                    if not doc_url:
-                        doc_url = _meta.get("url")
-            except Exception as exc:  # noqa: BLE001
-                logger.debug("knowledge_content_fetch_failed", file_id=file_id, error=str(exc))
+            if file_id and _is_attachment_doc(doc_meta):
+                text = doc.description or ""
+            elif file_id in contents:
+                _meta, payload = contents[file_id]
+                text = payload.decode("utf-8", errors="ignore")
+                if not doc_url:
+                    doc_url = _meta.get("url")
+            else:
                 text = doc.description or ""
 
             if file_id and _is_attachment_doc(doc_meta):
@@ -1648,6 +1691,8 @@ async def ask_llm(request: Request, llm_request: LLMRequest) -> ORJSONResponse:
         logger.error("mongo_client_missing", error=str(exc))
         raise HTTPException(status_code=500, detail="Mongo client unavailable") from exc
     project_name = _normalize_project(llm_request.project)
+    # Scope cached LLM responses and query rewrites to the project.
+    cache_project.set(project_name or None)
     project: Project | None = None
     if project_name:
         try:
@@ -1683,7 +1728,7 @@ async def ask_llm(request: Request, llm_request: LLMRequest) -> ORJSONResponse:
         logger.error("preset_load_failed", error=str(exc))
         raise HTTPException(status_code=500, detail="Failed to load preset") from exc
     try:
-        async for message in mongo_client.get_sessions(
+        async for message in _get_session_store(request, mongo_client).get_sessions(
             request.state.contexts_collection, str(llm_request.session_id)
         ):
             context.append({"role": str(message.role), "content": message.text})
@@ -1927,6 +1972,57 @@ async def ask_llm(request: Request, llm_request: LLMRequest) -> ORJSONResponse:
     return ORJSONResponse(payload)
 
 
+def _build_payload() -> dict[str, Any]:
+    build_info = get_build_info()
+    build_payload = {
+        key: build_info.get(key)
+        for key in ("version", "revision", "built_at", "built_at_iso")
+        if build_info.get(key) is not None
+    }
+    components = build_info.get("components")
+    if components:
+        build_payload["components"] = components
+    return build_payload
+
+
+async def _match_direct_qa(
+    mongo_client: MongoClient,
+    question: str,
+    project_obj: Project | None,
+) -> dict[str, Any] | None:
+    """Return a QA pair confident enough to answer ``question`` without the LLM."""
+
+    if not getattr(project_obj, "qa_direct_enabled", None) or not question.strip():
+        return None
+    if not hasattr(mongo_client, "match_qa_pair"):
+        return None
+    threshold = getattr(project_obj, "qa_direct_threshold", None)
+    if threshold is None:
+        threshold = _QA_DIRECT_THRESHOLD
+    try:
+        return await mongo_client.match_qa_pair(question, project_obj.name, min_score=threshold)
+    except Exception as exc:  # noqa: BLE001
+        logger.debug("qa_direct_match_failed", project=project_obj.name, error=str(exc))
+        return None
+
+
+def _sse_response(stream, model_name: str, session_cookie: str | None) -> StreamingResponse:
+    response = StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"X-Model-Name": model_name},
+    )
+    if session_cookie:
+        response.set_cookie(
+            "chat_session",
+            session_cookie,
+            max_age=30 * 24 * 3600,
+            httponly=False,
+            samesite="Lax",
+        )
+    return response
+
+
 @llm_router.get("/chat")
 async def chat(
     request: Request,
@@ -1951,6 +2047,8 @@ async def chat(
         session_id,
     )
     channel_name = (channel or "widget").strip() or "widget"
+    # Scope cached LLM responses and query rewrites to the project.
+    cache_project.set(project_name or None)
     project_obj: Project | None = None
     if project_name:
         project_obj = await request.state.mongo.get_project(project_name)
@@ -2033,12 +2131,13 @@ async def chat(
     effective_model = model_override or getattr(llm_client, "MODEL_NAME", "unknown")
 
     mongo_client = request.state.mongo
+    session_store = _get_session_store(request, mongo_client)
     contexts_collection = getattr(request.state, "contexts_collection", MongoSettings().contexts)
     normalized_question = question.strip()
     dialog_history: list[dict[str, str]] = []
     if session_key:
         try:
-            async for record in mongo_client.get_sessions(contexts_collection, session_key):
+            async for record in session_store.get_sessions(contexts_collection, session_key):
                 dialog_history.append({
                     "role": str(record.role),
                     "content": record.text,
@@ -2062,7 +2161,7 @@ async def chat(
             and last_entry.get("content") == normalized_question
         ):
             try:
-                await mongo_client.append_session_message(
+                await session_store.append_session_message(
                     contexts_collection,
                     session_key,
                     RoleEnum.user.value,
@@ -2120,6 +2219,160 @@ async def chat(
             channel=channel_name,
         )
 
+    async def store_assistant_reply(final_text: str) -> None:
+        if not session_key or not final_text:
+            return
+        last_entry = dialog_history[-1] if dialog_history else None
+        if last_entry and last_entry.get("role") == RoleEnum.assistant.value and last_entry.get("content") == final_text:
+            return
+        try:
+            await session_store.append_session_message(
+                contexts_collection,
+                session_key,
+                RoleEnum.assistant.value,
+                final_text,
+                project=project_name,
+                keep=keep_messages,
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning(
+                "session_history_append_failed",
+                role="assistant",
+                session=session_key,
+                project=project_name,
+                error=str(exc),
+            )
+        else:
+            dialog_history.append({
+                "role": RoleEnum.assistant.value,
+                "content": final_text,
+            })
+
+    session_cookie = session_base if session_generated else None
+    emotion_instruction = EMOTION_ON_PROMPT if emotions_enabled else EMOTION_OFF_PROMPT
+
+    direct_qa = None
+    if not _detect_attachment_consent(question):
+        direct_qa = await _match_direct_qa(mongo_client, question, project_obj)
+    if direct_qa is not None:
+        qa_answer = str(direct_qa.get("answer") or "").strip()
+        paraphrase = bool(getattr(project_obj, "qa_direct_paraphrase", None))
+        qa_prompt = ""
+        if paraphrase:
+            qa_prompt = "\n\n".join(
+                [
+                    QA_PARAPHRASE_PROMPT,
+                    emotion_instruction,
+                    f"Вопрос пользователя: {normalized_question or question}\nОтвет из базы: {qa_answer}",
+                    "Ассистент:",
+                ]
+            )
+        qa_info = {
+            "id": direct_qa.get("id"),
+            "question": direct_qa.get("question"),
+            "score": direct_qa.get("score"),
+        }
+        logger.info(
+            "qa_direct_answer",
+            project=project_name,
+            session=session_key,
+            qa_id=qa_info["id"],
+            score=qa_info["score"],
+            paraphrase=paraphrase,
+        )
+
+        async def direct_event_stream():
+            chunks: list[str] = []
+            error_text: str | None = None
+            meta_payload = {
+                "emotions_enabled": emotions_enabled,
+                "session_id": session_key,
+                "debug_enabled": send_debug,
+                "debug_info_enabled": info_enabled,
+                "debug_origin": debug_origin,
+                "attachments_pending": 0,
+                "model": effective_model if paraphrase else "qa",
+                "reading_mode": False,
+                "reading_available": False,
+                "bitrix_used": False,
+                "mail_used": False,
+                "source": "qa",
+                "qa": qa_info,
+                "paraphrased": paraphrase,
+            }
+            build_payload = _build_payload()
+            if build_payload:
+                meta_payload["build"] = build_payload
+            yield "event: meta\n"
+            yield f"data: {json.dumps(meta_payload, ensure_ascii=False)}\n\n"
+            if send_debug:
+                debug_payload = {
+                    "stage": "begin",
+                    "session_id": session_key,
+                    "project": project_name,
+                    "channel": channel_name,
+                    "question_preview": question[:160],
+                    "source": "qa",
+                    "qa": qa_info,
+                    "paraphrased": paraphrase,
+                    "ts": time.time(),
+                }
+                yield "event: debug\n"
+                yield f"data: {json.dumps(debug_payload, ensure_ascii=False)}\n\n"
+            try:
+                if paraphrase:
+                    try:
+                        async for token in llm_client.generate(qa_prompt, model=model_override):
+                            chunks.append(token)
+                            payload = {"text": token, "role": "assistant", "meta": {"source": "qa"}}
+                            yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                    except Exception as exc:  # noqa: BLE001
+                        logger.warning("qa_paraphrase_failed", project=project_name, error=str(exc))
+                        if chunks:
+                            raise
+                if not chunks:
+                    # Verbatim answer (or paraphrasing failed before the first token).
+                    chunks.append(qa_answer)
+                    payload = {"text": qa_answer, "role": "assistant", "meta": {"source": "qa"}}
+                    yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            except Exception as exc:  # noqa: BLE001
+                error_text = str(exc)
+                yield "event: llm_error\ndata: generation_failed\n\n"
+            finally:
+                final_text = "".join(chunks).strip()
+                if send_debug:
+                    debug_payload = {
+                        "stage": "end",
+                        "session_id": session_key,
+                        "project": project_name,
+                        "channel": channel_name,
+                        "response_chars": len(final_text),
+                        "error": error_text,
+                        "source": "qa",
+                        "ts": time.time(),
+                    }
+                    yield "event: debug\n"
+                    yield f"data: {json.dumps(debug_payload, ensure_ascii=False)}\n\n"
+                yield "event: end\ndata: [DONE]\n\n"
+                await request.state.mongo.log_request_stat(
+                    project=project_name,
+                    question=question,
+                    response_chars=len(final_text),
+                    attachments=0,
+                    prompt_chars=len(qa_prompt),
+                    channel=channel_name,
+                    session_id=session_key,
+                    user_id=None,
+                    error=error_text,
+                )
+                await store_assistant_reply(final_text)
+
+        return _sse_response(
+            direct_event_stream(),
+            effective_model if paraphrase else "qa",
+            session_cookie,
+        )
+
     now_ts = time.time()
     await _prune_pending_attachments(request.app, now_ts)
 
@@ -2273,7 +2526,6 @@ async def chat(
             details=mail_debug,
         )
 
-    emotion_instruction = EMOTION_ON_PROMPT if emotions_enabled else EMOTION_OFF_PROMPT
     if not reading_mode and reading_service.collect_reading_items(knowledge_snippets):
         reading_mode = True
     system_prompts: list[str] = []
@@ -2347,15 +2599,7 @@ async def chat(
 
     async def event_stream():
         nonlocal stream_chars, error_message
-        build_info = get_build_info()
-        build_payload = {
-            key: build_info.get(key)
-            for key in ("version", "revision", "built_at", "built_at_iso")
-            if build_info.get(key) is not None
-        }
-        components = build_info.get("components")
-        if components:
-            build_payload["components"] = components
+        build_payload = _build_payload()
         try:
             meta_payload = {
                 "emotions_enabled": emotions_enabled,
@@ -2485,45 +2729,9 @@ async def chat(
                 user_id=None,
                 error=error_message,
             )
-            final_text = "".join(response_chunks).strip()
-            if session_key and final_text:
-                last_entry = dialog_history[-1] if dialog_history else None
-                if not last_entry or last_entry.get("role") != RoleEnum.assistant.value or last_entry.get("content") != final_text:
-                    try:
-                        await mongo_client.append_session_message(
-                            contexts_collection,
-                            session_key,
-                            RoleEnum.assistant.value,
-                            final_text,
-                            project=project_name,
-                            keep=keep_messages,
-                        )
-                    except Exception as exc:  # noqa: BLE001
-                        logger.warning(
-                            "session_history_append_failed",
-                            role="assistant",
-                            session=session_key,
-                            project=project_name,
-                            error=str(exc),
-                        )
-                    else:
-                        dialog_history.append({
-                            "role": RoleEnum.assistant.value,
-                            "content": final_text,
-                        })
-
-    model_header = effective_model
-    headers = {"X-Model-Name": model_header}
-    response = StreamingResponse(event_stream(), media_type="text/event-stream", headers=headers)
-    if session_generated:
-        response.set_cookie(
-            "chat_session",
-            session_base,
-            max_age=30 * 24 * 3600,
-            httponly=False,
-            samesite="Lax",
-        )
-    return response
+            await store_assistant_reply("".join(response_chunks).strip())
+
+    return _sse_response(event_stream(), effective_model, session_cookie)
 
 
 @llm_router.get("/project-config", response_class=ORJSONResponse)
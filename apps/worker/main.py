@@ -7,12 +7,13 @@ import time
 from collections.abc import Generator
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-from typing import Dict
+from typing import Any, Dict
 from urllib.parse import quote_plus
 
 from bson import ObjectId
 from gridfs import GridFS
-from pymongo import MongoClient as SyncMongoClient
+from pymongo import MongoClient as SyncMongoClient, ReplaceOne
+from redis import Redis as SyncRedis
 from celery import Celery
 from celery.schedules import crontab
 from celery.signals import worker_ready
@@ -27,11 +28,20 @@ from packages.utils.backup import (
     perform_restore,
     should_run_backup,
 )
+from packages.backend.cache import bump_generations_sync
+from packages.core.blobs import document_blob_id, read_blob_sync, release_blob_sync
 from packages.core.models import BackupOperation, BackupStatus, Document, VoiceTrainingStatus
-from packages.core.mongo import MongoClient as AsyncMongoClient
+from packages.core.mongo import _DOCUMENT_PROJECTION, MongoClient as AsyncMongoClient
 from packages.core.settings import Settings
+from packages.core.storage_usage import (
+    document_usage,
+    increment_sync as increment_storage_sync,
+    project_key as storage_project_key,
+)
 from packages.core.vectors import DocumentsParser
+from packages.knowledge.chunking import Passage
 from packages.core.yallm import YaLLMEmbeddings
+from packages.retrieval.local_index import from_env as local_index_from_env
 from packages.core.status import status_dict
 from packages.utils.observability.logging import configure_logging
 
@@ -81,6 +91,7 @@ def update_vector_store():
     try:
         db = mongo_client[settings.mongo.database]
         documents_collection = db[settings.mongo.documents]
+        chunks_collection = db[settings.mongo.chunks]
         settings_collection = db[settings.mongo.settings]
 
         cleanup_stats = prune_knowledge_collection(db, documents_collection)
@@ -101,6 +112,20 @@ def update_vector_store():
                 index="documents_ts",
                 error=str(exc),
             )
+        try:
+            chunks_collection.create_index([("docId", 1), ("index", 1)], name="chunks_doc_index")
+            chunks_collection.create_index("deleted", name="chunks_deleted", sparse=True)
+        except Exception as exc:
+            logger.debug(
+                "mongo_index_create_failed",
+                collection=settings.mongo.chunks,
+                index="chunks_doc_index",
+                error=str(exc),
+            )
+
+        purged = purge_deleted_chunks(chunks_collection, vector_store)
+        if purged:
+            logger.info("deleted_passages_purged", vectors=purged)
 
         state_key = "vector_store_state"
         state = settings_collection.find_one({"_id": state_key}) or {}
@@ -121,12 +146,24 @@ def update_vector_store():
 
         processed = 0
         latest_ts = last_ts
+        projects: set[str | None] = set(cleanup_stats.get("projects") or [])
 
         for document, data in get_documents_sync(
             mongo_client, filter_query=filter_query
         ):
             logger.info("embedding", document=document.name)
-            vector_store.parse_document(document.name, document.fileId, data)
+            project_key = document.project or document.domain
+            passages = vector_store.parse_document(
+                document.name,
+                document.fileId,
+                data,
+                project=project_key,
+                url=document.url,
+            ) or []
+            stale = replace_document_chunks(chunks_collection, document, passages)
+            if stale:
+                vector_store.delete_vectors(stale, project=project_key)
+            projects.add(document.project or document.domain)
             processed += 1
             if document.ts is not None:
                 try:
@@ -145,6 +182,8 @@ def update_vector_store():
             {"$set": state_payload},
             upsert=True,
         )
+        if processed or cleanup_stats["removed"]:
+            _bump_cache_generations(projects)
         logger.info(
             "vector store update complete",
             processed=processed,
@@ -152,9 +191,70 @@ def update_vector_store():
         )
     finally:
         mongo_client.close()
+        if vector_store.local_index is not None:
+            vector_store.local_index.save()
         del vector_store
 
 
+def purge_deleted_chunks(collection, vector_store) -> int:
+    """Remove the vectors of tombstoned chunk records, then the records.
+
+    Deleting a document marks its chunk records ``deleted`` (see
+    ``MongoClient._tombstone_chunks``) because only this process holds the
+    Redis vector store and writes the local vector index.
+    """
+
+    by_project: dict[str | None, list[str]] = {}
+    for record in collection.find({"deleted": True}, {"_id": 1, "project": 1}):
+        by_project.setdefault(record.get("project"), []).append(record["_id"])
+    purged = 0
+    for project, ids in by_project.items():
+        vector_store.delete_vectors(ids, project=project)
+        collection.delete_many({"_id": {"$in": ids}, "deleted": True})
+        purged += len(ids)
+    return purged
+
+
+def replace_document_chunks(collection, document: Document, passages: list[Passage]) -> set[str]:
+    """Store ``passages`` as the chunk records of ``document``.
+
+    Returns the vector ids that no longer exist: passages beyond the new
+    count, or the whole-document id used before chunking.
+    """
+
+    previous = {
+        record["_id"]
+        for record in collection.find({"docId": document.fileId}, {"_id": 1})
+    }
+    project_key = document.project or document.domain
+    records = [
+        passage.to_record(project=project_key, name=document.name, url=document.url, ts=document.ts)
+        for passage in passages
+    ]
+    if records:
+        collection.bulk_write(
+            [ReplaceOne({"_id": record["_id"]}, record, upsert=True) for record in records],
+            ordered=False,
+        )
+    current = {passage.id for passage in passages}
+    stale = (previous or {document.fileId}) - current
+    if previous & stale:
+        collection.delete_many({"_id": {"$in": sorted(previous & stale)}})
+    return stale
+
+
+def _bump_cache_generations(projects: set[str | None]) -> None:
+    """Invalidate cached answers and search results for reindexed ``projects``."""
+    try:
+        client = SyncRedis.from_url(str(settings.redis_url))
+        try:
+            bump_generations_sync(client, projects)
+        finally:
+            client.close()
+    except Exception as exc:  # noqa: BLE001 - stale cache entries expire anyway
+        logger.warning("cache_generation_bump_failed", error=str(exc))
+
+
 def get_documents_sync(
     mongo_client: SyncMongoClient,
     *,
@@ -176,17 +276,17 @@ def get_documents_sync(
     collection = db[settings.mongo.documents]
     gridfs = GridFS(db)
     query = filter_query or {}
-    cursor = collection.find(query, {"_id": False}).sort("ts", 1).batch_size(50)
+    cursor = collection.find(query, _DOCUMENT_PROJECTION).sort("ts", 1).batch_size(50)
 
     for raw_doc in cursor:
         document = Document(**raw_doc)
         try:
-            file = gridfs.get(ObjectId(document.fileId))
+            payload = read_blob_sync(gridfs, document_blob_id(raw_doc))
         except Exception as exc:
             logger.warning("gridfs_fetch_failed", file_id=document.fileId, error=str(exc))
             continue
 
-        yield document, file.read()
+        yield document, payload
 
 
 def get_mongo_client() -> SyncMongoClient:
@@ -215,6 +315,7 @@ def get_document_parser() -> DocumentsParser:
         0,
         settings.redis.password,
         settings.redis.secure,
+        local_index=local_index_from_env(),
     )
 
 
@@ -284,18 +385,33 @@ def _looks_like_navigation_snippet(text: str) -> bool:
 
 
 def _delete_document(collection, gridfs: GridFS, file_id: str) -> None:
-    collection.delete_one({"fileId": file_id})
-    try:
-        gridfs.delete(ObjectId(file_id))
-    except Exception:
-        logger.debug("gridfs_delete_skip", file_id=file_id)
+    removed = collection.find_one_and_delete(
+        {"fileId": file_id},
+        {"fileId": 1, "blobId": 1, "project": 1, "domain": 1, "size_bytes": 1, "content_type": 1},
+    )
+    # Tombstones: the vectors are removed by ``purge_deleted_chunks``.
+    project = (removed or {}).get("project") or (removed or {}).get("domain")
+    chunks = collection.database[settings.mongo.chunks]
+    chunks.update_many({"docId": file_id}, {"$set": {"deleted": True}})
+    chunks.update_one(
+        {"_id": file_id}, {"$set": {"docId": file_id, "project": project, "deleted": True}}, upsert=True
+    )
+    release_blob_sync(collection.database, gridfs, document_blob_id(removed or {"fileId": file_id}))
+    if removed:
+        increment_storage_sync(
+            collection.database, {storage_project_key(removed): document_usage(removed, -1)}
+        )
+
 
+def prune_knowledge_collection(db, collection) -> dict[str, Any]:
+    """Remove duplicate and low-value knowledge documents before processing.
 
-def prune_knowledge_collection(db, collection) -> dict[str, int]:
-    """Remove duplicate and low-value knowledge documents before processing."""
+    ``projects`` in the result lists the projects that lost documents.
+    """
 
     gridfs = GridFS(db)
     seen_hashes: dict[str, set[str]] = {}
+    touched: set[str] = set()
     removed = duplicates = low_value = 0
     try:
         cursor = collection.find(
@@ -320,6 +436,7 @@ def prune_knowledge_collection(db, collection) -> dict[str, int]:
                 _delete_document(collection, gridfs, file_id)
                 duplicates += 1
                 removed += 1
+                touched.add(project_key)
                 continue
 
             skip_low_value = False
@@ -333,6 +450,7 @@ def prune_knowledge_collection(db, collection) -> dict[str, int]:
                 _delete_document(collection, gridfs, file_id)
                 low_value += 1
                 removed += 1
+                touched.add(project_key)
                 continue
 
             if content_hash:
@@ -340,7 +458,12 @@ def prune_knowledge_collection(db, collection) -> dict[str, int]:
     except Exception as exc:  # noqa: BLE001
         logger.warning("knowledge_prune_failed", error=str(exc))
 
-    return {"removed": removed, "duplicates": duplicates, "low_value": low_value}
+    return {
+        "removed": removed,
+        "duplicates": duplicates,
+        "low_value": low_value,
+        "projects": sorted(touched),
+    }
 
 @worker_ready.connect
 def on_startup(*args, **kwargs):
@@ -1,15 +1,33 @@
-"""Redis cache utilities for chat responses."""
+"""Redis cache utilities for chat responses.
+
+:class:`TwoTierCache` puts a size-bounded in-process LRU/TTL tier in front of
+Redis. Decoded values are kept locally, so hot keys skip both the network
+round trip and decoding; callers must treat returned values as read-only.
+Invalidations are broadcast on ``CACHE_INVALIDATION_CHANNEL`` so every
+replica drops its local copy (see :func:`start_invalidation_listener`).
+Lookups are counted per namespace and tier in ``cache_requests_total``.
+
+Keys are scoped by a per-project generation counter (:func:`scoped_key`).
+Anything that changes what a project would answer (documents, QA pairs,
+prompt/model settings, a vector store rebuild) calls
+:func:`bump_generation`, which makes every older key unreachable in O(1);
+the orphans simply expire, which is why TTLs can be measured in days.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
 from functools import wraps
 from typing import Any, Awaitable, Callable, Coroutine
 import json
-import importlib
-from types import SimpleNamespace
-import dataclasses
 
+from prometheus_client import REGISTRY, Counter
 from redis.asyncio import ConnectionPool, Redis
 import structlog
 
@@ -18,10 +36,32 @@ try:
 except ImportError:  # pragma: no cover - fallback for test stubs
     from packages.core.settings import get_settings  # type: ignore[assignment]
 
+from packages.backend import codec
+
 logger = structlog.get_logger(__name__)
 
 _POOL: ConnectionPool | None = None
 
+CACHE_TTL = int(os.getenv("CACHE_TTL", str(7 * 86400)))
+CACHE_LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "60"))
+CACHE_LOCAL_MAXSIZE = int(os.getenv("CACHE_LOCAL_MAXSIZE", "1024"))
+# Generations are re-read from Redis at most this often even if a pub/sub
+# invalidation is missed.
+CACHE_GEN_LOCAL_TTL = float(os.getenv("CACHE_GEN_LOCAL_TTL", "5"))
+GENERATION_PREFIX = "cache:gen:"
+INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache:invalidate")
+# Identifies this process so it can ignore its own invalidation broadcasts.
+_INSTANCE_ID = uuid.uuid4().hex
+
+try:
+    cache_requests = Counter(
+        "cache_requests_total",
+        "Cache lookups by namespace, tier and result",
+        ["namespace", "tier", "result"],
+    )
+except ValueError:  # module loaded twice (tests import it by path)
+    cache_requests = REGISTRY._names_to_collectors["cache_requests_total"]  # type: ignore[assignment]
+
 
 def _get_redis() -> Redis:
     """Return a Redis client using a global connection pool."""
@@ -33,10 +73,320 @@ def _get_redis() -> Redis:
     return Redis(connection_pool=_POOL)
 
 
+class LocalTTLCache:
+    """Size-bounded LRU whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int = CACHE_LOCAL_MAXSIZE, ttl: float = CACHE_LOCAL_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_MISS = object()
+
+
+def _as_text(raw: Any) -> str:
+    return raw.decode() if isinstance(raw, (bytes, bytearray)) else raw
+
+
+_encode, _decode = codec.get_codec()
+
+
+class TwoTierCache:
+    """In-process LRU/TTL tier in front of Redis for one key namespace.
+
+    Parameters
+    ----------
+    namespace:
+        Label used for metrics and invalidation messages.
+    ttl:
+        Redis expiry in seconds.
+    encode, decode:
+        Convert values to/from the Redis representation. ``decode`` may
+        return ``None`` to treat foreign data as a miss. Defaults to the
+        codec selected by ``CACHE_CODEC`` (see :mod:`packages.backend.codec`).
+    local_ttl, local_maxsize:
+        Bounds of the in-process tier. Set either to ``0`` to disable it.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        ttl: int = CACHE_TTL,
+        encode: Callable[[Any], Any] = _encode,
+        decode: Callable[[Any], Any] = _decode,
+        local_ttl: float = CACHE_LOCAL_TTL,
+        local_maxsize: int = CACHE_LOCAL_MAXSIZE,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.encode = encode
+        self.decode = decode
+        self.local = LocalTTLCache(local_maxsize, local_ttl)
+
+    def _count(self, tier: str, hit: bool) -> None:
+        cache_requests.labels(self.namespace, tier, "hit" if hit else "miss").inc()
+
+    async def get(self, key: str, *, redis: Redis | None = None) -> Any:
+        """Return the cached value for ``key`` or ``None``.
+
+        ``redis`` overrides the pooled client (callers with their own handle).
+        """
+
+        value = self.local.get(key, _MISS)
+        if value is not _MISS:
+            self._count("local", True)
+            return value
+        self._count("local", False)
+        raw = await (redis or _get_redis()).get(key)
+        value = None if raw is None else self.decode(raw)
+        self._count("redis", value is not None)
+        if value is not None:
+            self.local.set(key, value)
+        return value
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: int | None = None,
+        *,
+        redis: Redis | None = None,
+    ) -> None:
+        """Store ``value`` in both tiers."""
+
+        await (redis or _get_redis()).setex(key, ttl or self.ttl, self.encode(value))
+        self.local.set(key, value)
+
+    async def delete(self, key: str) -> None:
+        """Remove ``key`` from Redis and from every replica's local tier."""
+
+        await _get_redis().delete(key)
+        self.local.pop(key)
+        await publish_invalidation(self.namespace, key)
+
+    async def clear_local(self, *, broadcast: bool = True) -> None:
+        """Drop the local tier of this namespace (on all replicas)."""
+
+        self.local.clear()
+        if broadcast:
+            await publish_invalidation(self.namespace)
+
+
+_CACHES: dict[str, TwoTierCache] = {}
+
+
+def get_cache(namespace: str, **kwargs: Any) -> TwoTierCache:
+    """Return the shared :class:`TwoTierCache` for ``namespace``."""
+
+    cache = _CACHES.get(namespace)
+    if cache is None:
+        cache = _CACHES[namespace] = TwoTierCache(namespace, **kwargs)
+    return cache
+
+
+_LOCAL_CACHES: dict[str, LocalTTLCache] = {}
+
+
+def get_local_cache(
+    namespace: str,
+    *,
+    ttl: float = CACHE_LOCAL_TTL,
+    maxsize: int = CACHE_LOCAL_MAXSIZE,
+) -> LocalTTLCache:
+    """Return the shared in-process-only cache for ``namespace``.
+
+    For values that should never be written to Redis (e.g. project settings
+    carrying tokens). Invalidated through the same pub/sub channel as
+    :class:`TwoTierCache`; ``ttl`` bounds staleness if a message is missed.
+    """
+
+    cache = _LOCAL_CACHES.get(namespace)
+    if cache is None:
+        cache = _LOCAL_CACHES[namespace] = LocalTTLCache(maxsize, ttl)
+    return cache
+
+
+def _local_tier(namespace: str) -> LocalTTLCache | None:
+    cache = _CACHES.get(namespace)
+    return cache.local if cache is not None else _LOCAL_CACHES.get(namespace)
+
+
+def clear_local_caches() -> None:
+    """Empty the in-process tier of every namespace (this process only)."""
+
+    for cache in _CACHES.values():
+        cache.local.clear()
+    for local in _LOCAL_CACHES.values():
+        local.clear()
+
+
+async def publish_invalidation(
+    namespace: str,
+    key: str | None = None,
+    *,
+    redis: Redis | None = None,
+) -> None:
+    """Ask other replicas to drop ``key`` (or the whole ``namespace``)."""
+
+    message = json.dumps({"ns": namespace, "key": key, "origin": _INSTANCE_ID})
+    try:
+        await (redis or _get_redis()).publish(INVALIDATION_CHANNEL, message)
+    except Exception as exc:  # noqa: BLE001 - local TTL bounds staleness anyway
+        logger.warning("cache_invalidation_publish_failed", namespace=namespace, error=str(exc))
+
+
+def _apply_invalidation(data: Any) -> None:
+    try:
+        message = json.loads(_as_text(data))
+    except (TypeError, ValueError):
+        return
+    if not isinstance(message, dict) or message.get("origin") == _INSTANCE_ID:
+        return
+    local = _local_tier(str(message.get("ns")))
+    if local is None:
+        return
+    key = message.get("key")
+    if key:
+        local.pop(key)
+    else:
+        local.clear()
+
+
+async def _listen_invalidations() -> None:
+    while True:
+        pubsub = _get_redis().pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            logger.info("cache_invalidation_listener_started", channel=INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _apply_invalidation(message.get("data"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            # Entries cached while disconnected may have missed invalidations.
+            clear_local_caches()
+            logger.warning("cache_invalidation_listener_failed", error=str(exc))
+            await asyncio.sleep(1.0)
+        finally:
+            try:
+                await pubsub.aclose()
+            except Exception:  # noqa: BLE001
+                pass
+
+
+def start_invalidation_listener() -> asyncio.Task:
+    """Start the pub/sub subscriber; cancel the returned task to stop it."""
+
+    return asyncio.create_task(_listen_invalidations(), name="cache-invalidation")
+
+
+def _scope(project: str | None) -> str:
+    return (project or "").strip().lower() or "-"
+
+
+def generation_key(project: str | None) -> str:
+    """Return the Redis key of ``project``'s generation (``-`` is global)."""
+
+    return GENERATION_PREFIX + _scope(project)
+
+
+# Project used by decorated functions that do not receive one explicitly.
+current_project: ContextVar[str | None] = ContextVar("cache_project", default=None)
+
+
+async def get_generation(project: str | None, *, redis: Redis | None = None) -> int:
+    """Return the current generation of ``project`` (``0`` if never bumped)."""
+
+    generations = get_cache("generation", local_ttl=CACHE_GEN_LOCAL_TTL)
+    key = generation_key(project)
+    value = generations.local.get(key, _MISS)
+    if value is _MISS:
+        raw = await (redis or _get_redis()).get(key)
+        value = int(_as_text(raw)) if raw is not None else 0
+        generations.local.set(key, value)
+    return value
+
+
+async def scoped_key(
+    namespace: str,
+    project: str | None,
+    *parts: str,
+    redis: Redis | None = None,
+) -> str:
+    """Return ``namespace:project:g<generation>:parts...``."""
+
+    generation = await get_generation(project, redis=redis)
+    return ":".join([namespace, _scope(project), f"g{generation}", *parts])
+
+
+async def bump_generation(project: str | None, *, redis: Redis | None = None) -> None:
+    """Invalidate every cached entry of ``project``.
+
+    The global generation is bumped as well because unscoped entries may
+    include the project's data.
+    """
+
+    client = redis or _get_redis()
+    generations = get_cache("generation", local_ttl=CACHE_GEN_LOCAL_TTL)
+    for key in {generation_key(project), generation_key(None)}:
+        await client.incr(key)
+        generations.local.pop(key)
+        await publish_invalidation("generation", key, redis=client)
+    logger.info("cache_generation_bumped", project=_scope(project))
+
+
+def bump_generations_sync(client: Any, projects: Any) -> None:
+    """Synchronous :func:`bump_generation` for ``redis.Redis`` (Celery worker)."""
+
+    keys = {generation_key(project) for project in projects} | {generation_key(None)}
+    for key in keys:
+        client.incr(key)
+        client.publish(
+            INVALIDATION_CHANNEL,
+            json.dumps({"ns": "generation", "key": key, "origin": _INSTANCE_ID}),
+        )
+
+
 def cache_response(
     func: Callable[..., Awaitable[Any]]
 ) -> Callable[..., Coroutine[Any, Any, Any]]:
-    """Cache decorated coroutine results in Redis for 24h."""
+    """Cache decorated coroutine results (local tier + Redis).
+
+    Keys are scoped to :data:`current_project` and its generation.
+    """
+
+    cache = get_cache("response")
 
     @wraps(func)
     async def wrapper(*args: Any, **kwargs: Any) -> Any:
@@ -60,16 +410,18 @@ def cache_response(
                         break
         if question is None:
             raise ValueError("No question string found for caching")
-        key = hashlib.sha1(question.lower().encode()).hexdigest()
-        redis = _get_redis()
-        cached = await redis.get(key)
+        key = await scoped_key(
+            "response",
+            current_project.get(),
+            func.__qualname__,
+            hashlib.sha1(question.lower().encode()).hexdigest(),
+        )
+        cached = await cache.get(key)
         if cached is not None:
             logger.info("cache hit", key=key)
-            data = cached.decode() if isinstance(cached, (bytes, bytearray)) else cached
-            return _deserialize(json.loads(data))
+            return cached
         answer = await func(*args, **kwargs)
-        serialized = json.dumps(_serialize(answer), ensure_ascii=False)
-        await redis.setex(key, 86400, serialized)
+        await cache.set(key, answer)
         logger.info("cache store", key=key)
         return answer
 
@@ -79,71 +431,45 @@ def cache_response(
 def cache_query_rewrite(
     func: Callable[..., Awaitable[str]]
 ) -> Callable[..., Coroutine[Any, Any, str]]:
-    """Cache query rewrite results in Redis for 24h."""
+    """Cache query rewrite results (local tier + Redis).
+
+    Keys are scoped like :func:`cache_response`.
+    """
+
+    cache = get_cache("rewrite", encode=lambda value: value, decode=_as_text)
 
     @wraps(func)
     async def wrapper(query: str, *args: Any, **kwargs: Any) -> str:
-        key = "rewrite:" + hashlib.sha1(query.lower().encode()).hexdigest()
-        redis = _get_redis()
-        cached = await redis.get(key)
+        key = await scoped_key(
+            "rewrite", current_project.get(), hashlib.sha1(query.lower().encode()).hexdigest()
+        )
+        cached = await cache.get(key)
         if cached is not None:
             logger.info("cache hit", key=key)
-            return cached.decode()
+            return cached
         rewritten = await func(query, *args, **kwargs)
-        await redis.setex(key, 86400, rewritten)
+        await cache.set(key, rewritten)
         logger.info("cache store", key=key)
         return rewritten
 
     return wrapper
 
 
-__all__ = ["cache_response", "cache_query_rewrite"]
-
-
-def _serialize(obj: Any) -> Any:
-    """Recursively convert objects to JSON-serializable structures."""
-    if isinstance(obj, list):
-        return [_serialize(item) for item in obj]
-    if isinstance(obj, dict):
-        return {key: _serialize(val) for key, val in obj.items()}
-    if isinstance(obj, SimpleNamespace):
-        return {"__cls__": "types.SimpleNamespace", **_serialize(obj.__dict__)}
-    if dataclasses.is_dataclass(obj):
-        return {
-            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
-            **_serialize(dataclasses.asdict(obj)),
-        }
-    if hasattr(obj, "model_dump"):
-        return {
-            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
-            **_serialize(obj.model_dump()),
-        }
-    if hasattr(obj, "__dict__"):
-        return {
-            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
-            **_serialize(obj.__dict__),
-        }
-    return obj
-
-
-def _deserialize(obj: Any) -> Any:
-    """Reconstruct objects previously serialized with :func:`_serialize`."""
-    if isinstance(obj, list):
-        return [_deserialize(item) for item in obj]
-    if isinstance(obj, dict):
-        cls_name = obj.get("__cls__")
-        if cls_name:
-            payload = {k: _deserialize(v) for k, v in obj.items() if k != "__cls__"}
-            if cls_name == "types.SimpleNamespace":
-                return SimpleNamespace(**payload)
-            module_name, _, class_name = cls_name.rpartition(".")
-            try:
-                module = importlib.import_module(module_name)
-                cls = getattr(module, class_name)
-                if hasattr(cls, "model_validate"):
-                    return cls.model_validate(payload)  # type: ignore[call-arg]
-                return cls(**payload)
-            except Exception:  # pragma: no cover - fallback on failure
-                return payload
-        return {k: _deserialize(v) for k, v in obj.items()}
-    return obj
+__all__ = [
+    "LocalTTLCache",
+    "TwoTierCache",
+    "bump_generation",
+    "bump_generations_sync",
+    "cache_query_rewrite",
+    "cache_response",
+    "clear_local_caches",
+    "current_project",
+    "generation_key",
+    "get_cache",
+    "get_generation",
+    "get_local_cache",
+    "publish_invalidation",
+    "scoped_key",
+    "start_invalidation_listener",
+]
+
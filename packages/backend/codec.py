@@ -0,0 +1,273 @@
+"""Value codecs for the Redis cache.
+
+Two codecs are available (``CACHE_CODEC``):
+
+``binary`` (default)
+    ``orjson`` with a registry of known types. Registered classes are written
+    as ``{"__t": tag, "v": ...}`` and revived without any dynamic import;
+    payloads of ``CACHE_ZSTD_THRESHOLD`` bytes or more are zstd-compressed
+    when :mod:`zstandard` is installed. Uncompressed values stay valid JSON.
+``json``
+    The original recursive ``__cls__`` scheme (``json`` + ``importlib``).
+
+Both decoders understand each other's uncompressed output, so switching the
+codec does not invalidate existing entries. Unregistered dataclasses and
+pydantic models fall back to the ``__cls__`` form.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import importlib
+import json
+import os
+import threading
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import orjson
+import structlog
+
+try:  # optional dependency (``pip install .[cache]``)
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None  # type: ignore[assignment]
+
+logger = structlog.get_logger(__name__)
+
+CACHE_CODEC = os.getenv("CACHE_CODEC", "binary").strip().lower()
+ZSTD_THRESHOLD = int(os.getenv("CACHE_ZSTD_THRESHOLD", "2048"))
+ZSTD_LEVEL = int(os.getenv("CACHE_ZSTD_LEVEL", "3"))
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+_local = threading.local()
+_BY_TYPE: dict[type, tuple[str, Callable[[Any], Any]]] = {}
+_BY_TAG: dict[str, Callable[[Any], Any]] = {}
+_CLASS_CACHE: dict[str, type | None] = {}
+
+
+def register_type(
+    cls: type,
+    tag: str | None = None,
+    *,
+    dump: Callable[[Any], Any] | None = None,
+    load: Callable[[Any], Any] | None = None,
+) -> type:
+    """Register ``cls`` with the binary codec under ``tag``.
+
+    Namedtuples, dataclasses and pydantic models get default ``dump`` and
+    ``load`` functions; other classes must provide both. The tag is stored
+    in every value, so keep it short and stable across refactors.
+    """
+
+    tag = tag or f"{cls.__module__}.{cls.__qualname__}"
+    if dump is None or load is None:
+        if issubclass(cls, tuple) and hasattr(cls, "_fields"):
+            dump = dump or list
+            load = load or (lambda value: cls(*value))
+        elif dataclasses.is_dataclass(cls):
+            names = [field.name for field in dataclasses.fields(cls)]
+            dump = dump or (lambda obj: {name: getattr(obj, name) for name in names})
+            load = load or (lambda value: cls(**value))
+        elif hasattr(cls, "model_validate"):
+            dump = dump or (lambda obj: obj.model_dump(by_alias=True))
+            load = load or cls.model_validate  # type: ignore[attr-defined]
+        else:
+            raise TypeError(f"dump/load required for {cls!r}")
+    _BY_TYPE[cls] = (tag, dump)
+    _BY_TAG[tag] = load
+    return cls
+
+
+def _class_path(obj: Any) -> str:
+    return f"{obj.__class__.__module__}.{obj.__class__.__name__}"
+
+
+def _default(obj: Any) -> Any:
+    """``orjson`` hook for values it does not serialize natively."""
+
+    entry = _BY_TYPE.get(type(obj))
+    if entry is not None:
+        tag, dump = entry
+        return {"__t": tag, "v": dump(obj)}
+    # ``OPT_PASSTHROUGH_SUBCLASS`` routes str/int/dict/list subclasses here.
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return list(obj)
+    if isinstance(obj, SimpleNamespace):
+        return {"__cls__": "types.SimpleNamespace", **vars(obj)}
+    if dataclasses.is_dataclass(obj):
+        fields = {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+        return {"__cls__": _class_path(obj), **fields}
+    if hasattr(obj, "model_dump"):
+        return {"__cls__": _class_path(obj), **obj.model_dump()}
+    if hasattr(obj, "__dict__"):
+        return {"__cls__": _class_path(obj), **vars(obj)}
+    raise TypeError(f"cannot encode {type(obj)!r}")
+
+
+def _load_class(path: str) -> type | None:
+    if path not in _CLASS_CACHE:
+        module_name, _, class_name = path.rpartition(".")
+        try:
+            _CLASS_CACHE[path] = getattr(importlib.import_module(module_name), class_name)
+        except Exception:  # noqa: BLE001 - keep the plain mapping
+            _CLASS_CACHE[path] = None
+    return _CLASS_CACHE[path]
+
+
+def _revive(obj: Any) -> Any:
+    """Rebuild registered and ``__cls__`` objects in a decoded tree."""
+
+    if isinstance(obj, list):
+        return [_revive(item) for item in obj]
+    if not isinstance(obj, dict):
+        return obj
+    tag = obj.get("__t")
+    if tag is not None and len(obj) == 2 and "v" in obj:
+        load = _BY_TAG.get(tag)
+        value = _revive(obj["v"])
+        return load(value) if load is not None else value
+    cls_name = obj.get("__cls__")
+    if cls_name:
+        payload = {k: _revive(v) for k, v in obj.items() if k != "__cls__"}
+        if cls_name == "types.SimpleNamespace":
+            return SimpleNamespace(**payload)
+        cls = _load_class(cls_name)
+        if cls is None:
+            return payload
+        try:
+            if hasattr(cls, "model_validate"):
+                return cls.model_validate(payload)  # type: ignore[attr-defined]
+            return cls(**payload)
+        except Exception:  # noqa: BLE001 - fallback on failure
+            return payload
+    return {key: _revive(value) for key, value in obj.items()}
+
+
+def _zstd() -> tuple[Any, Any]:
+    """Return this thread's (compressor, decompressor) pair.
+
+    zstd contexts are cheap to reuse but must not be shared between threads.
+    """
+
+    pair = getattr(_local, "zstd", None)
+    if pair is None:
+        pair = (zstandard.ZstdCompressor(level=ZSTD_LEVEL), zstandard.ZstdDecompressor())
+        _local.zstd = pair
+    return pair
+
+
+def encode(value: Any) -> bytes:
+    """Serialize ``value`` with ``orjson`` (+ zstd above the threshold)."""
+
+    data = orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+    if zstandard is not None and ZSTD_THRESHOLD > 0 and len(data) >= ZSTD_THRESHOLD:
+        return _zstd()[0].compress(data)
+    return data
+
+
+def decode(raw: bytes | str) -> Any:
+    """Inverse of :func:`encode`; also reads :func:`json_encode` output."""
+
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8")
+    if raw[:4] == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed cache values")
+        raw = _zstd()[1].decompress(raw)
+    value = orjson.loads(raw)
+    # Plain data (the common case) needs no tree walk at all.
+    if b'"__t"' in raw or b'"__cls__"' in raw:
+        return _revive(value)
+    return value
+
+
+def _serialize(obj: Any) -> Any:
+    """Recursively convert objects to JSON-serializable structures."""
+    if isinstance(obj, list):
+        return [_serialize(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _serialize(val) for key, val in obj.items()}
+    if isinstance(obj, SimpleNamespace):
+        return {"__cls__": "types.SimpleNamespace", **_serialize(obj.__dict__)}
+    if dataclasses.is_dataclass(obj):
+        return {
+            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
+            **_serialize(dataclasses.asdict(obj)),
+        }
+    if hasattr(obj, "model_dump"):
+        return {
+            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
+            **_serialize(obj.model_dump()),
+        }
+    if hasattr(obj, "__dict__"):
+        return {
+            "__cls__": f"{obj.__class__.__module__}.{obj.__class__.__name__}",
+            **_serialize(obj.__dict__),
+        }
+    return obj
+
+
+def _deserialize(obj: Any) -> Any:
+    """Reconstruct objects previously serialized with :func:`_serialize`."""
+    if isinstance(obj, list):
+        return [_deserialize(item) for item in obj]
+    if isinstance(obj, dict):
+        cls_name = obj.get("__cls__")
+        if cls_name:
+            payload = {k: _deserialize(v) for k, v in obj.items() if k != "__cls__"}
+            if cls_name == "types.SimpleNamespace":
+                return SimpleNamespace(**payload)
+            module_name, _, class_name = cls_name.rpartition(".")
+            try:
+                module = importlib.import_module(module_name)
+                cls = getattr(module, class_name)
+                if hasattr(cls, "model_validate"):
+                    return cls.model_validate(payload)  # type: ignore[call-arg]
+                return cls(**payload)
+            except Exception:  # pragma: no cover - fallback on failure
+                return payload
+        return {k: _deserialize(v) for k, v in obj.items()}
+    return obj
+
+
+def json_encode(value: Any) -> str:
+    """Original cache encoding: :func:`_serialize` + ``json.dumps``."""
+
+    return json.dumps(_serialize(value), ensure_ascii=False)
+
+
+def json_decode(raw: bytes | str) -> Any:
+    """Original cache decoding: ``json.loads`` + :func:`_deserialize`."""
+
+    text = raw.decode() if isinstance(raw, (bytes, bytearray)) else raw
+    return _deserialize(json.loads(text))
+
+
+def get_codec(name: str | None = None) -> tuple[Callable[[Any], Any], Callable[[Any], Any]]:
+    """Return ``(encode, decode)`` for ``name`` (defaults to ``CACHE_CODEC``)."""
+
+    name = (name or CACHE_CODEC).lower()
+    if name == "json":
+        return json_encode, json_decode
+    if name != "binary":
+        logger.warning("cache_codec_unknown", codec=name)
+    return encode, decode
+
+
+__all__ = [
+    "decode",
+    "encode",
+    "get_codec",
+    "json_decode",
+    "json_encode",
+    "register_type",
+]
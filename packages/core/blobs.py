@@ -0,0 +1,264 @@
+"""Content-addressed GridFS storage for document payloads.
+
+Recrawls and text re-uploads used to delete the previous GridFS file and
+upload the same bytes again. Payloads are now stored once per sha256 digest:
+the ``blobs`` collection (``MONGO_BLOBS``) maps ``_id`` (the digest) to the
+GridFS ``blobId`` and a reference count. Documents keep ``fileId`` as their
+identity and point to the payload through ``blobId``; deleting a document
+releases its reference and the GridFS file goes away with the last one.
+
+Documents written before blobs existed have no ``blobId``; their ``fileId``
+is the GridFS id (see :func:`document_blob_id`) and releasing it deletes the
+file directly.
+
+Text payloads (``text/*``, JSON, XML) of at least
+``GRIDFS_COMPRESS_MIN_BYTES`` are compressed before upload according to
+``GRIDFS_COMPRESSION`` (``zstd`` by default, ``zlib`` when :mod:`zstandard`
+is missing, ``none`` to disable). The codec is recorded as
+``metadata.codec`` on the GridFS file and readers decompress transparently,
+so compressed and plain files can coexist. The sha256 key is always computed
+over the original bytes.
+
+This module holds the synchronous helpers used by the crawler and the worker
+(pymongo + :class:`gridfs.GridFS`); :class:`packages.core.mongo.MongoClient`
+implements the same protocol on Motor.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import time
+import zlib
+from collections.abc import Iterable, Iterator
+from contextlib import suppress
+from typing import Any, Mapping
+
+import structlog
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+try:  # optional dependency (``pip install .[cache]``)
+    import zstandard
+except ImportError:  # pragma: no cover - zlib fallback
+    zstandard = None  # type: ignore[assignment]
+
+logger = structlog.get_logger(__name__)
+
+BLOBS_COLLECTION = os.getenv("MONGO_BLOBS", "blobs")
+GRIDFS_COMPRESSION = os.getenv("GRIDFS_COMPRESSION", "zstd").strip().lower()
+GRIDFS_COMPRESS_MIN_BYTES = int(os.getenv("GRIDFS_COMPRESS_MIN_BYTES", "1024"))
+GRIDFS_ZSTD_LEVEL = int(os.getenv("GRIDFS_ZSTD_LEVEL", "6"))
+
+_COMPRESSIBLE_TYPES = ("text/", "application/json", "application/xml", "application/xhtml+xml")
+# Keep the plain bytes unless compression saves at least this fraction.
+_MIN_SAVING = 0.1
+
+# A concurrent writer may insert or drop the record for the same digest
+# between our lookup and insert; retry the lookup this many times.
+_PUT_ATTEMPTS = 3
+
+
+def payload_sha256(payload: bytes) -> str:
+    """Hex sha256 digest used as the blob key."""
+
+    return hashlib.sha256(payload).hexdigest()
+
+
+def document_blob_id(doc: Mapping[str, Any]) -> str | None:
+    """GridFS id holding the payload of ``doc`` (``blobId`` or legacy ``fileId``)."""
+
+    return doc.get("blobId") or doc.get("fileId")
+
+
+def _codec(content_type: str | None) -> str | None:
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if not media_type.startswith(_COMPRESSIBLE_TYPES):
+        return None
+    if GRIDFS_COMPRESSION == "zstd":
+        return "zstd" if zstandard is not None else "zlib"
+    if GRIDFS_COMPRESSION == "zlib":
+        return "zlib"
+    return None
+
+
+def encode_payload(payload: bytes, content_type: str | None) -> tuple[bytes, dict[str, Any]]:
+    """Return the bytes to upload for ``payload`` and their GridFS metadata.
+
+    The metadata carries ``codec`` and ``raw_length`` when the payload was
+    compressed and is empty otherwise.
+    """
+
+    codec = _codec(content_type)
+    if codec is None or len(payload) < GRIDFS_COMPRESS_MIN_BYTES:
+        return payload, {}
+    if codec == "zstd":
+        data = zstandard.ZstdCompressor(level=GRIDFS_ZSTD_LEVEL).compress(payload)
+    else:
+        data = zlib.compress(payload, 6)
+    if len(data) > len(payload) * (1 - _MIN_SAVING):
+        return payload, {}
+    return data, {"codec": codec, "raw_length": len(payload)}
+
+
+def stream_compressor(content_type: str | None) -> tuple[str | None, Any]:
+    """Return ``(codec, compressor)`` for a payload uploaded in chunks.
+
+    The size is unknown upfront, so every compressible payload is
+    compressed. The compressor has ``compress(chunk)`` and ``flush()``;
+    both are ``None`` for payloads stored as is.
+    """
+
+    codec = _codec(content_type)
+    if codec == "zstd":
+        return codec, zstandard.ZstdCompressor(level=GRIDFS_ZSTD_LEVEL).compressobj()
+    if codec == "zlib":
+        return codec, zlib.compressobj(6)
+    return None, None
+
+
+def decompressor(codec: str | None):
+    """Incremental decompressor for ``codec`` (``None`` for plain files).
+
+    The returned object has ``decompress(chunk)`` and ``flush()``.
+
+    Raises
+    ------
+    ValueError
+        If ``codec`` is unknown.
+    RuntimeError
+        If ``codec`` is ``zstd`` and :mod:`zstandard` is not installed.
+    """
+
+    if not codec:
+        return None
+    if codec == "zlib":
+        return zlib.decompressobj()
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed GridFS files")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"unknown GridFS codec: {codec}")
+
+
+def file_codec(grid_out: Any) -> str | None:
+    """Codec recorded on a GridFS file (sync or Motor ``GridOut``)."""
+
+    metadata = getattr(grid_out, "metadata", None) or {}
+    return metadata.get("codec")
+
+
+def iter_decoded(chunks: Iterable[bytes], codec: str | None) -> Iterator[bytes]:
+    """Yield the original bytes of a GridFS file read as ``chunks``."""
+
+    decoder = decompressor(codec)
+    for chunk in chunks:
+        data = decoder.decompress(chunk) if decoder is not None else chunk
+        if data:
+            yield data
+    if decoder is not None:
+        tail = decoder.flush()
+        if tail:
+            yield tail
+
+
+def read_blob_sync(gridfs, blob_id: str) -> bytes:
+    """Return the original contents of GridFS file ``blob_id``."""
+
+    grid_out = gridfs.get(ObjectId(blob_id))
+    codec = file_codec(grid_out)
+    data = grid_out.read()
+    return b"".join(iter_decoded([data], codec)) if codec else data
+
+
+def blob_record(digest: str, blob_id: Any, size: int, stored: int | None = None) -> dict[str, Any]:
+    """``blobs`` entry for a freshly stored payload (one reference).
+
+    ``size`` is the original length, ``stored`` the length in GridFS.
+    """
+
+    return {
+        "_id": digest,
+        "blobId": str(blob_id),
+        "size": size,
+        "stored": size if stored is None else stored,
+        "refs": 1,
+        "created_at": time.time(),
+    }
+
+
+def put_blob_sync(
+    db,
+    gridfs,
+    payload: bytes,
+    *,
+    filename: str,
+    content_type: str | None = None,
+    collection: str = BLOBS_COLLECTION,
+) -> tuple[str, str]:
+    """Store ``payload`` (or reference the existing copy) and return ``(blob_id, sha256)``."""
+
+    digest = payload_sha256(payload)
+    blobs = db[collection]
+    for _ in range(_PUT_ATTEMPTS):
+        record = blobs.find_one_and_update({"_id": digest}, {"$inc": {"refs": 1}}, projection={"blobId": 1})
+        if record:
+            return record["blobId"], digest
+        data, codec_metadata = encode_payload(payload, content_type)
+        file_id = gridfs.put(
+            data,
+            filename=filename,
+            content_type=content_type,
+            metadata={"sha256": digest, **codec_metadata},
+        )
+        try:
+            blobs.insert_one(blob_record(digest, file_id, len(payload), len(data)))
+        except DuplicateKeyError:
+            # Another writer stored the same bytes first; use its copy.
+            gridfs.delete(file_id)
+            continue
+        except Exception:
+            with suppress(Exception):
+                gridfs.delete(file_id)
+            raise
+        return str(file_id), digest
+    raise RuntimeError(f"could not store blob {digest}")
+
+
+def release_blob_sync(db, gridfs, blob_id: str | None, *, collection: str = BLOBS_COLLECTION) -> None:
+    """Drop one reference to ``blob_id``; delete the GridFS file with the last one."""
+
+    if not blob_id or not ObjectId.is_valid(blob_id):
+        return
+    blobs = db[collection]
+    record = blobs.find_one_and_update(
+        {"blobId": blob_id},
+        {"$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if record is not None:
+        if record.get("refs", 0) > 0:
+            return
+        if not blobs.delete_one({"_id": record["_id"], "refs": {"$lte": 0}}).deleted_count:
+            return
+    try:
+        gridfs.delete(ObjectId(blob_id))
+    except Exception:  # noqa: BLE001 - already gone
+        logger.debug("gridfs_delete_skip", blob_id=blob_id)
+
+
+__all__ = [
+    "BLOBS_COLLECTION",
+    "blob_record",
+    "decompressor",
+    "document_blob_id",
+    "encode_payload",
+    "file_codec",
+    "iter_decoded",
+    "payload_sha256",
+    "put_blob_sync",
+    "read_blob_sync",
+    "release_blob_sync",
+    "stream_compressor",
+]
@@ -133,6 +133,8 @@ class Document(BaseModel):
     auto_description_pending: bool | None = Field(default=None, alias="autoDescriptionPending")
     auto_description_generated_at: float | None = Field(default=None, alias="autoDescriptionGeneratedAt")
     content_hash: str | None = None
+    blobId: str | None = None
+    sha256: str | None = None
     reading_mode: bool | None = Field(default=None, alias="readingMode")
     reading_title: str | None = Field(default=None, alias="readingTitle")
 
@@ -294,6 +296,9 @@ class Project(BaseModel):
     llm_voice_enabled: bool | None = True
     llm_voice_model: str | None = None
     llm_sources_enabled: bool | None = None
+    qa_direct_enabled: bool | None = None
+    qa_direct_threshold: float | None = None
+    qa_direct_paraphrase: bool | None = None
     telegram_token: str | None = None
     telegram_auto_start: bool | None = None
     max_token: str | None = None
@@ -2,23 +2,52 @@
 
 from __future__ import annotations
 
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable
+from collections import Counter
 from typing import Any
 from datetime import datetime, timezone, timedelta
 from contextlib import suppress
+import asyncio
+import copy
 from urllib.parse import quote_plus
 import hashlib
-import json
 import os
 import time
-from difflib import SequenceMatcher
 
 import structlog
 from bson import ObjectId
+from gridfs.errors import NoFile
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
-from pymongo.errors import ConfigurationError
-
-from packages.backend.cache import _get_redis
+from pymongo import DeleteMany, ReadPreference, ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, ConfigurationError, DuplicateKeyError, OperationFailure
+
+from packages.backend.cache import (
+    _MISS,
+    _get_redis,
+    bump_generation,
+    get_cache,
+    get_local_cache,
+    publish_invalidation,
+    scoped_key,
+)
+from packages.backend.codec import register_type
+from packages.core.blobs import (
+    blob_record,
+    decompressor,
+    document_blob_id,
+    encode_payload,
+    file_codec,
+    payload_sha256,
+    stream_compressor,
+)
+from packages.core.storage_usage import (
+    COUNTER_FIELDS,
+    add_context_usage,
+    add_usage,
+    document_usage,
+    increment_requests,
+    project_key as storage_project_key,
+)
 from packages.core.models import (
     BackupJob,
     BackupOperation,
@@ -33,6 +62,8 @@ from packages.core.models import (
     VoiceTrainingJob,
     VoiceTrainingStatus,
 )
+from packages.core import retention
+from packages.retrieval import qa_index
 try:
     from models import Project
 except ImportError:  # pragma: no cover - fallback for test stubs
@@ -48,6 +79,57 @@ logger = structlog.get_logger(__name__)
 
 TOKEN_UNSET: object = object()
 
+# Project fields whose change alters generated answers (see ``upsert_project``).
+_ANSWER_FIELDS = ("llm_model", "llm_prompt", "llm_emotions_enabled", "llm_sources_enabled")
+
+# Text-search prefilter results; the local tier keeps decoded ``Document``s.
+register_type(
+    Document,
+    "Document",
+    dump=lambda doc: doc.model_dump(by_alias=True),
+    load=lambda value: Document(**value),
+)
+_prefilter_cache = get_cache("prefilter")
+
+# Project settings, knowledge priority and context presets are read on every
+# chat turn but change only through admin writes, which clear this cache on
+# all replicas; the TTL bounds staleness if an invalidation is missed.
+PROJECT_CACHE_TTL = float(os.getenv("PROJECT_CACHE_TTL", "30"))
+_project_cache = get_local_cache("project", ttl=PROJECT_CACHE_TTL, maxsize=2048)
+
+# ``message``: one document per chat message (legacy). ``document``: one
+# capped document per session, see :meth:`MongoClient.append_session_message`.
+SESSION_LAYOUT = os.getenv("MONGO_SESSION_LAYOUT", "message").strip().lower()
+
+# Text documents keep the head of their content in ``excerpt`` so snippets can
+# be built without a GridFS download; batch reads of the remaining payloads
+# run at most ``DOCUMENT_FETCH_CONCURRENCY`` at a time.
+DOCUMENT_EXCERPT_CHARS = int(os.getenv("DOCUMENT_EXCERPT_CHARS", "2000"))
+DOCUMENT_FETCH_CONCURRENCY = int(os.getenv("DOCUMENT_FETCH_CONCURRENCY", "8"))
+
+# Request stats are summed into per-day and per-hour rollups on write; the
+# dashboard reads only those. Daily rollups are kept, hourly ones expire.
+STATS_HOURLY_RETENTION_DAYS = int(os.getenv("STATS_HOURLY_RETENTION_DAYS", "30"))
+
+# Read paths fetch only what their models keep: chat history needs the
+# ``ContextMessage`` fields, and document listings never use the stored
+# ``excerpt`` (it is read by ``get_documents_with_content`` only).
+_SESSION_MESSAGE_PROJECTION = {"_id": False, "sessionId": True, "role": True, "number": True, "text": True, "project": True}
+_DOCUMENT_PROJECTION = {"_id": False, "excerpt": False}
+
+
+def document_content_hash(payload: bytes, content_type: str | None = None) -> str:
+    """Return the ``content_hash`` of a stored document payload.
+
+    Text is hashed case- and whitespace-insensitively, like the crawler does,
+    so backfilled hashes match the ones computed at crawl time.
+    """
+
+    if (content_type or "").startswith("text/"):
+        text = payload.decode("utf-8", errors="ignore")
+        return hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+    return hashlib.sha1(payload).hexdigest()
+
 
 class NotFound(Exception):
     """Raised when a query to MongoDB yields no results."""
@@ -130,7 +212,15 @@ class MongoClient:
         self.projects_collection = os.getenv("MONGO_PROJECTS", "projects")
         self.settings_collection = os.getenv("MONGO_SETTINGS", "app_settings")
         self.documents_collection = os.getenv("MONGO_DOCUMENTS", "documents")
+        self.chunks_collection = os.getenv("MONGO_CHUNKS", "document_chunks")
+        self.blobs_collection = os.getenv("MONGO_BLOBS", "blobs")
+        self.storage_collection = os.getenv("MONGO_PROJECT_STORAGE", "project_storage")
         self.stats_collection = os.getenv("MONGO_STATS", "request_stats")
+        self.stats_daily_collection = os.getenv("MONGO_STATS_DAILY", "request_stats_daily")
+        self.stats_hourly_collection = os.getenv("MONGO_STATS_HOURLY", "request_stats_hourly")
+        self.archive_collection = os.getenv("MONGO_ARCHIVE", "archive")
+        # Set by the app lifespan to batch ``log_request_stat`` writes.
+        self.stats_sink = None
         self.ollama_servers_collection = os.getenv("MONGO_OLLAMA_SERVERS", "ollama_servers")
         self.qa_collection = os.getenv("MONGO_QA", "knowledge_qa")
         self.unanswered_collection = os.getenv("MONGO_UNANSWERED", "knowledge_unanswered")
@@ -139,6 +229,9 @@ class MongoClient:
         self.voice_samples_collection = os.getenv("MONGO_VOICE_SAMPLES", "voice_samples")
         self.voice_jobs_collection = os.getenv("MONGO_VOICE_JOBS", "voice_training_jobs")
         self.backup_jobs_collection = os.getenv("MONGO_BACKUPS", "backup_jobs")
+        self.jobs_collection = os.getenv("MONGO_JOBS", "maintenance_jobs")
+        self.contexts_collection = os.getenv("MONGO_CONTEXTS", "contexts")
+        self.session_layout = SESSION_LAYOUT
         self._indexes_ready = False
 
     async def is_query_empty(self, collection: str, query: dict) -> bool:
@@ -164,13 +257,18 @@ class MongoClient:
         NotFound
             If the session does not exist.
         """
+        if getattr(self, "session_layout", "message") == "document":
+            for message in await self._get_session_document(collection, session_id):
+                yield message
+            return
+
         query = {"sessionId": session_id}
 
         try:
             if await self.is_query_empty(collection, query):
                 raise NotFound
 
-            cursor = self.db[collection].find(query, {"_id": False})
+            cursor = self.db[collection].find(query, _SESSION_MESSAGE_PROJECTION)
 
             async for message in cursor.sort({"number": 1}):
                 yield ContextMessage(**message)
@@ -180,6 +278,32 @@ class MongoClient:
             logger.error("mongo_get_sessions_failed", collection=collection, session_id=session_id, error=str(exc))
             raise
 
+    async def _get_session_document(self, collection: str, session_id: str) -> list[ContextMessage]:
+        """Read a ``document``-layout session in one round trip."""
+
+        try:
+            doc = await self.db[collection].find_one(
+                {"_id": session_id}, {"messages": 1, "seq": 1, "project": 1}
+            )
+        except Exception as exc:
+            logger.error("mongo_get_sessions_failed", collection=collection, session_id=session_id, error=str(exc))
+            raise
+        messages = (doc or {}).get("messages") or []
+        if not messages:
+            raise NotFound
+        # Messages are capped with ``$slice``; numbers end at ``seq - 1``.
+        first = int(doc.get("seq") or len(messages)) - len(messages)
+        return [
+            ContextMessage.model_construct(
+                session_id=session_id,
+                role=item.get("role"),
+                number=first + offset,
+                text=item.get("text") or "",
+                project=item.get("project", doc.get("project")),
+            )
+            for offset, item in enumerate(messages)
+        ]
+
     async def get_context_preset(
         self, collection: str
     ) -> AsyncGenerator[ContextPreset]:
@@ -190,21 +314,20 @@ class MongoClient:
         NotFound
             If the collection is empty.
         """
-        query = {}
-
-        try:
-            if await self.is_query_empty(collection, query):
-                raise NotFound
-
-            cursor = self.db[collection].find(query, {"_id": False})
-
-            async for message in cursor.sort({"number": 1}):
-                yield ContextPreset(**message)
-        except NotFound:
-            raise
-        except Exception as exc:
-            logger.error("mongo_get_presets_failed", collection=collection, error=str(exc))
-            raise
+        key = f"presets:{collection}"
+        presets = _project_cache.get(key, _MISS)
+        if presets is _MISS:
+            try:
+                cursor = self.db[collection].find({}, {"_id": False}).sort({"number": 1})
+                presets = [ContextPreset(**message) async for message in cursor]
+            except Exception as exc:
+                logger.error("mongo_get_presets_failed", collection=collection, error=str(exc))
+                raise
+            _project_cache.set(key, presets)
+        if not presets:
+            raise NotFound
+        for preset in presets:
+            yield preset
 
     async def get_documents(self, collection: str) -> AsyncGenerator[Document]:
         """Yield document metadata from ``collection``.
@@ -220,7 +343,7 @@ class MongoClient:
             if await self.is_query_empty(collection, query):
                 raise NotFound
 
-            cursor = self.db[collection].find(query, {"_id": False})
+            cursor = self.db[collection].find(query, _DOCUMENT_PROJECTION)
             async for message in cursor:
                 yield Document(**message)
         except NotFound:
@@ -444,6 +567,20 @@ class MongoClient:
             logger.error("mongo_voice_jobs_list_failed", project=project, error=str(exc))
             raise
 
+    async def _invalidate_project_cache(self) -> None:
+        """Drop cached project metadata here and on the other replicas."""
+
+        _project_cache.clear()
+        await publish_invalidation("project")
+
+    async def _bump_cache_generation(self, project: str | None) -> None:
+        """Invalidate cached answers/search results of ``project`` (best effort)."""
+
+        try:
+            await bump_generation(project)
+        except Exception as exc:  # noqa: BLE001 - entries still expire by TTL
+            logger.debug("cache_generation_bump_failed", project=project, error=str(exc))
+
     async def search_documents(
         self, collection: str, query: str, project: str | None = None
     ) -> list[Document]:
@@ -452,39 +589,53 @@ class MongoClient:
         search_query: dict = {"$text": {"$search": query}}
         if project:
             search_query["project"] = project
-        key_parts = [
-            "prefilter",
-            project or "__global__",
-            hashlib.sha1(query.lower().encode()).hexdigest(),
-        ]
-        key = ":".join(key_parts)
         redis = _get_redis()
         try:
-            cached = await redis.get(key)
-            if cached:
+            key = await scoped_key(
+                "prefilter",
+                project,
+                hashlib.sha1(query.lower().encode()).hexdigest(),
+                redis=redis,
+            )
+            cached = await _prefilter_cache.get(key, redis=redis)
+            if cached is not None:
                 logger.info("cache_hit", key=key)
-                docs_data = json.loads(cached.decode())
-                return [Document(**d) for d in docs_data]
+                return list(cached)
 
             cursor = self.db[collection].find(
-                search_query, {"_id": False, "score": {"$meta": "textScore"}}
+                search_query, {**_DOCUMENT_PROJECTION, "score": {"$meta": "textScore"}}
             )
             cursor = cursor.sort([("score", {"$meta": "textScore"})]).limit(50)
             documents = [Document(**doc) async for doc in cursor]
             # Cache the search results as a list of document dicts
-            docs_data = [doc.model_dump(by_alias=True) for doc in documents]
-            await redis.setex(key, 86400, json.dumps(docs_data, ensure_ascii=False))
+            await _prefilter_cache.set(key, documents, redis=redis)
             logger.info("cache_store", key=key, matched=len(documents))
             return documents
         except Exception as exc:
             logger.error("mongo_search_failed", collection=collection, query=query, project=project, error=str(exc))
             raise
 
-    async def get_gridfs_file(self, file_id: str) -> bytes:
-        """Return file contents from GridFS by ``file_id``."""
+    async def get_gridfs_file(self, file_id: str, *, max_bytes: int | None = None) -> bytes:
+        """Return file contents from GridFS by ``file_id``.
+
+        With ``max_bytes`` only the first ``max_bytes`` bytes are downloaded.
+        Compressed files are decompressed chunk by chunk, so a head read
+        stops downloading once enough output is available.
+        """
         try:
             download_stream = await self.gridfs.open_download_stream(ObjectId(file_id))
             try:
+                decoder = decompressor(file_codec(download_stream))
+                if decoder is not None:
+                    output = bytearray()
+                    while chunk := await download_stream.readchunk():
+                        output += decoder.decompress(chunk)
+                        if max_bytes is not None and 0 < max_bytes <= len(output):
+                            return bytes(output[:max_bytes])
+                    output += decoder.flush()
+                    return bytes(output)
+                if max_bytes is not None and max_bytes > 0:
+                    return await download_stream.read(max_bytes)
                 return await download_stream.read()
             finally:
                 with suppress(Exception):
@@ -493,6 +644,210 @@ class MongoClient:
             logger.error("gridfs_read_failed", file_id=file_id, error=str(exc))
             raise
 
+    async def put_blob(
+        self,
+        payload: bytes,
+        *,
+        filename: str,
+        content_type: str | None = None,
+    ) -> tuple[str, str]:
+        """Store ``payload`` once per sha256 digest; return ``(blob_id, sha256)``.
+
+        Identical bytes only add a reference to the existing GridFS file;
+        text payloads are stored compressed (see :mod:`packages.core.blobs`).
+        """
+
+        digest = payload_sha256(payload)
+        blobs = self.db[getattr(self, "blobs_collection", "blobs")]
+        try:
+            for _ in range(3):
+                record = await blobs.find_one_and_update(
+                    {"_id": digest}, {"$inc": {"refs": 1}}, projection={"blobId": 1}
+                )
+                if record:
+                    return record["blobId"], digest
+                data, codec_metadata = encode_payload(payload, content_type)
+                file_id = await self.gridfs.upload_from_stream(
+                    filename or "document",
+                    data,
+                    metadata={"content_type": content_type, "sha256": digest, **codec_metadata},
+                )
+                try:
+                    await blobs.insert_one(blob_record(digest, file_id, len(payload), len(data)))
+                except DuplicateKeyError:
+                    # Another writer stored the same bytes first; use its copy.
+                    await self.gridfs.delete(file_id)
+                    continue
+                except Exception:
+                    with suppress(Exception):
+                        await self.gridfs.delete(file_id)
+                    raise
+                return str(file_id), digest
+            raise RuntimeError(f"could not store blob {digest}")
+        except Exception as exc:
+            logger.error("mongo_put_blob_failed", sha256=digest, error=str(exc))
+            raise
+
+    async def put_blob_stream(
+        self,
+        chunks: AsyncIterable[bytes],
+        *,
+        filename: str,
+        content_type: str | None = None,
+    ) -> tuple[str, str, int]:
+        """Upload ``chunks`` to GridFS as they arrive; return ``(blob_id, sha256, size)``.
+
+        Memory stays bounded by one chunk. The digest is only known at the
+        end, so identical content already stored is detected after the
+        upload and the new copy is dropped in favour of the existing blob.
+        """
+
+        hasher = hashlib.sha256()
+        size = stored = 0
+        codec, compressor = stream_compressor(content_type)
+        metadata: dict[str, Any] = {"content_type": content_type}
+        if codec:
+            metadata["codec"] = codec
+        grid_in = self.gridfs.open_upload_stream(filename or "document", metadata=metadata)
+        try:
+            async for chunk in chunks:
+                hasher.update(chunk)
+                size += len(chunk)
+                data = compressor.compress(chunk) if compressor is not None else chunk
+                if data:
+                    await grid_in.write(data)
+                    stored += len(data)
+            if compressor is not None:
+                tail = compressor.flush()
+                await grid_in.write(tail)
+                stored += len(tail)
+        except BaseException:
+            with suppress(Exception):
+                await grid_in.abort()
+            raise
+        await grid_in.close()
+        file_id = grid_in._id
+        digest = hasher.hexdigest()
+        blobs = self.db[getattr(self, "blobs_collection", "blobs")]
+        try:
+            update = {"metadata.sha256": digest}
+            if codec:
+                update["metadata.raw_length"] = size
+            await self.db["fs.files"].update_one({"_id": file_id}, {"$set": update})
+            for _ in range(3):
+                record = await blobs.find_one_and_update(
+                    {"_id": digest}, {"$inc": {"refs": 1}}, projection={"blobId": 1}
+                )
+                if record:
+                    await self.gridfs.delete(file_id)
+                    return record["blobId"], digest, size
+                try:
+                    await blobs.insert_one(blob_record(digest, file_id, size, stored))
+                except DuplicateKeyError:
+                    continue
+                return str(file_id), digest, size
+            raise RuntimeError(f"could not store blob {digest}")
+        except Exception as exc:
+            logger.error("mongo_put_blob_failed", sha256=digest, error=str(exc))
+            # No blob record references the uploaded file.
+            with suppress(Exception):
+                await self.gridfs.delete(file_id)
+            raise
+
+    async def open_gridfs_file(self, blob_id: str):
+        """Open GridFS file ``blob_id`` for :meth:`iter_gridfs_file`.
+
+        The returned Motor ``GridOut`` exposes ``length``, ``metadata`` and
+        ``upload_date``; ``metadata.raw_length`` is the original size of
+        compressed files.
+        """
+
+        try:
+            return await self.gridfs.open_download_stream(ObjectId(blob_id))
+        except NoFile:
+            raise
+        except Exception as exc:
+            logger.error("gridfs_open_failed", blob_id=blob_id, error=str(exc))
+            raise
+
+    async def iter_gridfs_file(
+        self,
+        grid_out: Any,
+        *,
+        start: int = 0,
+        stop: int | None = None,
+    ) -> AsyncIterator[bytes]:
+        """Yield the original bytes ``[start, stop)`` of an opened GridFS file.
+
+        Plain files seek straight to ``start``; compressed files are decoded
+        from the beginning and the bytes before ``start`` are skipped. Only
+        one GridFS chunk is held in memory at a time.
+        """
+
+        decoder = decompressor(file_codec(grid_out))
+        position = 0
+        if decoder is None and start:
+            grid_out.seek(start)
+            position = start
+
+        async def _decoded() -> AsyncIterator[bytes]:
+            while chunk := await grid_out.readchunk():
+                yield decoder.decompress(chunk) if decoder is not None else chunk
+            if decoder is not None:
+                yield decoder.flush()
+
+        try:
+            async for data in _decoded():
+                if not data:
+                    continue
+                begin, position = position, position + len(data)
+                if position <= start:
+                    continue
+                yield data[max(start - begin, 0) : None if stop is None else stop - begin]
+                if stop is not None and position >= stop:
+                    break
+        finally:
+            with suppress(Exception):
+                grid_out.close()
+
+    async def release_blobs(self, blob_ids: Iterable[str | None]) -> int:
+        """Drop one reference per entry of ``blob_ids``.
+
+        GridFS files are deleted once their last reference is gone; ids
+        without a blob record (payloads stored before blobs existed) are
+        deleted directly. Returns the number of GridFS files removed.
+        """
+
+        counts = Counter(blob_id for blob_id in blob_ids if blob_id and ObjectId.is_valid(blob_id))
+        if not counts:
+            return 0
+        blobs = self.db[getattr(self, "blobs_collection", "blobs")]
+        doomed: list[ObjectId] = []
+        try:
+            tracked: set[str] = set()
+            async for record in blobs.find({"blobId": {"$in": list(counts)}}, {"blobId": 1}):
+                tracked.add(record["blobId"])
+            doomed.extend(ObjectId(blob_id) for blob_id in counts if blob_id not in tracked)
+            for blob_id in tracked:
+                record = await blobs.find_one_and_update(
+                    {"blobId": blob_id},
+                    {"$inc": {"refs": -counts[blob_id]}},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if record is None or record.get("refs", 0) > 0:
+                    continue
+                deleted = await blobs.delete_one({"_id": record["_id"], "refs": {"$lte": 0}})
+                if deleted.deleted_count:
+                    doomed.append(ObjectId(blob_id))
+            if doomed:
+                # ``self.gridfs`` uses the default bucket.
+                await self.db["fs.files"].delete_many({"_id": {"$in": doomed}})
+                await self.db["fs.chunks"].delete_many({"files_id": {"$in": doomed}})
+        except Exception as exc:
+            logger.error("mongo_release_blobs_failed", blobs=len(counts), error=str(exc))
+            raise
+        return len(doomed)
+
     async def get_document_with_content(
         self, collection: str, file_id: str
     ) -> tuple[dict, bytes]:
@@ -502,7 +857,7 @@ class MongoClient:
             doc = await self.db[collection].find_one({"fileId": file_id}, {"_id": False})
             if not doc:
                 raise NotFound
-            payload = await self.get_gridfs_file(file_id)
+            payload = await self.get_gridfs_file(document_blob_id(doc))
             return doc, payload
         except NotFound:
             raise
@@ -510,16 +865,97 @@ class MongoClient:
             logger.error("mongo_get_document_with_content_failed", collection=collection, file_id=file_id, error=str(exc))
             raise
 
+    async def get_documents_with_content(
+        self,
+        collection: str,
+        file_ids: Iterable[str],
+        *,
+        max_bytes: int | None = None,
+        excerpt_field: str | None = None,
+        concurrency: int = DOCUMENT_FETCH_CONCURRENCY,
+    ) -> dict[str, tuple[dict, bytes]]:
+        """Return ``{file_id: (metadata, contents)}`` for several documents.
+
+        Metadata is read with a single ``$in`` query and GridFS payloads are
+        downloaded concurrently (at most ``concurrency`` at a time).
+
+        Parameters
+        ----------
+        max_bytes:
+            Download only the head of each payload.
+        excerpt_field:
+            Metadata field holding precomputed text; documents that have it
+            are returned without touching GridFS.
+
+        Documents without metadata or whose payload cannot be read are left
+        out of the result instead of failing the whole batch.
+        """
+
+        ids = list(dict.fromkeys(str(file_id) for file_id in file_ids if file_id))
+        if not ids:
+            return {}
+        try:
+            cursor = self.db[collection].find({"fileId": {"$in": ids}}, {"_id": False})
+            metadata = {doc["fileId"]: doc async for doc in cursor if doc.get("fileId")}
+        except Exception as exc:
+            logger.error("mongo_get_documents_with_content_failed", collection=collection, files=len(ids), error=str(exc))
+            raise
+
+        results: dict[str, tuple[dict, bytes]] = {}
+        pending: list[str] = []
+        for file_id in ids:
+            doc = metadata.get(file_id)
+            if doc is None:
+                continue
+            excerpt = doc.get(excerpt_field) if excerpt_field else None
+            if isinstance(excerpt, str) and excerpt:
+                results[file_id] = (doc, excerpt.encode("utf-8"))
+            else:
+                pending.append(file_id)
+
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _read(file_id: str) -> None:
+            async with semaphore:
+                try:
+                    payload = await self.get_gridfs_file(
+                        document_blob_id(metadata[file_id]), max_bytes=max_bytes
+                    )
+                except Exception:  # noqa: BLE001 - already logged by get_gridfs_file
+                    return
+            results[file_id] = (metadata[file_id], payload)
+
+        await asyncio.gather(*(_read(file_id) for file_id in pending))
+        return {file_id: results[file_id] for file_id in ids if file_id in results}
+
     async def delete_document(self, collection: str, file_id: str) -> None:
-        """Remove document metadata and GridFS payload."""
+        """Remove document metadata and release its GridFS payload."""
 
         try:
-            await self.db[collection].delete_one({"fileId": file_id})
-            with suppress(Exception):
-                await self.gridfs.delete(ObjectId(file_id))
+            removed = await self.db[collection].find_one_and_delete(
+                {"fileId": file_id},
+                projection={
+                    "project": 1,
+                    "domain": 1,
+                    "fileId": 1,
+                    "blobId": 1,
+                    "size_bytes": 1,
+                    "content_type": 1,
+                },
+            )
+            if removed:
+                await self.release_blobs([document_blob_id(removed)])
+                await self.increment_project_storage(
+                    {storage_project_key(removed): document_usage(removed, -1)}
+                )
+            await self._tombstone_chunks(
+                {file_id: (removed.get("project") or removed.get("domain")) if removed else None}
+            )
         except Exception as exc:
             logger.error("mongo_delete_document_failed", collection=collection, file_id=file_id, error=str(exc))
             raise
+        if removed:
+            await self._bump_cache_generation(removed.get("project") or removed.get("domain"))
 
     async def update_document_status(
         self, collection: str, file_id: str, status: str, message: str | None = None
@@ -536,7 +972,7 @@ class MongoClient:
     async def upload_document(
         self,
         file_name: str,
-        file: bytes,
+        file: bytes | AsyncIterable[bytes],
         documents_collection: str,
         *,
         description: str | None = None,
@@ -547,19 +983,27 @@ class MongoClient:
     ) -> str:
         """Upload ``file`` to GridFS and store metadata in ``documents_collection``.
 
+        ``file`` is either the payload or an async iterable of chunks, which
+        is streamed to GridFS without being buffered.
+
         Returns
         -------
         str
-            The generated GridFS ``file_id``.
+            The generated document ``file_id``.
         """
         try:
-            f_id = await self.gridfs.upload_from_stream(
-                file_name or "document",
-                file,
-            )
+            if isinstance(file, (bytes, bytearray)):
+                blob_id, digest = await self.put_blob(
+                    bytes(file), filename=file_name or "document", content_type=content_type
+                )
+                size_bytes = len(file)
+            else:
+                blob_id, digest, size_bytes = await self.put_blob_stream(
+                    file, filename=file_name or "document", content_type=content_type
+                )
+            f_id = ObjectId()
             project_key = (project or "default").strip().lower()
             description_value = "" if description is None else description
-            size_bytes = len(file) if isinstance(file, (bytes, bytearray)) else None
             document = Document(
                 name=file_name,
                 description=description_value,
@@ -570,64 +1014,264 @@ class MongoClient:
                 domain=domain or project_key,
                 project=project_key,
                 size_bytes=size_bytes,
+                blobId=blob_id,
+                sha256=digest,
             ).model_dump()
             await self.db[documents_collection].insert_one(document)
+            await self.increment_project_storage({storage_project_key(document): document_usage(document)})
+            await self._bump_cache_generation(project_key)
             return str(f_id)
         except Exception as exc:
             logger.error("mongo_upload_document_failed", collection=documents_collection, name=file_name, project=project, error=str(exc))
             raise
 
+    async def backfill_content_hashes(
+        self,
+        documents_collection: str,
+        project: str | None = None,
+        *,
+        concurrency: int = DOCUMENT_FETCH_CONCURRENCY,
+        batch_size: int = 200,
+        progress: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
+    ) -> dict[str, Any]:
+        """Store ``content_hash`` for documents that do not have one yet.
+
+        Payloads are read from GridFS ``concurrency`` at a time. Documents
+        whose GridFS file no longer exists are returned as ``orphans``.
+        """
+
+        query: dict[str, Any] = {"content_hash": {"$in": [None, ""]}}
+        if project:
+            query["project"] = project
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        orphans: list[str] = []
+        hashed = 0
+
+        async def _hash(doc: dict[str, Any]) -> tuple[str, str | None]:
+            file_id = doc["fileId"]
+            async with semaphore:
+                try:
+                    payload = await self.get_gridfs_file(document_blob_id(doc))
+                except NoFile:
+                    orphans.append(file_id)
+                    return file_id, None
+                except Exception as exc:  # noqa: BLE001 - retried on the next run
+                    logger.warning("mongo_content_hash_failed", file_id=file_id, error=str(exc))
+                    return file_id, None
+            return file_id, document_content_hash(payload, doc.get("content_type"))
+
+        async def _flush(batch: list[dict[str, Any]]) -> None:
+            nonlocal hashed
+            results = await asyncio.gather(*(_hash(doc) for doc in batch))
+            updates = [
+                UpdateOne({"fileId": file_id}, {"$set": {"content_hash": digest}})
+                for file_id, digest in results
+                if digest
+            ]
+            if updates:
+                await self.db[documents_collection].bulk_write(updates, ordered=False)
+            hashed += len(updates)
+            if progress is not None:
+                await progress({"phase": "hashing", "hashed": hashed})
+
+        batch: list[dict[str, Any]] = []
+        cursor = self.db[documents_collection].find(
+            query, {"_id": False, "fileId": 1, "blobId": 1, "content_type": 1}
+        )
+        async for doc in cursor:
+            if doc.get("fileId"):
+                batch.append(doc)
+            if len(batch) >= batch_size:
+                await _flush(batch)
+                batch = []
+        if batch:
+            await _flush(batch)
+        return {"hashed": hashed, "orphans": orphans}
+
+    async def _tombstone_chunks(self, documents: dict[str, str | None]) -> None:
+        """Mark the chunk records of deleted ``documents`` for the vector purge.
+
+        The records are the only list of a document's passage vector ids
+        (``<fileId>#n``), so they are kept with ``deleted: true`` until the
+        worker has removed the vectors (``purge_deleted_chunks``). A record
+        for the whole-document id used before chunking is added as well.
+        Best effort.
+        """
+
+        if not documents:
+            return
+        chunks = self.db[getattr(self, "chunks_collection", "document_chunks")]
+        try:
+            await chunks.update_many({"docId": {"$in": list(documents)}}, {"$set": {"deleted": True}})
+            await chunks.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": file_id},
+                        {"$set": {"docId": file_id, "project": project, "deleted": True}},
+                        upsert=True,
+                    )
+                    for file_id, project in documents.items()
+                ],
+                ordered=False,
+            )
+        except Exception as exc:  # noqa: BLE001 - must not fail the delete
+            logger.warning("document_chunks_tombstone_failed", documents=len(documents), error=str(exc))
+
+    async def delete_documents(
+        self,
+        documents_collection: str,
+        file_ids: Iterable[str],
+        *,
+        batch_size: int = 500,
+    ) -> int:
+        """Remove many documents (metadata, GridFS payloads) and tombstone their chunks."""
+
+        ids = list(dict.fromkeys(file_ids))
+        projects: set[str | None] = set()
+        usage: dict[str, Counter] = {}
+        removed = 0
+        for offset in range(0, len(ids), batch_size):
+            batch = ids[offset : offset + batch_size]
+            # Orphans found by the hash backfill have no readable payload but
+            # may still own a legacy GridFS entry under their ``fileId``.
+            blob_ids = {file_id: file_id for file_id in batch}
+            owners: dict[str, str | None] = {}
+            try:
+                async for doc in self.db[documents_collection].find(
+                    {"fileId": {"$in": batch}},
+                    {
+                        "_id": 0,
+                        "project": 1,
+                        "domain": 1,
+                        "fileId": 1,
+                        "blobId": 1,
+                        "size_bytes": 1,
+                        "content_type": 1,
+                    },
+                ):
+                    projects.add(doc.get("project") or doc.get("domain"))
+                    owners[doc["fileId"]] = doc.get("project") or doc.get("domain")
+                    blob_ids[doc["fileId"]] = document_blob_id(doc)
+                    add_usage(usage, storage_project_key(doc), document_usage(doc, -1))
+                result = await self.db[documents_collection].delete_many({"fileId": {"$in": batch}})
+                removed += int(getattr(result, "deleted_count", 0) or 0)
+                await self.release_blobs(blob_ids.values())
+                await self._tombstone_chunks({file_id: owners.get(file_id) for file_id in batch})
+            except Exception as exc:
+                logger.error(
+                    "mongo_delete_documents_failed",
+                    collection=documents_collection,
+                    documents=len(batch),
+                    error=str(exc),
+                )
+                raise
+        await self.increment_project_storage(usage)
+        for project_name in projects:
+            await self._bump_cache_generation(project_name)
+        return removed
+
     async def deduplicate_documents(
         self,
         documents_collection: str,
         project: str | None = None,
+        *,
+        concurrency: int = DOCUMENT_FETCH_CONCURRENCY,
+        progress: Callable[[dict[str, Any]], Awaitable[None]] | None = None,
     ) -> dict[str, object]:
-        """Remove duplicate documents based on content hash within ``project``."""
+        """Remove duplicate documents based on content hash within ``project``.
+
+        Missing ``content_hash`` values are backfilled first; duplicate groups
+        then come from a single aggregation and the oldest document of each
+        group is kept. Every step is idempotent, so an interrupted run can
+        simply be started again.
+        """
 
         filter_query: dict[str, object] = {}
         if project:
             filter_query["project"] = project
 
-        seen: dict[str, str] = {}
-        removed: list[str] = []
-        checked = 0
-
-        cursor = self.db[documents_collection].find(filter_query, {"_id": False, "fileId": 1, "project": 1, "domain": 1})
-        async for doc in cursor:
-            file_id = doc.get("fileId")
-            if not file_id:
-                continue
-            checked += 1
-            try:
-                _meta, payload = await self.get_document_with_content(documents_collection, file_id)
-            except NotFound:
-                with suppress(Exception):
-                    await self.db[documents_collection].delete_one({"fileId": file_id})
-                removed.append(file_id)
-                continue
-            except Exception as exc:  # noqa: BLE001
-                logger.warning("mongo_deduplicate_fetch_failed", file_id=file_id, error=str(exc))
-                continue
-
-            digest = hashlib.sha1(payload).hexdigest()
-            project_key = (_meta.get("project") or _meta.get("domain") or "").strip().lower()
-            key = f"{project_key}:{digest}"
-            if key in seen:
-                try:
-                    await self.delete_document(documents_collection, file_id)
-                    removed.append(file_id)
-                except Exception as exc:  # noqa: BLE001
-                    logger.warning("mongo_deduplicate_delete_failed", file_id=file_id, error=str(exc))
-            else:
-                seen[key] = file_id
+        backfill = await self.backfill_content_hashes(
+            documents_collection, project, concurrency=concurrency, progress=progress
+        )
+        orphans = backfill["orphans"]
+        if orphans:
+            await self.delete_documents(documents_collection, orphans)
+        checked = await self.db[documents_collection].count_documents(filter_query)
+
+        pipeline: list[dict[str, Any]] = [
+            {"$match": {**filter_query, "content_hash": {"$nin": [None, ""]}}},
+            {"$sort": {"ts": 1, "_id": 1}},
+            {
+                "$group": {
+                    "_id": {
+                        "project": {"$toLower": {"$ifNull": ["$project", {"$ifNull": ["$domain", ""]}]}},
+                        "hash": "$content_hash",
+                    },
+                    "fileIds": {"$push": "$fileId"},
+                    "count": {"$sum": 1},
+                }
+            },
+            {"$match": {"count": {"$gt": 1}}},
+        ]
+        duplicates: list[str] = []
+        groups = 0
+        async for group in self.db[documents_collection].aggregate(pipeline, allowDiskUse=True):
+            groups += 1
+            duplicates.extend(file_id for file_id in group["fileIds"][1:] if file_id)
+        if progress is not None:
+            await progress({"phase": "deleting", "groups": groups, "duplicates": len(duplicates)})
+        if duplicates:
+            await self.delete_documents(documents_collection, duplicates)
 
+        removed = orphans + duplicates
         return {
-            "checked": checked,
-            "kept": len(seen),
+            "checked": checked + len(orphans),
+            "kept": checked - len(duplicates),
             "removed": len(removed),
             "removed_ids": removed,
+            "hashed": backfill["hashed"],
+            "groups": groups,
         }
 
+    async def create_maintenance_job(self, kind: str, params: dict[str, Any]) -> dict[str, Any]:
+        """Record a background maintenance job (e.g. ``deduplicate``)."""
+
+        now = time.time()
+        doc = {"kind": kind, "status": "queued", "params": params, "createdAt": now, "updatedAt": now}
+        result = await self.db[self.jobs_collection].insert_one(doc)
+        doc["id"] = str(result.inserted_id)
+        doc.pop("_id", None)
+        return doc
+
+    async def update_maintenance_job(self, job_id: str, updates: dict[str, Any]) -> None:
+        try:
+            await self.db[self.jobs_collection].update_one(
+                {"_id": ObjectId(job_id)},
+                {"$set": {**updates, "updatedAt": time.time()}},
+            )
+        except Exception as exc:  # noqa: BLE001 - progress is best effort
+            logger.debug("mongo_job_update_failed", job_id=job_id, error=str(exc))
+
+    async def get_maintenance_job(self, job_id: str) -> dict[str, Any] | None:
+        if not ObjectId.is_valid(job_id):
+            return None
+        doc = await self.db[self.jobs_collection].find_one({"_id": ObjectId(job_id)})
+        if not doc:
+            return None
+        doc["id"] = str(doc.pop("_id"))
+        return doc
+
+    async def list_unfinished_maintenance_jobs(self, kind: str) -> list[dict[str, Any]]:
+        """Return ``queued``/``running`` jobs of ``kind`` so they can be resumed."""
+
+        jobs = []
+        async for doc in self.db[self.jobs_collection].find(
+            {"kind": kind, "status": {"$in": ["queued", "running"]}}
+        ):
+            doc["id"] = str(doc.pop("_id"))
+            jobs.append(doc)
+        return jobs
+
     async def append_session_message(
         self,
         collection: str,
@@ -638,7 +1282,17 @@ class MongoClient:
         project: str | None = None,
         keep: int = 10,
     ) -> ContextMessage:
-        """Append a message to a conversation session."""
+        """Append a message to a conversation session.
+
+        With the ``document`` session layout this is a single atomic
+        ``find_one_and_update``: ``$inc`` on ``seq`` numbers the message and
+        ``$push``/``$slice`` keeps only the last ``keep`` entries.
+        """
+
+        if getattr(self, "session_layout", "message") == "document":
+            return await self._append_session_document(
+                collection, session_id, role, text, project=project, keep=keep
+            )
 
         try:
             last = await self.db[collection].find_one(
@@ -649,49 +1303,317 @@ class MongoClient:
             next_number = int(last.get("number", -1)) + 1 if last else 0
         except Exception as exc:  # noqa: BLE001
             logger.error(
-                "mongo_session_next_number_failed",
+                "mongo_session_next_number_failed",
+                collection=collection,
+                session=session_id,
+                error=str(exc),
+            )
+            raise
+
+        message = ContextMessage(
+            sessionId=session_id,
+            role=role,
+            number=next_number,
+            text=text,
+            project=(project or None),
+        )
+        payload = message.model_dump(by_alias=True)
+        # Native UUIDs cannot be encoded without a configured uuidRepresentation.
+        payload["sessionId"] = str(payload["sessionId"])
+        payload["ts"] = datetime.now(timezone.utc)
+        try:
+            await self.db[collection].insert_one(payload)
+            usage: dict[str, Counter] = {}
+            add_context_usage(usage, payload)
+            await self.increment_project_storage(usage)
+            if keep > 0:
+                total = await self.db[collection].count_documents({"sessionId": session_id})
+                if total > keep:
+                    async for outdated in (
+                        self.db[collection]
+                        .find({"sessionId": session_id}, {"_id": 1})
+                        .sort("number", 1)
+                        .limit(total - keep)
+                    ):
+                        oid = outdated.get("_id")
+                        if oid:
+                            await self.db[collection].delete_one({"_id": oid})
+        except Exception as exc:  # noqa: BLE001
+            logger.error(
+                "mongo_append_session_failed",
+                collection=collection,
+                session=session_id,
+                error=str(exc),
+            )
+            raise
+        return message
+
+    async def _append_session_document(
+        self,
+        collection: str,
+        session_id: str,
+        role: str,
+        text: str,
+        *,
+        project: str | None = None,
+        keep: int = 10,
+    ) -> ContextMessage:
+        entry = {"role": role, "text": text, "project": project or None}
+        push: dict[str, Any] = {"$each": [entry]}
+        if keep > 0:
+            push["$slice"] = -keep
+        try:
+            doc = await self.db[collection].find_one_and_update(
+                {"_id": session_id},
+                {
+                    "$inc": {"seq": 1},
+                    "$push": {"messages": push},
+                    "$set": {"updated_at": datetime.now(timezone.utc)},
+                    "$setOnInsert": {"sessionId": session_id, "project": project or None},
+                },
+                projection={"seq": 1},
+                upsert=True,
+                return_document=True,
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.error(
+                "mongo_append_session_failed",
+                collection=collection,
+                session=session_id,
+                error=str(exc),
+            )
+            raise
+        usage: dict[str, Counter] = {}
+        add_context_usage(usage, entry, new_record=int(doc["seq"]) == 1)
+        await self.increment_project_storage(usage)
+        return ContextMessage.model_construct(
+            session_id=session_id,
+            role=role,
+            number=int(doc["seq"]) - 1,
+            text=text,
+            project=project or None,
+        )
+
+    async def append_session_messages(
+        self,
+        collection: str,
+        messages: Iterable[ContextMessage],
+        *,
+        keep: int = 10,
+    ) -> None:
+        """Persist already numbered ``messages`` in a single ``bulk_write``.
+
+        Used by the write-behind session store. Messages are upserted on
+        ``(sessionId, number)`` so retried batches do not duplicate entries,
+        and each session is trimmed to its last ``keep`` messages. With the
+        ``document`` layout every session is one guarded ``$push`` instead.
+        """
+
+        if getattr(self, "session_layout", "message") == "document":
+            await self._append_session_documents(collection, messages, keep=keep)
+            return
+
+        requests: list[Any] = []
+        newest: dict[str, int] = {}
+        usage: dict[str, Counter] = {}
+        now = datetime.now(timezone.utc)
+        for message in messages:
+            payload = message.model_dump(by_alias=True)
+            session_id = payload["sessionId"] = str(payload["sessionId"])
+            payload["ts"] = now
+            add_context_usage(usage, payload)
+            requests.append(
+                UpdateOne(
+                    {"sessionId": session_id, "number": message.number},
+                    {"$setOnInsert": payload},
+                    upsert=True,
+                )
+            )
+            newest[session_id] = max(newest.get(session_id, -1), message.number)
+        if not requests:
+            return
+        if keep > 0:
+            requests.extend(
+                DeleteMany({"sessionId": session_id, "number": {"$lte": number - keep}})
+                for session_id, number in newest.items()
+                if number >= keep
+            )
+        try:
+            await self.db[collection].bulk_write(requests, ordered=False)
+        except Exception as exc:  # noqa: BLE001
+            logger.error(
+                "mongo_append_sessions_failed",
+                collection=collection,
+                sessions=len(newest),
+                error=str(exc),
+            )
+            raise
+        await self.increment_project_storage(usage)
+
+    async def _append_session_documents(
+        self,
+        collection: str,
+        messages: Iterable[ContextMessage],
+        *,
+        keep: int = 10,
+    ) -> None:
+        sessions: dict[str, list[ContextMessage]] = {}
+        for message in messages:
+            sessions.setdefault(str(message.session_id), []).append(message)
+        requests: list[Any] = []
+        usage: dict[str, Counter] = {}
+        now = datetime.now(timezone.utc)
+        for session_id, batch in sessions.items():
+            batch.sort(key=lambda item: item.number)
+            entries = [
+                {"role": getattr(m.role, "value", m.role), "text": m.text, "project": m.project}
+                for m in batch
+            ]
+            for entry in entries:
+                # A session document is created with its first message.
+                add_context_usage(usage, entry, new_record=batch[0].number == 0 and entry is entries[0])
+            push: dict[str, Any] = {"$each": entries}
+            if keep > 0:
+                push["$slice"] = -keep
+            requests.append(
+                UpdateOne(
+                    {"_id": session_id},
+                    {
+                        "$setOnInsert": {
+                            "sessionId": session_id,
+                            "project": batch[0].project,
+                            "seq": 0,
+                            "messages": [],
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+            # The ``seq`` guard makes a retried batch a no-op.
+            requests.append(
+                UpdateOne(
+                    {"_id": session_id, "seq": {"$lte": batch[0].number}},
+                    {
+                        "$push": {"messages": push},
+                        "$set": {"seq": batch[-1].number + 1, "updated_at": now},
+                    },
+                )
+            )
+        if not requests:
+            return
+        try:
+            await self.db[collection].bulk_write(requests, ordered=True)
+        except Exception as exc:  # noqa: BLE001
+            logger.error(
+                "mongo_append_sessions_failed",
                 collection=collection,
-                session=session_id,
+                sessions=len(sessions),
                 error=str(exc),
             )
             raise
+        await self.increment_project_storage(usage)
+
+    async def migrate_sessions_to_documents(
+        self,
+        collection: str,
+        *,
+        target: str | None = None,
+        keep: int = 10,
+        delete: bool = False,
+        batch_size: int = 500,
+    ) -> dict[str, int]:
+        """Convert ``message``-layout sessions into ``document``-layout ones.
+
+        Sessions are grouped server-side and written to ``target`` (defaults
+        to ``collection``; session documents have no ``number`` field, so
+        both layouts can share a collection during the switch). A session
+        document is only replaced while its ``seq`` is below the one rebuilt
+        from the messages, so re-running after the switch (e.g. with
+        ``delete``) keeps turns appended to live session documents. With
+        ``delete`` the migrated message documents are removed. Returns
+        migration counters.
+        """
+
+        target = target or collection
+        pipeline: list[dict[str, Any]] = [
+            {"$match": {"number": {"$exists": True}}},
+            {"$sort": {"sessionId": 1, "number": 1}},
+            {
+                "$group": {
+                    "_id": "$sessionId",
+                    "project": {"$last": "$project"},
+                    "last": {"$max": "$number"},
+                    "count": {"$sum": 1},
+                    "messages": {"$push": {"role": "$role", "text": "$text", "project": "$project"}},
+                }
+            },
+        ]
+        if keep > 0:
+            pipeline.append({"$set": {"messages": {"$slice": ["$messages", -keep]}}})
+        summary = {"sessions": 0, "messages": 0, "skipped": 0, "deleted": 0}
+
+        async def _write(chunk: list[dict[str, Any]]) -> None:
+            now = datetime.now(timezone.utc)
+            requests = []
+            for item in chunk:
+                seq = int(item["last"]) + 1
+                requests.append(
+                    UpdateOne(
+                        # A newer document does not match, and its upsert
+                        # then fails with a duplicate key, which is skipped.
+                        {"_id": str(item["_id"]), "seq": {"$not": {"$gte": seq}}},
+                        {
+                            "$set": {
+                                "sessionId": str(item["_id"]),
+                                "project": item.get("project"),
+                                "seq": seq,
+                                "messages": item["messages"],
+                                "updated_at": now,
+                            }
+                        },
+                        upsert=True,
+                    )
+                )
+            skipped = 0
+            try:
+                await self.db[target].bulk_write(requests, ordered=False)
+            except BulkWriteError as exc:
+                errors = exc.details.get("writeErrors", [])
+                if not errors or any(error.get("code") != 11000 for error in errors):
+                    raise
+                skipped = len(errors)
+            summary["sessions"] += len(chunk) - skipped
+            summary["skipped"] += skipped
+            summary["messages"] += sum(int(item["count"]) for item in chunk)
+            if delete:
+                result = await self.db[collection].delete_many(
+                    {"sessionId": {"$in": [item["_id"] for item in chunk]}, "number": {"$exists": True}}
+                )
+                summary["deleted"] += int(result.deleted_count or 0)
 
-        message = ContextMessage(
-            sessionId=session_id,
-            role=role,
-            number=next_number,
-            text=text,
-            project=(project or None),
-        )
-        payload = message.model_dump(by_alias=True)
         try:
-            await self.db[collection].insert_one(payload)
-            if keep > 0:
-                total = await self.db[collection].count_documents({"sessionId": session_id})
-                if total > keep:
-                    async for outdated in (
-                        self.db[collection]
-                        .find({"sessionId": session_id}, {"_id": 1})
-                        .sort("number", 1)
-                        .limit(total - keep)
-                    ):
-                        oid = outdated.get("_id")
-                        if oid:
-                            await self.db[collection].delete_one({"_id": oid})
+            chunk: list[dict[str, Any]] = []
+            async for item in self.db[collection].aggregate(pipeline, allowDiskUse=True):
+                if item.get("_id") is None:
+                    continue
+                chunk.append(item)
+                if len(chunk) >= batch_size:
+                    await _write(chunk)
+                    chunk = []
+            if chunk:
+                await _write(chunk)
         except Exception as exc:  # noqa: BLE001
-            logger.error(
-                "mongo_append_session_failed",
-                collection=collection,
-                session=session_id,
-                error=str(exc),
-            )
+            logger.error("mongo_migrate_sessions_failed", collection=collection, target=target, error=str(exc))
             raise
-        return message
+        return summary
 
     async def clear_session(self, collection: str, session_id: str) -> None:
         """Remove all messages for ``session_id``."""
 
         try:
+            if getattr(self, "session_layout", "message") == "document":
+                await self.db[collection].delete_one({"_id": session_id})
+                return
             await self.db[collection].delete_many({"sessionId": session_id})
         except Exception as exc:  # noqa: BLE001
             logger.error(
@@ -724,40 +1646,48 @@ class MongoClient:
             project_key = (project or "default").strip().lower()
             existing = await self.db[documents_collection].find_one(
                 {"name": name, "project": project_key},
-                {"fileId": 1},
-            )
-            if existing and existing.get("fileId"):
-                with suppress(Exception):
-                    await self.gridfs.delete(ObjectId(existing["fileId"]))
-
-            file_id = await self.gridfs.upload_from_stream(
-                name or "document",
-                payload,
-                metadata={
-                    "content_type": "text/plain",
-                    "encoding": "utf-8",
-                },
-            )
+                {"fileId": 1, "blobId": 1, "sha256": 1, "size_bytes": 1, "content_type": 1},
+            ) or {}
+            file_id = existing.get("fileId") or str(ObjectId())
+            previous_blob = document_blob_id(existing)
+            if existing.get("blobId") and existing.get("sha256") == payload_sha256(payload):
+                # Unchanged content: keep the stored payload.
+                blob_id, digest = existing["blobId"], existing["sha256"]
+                previous_blob = None
+            else:
+                blob_id, digest = await self.put_blob(
+                    payload, filename=name or "document", content_type="text/plain"
+                )
 
             doc = Document(
                 name=name,
                 description=description_value,
-                fileId=str(file_id),
+                fileId=file_id,
                 url=url,
                 ts=time.time(),
                 content_type="text/plain",
                 domain=domain or project_key,
                 project=project_key,
                 size_bytes=len(payload),
+                blobId=blob_id,
+                sha256=digest,
             ).model_dump()
+            doc["excerpt"] = content[:DOCUMENT_EXCERPT_CHARS] if DOCUMENT_EXCERPT_CHARS > 0 else None
 
             await self.db[documents_collection].update_one(
                 {"name": name, "project": project_key},
                 {"$set": doc},
                 upsert=True,
             )
-
-            return str(file_id)
+            if previous_blob:
+                await self.release_blobs([previous_blob])
+            usage: dict[str, Counter] = {}
+            add_usage(usage, project_key, document_usage(doc))
+            add_usage(usage, project_key, document_usage(existing, -1))
+            await self.increment_project_storage(usage)
+            await self._bump_cache_generation(project_key)
+
+            return file_id
         except Exception as exc:
             logger.error("mongo_upsert_text_document_failed", collection=documents_collection, name=name, project=project, error=str(exc))
             raise
@@ -802,6 +1732,7 @@ class MongoClient:
         now = time.time()
         inserted = 0
         updated = 0
+        changed: list[str] = []
         for item in items:
             question = str(item.get("question") or "").strip()
             answer = str(item.get("answer") or "").strip()
@@ -828,8 +1759,10 @@ class MongoClient:
                 )
                 if result.upserted_id is not None:
                     inserted += 1
+                    changed.append(question)
                 elif result.modified_count:
                     updated += 1
+                    changed.append(question)
             except Exception as exc:
                 logger.warning(
                     "mongo_qa_upsert_failed",
@@ -837,6 +1770,9 @@ class MongoClient:
                     question=question,
                     error=str(exc),
                 )
+        if inserted or updated:
+            await self._bump_cache_generation(project)
+            await self._refresh_qa_index(project, {"project": project, "question": {"$in": changed}})
         return {"inserted": inserted, "updated": updated}
 
     async def update_qa_pair(self, pair_id: str, updates: dict[str, object]) -> dict | None:
@@ -940,6 +1876,7 @@ class MongoClient:
             "updated_at": True,
             "score": {"$meta": "textScore"},
         }
+        results: list[dict[str, object]] = []
         try:
             cursor = (
                 self.db[self.qa_collection]
@@ -951,17 +1888,7 @@ class MongoClient:
                 ])
                 .limit(max(5, min(int(limit), 50)))
             )
-        except Exception as exc:
-            logger.debug("mongo_qa_text_search_failed", error=str(exc), project=project)
-            cursor = (
-                self.db[self.qa_collection]
-                .find(filter_query, {"question": True, "answer": True, "priority": True, "project": True, "updated_at": True})
-                .sort([("priority", -1), ("updated_at", -1)])
-                .limit(max(5, min(int(limit), 50)))
-            )
-
-        results: list[dict[str, object]] = []
-        async for doc in cursor:
+            async for doc in cursor:
                 results.append(
                     {
                         "id": str(doc.get("_id")),
@@ -973,48 +1900,61 @@ class MongoClient:
                         "updated_at": doc.get("updated_at"),
                     }
                 )
+        except Exception as exc:
+            # No text index (or a failed query): the QA index below covers it.
+            logger.debug("mongo_qa_text_search_failed", error=str(exc), project=project)
 
         if results:
             return results[:limit]
 
-        # Fallback: perform lightweight similarity scoring when text index misses.
+        # Fallback: fuzzy-match against the in-memory per-project QA index.
         try:
-            cursor = (
-                self.db[self.qa_collection]
-                .find(
-                    filter_query,
-                    {
-                        "_id": True,
-                        "question": True,
-                        "answer": True,
-                        "priority": True,
-                        "project": True,
-                        "updated_at": True,
-                    },
-                )
-                .sort([("priority", -1), ("updated_at", -1)])
-                .limit(200)
-            )
-            candidates = [self._serialize_qa(doc) async for doc in cursor]
+            index = await qa_index.get_index(project, lambda: self._load_qa_pairs(project))
         except Exception as exc:
             logger.debug("mongo_qa_similarity_fallback_failed", project=project, error=str(exc))
             return []
+        return index.search(cleaned, limit)
 
-        if not candidates:
-            return []
+    async def match_qa_pair(
+        self,
+        query: str,
+        project: str,
+        *,
+        min_score: float,
+    ) -> dict[str, object] | None:
+        """Return the best QA pair of ``project`` scoring at least ``min_score``.
 
-        scored: list[dict[str, object]] = []
-        cleaned_lower = cleaned.lower()
-        for doc in candidates:
-            question_text = str(doc.get("question") or "")
-            ratio = SequenceMatcher(None, question_text.lower(), cleaned_lower).ratio()
-            if ratio < 0.35:
-                continue
-            enriched = doc | {"score": ratio}
-            scored.append(enriched)
+        Unlike :meth:`search_qa_pairs` the score is always the ``0..1``
+        similarity of the in-memory QA index, so it can be compared with a
+        fixed confidence threshold.
+        """
+
+        cleaned = (query or "").strip()
+        if not cleaned or not project:
+            return None
+        index = await qa_index.get_index(project, lambda: self._load_qa_pairs(project))
+        matches = index.search(cleaned, 1, min_score=min_score)
+        return matches[0] if matches else None
+
+    async def _load_qa_pairs(self, project: str | None) -> list[dict]:
+        """Return every QA pair of ``project`` (all projects for ``None``)."""
+
+        filter_query: dict[str, object] = {"project": project} if project else {}
+        projection = {"_id": True, "question": True, "answer": True, "priority": True, "project": True, "updated_at": True}
+        cursor = self.db[self.qa_collection].find(filter_query, projection)
+        return [self._serialize_qa(doc) async for doc in cursor]
 
-        scored.sort(key=lambda item: (item.get("score") or 0, item.get("priority") or 0), reverse=True)
-        return scored[:limit]
+    async def _refresh_qa_index(self, project: str | None, query: dict[str, object]) -> None:
+        """Re-read pairs matching ``query`` into the QA index of ``project``."""
+
+        try:
+            cursor = self.db[self.qa_collection].find(query)
+            pairs = [self._serialize_qa(doc) async for doc in cursor]
+        except Exception as exc:
+            logger.debug("mongo_qa_index_refresh_failed", project=project, error=str(exc))
+            await qa_index.drop(project)
+            return
+        await qa_index.apply_changes(project, upserted=pairs)
 
     async def record_unanswered_question(
         self,
@@ -1022,9 +1962,13 @@ class MongoClient:
         project: str | None,
         question: str,
         metadata: dict[str, object] | None = None,
-        ttl_seconds: int = 30 * 24 * 60 * 60,
+        ttl_seconds: int | None = None,
     ) -> None:
-        """Store unanswered ``question`` for statistics with TTL cleanup."""
+        """Store unanswered ``question`` for statistics.
+
+        Old questions are archived by the retention worker; pass
+        ``ttl_seconds`` (or disable archiving) to delete them inline instead.
+        """
 
         cleaned = (question or "").strip()
         if not cleaned:
@@ -1036,7 +1980,8 @@ class MongoClient:
             "metadata": metadata or {},
             "updated_at": now,
         }
-        ttl_threshold = now - max(3600, int(ttl_seconds))
+        if ttl_seconds is None and not retention.RETENTION_ARCHIVE:
+            ttl_seconds = retention.UNANSWERED_RETENTION_DAYS * 86400
         try:
             await self.db[self.unanswered_collection].update_one(
                 {"project": project, "question": cleaned},
@@ -1050,10 +1995,56 @@ class MongoClient:
                 },
                 upsert=True,
             )
-            await self.db[self.unanswered_collection].delete_many({"updated_at": {"$lt": ttl_threshold}})
+            if ttl_seconds:
+                ttl_threshold = now - max(3600, int(ttl_seconds))
+                await self.db[self.unanswered_collection].delete_many({"updated_at": {"$lt": ttl_threshold}})
         except Exception as exc:
             logger.warning("mongo_unanswered_record_failed", project=project, error=str(exc))
 
+    async def iter_unanswered_questions(
+        self,
+        project: str | None,
+        *,
+        limit: int | None = None,
+        projection: dict[str, int] | None = None,
+        batch_size: int = 1000,
+        include_archive: bool = False,
+    ) -> AsyncGenerator[dict[str, object], None]:
+        """Yield raw unanswered question documents, most recent first.
+
+        With ``include_archive`` archived questions follow the live ones.
+        """
+
+        query: dict[str, object] = {}
+        if project:
+            query["project"] = project
+        cursor = (
+            self.db[self.unanswered_collection]
+            .find(query, projection)
+            .sort([("updated_at", -1)])
+            .batch_size(batch_size)
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        yielded = 0
+        async for doc in cursor:
+            yielded += 1
+            yield doc
+        if not include_archive or (limit and yielded >= limit):
+            return
+        async for doc in retention.iter_archived(
+            self.db,
+            self.unanswered_collection,
+            archive_collection=getattr(self, "archive_collection", "archive"),
+            match=query,
+            projection=projection,
+            newest_first=True,
+        ):
+            yield doc
+            yielded += 1
+            if limit and yielded >= limit:
+                return
+
     async def list_unanswered_questions(
         self,
         project: str | None,
@@ -1116,14 +2107,18 @@ class MongoClient:
         """Return knowledge source priority order for ``project``."""
 
         key = f"knowledge_priority::{project or 'default'}"
+        cached = _project_cache.get(key, _MISS)
+        if cached is not _MISS:
+            return list(cached)
         try:
             doc = await self.get_setting(key) or {}
         except Exception:
-            doc = {}
+            return []
         order = doc.get("order") if isinstance(doc, dict) else None
-        if isinstance(order, list) and all(isinstance(item, str) for item in order):
-            return order
-        return []
+        if not (isinstance(order, list) and all(isinstance(item, str) for item in order)):
+            order = []
+        _project_cache.set(key, order)
+        return list(order)
 
     async def set_knowledge_priority(self, project: str | None, order: list[str]) -> None:
         """Persist knowledge source priority order for ``project``."""
@@ -1135,6 +2130,8 @@ class MongoClient:
             "updated_at": time.time(),
         }
         await self.set_setting(key, payload)
+        await self._invalidate_project_cache()
+        await self._bump_cache_generation(project)
 
     async def list_project_names(self, documents_collection: str, limit: int = 100) -> list[str]:
         """Return a list of known project identifiers."""
@@ -1395,6 +2392,14 @@ class MongoClient:
             data["llm_voice_enabled"] = bool(data["llm_voice_enabled"])
         if "llm_sources_enabled" in data and data["llm_sources_enabled"] is not None:
             data["llm_sources_enabled"] = bool(data["llm_sources_enabled"])
+        for field in ("qa_direct_enabled", "qa_direct_paraphrase"):
+            if field in data and data[field] is not None:
+                data[field] = bool(data[field])
+        if data.get("qa_direct_threshold") is not None:
+            try:
+                data["qa_direct_threshold"] = min(max(float(data["qa_direct_threshold"]), 0.0), 1.0)
+            except (TypeError, ValueError):
+                data["qa_direct_threshold"] = None
         if data.get("llm_voice_model"):
             data["llm_voice_model"] = str(data["llm_voice_model"]).strip() or None
         if "knowledge_image_caption_enabled" in data and data["knowledge_image_caption_enabled"] is not None:
@@ -1421,6 +2426,10 @@ class MongoClient:
             if isinstance(data.get(field), str):
                 data[field] = data[field].strip() or None
         try:
+            previous = await self.db[self.projects_collection].find_one(
+                {"name": data["name"]},
+                {"_id": False, **{field: True for field in _ANSWER_FIELDS}},
+            )
             await self.db[self.projects_collection].update_one(
                 {"name": data["name"]},
                 {"$set": data},
@@ -1430,10 +2439,14 @@ class MongoClient:
                 {"name": data["name"]},
                 {"_id": False},
             )
-            return self._project_from_doc(stored) or project
         except Exception as exc:
             logger.error("mongo_upsert_project_failed", project=data.get("name"), error=str(exc))
             raise
+        await self._invalidate_project_cache()
+        previous = previous or {}
+        if any(previous.get(field) != data.get(field) for field in _ANSWER_FIELDS):
+            await self._bump_cache_generation(data["name"])
+        return self._project_from_doc(stored) or project
 
     async def delete_project(
         self,
@@ -1516,6 +2529,9 @@ class MongoClient:
                 error=str(exc),
             )
 
+        with suppress(Exception):
+            await self.db[self.storage_collection].delete_one({"_id": project_key})
+
         # Remove request statistics for the project
         stats_coll = stats_collection or self.stats_collection
         try:
@@ -1540,6 +2556,8 @@ class MongoClient:
             raise
 
         summary["file_ids"] = file_ids
+        await self._invalidate_project_cache()
+        await self._bump_cache_generation(project_key)
         return summary
 
     async def list_ollama_servers(self) -> list[OllamaServer]:
@@ -1635,6 +2653,15 @@ class MongoClient:
             )
 
     async def get_project(self, domain: str) -> Project | None:
+        """Return the project named (or with the domain) ``domain``.
+
+        Served from the in-process project cache; callers get a copy.
+        """
+
+        key = f"project:{domain}"
+        cached = _project_cache.get(key, _MISS)
+        if cached is not _MISS:
+            return copy.deepcopy(cached)
         try:
             doc = await self.db[self.projects_collection].find_one(
                 {"name": domain},
@@ -1645,10 +2672,12 @@ class MongoClient:
                     {"domain": domain},
                     {"_id": False},
                 )
-            return self._project_from_doc(doc)
+            project = self._project_from_doc(doc)
         except Exception as exc:
             logger.error("mongo_get_project_failed", project=domain, error=str(exc))
             raise
+        _project_cache.set(key, project)
+        return copy.deepcopy(project)
 
     async def get_project_by_admin_username(self, username: str) -> Project | None:
         normalized = (username or "").strip().lower()
@@ -2007,10 +3036,13 @@ class MongoClient:
             return 0
         try:
             result = await self.db[self.qa_collection].insert_many(documents)
-            return len(result.inserted_ids)
         except Exception as exc:
             logger.error("mongo_qa_bulk_insert_failed", project=project, error=str(exc))
             raise
+        await self._bump_cache_generation(project)
+        # ``insert_many`` stores the generated ``_id`` on each document.
+        await qa_index.apply_changes(project, upserted=[self._serialize_qa(doc) for doc in documents])
+        return len(result.inserted_ids)
 
     async def create_qa_pair(self, project: str, question: str, answer: str, *, priority: int = 0) -> dict:
         if not project:
@@ -2031,10 +3063,13 @@ class MongoClient:
         try:
             result = await self.db[self.qa_collection].insert_one(doc)
             doc["_id"] = result.inserted_id
-            return self._serialize_qa(doc)
         except Exception as exc:
             logger.error("mongo_qa_create_failed", project=project, error=str(exc))
             raise
+        await self._bump_cache_generation(project)
+        pair = self._serialize_qa(doc)
+        await qa_index.apply_changes(project, upserted=[pair])
+        return pair
 
     def _serialize_qa(self, doc: dict | None) -> dict:
         if not doc:
@@ -2086,10 +3121,14 @@ class MongoClient:
                 {"$set": updates},
                 return_document=True,
             )
-            return self._serialize_qa(result)
         except Exception as exc:
             logger.error("mongo_qa_update_failed", qa_id=qa_id, error=str(exc))
             raise
+        pair = self._serialize_qa(result)
+        if result:
+            await self._bump_cache_generation(result.get("project"))
+            await qa_index.apply_changes(result.get("project"), upserted=[pair])
+        return pair
 
     async def delete_qa_pair(self, qa_id: str) -> bool:
         try:
@@ -2097,11 +3136,16 @@ class MongoClient:
         except Exception:
             return False
         try:
-            result = await self.db[self.qa_collection].delete_one({"_id": oid})
-            return bool(result.deleted_count)
+            removed = await self.db[self.qa_collection].find_one_and_delete(
+                {"_id": oid}, projection={"project": 1}
+            )
         except Exception as exc:
             logger.error("mongo_qa_delete_failed", qa_id=qa_id, error=str(exc))
             raise
+        if removed:
+            await self._bump_cache_generation(removed.get("project"))
+            await qa_index.apply_changes(removed.get("project"), removed=[qa_id])
+        return bool(removed)
 
     async def reorder_qa_pairs(self, project: str, ordered_ids: list[str]) -> None:
         if not project or not ordered_ids:
@@ -2130,6 +3174,8 @@ class MongoClient:
             bulk.execute()
         except Exception as exc:
             logger.debug("mongo_qa_reorder_failed", project=project, error=str(exc))
+        await self._bump_cache_generation(project)
+        await qa_index.drop(project)
 
     async def log_unanswered_question(self, *, project: str | None, question: str, channel: str | None, session_id: str | None) -> None:
         question = (question or "").strip()
@@ -2276,6 +3322,20 @@ class MongoClient:
                 error=str(exc),
             )
 
+        contexts_collection = getattr(self, "contexts_collection", "contexts")
+        try:
+            await self.db[contexts_collection].create_index(
+                [("sessionId", 1), ("number", 1)],
+                name="contexts_session_number",
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(
+                "mongo_index_create_failed",
+                collection=contexts_collection,
+                index="contexts_session_number",
+                error=str(exc),
+            )
+
         try:
             await self.db[self.qa_collection].create_index(
                 [
@@ -2444,6 +3504,37 @@ class MongoClient:
                 error=str(exc),
             )
 
+        try:
+            await self.db[self.documents_collection].create_index(
+                [("project", 1), ("content_hash", 1)],
+                name="documents_project_content_hash",
+            )
+            await self.db[self.jobs_collection].create_index(
+                [("kind", 1), ("status", 1)],
+                name="maintenance_jobs_kind_status",
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(
+                "mongo_index_create_failed",
+                collection=self.documents_collection,
+                index="documents_project_content_hash",
+                error=str(exc),
+            )
+
+        try:
+            await self.db[self.blobs_collection].create_index(
+                "blobId",
+                unique=True,
+                name="blobs_blob_id",
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.debug(
+                "mongo_index_create_failed",
+                collection=self.blobs_collection,
+                index="blobs_blob_id",
+                error=str(exc),
+            )
+
         try:
             await self.db[self.stats_collection].create_index(
                 [("project", 1), ("date", 1)],
@@ -2460,19 +3551,39 @@ class MongoClient:
                 index="request_stats_project_date",
                 error=str(exc),
             )
+        # TTL safety nets behind the retention worker, plus the archive index.
+        await retention.ensure_ttl_indexes(
+            self.db,
+            retention.policies_for(self),
+            archive_collection=getattr(self, "archive_collection", "archive"),
+        )
+
+        for collection, field, ttl_days in (
+            (self.stats_daily_collection, "date", 0),
+            (self.stats_hourly_collection, "hour", STATS_HOURLY_RETENTION_DAYS),
+        ):
+            try:
+                await self.db[collection].create_index(
+                    [("project", 1), (field, 1)],
+                    name=f"{collection}_project_{field}",
+                )
+                # The TTL index also serves lookups on ``field``; a plain index
+                # on the same key would be rejected with IndexOptionsConflict.
+                if ttl_days > 0:
+                    with suppress(OperationFailure):
+                        await self.db[collection].drop_index(f"{collection}_{field}")
+                    await retention.ensure_ttl_index(self.db, collection, field, ttl_days * 86400)
+                else:
+                    await retention.ensure_ttl_index(self.db, collection, field, 0)
+                    await self.db[collection].create_index(field, name=f"{collection}_{field}")
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("mongo_index_create_failed", collection=collection, error=str(exc))
         try:
-            await self.db[self.stats_collection].create_index(
-                "ts",
-                name="request_stats_ts_ttl",
-                expireAfterSeconds=60 * 60 * 24 * 3,
-            )
+            # Seed the rollups once from the raw entries that are still around.
+            if not await self.db[self.stats_daily_collection].find_one({}, {"_id": 1}):
+                await self.rebuild_request_stat_rollups()
         except Exception as exc:  # noqa: BLE001
-            logger.debug(
-                "mongo_index_create_failed",
-                collection=self.stats_collection,
-                index="request_stats_ts_ttl",
-                error=str(exc),
-            )
+            logger.warning("request_stat_rollups_seed_failed", error=str(exc))
 
         try:
             await self.db[self.ollama_servers_collection].create_index(
@@ -2542,7 +3653,11 @@ class MongoClient:
         user_id: str | None,
         error: str | None = None,
     ) -> None:
-        """Persist a single request statistic entry."""
+        """Persist a single request statistic entry.
+
+        With a :class:`~packages.core.stats_sink.StatsSink` attached as
+        ``stats_sink`` the entry is only queued; it is written in bulk later.
+        """
 
         try:
             now = datetime.now(timezone.utc)
@@ -2560,16 +3675,214 @@ class MongoClient:
                 "user_id": user_id,
                 "error": error,
             }
-            await self.db[self.stats_collection].insert_one(doc)
+            sink = getattr(self, "stats_sink", None)
+            if sink is not None:
+                sink.put(doc)
+            else:
+                await self.insert_request_stats([doc])
         except Exception as exc:  # noqa: BLE001
             logger.debug("stats_log_failed", project=project, error=str(exc))
 
+    async def insert_request_stats(self, docs: list[dict[str, Any]]) -> None:
+        """Write a batch of request statistic entries and update the rollups.
+
+        Rollups are only incremented once every raw entry of the batch is
+        stored, so retrying a failed batch does not count it twice.
+        """
+
+        if not docs:
+            return
+        try:
+            await self.db[self.stats_collection].insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            # ``insert_many`` assigns ``_id`` in place, so a retried batch only
+            # conflicts on the entries that were already written.
+            errors = exc.details.get("writeErrors", [])
+            if not errors or any(error.get("code") != 11000 for error in errors):
+                logger.error("mongo_stats_insert_failed", entries=len(docs), error=str(exc))
+                raise
+        except Exception as exc:
+            logger.error("mongo_stats_insert_failed", entries=len(docs), error=str(exc))
+            raise
+        try:
+            for collection, totals in self._request_stat_rollups(docs).items():
+                await self.db[collection].bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": key},
+                            {"$inc": values.pop("$inc"), "$setOnInsert": values},
+                            upsert=True,
+                        )
+                        for key, values in totals.items()
+                    ],
+                    ordered=False,
+                )
+        except Exception as exc:
+            logger.error("mongo_stats_rollup_failed", entries=len(docs), error=str(exc))
+            raise
+
+    def _request_stat_rollups(
+        self, docs: Iterable[dict[str, Any]]
+    ) -> dict[str, dict[str, dict[str, Any]]]:
+        """Sum ``docs`` per project x channel x day and per hour.
+
+        Returns ``{collection: {rollup_id: {"$inc": counters, **fields}}}``.
+        """
+
+        rollups: dict[str, dict[str, dict[str, Any]]] = {
+            self.stats_daily_collection: {},
+            self.stats_hourly_collection: {},
+        }
+        for doc in docs:
+            ts = doc.get("ts")
+            if not isinstance(ts, datetime):
+                continue
+            project = doc.get("project") or "__default__"
+            channel = doc.get("channel") or ""
+            day = ts.replace(hour=0, minute=0, second=0, microsecond=0)
+            hour = ts.replace(minute=0, second=0, microsecond=0)
+            increments = {
+                "count": 1,
+                "attachments": int(doc.get("attachments") or 0),
+                "response_chars": int(doc.get("response_chars") or 0),
+                "prompt_chars": int(doc.get("prompt_chars") or 0),
+                "errors": 1 if doc.get("error") else 0,
+            }
+            for collection, field, bucket, fmt in (
+                (self.stats_daily_collection, "date", day, "%Y-%m-%d"),
+                (self.stats_hourly_collection, "hour", hour, "%Y-%m-%dT%H"),
+            ):
+                key = f"{project}|{channel}|{bucket.strftime(fmt)}"
+                entry = rollups[collection].setdefault(
+                    key,
+                    {"$inc": dict.fromkeys(increments, 0), "project": project, "channel": channel, field: bucket},
+                )
+                for name, value in increments.items():
+                    entry["$inc"][name] += value
+        return rollups
+
+    async def rebuild_request_stat_rollups(self, *, batch_size: int = 5000) -> int:
+        """Recompute the rollups from the raw entries still stored.
+
+        Used to seed empty rollup collections; counters of periods whose raw
+        entries already expired are left untouched. Returns the entries read.
+        """
+
+        totals: dict[str, dict[str, dict[str, Any]]] = {}
+        seen = 0
+        batch: list[dict[str, Any]] = []
+
+        def _merge(entries: list[dict[str, Any]]) -> None:
+            for collection, rollups in self._request_stat_rollups(entries).items():
+                target = totals.setdefault(collection, {})
+                for key, values in rollups.items():
+                    current = target.setdefault(key, values)
+                    if current is not values:
+                        for name, value in values["$inc"].items():
+                            current["$inc"][name] += value
+
+        cursor = self.db[self.stats_collection].find(
+            {}, {"_id": 0, "question": 0, "session_id": 0, "user_id": 0}
+        ).batch_size(batch_size)
+        async for doc in cursor:
+            ts = doc.get("ts")
+            if isinstance(ts, datetime) and ts.tzinfo is None:
+                doc["ts"] = ts.replace(tzinfo=timezone.utc)
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                _merge(batch)
+                seen += len(batch)
+                batch = []
+        _merge(batch)
+        seen += len(batch)
+
+        for collection, rollups in totals.items():
+            if not rollups:
+                continue
+            await self.db[collection].bulk_write(
+                [
+                    ReplaceOne({"_id": key}, {**values.pop("$inc"), **values}, upsert=True)
+                    for key, values in rollups.items()
+                ],
+                ordered=False,
+            )
+        logger.info("request_stat_rollups_rebuilt", entries=seen)
+        return seen
+
+    async def increment_project_storage(self, deltas: dict[str, Counter]) -> None:
+        """Apply per-project counter ``deltas`` (best effort).
+
+        A failed update only leaves drift for the next reconciliation, so it
+        never fails the write it accounts for.
+        """
+
+        requests = increment_requests(deltas)
+        if not requests:
+            return
+        try:
+            await self.db[getattr(self, "storage_collection", "project_storage")].bulk_write(
+                requests, ordered=False
+            )
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("mongo_storage_counters_update_failed", projects=len(requests), error=str(exc))
+
+    async def get_project_storage(self) -> dict[str, dict[str, Any]]:
+        """Return the storage counters of every project."""
+
+        try:
+            cursor = self.db[self.storage_collection].find({})
+            return {doc.pop("_id"): doc async for doc in cursor}
+        except Exception as exc:
+            logger.error("mongo_get_project_storage_failed", error=str(exc))
+            raise
+
+    async def replace_project_storage(
+        self,
+        usage: dict[str, dict[str, float | int]],
+        redis_usage: dict[str, dict[str, float | int]] | None = None,
+    ) -> int:
+        """Overwrite the storage counters with freshly computed totals.
+
+        Projects missing from both ``usage`` and ``redis_usage`` are dropped.
+        Returns the number of projects written.
+        """
+
+        redis_usage = redis_usage or {}
+        now = datetime.now(timezone.utc)
+        projects = set(usage) | set(redis_usage)
+        requests: list[Any] = [
+            ReplaceOne(
+                {"_id": project},
+                {
+                    **{field: int(usage.get(project, {}).get(field, 0) or 0) for field in COUNTER_FIELDS},
+                    "redis_bytes": float(redis_usage.get(project, {}).get("redis_bytes", 0) or 0),
+                    "redis_keys": int(redis_usage.get(project, {}).get("redis_keys", 0) or 0),
+                    "reconciled_at": now,
+                },
+                upsert=True,
+            )
+            for project in projects
+        ]
+        requests.append(DeleteMany({"_id": {"$nin": list(projects)}}))
+        try:
+            await self.db[self.storage_collection].bulk_write(requests, ordered=False)
+        except Exception as exc:
+            logger.error("mongo_replace_project_storage_failed", projects=len(projects), error=str(exc))
+            raise
+        return len(projects)
+
     async def aggregate_project_storage(
         self,
         documents_collection: str,
         contexts_collection: str,
     ) -> dict[str, dict[str, float | int]]:
-        """Return storage metrics per project for documents and contexts."""
+        """Return storage metrics per project for documents and contexts.
+
+        This scans both collections (on a secondary when one is available);
+        it backs :class:`packages.core.storage_usage.StorageReconciler`, while
+        readers use :meth:`get_project_storage`. Fails as a whole when either
+        scan fails, since a partial result would overwrite the counters.
+        """
 
         result: dict[str, dict[str, float | int]] = {}
 
@@ -2669,23 +3982,31 @@ class MongoClient:
         ]
 
         try:
-            async for item in self.db[documents_collection].aggregate(docs_pipeline):
+            documents = self.db[documents_collection].with_options(
+                read_preference=ReadPreference.SECONDARY_PREFERRED
+            )
+            async for item in documents.aggregate(docs_pipeline):
                 project_key = item.get("_id") or "__default__"
                 entry = _ensure(project_key)
                 entry["documents_bytes"] = int(item.get("documents_bytes", 0) or 0)
                 entry["document_count"] = int(item.get("document_count", 0) or 0)
                 entry["binary_bytes"] = int(item.get("binary_bytes", 0) or 0)
-        except Exception as exc:  # noqa: BLE001
-            logger.warning("mongo_aggregate_documents_failed", error=str(exc))
+        except Exception as exc:
+            logger.error("mongo_aggregate_documents_failed", error=str(exc))
+            raise
 
         try:
-            async for item in self.db[contexts_collection].aggregate(contexts_pipeline):
+            contexts = self.db[contexts_collection].with_options(
+                read_preference=ReadPreference.SECONDARY_PREFERRED
+            )
+            async for item in contexts.aggregate(contexts_pipeline):
                 project_key = item.get("_id") or "__default__"
                 entry = _ensure(project_key)
                 entry["context_bytes"] = int(item.get("context_bytes", 0) or 0)
                 entry["context_count"] = int(item.get("context_count", 0) or 0)
-        except Exception as exc:  # noqa: BLE001
-            logger.warning("mongo_aggregate_contexts_failed", error=str(exc))
+        except Exception as exc:
+            logger.error("mongo_aggregate_contexts_failed", error=str(exc))
+            raise
 
         return result
 
@@ -2696,7 +4017,16 @@ class MongoClient:
         start: datetime | None = None,
         end: datetime | None = None,
         channel: str | None = None,
+        granularity: str = "day",
     ) -> list[dict[str, object]]:
+        """Return request counters per day (or hour) from the rollups.
+
+        Raw entries are not touched; see :meth:`insert_request_stats`.
+        """
+
+        hourly = granularity == "hour"
+        collection = self.stats_hourly_collection if hourly else self.stats_daily_collection
+        field = "hour" if hourly else "date"
         match: dict[str, object] = {}
         if project:
             match["project"] = project.strip().lower()
@@ -2708,7 +4038,7 @@ class MongoClient:
                 bounds["$gte"] = start
             if end:
                 bounds["$lt"] = end
-            match["date"] = bounds
+            match[field] = bounds
 
         pipeline: list[dict[str, object]] = []
         if match:
@@ -2717,22 +4047,26 @@ class MongoClient:
             [
                 {
                     "$group": {
-                        "_id": "$date",
-                        "count": {"$sum": 1},
-                        "attachments": {"$sum": {"$ifNull": ["$attachments", 0]}},
-                        "response_chars": {"$sum": {"$ifNull": ["$response_chars", 0]}},
+                        "_id": f"${field}",
+                        "count": {"$sum": "$count"},
+                        "attachments": {"$sum": "$attachments"},
+                        "response_chars": {"$sum": "$response_chars"},
                     }
                 },
                 {"$sort": {"_id": 1}},
             ]
         )
-        cursor = self.db[self.stats_collection].aggregate(pipeline)
+        cursor = self.db[collection].aggregate(pipeline)
         results: list[dict[str, object]] = []
         async for item in cursor:
-            day: datetime = item.get("_id")
+            bucket: datetime = item.get("_id")
+            if isinstance(bucket, datetime):
+                label = bucket.isoformat(timespec="minutes") if hourly else bucket.date().isoformat()
+            else:
+                label = str(bucket)
             results.append(
                 {
-                    "date": day.date().isoformat() if isinstance(day, datetime) else str(day),
+                    "date": label,
                     "count": item.get("count", 0),
                     "attachments": item.get("attachments", 0),
                     "response_chars": item.get("response_chars", 0),
@@ -2747,7 +4081,16 @@ class MongoClient:
         start: datetime | None = None,
         end: datetime | None = None,
         channel: str | None = None,
+        projection: dict[str, int] | None = None,
+        batch_size: int = 1000,
+        include_archive: bool = False,
     ) -> AsyncGenerator[dict[str, object], None]:
+        """Yield raw request stats ordered by time, reading ``batch_size`` at a time.
+
+        With ``include_archive`` entries already moved to the archive by the
+        retention worker come first.
+        """
+
         match: dict[str, object] = {}
         if project:
             match["project"] = project.strip().lower()
@@ -2761,6 +4104,22 @@ class MongoClient:
                 bounds["$lt"] = end
             match["date"] = bounds
 
-        cursor = self.db[self.stats_collection].find(match, {"_id": False}).sort("ts", 1)
+        if include_archive:
+            async for item in retention.iter_archived(
+                self.db,
+                self.stats_collection,
+                archive_collection=getattr(self, "archive_collection", "archive"),
+                start=start,
+                end=end,
+                match=match,
+                projection=projection or {"_id": False},
+            ):
+                yield item
+        cursor = (
+            self.db[self.stats_collection]
+            .find(match, projection or {"_id": False})
+            .sort("ts", 1)
+            .batch_size(batch_size)
+        )
         async for item in cursor:
             yield item
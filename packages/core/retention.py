@@ -0,0 +1,388 @@
+"""Retention tiers for request stats, chat contexts and unanswered questions.
+
+Every collection gets a retention period (``*_RETENTION_DAYS``, ``0`` keeps
+data forever). :class:`RetentionWorker` periodically moves expired entries
+into the cold ``archive`` collection and deletes them from the hot one, so
+the working set stays small while old periods remain readable:
+:func:`iter_archived` streams them back for exports.
+
+Archived entries are grouped into bucket documents per collection, month
+and batch holding the BSON rows compressed with zstd (zlib when
+:mod:`zstandard` is missing). A bucket is split once its raw rows reach
+``RETENTION_BUCKET_BYTES``, which keeps it well below Mongo's 16 MB document
+limit however large the rows are. Bucket ids derive from the first archived
+``_id``, so a batch retried after a crash replaces its bucket instead of
+duplicating it.
+
+Where the timestamp is a BSON date, ``ensure_ttl_indexes`` also installs a
+TTL index ``RETENTION_TTL_GRACE_DAYS`` after the retention period as a safety
+net (or exactly at it when archiving is disabled).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import zlib
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import structlog
+from bson import CodecOptions, ObjectId, decode_all, encode
+from bson.binary import Binary
+from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure
+
+try:  # pragma: no cover - optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - zlib fallback
+    zstandard = None  # type: ignore[assignment]
+
+logger = structlog.get_logger(__name__)
+
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in {"0", "false", "no", "off"}
+
+
+STATS_RETENTION_DAYS = int(os.getenv("STATS_RETENTION_DAYS", "3"))
+CONTEXTS_RETENTION_DAYS = int(os.getenv("CONTEXTS_RETENTION_DAYS", "0"))
+UNANSWERED_RETENTION_DAYS = int(os.getenv("UNANSWERED_RETENTION_DAYS", "30"))
+RETENTION_ARCHIVE = _flag("RETENTION_ARCHIVE", "1")
+RETENTION_TTL_GRACE_DAYS = int(os.getenv("RETENTION_TTL_GRACE_DAYS", "7"))
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "5000"))
+RETENTION_BUCKET_BYTES = int(os.getenv("RETENTION_BUCKET_BYTES", str(8 * 1024 * 1024)))
+
+_CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+_ZSTD_LEVEL = 10
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How long entries of ``collection`` stay in the hot tier.
+
+    ``field`` orders and selects expired entries; ``kind`` is ``date``,
+    ``epoch`` (float seconds) or ``objectid`` (creation time of ``_id``).
+    ``ttl_field`` names a BSON date field for the TTL safety net.
+    """
+
+    collection: str
+    field: str
+    kind: str
+    days: int
+    ttl_field: str | None = None
+
+    def cutoff(self, now: datetime) -> Any:
+        moment = now - timedelta(days=self.days)
+        if self.kind == "epoch":
+            return moment.timestamp()
+        if self.kind == "objectid":
+            return ObjectId.from_datetime(moment)
+        return moment
+
+    def timestamp(self, doc: dict[str, Any]) -> datetime | None:
+        value = doc.get(self.field)
+        if isinstance(value, ObjectId):
+            return value.generation_time
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        if isinstance(value, datetime):
+            return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return None
+
+
+def policies_for(mongo: Any) -> list[RetentionPolicy]:
+    """Return the retention policies for the collections of ``mongo``."""
+
+    contexts = getattr(mongo, "contexts_collection", "contexts")
+    if getattr(mongo, "session_layout", "message") == "document":
+        contexts_policy = RetentionPolicy(contexts, "updated_at", "date", CONTEXTS_RETENTION_DAYS, "updated_at")
+    else:
+        # Older messages carry no timestamp; their ObjectId does.
+        contexts_policy = RetentionPolicy(contexts, "_id", "objectid", CONTEXTS_RETENTION_DAYS, "ts")
+    return [
+        RetentionPolicy(
+            getattr(mongo, "stats_collection", "request_stats"), "ts", "date", STATS_RETENTION_DAYS, "ts"
+        ),
+        contexts_policy,
+        RetentionPolicy(
+            getattr(mongo, "unanswered_collection", "unanswered_questions"),
+            "updated_at",
+            "epoch",
+            UNANSWERED_RETENTION_DAYS,
+        ),
+    ]
+
+
+def _compress(data: bytes) -> tuple[str, bytes]:
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=_ZSTD_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this archive bucket")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+
+def _buckets(
+    policy: RetentionPolicy,
+    docs: list[dict[str, Any]],
+    max_bytes: int = RETENTION_BUCKET_BYTES,
+) -> list[ReplaceOne]:
+    buckets: list[tuple[str, list[tuple[datetime, dict[str, Any], bytes]]]] = []
+    current: dict[str, list[tuple[datetime, dict[str, Any], bytes]]] = {}
+    sizes: dict[str, int] = {}
+    for doc in docs:
+        ts = policy.timestamp(doc) or datetime.now(timezone.utc)
+        month = ts.strftime("%Y-%m")
+        raw = encode(doc)
+        if month not in current or sizes[month] + len(raw) > max_bytes:
+            current[month], sizes[month] = [], 0
+            buckets.append((month, current[month]))
+        current[month].append((ts, doc, raw))
+        sizes[month] += len(raw)
+    operations = []
+    for month, rows in buckets:
+        codec, data = _compress(b"".join(raw for _, _, raw in rows))
+        bucket_id = f"{policy.collection}:{month}:{rows[0][1]['_id']}"
+        operations.append(
+            ReplaceOne(
+                {"_id": bucket_id},
+                {
+                    "_id": bucket_id,
+                    "collection": policy.collection,
+                    "month": month,
+                    "start": min(ts for ts, _, _ in rows),
+                    "end": max(ts for ts, _, _ in rows),
+                    "count": len(rows),
+                    "codec": codec,
+                    "data": Binary(data),
+                    "archived_at": datetime.now(timezone.utc),
+                },
+                upsert=True,
+            )
+        )
+    return operations
+
+
+async def archive_expired(
+    db: Any,
+    policy: RetentionPolicy,
+    *,
+    archive_collection: str = "archive",
+    archive: bool = RETENTION_ARCHIVE,
+    now: datetime | None = None,
+    batch_size: int = RETENTION_BATCH,
+    bucket_bytes: int = RETENTION_BUCKET_BYTES,
+) -> int:
+    """Archive (optionally) and delete entries older than ``policy.days``.
+
+    Returns the number of entries removed from the hot collection.
+    """
+
+    if policy.days <= 0:
+        return 0
+    query = {policy.field: {"$lt": policy.cutoff(now or datetime.now(timezone.utc))}}
+    removed = 0
+    while True:
+        cursor = db[policy.collection].find(query).sort(policy.field, 1).limit(batch_size)
+        docs = await cursor.to_list(batch_size)
+        if not docs:
+            break
+        if archive:
+            await db[archive_collection].bulk_write(_buckets(policy, docs, bucket_bytes), ordered=False)
+        await db[policy.collection].delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+        removed += len(docs)
+        if len(docs) < batch_size:
+            break
+    return removed
+
+
+def _matches(doc: dict[str, Any], match: dict[str, Any]) -> bool:
+    for field, condition in match.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        if value is None:
+            return False
+        for op, bound in condition.items():
+            if isinstance(value, datetime) and isinstance(bound, datetime):
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+                if bound.tzinfo is None:
+                    bound = bound.replace(tzinfo=timezone.utc)
+            if (
+                (op == "$gte" and not value >= bound)
+                or (op == "$gt" and not value > bound)
+                or (op == "$lt" and not value < bound)
+                or (op == "$lte" and not value <= bound)
+            ):
+                return False
+    return True
+
+
+def _project(doc: dict[str, Any], projection: dict[str, Any] | None) -> dict[str, Any]:
+    if not projection:
+        return doc
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        row = {field: doc[field] for field in included if field in doc}
+        if projection.get("_id"):
+            row["_id"] = doc.get("_id")
+        return row
+    return {field: value for field, value in doc.items() if projection.get(field, True)}
+
+
+async def iter_archived(
+    db: Any,
+    collection: str,
+    *,
+    archive_collection: str = "archive",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    match: dict[str, Any] | None = None,
+    projection: dict[str, Any] | None = None,
+    newest_first: bool = False,
+) -> AsyncGenerator[dict[str, Any], None]:
+    """Yield archived entries of ``collection`` overlapping ``start``..``end``.
+
+    ``match`` supports equality and ``$gte``/``$gt``/``$lt``/``$lte``
+    conditions, which is what the export queries use.
+    """
+
+    query: dict[str, Any] = {"collection": collection}
+    if start:
+        query["end"] = {"$gte": start}
+    if end:
+        query["start"] = {"$lt": end}
+    order = -1 if newest_first else 1
+    cursor = db[archive_collection].find(query).sort("start", order)
+    async for bucket in cursor:
+        rows = decode_all(_decompress(bucket.get("codec", ""), bytes(bucket["data"])), _CODEC_OPTIONS)
+        if newest_first:
+            rows.reverse()
+        for row in rows:
+            if match and not _matches(row, match):
+                continue
+            yield _project(row, projection)
+
+
+async def ensure_ttl_index(db: Any, collection: str, field: str, seconds: int) -> None:
+    """Create, adjust or (``seconds <= 0``) drop the TTL index on ``field``."""
+
+    name = f"{collection}_{field}_ttl"
+    if seconds <= 0:
+        try:
+            await db[collection].drop_index(name)
+        except OperationFailure:
+            pass
+        return
+    try:
+        await db[collection].create_index(field, name=name, expireAfterSeconds=seconds)
+    except OperationFailure:
+        # Same index with another period: adjust it in place.
+        await db.command("collMod", collection, index={"name": name, "expireAfterSeconds": seconds})
+
+
+async def ensure_ttl_indexes(
+    db: Any,
+    policies: list[RetentionPolicy],
+    *,
+    archive_collection: str = "archive",
+    archive: bool = RETENTION_ARCHIVE,
+) -> None:
+    """Create or adjust TTL indexes and the archive lookup index."""
+
+    for policy in policies:
+        if not policy.ttl_field:
+            continue
+        days = policy.days + (RETENTION_TTL_GRACE_DAYS if archive else 0) if policy.days > 0 else 0
+        try:
+            await ensure_ttl_index(db, policy.collection, policy.ttl_field, days * 86400)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug("mongo_ttl_index_failed", collection=policy.collection, error=str(exc))
+    try:
+        await db[archive_collection].create_index(
+            [("collection", 1), ("start", 1)], name="archive_collection_start"
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.debug("mongo_index_create_failed", collection=archive_collection, error=str(exc))
+
+
+class RetentionWorker:
+    """Periodically archive and expire entries of the hot collections."""
+
+    def __init__(self, mongo: Any, *, interval: float = RETENTION_INTERVAL) -> None:
+        self.mongo = mongo
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def run_once(self) -> dict[str, int]:
+        """Apply every policy once; returns removed entries per collection."""
+
+        archive_collection = getattr(self.mongo, "archive_collection", "archive")
+        summary: dict[str, int] = {}
+        for policy in policies_for(self.mongo):
+            try:
+                removed = await archive_expired(
+                    self.mongo.db, policy, archive_collection=archive_collection
+                )
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("retention_archive_failed", collection=policy.collection, error=str(exc))
+                continue
+            if removed:
+                summary[policy.collection] = removed
+        if summary:
+            logger.info("retention_archived", archived=RETENTION_ARCHIVE, **summary)
+        return summary
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Start the periodic task (idempotent)."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def retention_worker_from_env(mongo: Any) -> RetentionWorker | None:
+    """Return a :class:`RetentionWorker` unless ``RETENTION_INTERVAL<=0``."""
+
+    if RETENTION_INTERVAL <= 0:
+        return None
+    return RetentionWorker(mongo)
+
+
+__all__ = [
+    "RetentionPolicy",
+    "RetentionWorker",
+    "archive_expired",
+    "ensure_ttl_indexes",
+    "iter_archived",
+    "policies_for",
+    "retention_worker_from_env",
+]
@@ -0,0 +1,285 @@
+"""Redis-backed hot store for chat sessions with write-behind to MongoDB.
+
+Active sessions live in a Redis list per session (``RPUSH`` + ``LTRIM``)
+next to a sequence counter, so reading the history or appending a message is
+a single pipelined round trip. Appended messages are queued and written to
+Mongo in batches by a background task (:meth:`MongoClient.append_session_messages`),
+which keeps the ``contexts`` collection complete for analytics and as the
+fallback when Redis misses or fails.
+
+:class:`SessionStore` mirrors the ``get_sessions``/``append_session_message``
+signatures of :class:`~packages.core.mongo.MongoClient`, so callers can use
+either interchangeably.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import orjson
+import structlog
+from redis.exceptions import WatchError
+
+from packages.backend.cache import _get_redis
+from packages.core.models import ContextMessage
+from packages.core.mongo import MongoClient
+
+logger = structlog.get_logger(__name__)
+
+SESSION_STORE = os.getenv("SESSION_STORE", "redis").strip().lower()
+SESSION_PREFIX = os.getenv("SESSION_PREFIX", "session:")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_KEEP = int(os.getenv("SESSION_KEEP", "10"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "1.0"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "200"))
+SESSION_MAX_PENDING = int(os.getenv("SESSION_MAX_PENDING", "10000"))
+
+
+def _message(session_id: str, number: int, entry: dict[str, Any]) -> ContextMessage:
+    # Session keys may be composite (``project::id``), so skip UUID validation.
+    return ContextMessage.model_construct(
+        session_id=session_id,
+        role=entry["role"],
+        number=number,
+        text=entry["text"],
+        project=entry.get("project"),
+    )
+
+
+class SessionStore:
+    """Hot chat history in Redis, persisted to Mongo asynchronously.
+
+    Parameters
+    ----------
+    mongo:
+        Durable store used for write-behind and on Redis misses.
+    keep:
+        Messages copied into Redis when a session is loaded from Mongo;
+        appends trim to the ``keep`` passed by the caller.
+    ttl:
+        Expiry of idle sessions in Redis, in seconds.
+    flush_interval, flush_batch:
+        The write-behind task flushes every ``flush_interval`` seconds or as
+        soon as ``flush_batch`` messages are pending.
+    """
+
+    def __init__(
+        self,
+        mongo: MongoClient,
+        *,
+        keep: int = SESSION_KEEP,
+        ttl: int = SESSION_TTL,
+        flush_interval: float = SESSION_FLUSH_INTERVAL,
+        flush_batch: int = SESSION_FLUSH_BATCH,
+        redis: Any | None = None,
+    ) -> None:
+        self.mongo = mongo
+        self.keep = keep
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._redis = redis
+        self._pending: list[tuple[str, ContextMessage, int]] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _client(self):
+        return self._redis if self._redis is not None else _get_redis()
+
+    @staticmethod
+    def _keys(collection: str, session_id: str) -> tuple[str, str]:
+        base = f"{SESSION_PREFIX}{collection}:{session_id}"
+        return base, f"{base}:seq"
+
+    async def get_sessions(
+        self, collection: str, session_id: str
+    ) -> AsyncGenerator[ContextMessage]:
+        """Yield messages for ``session_id`` ordered by ``number``.
+
+        Raises
+        ------
+        NotFound
+            If the session exists neither in Redis nor in Mongo.
+        """
+
+        for message in await self.history(collection, session_id):
+            yield message
+
+    async def history(self, collection: str, session_id: str) -> list[ContextMessage]:
+        """Return the session history, loading it from Mongo on a miss."""
+
+        list_key, seq_key = self._keys(collection, session_id)
+        try:
+            pipe = self._client().pipeline(transaction=False)
+            pipe.lrange(list_key, 0, -1)
+            pipe.get(seq_key)
+            raw_entries, raw_seq = await pipe.execute()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("session_store_read_failed", session=session_id, error=str(exc))
+            return [message async for message in self.mongo.get_sessions(collection, session_id)]
+
+        if raw_entries and raw_seq is not None:
+            # Numbers are contiguous, so the list ends at ``seq - 1``.
+            first = int(raw_seq) - len(raw_entries)
+            return [
+                _message(session_id, first + offset, orjson.loads(raw))
+                for offset, raw in enumerate(raw_entries)
+            ]
+
+        messages = [message async for message in self.mongo.get_sessions(collection, session_id)]
+        await self._warm(collection, session_id, messages)
+        return messages
+
+    async def _warm(self, collection: str, session_id: str, messages: list[ContextMessage]) -> None:
+        """Copy ``messages`` read from Mongo into Redis.
+
+        Mongo lacks messages still waiting for the write-behind, so the
+        sequence only ever moves forward and the list is only written when
+        it is missing and the sequence matches the Mongo history; otherwise
+        reads keep falling back to Mongo until the flush catches up.
+        """
+
+        if not messages:
+            return
+        list_key, seq_key = self._keys(collection, session_id)
+        numbers = [
+            message.number
+            for pending_collection, message, _ in self._pending
+            if pending_collection == collection and message.session_id == session_id
+        ]
+        target = max([messages[-1].number, *numbers]) + 1
+        tail = messages[-self.keep :] if self.keep > 0 else messages
+        entries = [
+            orjson.dumps(
+                {"role": getattr(m.role, "value", m.role), "text": m.text, "project": m.project}
+            )
+            for m in tail
+        ]
+        try:
+            async with self._client().pipeline(transaction=True) as pipe:
+                # Appends touching either key in between abort the warm.
+                await pipe.watch(list_key, seq_key)
+                current = await pipe.get(seq_key)
+                listed = await pipe.exists(list_key)
+                seq = max(target, int(current or 0))
+                pipe.multi()
+                if current is None or int(current) < seq:
+                    pipe.set(seq_key, seq, ex=self.ttl)
+                if not listed and seq == target:
+                    pipe.rpush(list_key, *entries)
+                    pipe.expire(list_key, self.ttl)
+                await pipe.execute()
+        except WatchError:
+            logger.debug("session_store_warm_skipped", session=session_id)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug("session_store_warm_failed", session=session_id, error=str(exc))
+
+    async def append_session_message(
+        self,
+        collection: str,
+        session_id: str,
+        role: str,
+        text: str,
+        *,
+        project: str | None = None,
+        keep: int = 10,
+    ) -> ContextMessage:
+        """Append a message in Redis and queue it for Mongo.
+
+        Only the last ``keep`` messages are retained, in Redis and (on flush)
+        in Mongo. Falls back to a direct Mongo append when Redis is unavailable.
+        """
+
+        entry = {"role": role, "text": text, "project": project or None}
+        list_key, seq_key = self._keys(collection, session_id)
+        try:
+            pipe = self._client().pipeline(transaction=True)
+            pipe.rpush(list_key, orjson.dumps(entry))
+            pipe.incr(seq_key)
+            pipe.ltrim(list_key, -keep, -1)
+            pipe.expire(list_key, self.ttl)
+            pipe.expire(seq_key, self.ttl)
+            _, seq, *_ = await pipe.execute()
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("session_store_append_failed", session=session_id, error=str(exc))
+            return await self.mongo.append_session_message(
+                collection, session_id, role, text, project=project, keep=keep
+            )
+
+        message = _message(session_id, int(seq) - 1, entry)
+        self._pending.append((collection, message, keep))
+        if len(self._pending) > SESSION_MAX_PENDING:
+            dropped = len(self._pending) - SESSION_MAX_PENDING
+            del self._pending[:dropped]
+            logger.error("session_store_pending_dropped", dropped=dropped)
+        if len(self._pending) >= self.flush_batch:
+            self._wakeup.set()
+        return message
+
+    async def flush(self) -> int:
+        """Write pending messages to Mongo; returns how many were persisted."""
+
+        pending, self._pending = self._pending, []
+        batches: dict[tuple[str, int], list[ContextMessage]] = {}
+        for collection, message, keep in pending:
+            batches.setdefault((collection, keep), []).append(message)
+        written = 0
+        for (collection, keep), messages in batches.items():
+            try:
+                await self.mongo.append_session_messages(collection, messages, keep=keep)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning(
+                    "session_store_flush_failed",
+                    collection=collection,
+                    messages=len(messages),
+                    error=str(exc),
+                )
+                # Retry with the next flush; upserts make this idempotent.
+                self._pending[:0] = [(collection, message, keep) for message in messages]
+                continue
+            written += len(messages)
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self.flush()
+
+    def start(self) -> asyncio.Task:
+        """Start the write-behind task (idempotent)."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self) -> None:
+        """Stop the write-behind task and flush what is still pending."""
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await self.flush()
+
+
+def session_store_from_env(mongo: MongoClient) -> SessionStore | None:
+    """Return a :class:`SessionStore` unless ``SESSION_STORE=mongo``."""
+
+    if SESSION_STORE != "redis":
+        return None
+    return SessionStore(mongo)
+
+
+__all__ = ["SessionStore", "session_store_from_env"]
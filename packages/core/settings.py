@@ -26,6 +26,7 @@ class MongoSettings(BaseSettings):
     presets: str = "contextPresets"
     vectors: str = "vectors"
     documents: str = "documents"
+    chunks: str = "document_chunks"
     settings: str = "app_settings"
     voice_samples: str = "voice_samples"
     voice_jobs: str = "voice_training_jobs"
@@ -0,0 +1,248 @@
+"""Buffered writer for request statistics.
+
+:meth:`MongoClient.log_request_stat` used to ``insert_one`` per chat request
+from the ``finally`` of the SSE generator, so every stream waited for Mongo
+before closing. :class:`StatsSink` keeps the entries in a bounded in-memory
+buffer instead and writes them with ``insert_many`` every
+``STATS_FLUSH_INTERVAL`` seconds or as soon as ``STATS_FLUSH_BATCH`` entries
+are pending. The buffer is drained on shutdown.
+
+When ``STATS_MAX_PENDING`` entries are already waiting (Mongo is down or
+slow), ``STATS_OVERFLOW`` decides what happens to new ones: ``drop`` discards
+them, ``redis`` spills them to a Redis list that is written back to Mongo
+once the buffer has room again. Queue depth, written, spilled and dropped
+entries are exported as Prometheus metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any
+
+import orjson
+import structlog
+from bson import ObjectId
+from prometheus_client import REGISTRY, Counter, Gauge
+
+from packages.backend.cache import _get_redis
+
+logger = structlog.get_logger(__name__)
+
+STATS_SINK = os.getenv("STATS_SINK", "buffered").strip().lower()
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "2.0"))
+STATS_FLUSH_BATCH = int(os.getenv("STATS_FLUSH_BATCH", "500"))
+STATS_MAX_PENDING = int(os.getenv("STATS_MAX_PENDING", "20000"))
+STATS_OVERFLOW = os.getenv("STATS_OVERFLOW", "drop").strip().lower()
+STATS_SPILL_KEY = os.getenv("STATS_SPILL_KEY", "stats:spill")
+
+# Fields restored from ISO strings when spilled entries are read back.
+_DATETIME_FIELDS = ("ts", "date")
+
+
+def _metric(factory, name: str, documentation: str, labels: list[str] | None = None):
+    try:
+        return factory(name, documentation, labels or [])
+    except ValueError:  # module loaded twice (tests import it by path)
+        return REGISTRY._names_to_collectors[name]
+
+
+stats_queue_depth = _metric(Gauge, "stats_sink_queue_depth", "Request stats waiting to be written")
+stats_entries = _metric(
+    Counter,
+    "stats_sink_entries_total",
+    "Request stats handled by the buffered sink",
+    ["result"],
+)
+
+
+def _encode_spilled(doc: dict[str, Any]) -> bytes:
+    # ``insert_many`` assigns an ObjectId ``_id`` before a failed batch reaches
+    # the spill; keep it so the retry still only conflicts on written entries.
+    def default(value: Any) -> Any:
+        if isinstance(value, ObjectId):
+            return {"$oid": str(value)}
+        raise TypeError(f"unsupported type: {type(value).__name__}")
+
+    return orjson.dumps(doc, default=default)
+
+
+def _decode_spilled(raw: bytes | str) -> dict[str, Any]:
+    doc = orjson.loads(raw)
+    oid = doc.get("_id")
+    if isinstance(oid, dict) and "$oid" in oid:
+        doc["_id"] = ObjectId(oid["$oid"])
+    for field in _DATETIME_FIELDS:
+        value = doc.get(field)
+        if isinstance(value, str):
+            doc[field] = datetime.fromisoformat(value)
+    return doc
+
+
+class StatsSink:
+    """Bounded buffer in front of ``MongoClient.insert_request_stats``.
+
+    Parameters
+    ----------
+    mongo:
+        Client providing ``insert_request_stats(docs)``.
+    flush_interval, flush_batch:
+        The background task flushes every ``flush_interval`` seconds or as
+        soon as ``flush_batch`` entries are pending.
+    max_pending:
+        Buffer capacity; beyond it ``overflow`` applies.
+    overflow:
+        ``"drop"`` or ``"redis"`` (spill to ``spill_key``).
+    """
+
+    def __init__(
+        self,
+        mongo: Any,
+        *,
+        flush_interval: float = STATS_FLUSH_INTERVAL,
+        flush_batch: int = STATS_FLUSH_BATCH,
+        max_pending: int = STATS_MAX_PENDING,
+        overflow: str = STATS_OVERFLOW,
+        spill_key: str = STATS_SPILL_KEY,
+        redis: Any | None = None,
+    ) -> None:
+        self.mongo = mongo
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.max_pending = max(1, max_pending)
+        self.overflow = overflow if overflow in {"drop", "redis"} else "drop"
+        self.spill_key = spill_key
+        self._redis = redis
+        self._pending: deque[dict[str, Any]] = deque()
+        self._spilled = False
+        self._spills: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def _client(self):
+        return self._redis if self._redis is not None else _get_redis()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def put(self, doc: dict[str, Any]) -> None:
+        """Queue ``doc`` without waiting for any I/O."""
+
+        if len(self._pending) >= self.max_pending:
+            self._overflow([doc])
+            return
+        self._pending.append(doc)
+        stats_queue_depth.set(len(self._pending))
+        if len(self._pending) >= self.flush_batch:
+            self._wakeup.set()
+
+    def _overflow(self, docs: list[dict[str, Any]]) -> None:
+        if self.overflow == "redis":
+            task = asyncio.get_running_loop().create_task(self._spill(docs))
+            self._spills.add(task)
+            task.add_done_callback(self._spills.discard)
+            return
+        stats_entries.labels("dropped").inc(len(docs))
+        logger.warning("stats_sink_dropped", entries=len(docs))
+
+    async def _spill(self, docs: list[dict[str, Any]]) -> None:
+        try:
+            await self._client().rpush(self.spill_key, *(_encode_spilled(doc) for doc in docs))
+        except Exception as exc:  # noqa: BLE001
+            stats_entries.labels("dropped").inc(len(docs))
+            logger.warning("stats_sink_spill_failed", entries=len(docs), error=str(exc))
+            return
+        self._spilled = True
+        stats_entries.labels("spilled").inc(len(docs))
+
+    async def _restore(self) -> None:
+        """Move spilled entries back into the buffer while there is room."""
+
+        room = min(self.flush_batch, self.max_pending - len(self._pending))
+        if room <= 0:
+            return
+        try:
+            raw = await self._client().lpop(self.spill_key, room)
+        except Exception as exc:  # noqa: BLE001
+            logger.debug("stats_sink_restore_failed", error=str(exc))
+            return
+        if not raw:
+            self._spilled = False
+            return
+        self._pending.extend(_decode_spilled(item) for item in raw)
+
+    async def _write(self) -> tuple[int, bool]:
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.flush_batch, len(self._pending)))]
+            try:
+                await self.mongo.insert_request_stats(batch)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("stats_sink_flush_failed", entries=len(batch), error=str(exc))
+                # Keep the batch for the next flush, within capacity.
+                room = self.max_pending - len(self._pending)
+                self._pending.extendleft(reversed(batch[:room]))
+                if batch[room:]:
+                    self._overflow(batch[room:])
+                return written, False
+            written += len(batch)
+        return written, True
+
+    async def flush(self) -> int:
+        """Write pending entries to Mongo; returns how many were persisted."""
+
+        written, ok = await self._write()
+        if ok and self._spilled:
+            await self._restore()
+            restored, _ = await self._write()
+            written += restored
+        stats_entries.labels("written").inc(written)
+        stats_queue_depth.set(len(self._pending))
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending or self._spilled:
+                await self.flush()
+
+    def start(self) -> asyncio.Task:
+        """Start the flush task (idempotent)."""
+
+        if self._task is None or self._task.done():
+            # Pick up entries spilled before a restart.
+            self._spilled = self.overflow == "redis"
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self) -> None:
+        """Stop the flush task and drain the buffer."""
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._spills:
+            await asyncio.gather(*self._spills, return_exceptions=True)
+        if self._pending:
+            await self.flush()
+
+
+def stats_sink_from_env(mongo: Any) -> StatsSink | None:
+    """Return a :class:`StatsSink` unless ``STATS_SINK=direct``."""
+
+    if STATS_SINK == "direct":
+        return None
+    return StatsSink(mongo)
+
+
+__all__ = ["StatsSink", "stats_sink_from_env"]
@@ -0,0 +1,233 @@
+"""Per-project storage counters.
+
+The admin storage view used to run ``$bsonSize`` over every document and
+context record plus a Redis ``SCAN`` with ``MEMORY USAGE`` per key on each
+request. Usage is now kept in the ``project_storage`` collection
+(``MONGO_PROJECT_STORAGE``), one document per project with
+``documents_bytes``, ``document_count``, ``binary_bytes``, ``context_bytes``
+and ``context_count``:
+
+* writers ``$inc`` the counters when documents are uploaded, replaced or
+  deleted and when chat messages are stored;
+* :class:`StorageReconciler` recomputes everything every
+  ``STORAGE_RECONCILE_INTERVAL`` seconds (reading from secondaries when
+  available) and overwrites the counters, which corrects drift from writes
+  that are not tracked (TTL expiry, session trimming, manual edits) and
+  refreshes the Redis usage.
+
+Reading usage is then a single query on a small collection.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from collections import Counter
+from typing import Any, Mapping
+
+import bson
+import structlog
+from pymongo import UpdateOne
+
+from packages.backend.cache import _get_redis
+
+logger = structlog.get_logger(__name__)
+
+STORAGE_COLLECTION = os.getenv("MONGO_PROJECT_STORAGE", "project_storage")
+STORAGE_RECONCILE_INTERVAL = float(os.getenv("STORAGE_RECONCILE_INTERVAL", "3600"))
+
+DEFAULT_PROJECT = "__default__"
+COUNTER_FIELDS = ("documents_bytes", "document_count", "binary_bytes", "context_bytes", "context_count")
+
+
+def project_key(doc: Mapping[str, Any]) -> str:
+    """Counter key of ``doc``: its project, else its domain, lower-cased."""
+
+    for field in ("project", "domain"):
+        value = doc.get(field)
+        if isinstance(value, str) and value.strip():
+            return value.strip().lower()
+    return DEFAULT_PROJECT
+
+
+def document_usage(doc: Mapping[str, Any] | None, sign: int = 1) -> Counter:
+    """Counter deltas for adding (``sign=1``) or removing (``-1``) ``doc``.
+
+    Sizes come from ``size_bytes``; documents whose content type is not
+    ``text/*`` also count as binary.
+    """
+
+    if not doc:
+        return Counter()
+    size = int(doc.get("size_bytes") or 0)
+    content_type = str(doc.get("content_type") or "").lower()
+    binary = bool(content_type) and not content_type.startswith("text/")
+    return Counter(
+        {
+            "documents_bytes": sign * size,
+            "document_count": sign,
+            "binary_bytes": sign * size if binary else 0,
+        }
+    )
+
+
+def add_context_usage(deltas: dict[str, Counter], record: Mapping[str, Any], *, new_record: bool = True) -> None:
+    """Account for a stored chat ``record`` (a message or a pushed entry).
+
+    ``new_record`` is false when the entry went into an existing session
+    document, which adds bytes but no record.
+    """
+
+    try:
+        size = len(bson.encode(dict(record)))
+    except Exception:  # noqa: BLE001 - types the driver converts on write
+        size = len(repr(record))
+    add_usage(deltas, project_key(record), {"context_bytes": size, "context_count": int(new_record)})
+
+
+def add_usage(deltas: dict[str, Counter], project: str, usage: Mapping[str, int]) -> None:
+    """Accumulate ``usage`` for ``project`` into ``deltas``."""
+
+    deltas.setdefault(project, Counter()).update(usage)
+
+
+def increment_requests(deltas: Mapping[str, Mapping[str, int]]) -> list[UpdateOne]:
+    """``$inc`` upserts applying ``deltas`` (zero counters are skipped)."""
+
+    requests = []
+    for project, usage in deltas.items():
+        inc = {field: int(value) for field, value in usage.items() if field in COUNTER_FIELDS and value}
+        if inc:
+            requests.append(UpdateOne({"_id": project}, {"$inc": inc}, upsert=True))
+    return requests
+
+
+def increment_sync(db, deltas: Mapping[str, Mapping[str, int]], *, collection: str = STORAGE_COLLECTION) -> None:
+    """Apply ``deltas`` with pymongo (crawler and worker); best effort."""
+
+    requests = increment_requests(deltas)
+    if not requests:
+        return
+    try:
+        db[collection].bulk_write(requests, ordered=False)
+    except Exception as exc:  # noqa: BLE001 - corrected by the reconciliation
+        logger.warning("storage_counters_update_failed", projects=len(requests), error=str(exc))
+
+
+async def redis_project_usage(redis: Any | None = None) -> dict[str, dict[str, float | int]]:
+    """Memory used by crawler progress keys in Redis, per project.
+
+    Raises when the scan fails rather than returning partial usage.
+    """
+
+    redis = redis if redis is not None else _get_redis()
+    usage: dict[str, dict[str, float | int]] = {}
+    try:
+        async for key in redis.scan_iter(match="crawler:progress:*"):
+            project = DEFAULT_PROJECT
+            try:
+                project_value = await redis.hget(key, "project")
+                if project_value:
+                    decoded = project_value.decode().strip().lower()
+                    if decoded:
+                        project = decoded
+            except Exception:  # noqa: BLE001
+                pass
+            try:
+                size = await redis.memory_usage(key)
+            except Exception:  # noqa: BLE001
+                size = None
+            entry = usage.setdefault(project, {"redis_bytes": 0.0, "redis_keys": 0})
+            entry["redis_keys"] += 1
+            entry["redis_bytes"] += float(size or 0)
+    except Exception as exc:
+        logger.error("redis_usage_failed", error=str(exc))
+        raise
+    return usage
+
+
+class StorageReconciler:
+    """Periodically recompute the storage counters from scratch."""
+
+    def __init__(
+        self,
+        mongo: Any,
+        *,
+        interval: float = STORAGE_RECONCILE_INTERVAL,
+        documents_collection: str | None = None,
+        contexts_collection: str | None = None,
+    ) -> None:
+        self.mongo = mongo
+        self.interval = interval
+        self.documents_collection = documents_collection or getattr(mongo, "documents_collection", "documents")
+        self.contexts_collection = contexts_collection or getattr(mongo, "contexts_collection", "contexts")
+        self._task: asyncio.Task | None = None
+
+    async def reconcile(self) -> int:
+        """Overwrite the counters with fresh totals; returns the project count.
+
+        Any failed scan aborts the run and leaves the counters untouched:
+        projects missing from a partial result would otherwise be deleted.
+        """
+
+        usage = await self.mongo.aggregate_project_storage(self.documents_collection, self.contexts_collection)
+        redis_usage = await redis_project_usage()
+        projects = await self.mongo.replace_project_storage(usage, redis_usage)
+        logger.info("storage_counters_reconciled", projects=projects)
+        return projects
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("storage_reconcile_failed", error=str(exc))
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> asyncio.Task:
+        """Start the periodic task (idempotent); the first run is immediate."""
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def storage_reconciler_from_env(
+    mongo: Any,
+    *,
+    documents_collection: str | None = None,
+    contexts_collection: str | None = None,
+) -> StorageReconciler | None:
+    """Return a :class:`StorageReconciler` unless ``STORAGE_RECONCILE_INTERVAL<=0``."""
+
+    if STORAGE_RECONCILE_INTERVAL <= 0:
+        return None
+    return StorageReconciler(
+        mongo,
+        documents_collection=documents_collection,
+        contexts_collection=contexts_collection,
+    )
+
+
+__all__ = [
+    "COUNTER_FIELDS",
+    "DEFAULT_PROJECT",
+    "StorageReconciler",
+    "add_context_usage",
+    "add_usage",
+    "document_usage",
+    "increment_requests",
+    "increment_sync",
+    "project_key",
+    "redis_project_usage",
+    "storage_reconciler_from_env",
+]
@@ -1,9 +1,17 @@
-"""Utilities for parsing documents and storing vectors in Redis."""
+"""Utilities for parsing documents and storing vectors in Redis.
+
+Documents are split into passages (:mod:`packages.knowledge.chunking`) and
+every passage is embedded under its own id, so search hits point at the
+relevant part of a long document.
+"""
 
 import os
 import tempfile
+from collections import OrderedDict
 from pathlib import Path
 
+import numpy as np
+from langchain_core.documents import Document as LCDocument
 from langchain_core.embeddings import Embeddings
 from langchain_redis import RedisVectorStore, RedisConfig
 from redis.exceptions import ResponseError
@@ -11,8 +19,46 @@ from langchain_community.document_loaders import Docx2txtLoader, PyPDFLoader, Te
 
 from redis import Redis
 
+from packages.knowledge.chunking import Passage, split_passages
 from packages.knowledge.text import extract_doc_text, extract_xls_text, extract_xlsx_text
 
+EMBEDDING_CACHE_SIZE = int(os.getenv("KNOWLEDGE_EMBEDDING_CACHE_SIZE", "4096"))
+
+
+class CachedEmbeddings(Embeddings):
+    """Reuse embeddings of identical passages (headers, footers, menus).
+
+    Crawled pages repeat a lot of boilerplate; keyed by text, such passages
+    are embedded once per worker run.
+    """
+
+    def __init__(self, embeddings: Embeddings, maxsize: int = EMBEDDING_CACHE_SIZE) -> None:
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self._cache: OrderedDict[str, list[float]] = OrderedDict()
+        self.hits = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        missing = list(dict.fromkeys(text for text in texts if text not in self._cache))
+        computed = dict(zip(missing, self.embeddings.embed_documents(missing))) if missing else {}
+        self.hits += len(texts) - len(missing)
+        vectors = []
+        for text in texts:
+            vector = computed.get(text)
+            if vector is None:
+                vector = self._cache[text]
+                self._cache.move_to_end(text)
+            vectors.append(vector)
+        if self.maxsize > 0:
+            for text, vector in computed.items():
+                self._cache[text] = vector
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
 
 class DocumentsParser:
     """Parse documents and store embeddings in a Redis vector store."""
@@ -26,15 +72,20 @@ class DocumentsParser:
         redis_password: str | None = None,
         redis_secure: bool = False,
         redis_url: str | None = None,
+        local_index=None,
     ):
-        """Create a vector store in Redis and ensure index exists."""
+        """Create a vector store in Redis and ensure index exists.
+
+        ``local_index`` optionally mirrors every parsed document into a
+        :class:`packages.retrieval.local_index.LocalVectorIndex`.
+        """
         if redis_url:
             url = redis_url
         else:
             redis_host = redis_host or "localhost"
             redis_port = int(redis_port or 6379)
             url = f"redis{'s' if redis_secure else ''}://{':' + redis_password + '@' if redis_password else ''}{redis_host}:{redis_port}/{redis_db}"
-        self.embeddings = embeddings
+        self.embeddings = CachedEmbeddings(embeddings)
 
         if redis_url:
             client = Redis.from_url(redis_url)
@@ -55,10 +106,79 @@ class DocumentsParser:
 
         config = RedisConfig(index_name=index_name, redis_url=url, from_existing=exists)
 
-        self.redis_store = RedisVectorStore(embeddings, config)
+        self.redis_store = RedisVectorStore(self.embeddings, config)
+        self.local_index = local_index
+
+    def _store(
+        self,
+        documents,
+        document_id: str,
+        project: str | None,
+        name: str | None = None,
+        url: str | None = None,
+    ) -> list[Passage]:
+        text = "\n".join(doc.page_content for doc in documents if doc.page_content)
+        passages = split_passages(document_id, text)
+        if not passages:
+            return []
+        self.redis_store.add_documents(
+            [
+                LCDocument(
+                    page_content=passage.text,
+                    metadata={"doc_id": document_id, "chunk": passage.index},
+                )
+                for passage in passages
+            ],
+            ids=[passage.id for passage in passages],
+        )
+        if self.local_index is None:
+            return passages
+        # Embed each distinct passage once.
+        rows: dict[str, int] = {}
+        unique: list[str] = []
+        for passage in passages:
+            if passage.hash not in rows:
+                rows[passage.hash] = len(unique)
+                unique.append(passage.text)
+        vectors = np.atleast_2d(np.asarray(self.local_index.encoder(unique), dtype=np.float32))
+        self.local_index.add(
+            [passage.id for passage in passages],
+            vectors=vectors[[rows[passage.hash] for passage in passages]],
+            payloads=[
+                {
+                    "text": passage.text,
+                    "project": project,
+                    "doc_id": document_id,
+                    "name": name,
+                    "url": url,
+                    "offset": passage.offset,
+                }
+                for passage in passages
+            ],
+            project=project,
+        )
+        return passages
 
-    def parse_document(self, name: str, document_id: str, data: bytes):
-        """Load ``data`` into Redis vector store under ``document_id``.
+    def delete_vectors(self, ids, *, project: str | None = None) -> None:
+        """Remove vectors ``ids`` (e.g. passages of a shrunken document)."""
+
+        ids = [str(item) for item in ids]
+        if not ids:
+            return
+        self.redis_store.delete(ids)
+        if self.local_index is not None:
+            self.local_index.delete(ids, project=project)
+
+    def parse_document(
+        self,
+        name: str,
+        document_id: str,
+        data: bytes,
+        *,
+        project: str | None = None,
+        url: str | None = None,
+    ) -> list[Passage]:
+        """Embed the passages of ``data`` under ``"{document_id}#{n}"`` ids.
 
         Parameters
         ----------
@@ -68,6 +188,15 @@ class DocumentsParser:
             Unique identifier to store the vectors under.
         data:
             Raw file contents to embed.
+        project:
+            Project partition used by the optional local index.
+        url:
+            Source URL stored in the local index payloads.
+
+        Returns
+        -------
+        list[Passage]
+            The stored passages, for the chunk collection.
         """
         _, file_extension = os.path.splitext(name)
         file_extension = file_extension.lower()
@@ -93,10 +222,9 @@ class DocumentsParser:
                     try:
                         parser = TextLoader(tmp_txt_path)
                         document = parser.load()
-                        self.redis_store.add_documents(document, ids=[document_id])
+                        return self._store(document, document_id, project, name, url)
                     finally:
                         tmp_txt_path.unlink(missing_ok=True)
-                    return
                 case ".pdf":
                     parser = PyPDFLoader(file_path=str(saved_file), mode="single")
                 case ".xlsx" | ".xlsm" | ".xltx" | ".xltm" | ".xlsb":
@@ -109,10 +237,9 @@ class DocumentsParser:
                     try:
                         parser = TextLoader(tmp_txt_path)
                         document = parser.load()
-                        self.redis_store.add_documents(document, ids=[document_id])
+                        return self._store(document, document_id, project, name, url)
                     finally:
                         tmp_txt_path.unlink(missing_ok=True)
-                    return
                 case ".xls" | ".xlt" | ".xlm" | ".xla" | ".xlw":
                     text = extract_xls_text(saved_file.read_bytes())
                     if not text.strip():
@@ -123,14 +250,13 @@ class DocumentsParser:
                     try:
                         parser = TextLoader(tmp_txt_path)
                         document = parser.load()
-                        self.redis_store.add_documents(document, ids=[document_id])
+                        return self._store(document, document_id, project, name, url)
                     finally:
                         tmp_txt_path.unlink(missing_ok=True)
-                    return
                 case _:
                     raise ValueError("Unsupported file extension")
 
             document = parser.load()
-            self.redis_store.add_documents(document, ids=[document_id])
+            return self._store(document, document_id, project, name, url)
         finally:
             saved_file.unlink(missing_ok=True)
@@ -11,10 +11,12 @@ from langchain_core.runnables.config import ensure_config
 from langchain_core.messages.utils import convert_to_messages
 import structlog
 from packages.backend.cache import cache_response
+from packages.backend.codec import register_type
 
 logger = structlog.get_logger(__name__)
 
 YaGPTResponse = namedtuple("YaGPTResponse", ["speaker", "text"])
+register_type(YaGPTResponse, "YaGPTResponse")
 
 
 class YaLLM:
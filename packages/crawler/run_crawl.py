@@ -21,6 +21,7 @@ import os
 import re
 import sys
 import time
+from collections import Counter
 import urllib.parse as urlparse
 from typing import Any, AsyncIterator, Callable, Iterable, List, Optional, Set, Tuple
 
@@ -45,7 +46,14 @@ from packages.knowledge.summary import (
     generate_reading_segment_summary,
 )
 from packages.knowledge.text import extract_best_effort_text, extract_doc_text, extract_docx_text
+from packages.core.blobs import document_blob_id, payload_sha256, put_blob_sync, release_blob_sync
 from packages.core.models import Project
+from packages.core.storage_usage import (
+    add_usage,
+    document_usage,
+    increment_sync as increment_storage_sync,
+    project_key as storage_project_key,
+)
 
 from packages.utils.observability.logging import configure_logging
 from packages.core.settings import MongoSettings
@@ -1442,6 +1450,45 @@ def _filename_from_url(url: str, suffix: str = ".txt") -> str:
     return base
 
 
+def _store_blob(
+    db,
+    gridfs: GridFS,
+    documents_collection,
+    key: dict[str, Any],
+    payload: bytes,
+    *,
+    filename: str,
+    content_type: str | None,
+) -> tuple[str, dict[str, str], dict[str, Any], str | None]:
+    """Store ``payload`` for the document matching ``key``.
+
+    Returns the document ``fileId`` (kept across recrawls), the blob fields
+    to ``$set``, the previous document (empty for new ones) and the blob it
+    referenced when the content changed. Unchanged content costs a single
+    lookup. The caller releases that previous blob once the document points
+    to the new one (see :func:`_release_blobs`).
+    """
+
+    existing = documents_collection.find_one(
+        key, {"fileId": 1, "blobId": 1, "sha256": 1, "size_bytes": 1, "content_type": 1}
+    ) or {}
+    file_id = existing.get("fileId") or str(ObjectId())
+    if existing.get("blobId") and existing.get("sha256") == payload_sha256(payload):
+        return file_id, {"blobId": existing["blobId"], "sha256": existing["sha256"]}, existing, None
+    blob_id, digest = put_blob_sync(db, gridfs, payload, filename=filename, content_type=content_type)
+    return file_id, {"blobId": blob_id, "sha256": digest}, existing, document_blob_id(existing)
+
+
+def _release_blobs(db, gridfs: GridFS, blob_ids: list[str]) -> None:
+    """Release blobs replaced by documents that were written successfully."""
+
+    for blob_id in blob_ids:
+        try:
+            release_blob_sync(db, gridfs, blob_id)
+        except Exception:
+            logger.warning("gridfs_delete_failed", file_id=blob_id)
+
+
 async def crawl(
     start_url: str,
     *,
@@ -1941,6 +1988,10 @@ def run(
             logger.warning("project_upsert_failed", project=document_project)
 
         operations: list[UpdateOne] = []
+        # Storage counter deltas of the documents in ``operations``.
+        storage_deltas: dict[str, Counter] = {}
+        # Blobs replaced by ``operations``, released once they are written.
+        replaced_blobs: list[str] = []
         project_model: Project | None = None
         try:
             project_doc = db[os.getenv("MONGO_PROJECTS", "projects")].find_one(
@@ -2128,17 +2179,11 @@ def run(
                         description = text.replace("\n", " ").strip()[:200]
 
                     if store_document:
-                        existing = documents_collection.find_one(
+                        file_id, blob_fields, previous_doc, replaced_blob = _store_blob(
+                            db,
+                            gridfs,
+                            documents_collection,
                             {"url": page_url, "project": document_project},
-                            {"fileId": 1},
-                        )
-                        if existing and existing.get("fileId"):
-                            try:
-                                gridfs.delete(ObjectId(existing["fileId"]))
-                            except Exception:
-                                logger.warning("gridfs_delete_failed", file_id=existing["fileId"])
-
-                        file_id = gridfs.put(
                             payload_bytes,
                             filename=filename,
                             content_type=storage_type,
@@ -2147,7 +2192,8 @@ def run(
                         doc: dict[str, object] = {
                             "name": filename,
                             "description": description,
-                            "fileId": str(file_id),
+                            "fileId": file_id,
+                            **blob_fields,
                             "url": page_url,
                             "ts": time.time(),
                             "content_type": storage_type,
@@ -2176,13 +2222,17 @@ def run(
                                 upsert=True,
                             )
                         )
+                        add_usage(storage_deltas, storage_project_key(doc), document_usage(doc))
+                        add_usage(storage_deltas, storage_project_key(doc), document_usage(previous_doc, -1))
+                        if replaced_blob:
+                            replaced_blobs.append(replaced_blob)
 
                         if reading_payload and reading_payload.get("text"):
                             reading_records.append(
                                 {
                                     "url": page_url,
                                     "project": document_project,
-                                    "file_id": str(file_id),
+                                    "file_id": file_id,
                                     "title": reading_payload.get("title"),
                                     "text": reading_payload.get("text"),
                                     "html": reading_payload.get("html"),
@@ -2224,7 +2274,11 @@ def run(
                             project_model,
                         )
                         try:
-                            image_file_id = gridfs.put(
+                            image_file_id, image_blob_fields, previous_image, replaced_image = _store_blob(
+                                db,
+                                gridfs,
+                                documents_collection,
+                                {"url": image_url, "project": document_project},
                                 compressed,
                                 filename=image_filename,
                                 content_type=final_type,
@@ -2235,7 +2289,8 @@ def run(
                         image_doc = {
                             "name": image_filename,
                             "description": image_description,
-                            "fileId": str(image_file_id),
+                            "fileId": image_file_id,
+                            **image_blob_fields,
                             "url": image_url,
                             "ts": time.time(),
                             "content_type": final_type,
@@ -2245,7 +2300,7 @@ def run(
                         }
                         if original_type:
                             image_doc["source_content_type"] = original_type
-                        image_file_map[image_url] = str(image_file_id)
+                        image_file_map[image_url] = image_file_id
                         operations.append(
                             UpdateOne(
                                 {"url": image_url, "project": document_project},
@@ -2253,6 +2308,10 @@ def run(
                                 upsert=True,
                             )
                         )
+                        add_usage(storage_deltas, storage_project_key(image_doc), document_usage(image_doc))
+                        add_usage(storage_deltas, storage_project_key(image_doc), document_usage(previous_image, -1))
+                        if replaced_image:
+                            replaced_blobs.append(replaced_image)
 
                     if progress_callback:
                         progress_callback(page_url, get_crawler_counters(document_project))
@@ -2260,10 +2319,14 @@ def run(
                     if len(operations) >= BATCH_SIZE:
                         try:
                             documents_collection.bulk_write(operations, ordered=False)
+                            _release_blobs(db, gridfs, replaced_blobs)
+                            increment_storage_sync(db, storage_deltas)
                         except Exception as exc:  # pragma: no cover - bulk failure
                             logger.warning("bulk_write_failed", error=str(exc))
                         finally:
                             operations.clear()
+                            storage_deltas.clear()
+                            replaced_blobs.clear()
             finally:
                 if JS_RENDER_ENABLED:
                     await _shutdown_playwright()
@@ -2397,10 +2460,14 @@ def run(
         if operations:
             try:
                 documents_collection.bulk_write(operations, ordered=False)
+                _release_blobs(db, gridfs, replaced_blobs)
+                increment_storage_sync(db, storage_deltas)
             except Exception as exc:  # pragma: no cover - bulk failure
                 logger.warning("bulk_write_failed", error=str(exc))
             finally:
                 operations.clear()
+                storage_deltas.clear()
+                replaced_blobs.clear()
 
         if abort_note:
             logger.warning("crawler aborted", reason=abort_note)
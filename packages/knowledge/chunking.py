@@ -0,0 +1,124 @@
+"""Split document text into overlapping passages for retrieval.
+
+Every passage is embedded and indexed on its own (vector id
+``"{doc_id}#{index}"``) and recorded in the chunk collection, so retrieval
+returns the relevant part of a long document instead of its first page.
+Passages prefer paragraph, then sentence, then word boundaries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+
+CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "150"))
+CHUNK_MIN_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_MIN_CHARS", "40"))
+
+_BOUNDARIES = (
+    re.compile(r"\n\s*\n"),
+    re.compile(r"(?<=[.!?…])\s+"),
+    re.compile(r"\s+"),
+)
+
+
+@dataclass(frozen=True)
+class Passage:
+    """A slice of a document stored and searched on its own."""
+
+    id: str
+    doc_id: str
+    index: int
+    offset: int
+    text: str
+    hash: str
+
+    def to_record(self, **extra: object) -> dict[str, object]:
+        """Return the chunk-collection document for this passage."""
+
+        return {
+            "_id": self.id,
+            "docId": self.doc_id,
+            "index": self.index,
+            "offset": self.offset,
+            "text": self.text,
+            "hash": self.hash,
+            **extra,
+        }
+
+
+def chunk_id(doc_id: str, index: int) -> str:
+    return f"{doc_id}#{index}"
+
+
+def text_hash(text: str) -> str:
+    """Content hash used to reuse embeddings of repeated passages."""
+
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _cut(text: str, start: int, size: int) -> int:
+    """Return the end of a passage starting at ``start`` (at most ``size``)."""
+
+    limit = start + size
+    if limit >= len(text):
+        return len(text)
+    window = text[start:limit]
+    for pattern in _BOUNDARIES:
+        ends = [match.end() for match in pattern.finditer(window)]
+        # Do not shrink a passage below half its size for a nicer boundary.
+        ends = [end for end in ends if end >= size // 2]
+        if ends:
+            return start + ends[-1]
+    return limit
+
+
+def split_passages(
+    doc_id: str,
+    text: str,
+    *,
+    size: int = CHUNK_CHARS,
+    overlap: int = CHUNK_OVERLAP,
+    min_chars: int = CHUNK_MIN_CHARS,
+) -> list[Passage]:
+    """Return the passages of ``text``.
+
+    ``size <= 0`` disables chunking: the whole text becomes one passage whose
+    id is ``doc_id`` itself, which is how documents were indexed before.
+    """
+
+    if not text or not text.strip():
+        return []
+    if size <= 0:
+        return [Passage(doc_id, doc_id, 0, 0, text, text_hash(text))]
+    overlap = max(0, min(overlap, size // 2))
+
+    passages: list[Passage] = []
+    start = 0
+    while start < len(text):
+        end = _cut(text, start, size)
+        piece = text[start:end]
+        stripped = piece.strip()
+        if stripped and len(stripped) < min_chars and passages:
+            # Fold a short tail into the previous passage instead of dropping it.
+            last = passages.pop()
+            stripped = text[last.offset : end].strip()
+            passages.append(Passage(last.id, doc_id, last.index, last.offset, stripped, text_hash(stripped)))
+        elif stripped:
+            offset = start + (len(piece) - len(piece.lstrip()))
+            index = len(passages)
+            passages.append(
+                Passage(chunk_id(doc_id, index), doc_id, index, offset, stripped, text_hash(stripped))
+            )
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap on a word boundary.
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return passages
+
+
+__all__ = ["Passage", "chunk_id", "split_passages", "text_hash"]
@@ -7,11 +7,11 @@ import time
 from typing import Any
 
 import structlog
-from bson import ObjectId
 from gridfs import GridFS
 from pymongo import MongoClient
 
 from apps.worker.main import celery, get_mongo_client, settings as worker_settings
+from packages.core.blobs import document_blob_id, read_blob_sync
 from packages.core.models import Project
 from packages.knowledge.summary import generate_document_summary
 from packages.knowledge.text import extract_best_effort_text
@@ -100,7 +100,7 @@ def generate_auto_description(self, file_id: str, project: str | None = None) ->
         gridfs = GridFS(db)
         _update_status(collection, file_id, "auto_description_in_progress", "Формируем описание")
         try:
-            payload = gridfs.get(ObjectId(file_id)).read()
+            payload = read_blob_sync(gridfs, document_blob_id(doc))
         except Exception as exc:  # noqa: BLE001
             logger.error("auto_description_gridfs_failed", file_id=file_id, error=str(exc))
             _update_status(collection, file_id, "auto_description_failed", "Не удалось прочитать файл")
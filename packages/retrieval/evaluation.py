@@ -0,0 +1,319 @@
+"""Offline retrieval quality/latency evaluation.
+
+Used by ``scripts/benchmark_retrieval.py``. A labeled dataset is a corpus of
+``{"id", "text"}`` records plus queries with the ids that should be
+retrieved. It can be generated synthetically, loaded from JSONL or built from
+a project's Mongo QA pairs (question -> answer document). Every
+:class:`RetrievalConfig` is run against a :class:`LocalVectorIndex`, so no
+Qdrant/Redis/LLM services are needed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Sequence
+
+import numpy as np
+import structlog
+
+from . import fusion, search
+
+logger = structlog.get_logger(__name__)
+
+SnippetStage = Callable[[str, str | None, int], Awaitable[list[dict[str, Any]]]]
+
+
+@dataclass
+class LabeledQuery:
+    """Question and the ids of documents that answer it."""
+
+    question: str
+    relevant: set[str]
+    project: str | None = None
+
+
+@dataclass
+class Dataset:
+    corpus: list[dict[str, Any]]
+    queries: list[LabeledQuery]
+
+
+@dataclass
+class RetrievalConfig:
+    """One point of the benchmark grid."""
+
+    name: str
+    fusion: fusion.FusionConfig = field(default_factory=fusion.FusionConfig)
+    k: int = 10
+    rerank: bool = False
+
+
+def recall_at_k(ranked: Sequence[str], relevant: set[str], k: int) -> float:
+    """Share of ``relevant`` ids found in the first ``k`` of ``ranked``."""
+    if not relevant:
+        return 0.0
+    return len(relevant.intersection(ranked[:k])) / len(relevant)
+
+
+def reciprocal_rank(ranked: Sequence[str], relevant: set[str]) -> float:
+    """``1 / rank`` of the first relevant id, ``0`` when none is present."""
+    for rank, doc_id in enumerate(ranked, 1):
+        if doc_id in relevant:
+            return 1.0 / rank
+    return 0.0
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def synthetic_dataset(
+    docs: int = 500,
+    queries: int = 200,
+    *,
+    topics: int = 25,
+    seed: int = 0,
+    project: str | None = "bench",
+) -> Dataset:
+    """Return a deterministic corpus whose queries are noisy word samples.
+
+    Documents share topic vocabulary, so lexical and dense legs both have to
+    discriminate between near neighbours.
+    """
+    rng = random.Random(seed)
+    syllables = ["ка", "ро", "ми", "ту", "ле", "на", "во", "ст", "пр", "ди", "за", "шо"]
+
+    def word() -> str:
+        return "".join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+
+    vocab = [[word() for _ in range(60)] for _ in range(topics)]
+    common = [word() for _ in range(200)]
+    corpus: list[dict[str, Any]] = []
+    for idx in range(docs):
+        topic = vocab[idx % topics]
+        words = rng.sample(topic, 25) + rng.sample(common, 15)
+        rng.shuffle(words)
+        corpus.append({"id": f"doc-{idx}", "text": " ".join(words), "project": project})
+
+    labeled: list[LabeledQuery] = []
+    for _ in range(queries):
+        doc = rng.choice(corpus)
+        terms = rng.sample(doc["text"].split(), 4) + [rng.choice(common)]
+        labeled.append(LabeledQuery(" ".join(terms), {doc["id"]}, project))
+    return Dataset(corpus, labeled)
+
+
+def load_dataset(path: str | Path) -> Dataset:
+    """Load a JSONL dataset.
+
+    Lines with ``"type": "doc"`` carry ``id``/``text``/``project``; lines
+    with ``"type": "query"`` carry ``question``, ``relevant`` (list of ids)
+    and optional ``project``.
+    """
+    corpus: list[dict[str, Any]] = []
+    queries: list[LabeledQuery] = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "query":
+                queries.append(
+                    LabeledQuery(
+                        record["question"],
+                        {str(item) for item in record.get("relevant") or []},
+                        record.get("project"),
+                    )
+                )
+            else:
+                corpus.append(
+                    {"id": str(record["id"]), "text": record["text"], "project": record.get("project")}
+                )
+    return Dataset(corpus, queries)
+
+
+def dump_dataset(dataset: Dataset, path: str | Path) -> None:
+    """Write ``dataset`` in the format read by :func:`load_dataset`."""
+    with open(path, "w", encoding="utf-8") as fh:
+        for doc in dataset.corpus:
+            fh.write(json.dumps({"type": "doc", **doc}, ensure_ascii=False) + "\n")
+        for query in dataset.queries:
+            record = {
+                "type": "query",
+                "question": query.question,
+                "relevant": sorted(query.relevant),
+                "project": query.project,
+            }
+            fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+async def qa_dataset(mongo, project: str, *, limit: int = 1000) -> Dataset:
+    """Build a dataset from ``project`` QA pairs: answers become documents."""
+    pairs = await mongo.list_qa_pairs(project, limit=limit)
+    corpus: list[dict[str, Any]] = []
+    queries: list[LabeledQuery] = []
+    for pair in pairs:
+        question = str(pair.get("question") or "").strip()
+        answer = str(pair.get("answer") or "").strip()
+        if not question or not answer:
+            continue
+        doc_id = f"qa::{pair.get('id')}"
+        corpus.append({"id": doc_id, "text": answer, "project": project})
+        queries.append(LabeledQuery(question, {doc_id}, project))
+    return Dataset(corpus, queries)
+
+
+def build_index(dataset: Dataset, path: str | Path, **kwargs: Any):
+    """Index ``dataset.corpus`` into a fresh :class:`LocalVectorIndex`."""
+    from .local_index import LocalVectorIndex
+
+    index = LocalVectorIndex(path, **kwargs)
+    by_project: dict[str | None, list[dict[str, Any]]] = {}
+    for doc in dataset.corpus:
+        by_project.setdefault(doc.get("project"), []).append(doc)
+    for project, docs in by_project.items():
+        for offset in range(0, len(docs), 500):
+            batch = docs[offset : offset + 500]
+            index.add(
+                [doc["id"] for doc in batch],
+                texts=[doc["text"] for doc in batch],
+                project=project,
+            )
+    return index
+
+
+def default_configs(k: int = 10) -> list[RetrievalConfig]:
+    """Return the benchmark grid: fusion method x leg weights x depth."""
+    configs: list[RetrievalConfig] = []
+    weights = {
+        "dense": {"dense": 1.0, "bm25": 0.0},
+        "bm25": {"dense": 0.0, "bm25": 1.0},
+        "balanced": {"dense": 1.0, "bm25": 1.0},
+    }
+    for method in fusion.FUSION_METHODS:
+        for label, leg_weights in weights.items():
+            for depth in (20, 50):
+                configs.append(
+                    RetrievalConfig(
+                        name=f"{method}-{label}-d{depth}",
+                        fusion=fusion.FusionConfig(
+                            method=method,
+                            weights=leg_weights,
+                            min_depth=depth,
+                            max_depth=depth * 2,
+                        ),
+                        k=k,
+                    )
+                )
+    return configs
+
+
+class _StageTimer:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = {}
+
+    def add(self, stage: str, start: float) -> None:
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {
+            stage: {
+                "p50_ms": round(_percentile(values, 50), 3),
+                "p95_ms": round(_percentile(values, 95), 3),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+async def evaluate(
+    index,
+    queries: Iterable[LabeledQuery],
+    config: RetrievalConfig,
+    *,
+    snippets: SnippetStage | None = None,
+) -> dict[str, Any]:
+    """Run ``queries`` through ``config`` and return quality/latency metrics.
+
+    Stages timed: ``dense`` and ``bm25`` legs, ``fusion`` over their output,
+    end-to-end ``hybrid`` search, ``rerank`` (when enabled) and the optional
+    ``snippets`` callable (``_collect_knowledge_snippets``).
+    """
+    rerank_fn = None
+    if config.rerank:
+        from .rerank import rerank as rerank_fn
+
+    previous = search.qdrant, search.local_index
+    search.qdrant, search.local_index = None, index
+    timer = _StageTimer()
+    recalls: list[float] = []
+    rranks: list[float] = []
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    try:
+        for query in queries:
+            depth = config.fusion.min_depth
+            start = time.perf_counter()
+            dense = index.similarity(query.question, top=depth, method="dense", project=query.project)
+            timer.add("dense", start)
+            start = time.perf_counter()
+            bm25 = index.similarity(query.question, top=depth, method="bm25", project=query.project)
+            timer.add("bm25", start)
+            start = time.perf_counter()
+            fusion.fuse_scores({"dense": dense, "bm25": bm25}, config.k, config.fusion)
+            timer.add("fusion", start)
+
+            fetch = config.k * 3 if rerank_fn else config.k
+            start = time.perf_counter()
+            docs = await search.hybrid_search(
+                query.question, fetch, project=query.project, config=config.fusion
+            )
+            timer.add("hybrid", start)
+            if rerank_fn is not None:
+                start = time.perf_counter()
+                docs = await asyncio.to_thread(rerank_fn, query.question, docs, config.k)
+                timer.add("rerank", start)
+            if snippets is not None:
+                start = time.perf_counter()
+                await snippets(query.question, query.project, config.k)
+                timer.add("snippets", start)
+
+            ranked = [str(doc.id) for doc in docs]
+            recalls.append(recall_at_k(ranked, query.relevant, config.k))
+            rranks.append(reciprocal_rank(ranked, query.relevant))
+    finally:
+        search.qdrant, search.local_index = previous
+
+    result: dict[str, Any] = {
+        "config": config.name,
+        "k": config.k,
+        "queries": len(recalls),
+        "recall_at_k": round(float(np.mean(recalls)) if recalls else 0.0, 4),
+        "mrr": round(float(np.mean(rranks)) if rranks else 0.0, 4),
+        "stages": timer.summary(),
+    }
+    if tracing:
+        result["peak_mem_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    return result
+
+
+__all__ = [
+    "Dataset",
+    "LabeledQuery",
+    "RetrievalConfig",
+    "build_index",
+    "default_configs",
+    "dump_dataset",
+    "evaluate",
+    "load_dataset",
+    "qa_dataset",
+    "recall_at_k",
+    "reciprocal_rank",
+    "synthetic_dataset",
+]
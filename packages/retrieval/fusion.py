@@ -0,0 +1,269 @@
+"""Pluggable rank/score fusion for hybrid retrieval.
+
+Candidates from each retrieval leg (``dense``, ``bm25``, ...) are aligned on a
+shared id axis and fused with NumPy. Only the final top-``k`` rows are turned
+back into :class:`~packages.retrieval.search.Doc` objects.
+
+Two strategies are available:
+
+``rrf``
+    Weighted reciprocal rank fusion: ``sum(w_leg / (rrf_k + rank_leg))``.
+``score``
+    Min-max normalised raw scores combined with leg weights.
+
+Per-project overrides are read from ``RETRIEVAL_FUSION_PROJECTS`` (JSON
+mapping project -> config fields) or registered at runtime with
+:func:`set_project_config`. ``RETRIEVAL_FUSION`` holds the global default.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, Mapping, Sequence
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+FUSION_METHODS = ("rrf", "score")
+
+
+@dataclass(frozen=True)
+class FusionConfig:
+    """Parameters controlling how retrieval legs are fused."""
+
+    method: str = "rrf"
+    rrf_k: float = 60.0
+    weights: Mapping[str, float] = field(default_factory=lambda: {"dense": 1.0, "bm25": 1.0})
+    # The first round fetches as deep as the single round this replaced, so
+    # the default never costs more than before unless the top-k is unsettled.
+    min_depth: int = 50
+    max_depth: int = 100
+    # ``score`` fusion: relative gap between the k-th and (k+1)-th fused score
+    # below which the legs are fetched again at ``max_depth``. RRF scores of
+    # neighbouring ranks always differ by ~1/(rrf_k + r), so ``rrf`` instead
+    # checks whether deeper hits could still overtake the k-th item.
+    gap_threshold: float = 0.05
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, Any], base: "FusionConfig | None" = None) -> "FusionConfig":
+        """Return a config built from ``data`` on top of ``base``."""
+
+        base = base or cls()
+        known = {f.name for f in fields(cls)}
+        updates: dict[str, Any] = {}
+        for key, value in data.items():
+            if key not in known:
+                continue
+            if key == "weights" and isinstance(value, Mapping):
+                updates[key] = {str(k): float(v) for k, v in value.items()}
+            elif key == "method":
+                if value not in FUSION_METHODS:
+                    raise ValueError(f"unknown fusion method: {value}")
+                updates[key] = value
+            elif key in {"min_depth", "max_depth"}:
+                updates[key] = max(1, int(value))
+            else:
+                updates[key] = float(value)
+        return replace(base, **updates)
+
+    def weight(self, leg: str) -> float:
+        return float(self.weights.get(leg, 1.0))
+
+
+def _load_json_env(name: str) -> dict[str, Any]:
+    raw = os.getenv(name)
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        logger.warning("fusion_config_invalid", env=name)
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+_DEFAULT_CONFIG = FusionConfig.from_mapping(_load_json_env("RETRIEVAL_FUSION"))
+_PROJECT_CONFIGS: dict[str, FusionConfig] = {
+    str(project).strip().lower(): FusionConfig.from_mapping(cfg, _DEFAULT_CONFIG)
+    for project, cfg in _load_json_env("RETRIEVAL_FUSION_PROJECTS").items()
+    if isinstance(cfg, Mapping)
+}
+
+
+def get_config(project: str | None = None) -> FusionConfig:
+    """Return the fusion config for ``project`` or the global default."""
+
+    if project:
+        config = _PROJECT_CONFIGS.get(project.strip().lower())
+        if config is not None:
+            return config
+    return _DEFAULT_CONFIG
+
+
+def set_project_config(project: str, config: FusionConfig | Mapping[str, Any] | None) -> None:
+    """Register (or clear with ``None``) a per-project fusion override."""
+
+    key = project.strip().lower()
+    if config is None:
+        _PROJECT_CONFIGS.pop(key, None)
+        return
+    if not isinstance(config, FusionConfig):
+        config = FusionConfig.from_mapping(config, _DEFAULT_CONFIG)
+    _PROJECT_CONFIGS[key] = config
+
+
+@dataclass
+class FusionResult:
+    """Top-``k`` fused candidates plus diagnostics for tuning."""
+
+    ids: list[str]
+    scores: np.ndarray
+    payloads: list[Any]
+    candidates: int
+    gap: float
+    stats: dict[str, float]
+    # ``True`` when deeper legs cannot change the top-``k`` (see ``fuse_scores``).
+    settled: bool = True
+
+
+def _align(legs: Mapping[str, Sequence[Any]]) -> tuple[list[str], list[Any], dict[str, tuple[np.ndarray, np.ndarray]]]:
+    """Map every leg onto a shared id axis in order of first appearance."""
+
+    position: dict[str, int] = {}
+    ids: list[str] = []
+    payloads: list[Any] = []
+    aligned: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    for leg, hits in legs.items():
+        rows = np.empty(len(hits), dtype=np.int64)
+        scores = np.empty(len(hits), dtype=np.float64)
+        for rank, hit in enumerate(hits):
+            doc_id = str(getattr(hit, "id"))
+            idx = position.get(doc_id)
+            if idx is None:
+                idx = position[doc_id] = len(ids)
+                ids.append(doc_id)
+                payloads.append(getattr(hit, "payload", None))
+            elif payloads[idx] is None:
+                payloads[idx] = getattr(hit, "payload", None)
+            rows[rank] = idx
+            scores[rank] = float(getattr(hit, "score", 0.0) or 0.0)
+        aligned[leg] = (rows, scores)
+    return ids, payloads, aligned
+
+
+def _rrf_settled(
+    fused: np.ndarray,
+    picked: np.ndarray,
+    aligned: Mapping[str, tuple[np.ndarray, np.ndarray]],
+    config: FusionConfig,
+    depth: int,
+) -> bool:
+    """Whether no hit beyond ``depth`` can lift a candidate above the k-th score.
+
+    A leg that returned ``depth`` hits may rank any document it did not
+    return at ``depth + 1`` at best, adding ``w / (rrf_k + depth + 1)``.
+    """
+
+    full = {
+        leg: config.weight(leg) / (config.rrf_k + depth + 1)
+        for leg, (rows, _) in aligned.items()
+        if rows.size >= depth
+    }
+    if not full:
+        return True
+    kth = fused[picked[-1]]
+    bound = fused.copy()
+    for leg, headroom in full.items():
+        absent = np.ones(fused.size, dtype=bool)
+        absent[aligned[leg][0]] = False
+        bound[absent] += headroom
+    bound[picked] = -np.inf
+    return max(float(bound.max()), sum(full.values())) <= kth
+
+
+def fuse_scores(
+    legs: Mapping[str, Sequence[Any]],
+    k: int,
+    config: FusionConfig | None = None,
+    *,
+    depth: int | None = None,
+) -> FusionResult:
+    """Fuse ``legs`` (leg name -> ranked hits) and return the top ``k``.
+
+    Hits only need ``id`` and optionally ``payload``/``score`` attributes.
+    Ties are broken by first appearance, so the leg order is significant.
+    ``depth`` is the number of hits requested per leg; with it,
+    :attr:`FusionResult.settled` tells whether fetching deeper could change
+    the result.
+    """
+
+    config = config or _DEFAULT_CONFIG
+    ids, payloads, aligned = _align(legs)
+    fused = np.zeros(len(ids), dtype=np.float64)
+    for leg, (rows, scores) in aligned.items():
+        if rows.size == 0:
+            continue
+        weight = config.weight(leg)
+        if config.method == "rrf":
+            ranks = np.arange(1, rows.size + 1, dtype=np.float64)
+            np.add.at(fused, rows, weight / (config.rrf_k + ranks))
+        else:
+            low, high = scores.min(), scores.max()
+            span = high - low
+            norm = (scores - low) / span if span > 0 else np.ones_like(scores)
+            np.add.at(fused, rows, weight * norm)
+
+    total = fused.size
+    top = min(max(k, 0), total)
+    if top == 0:
+        return FusionResult([], np.empty(0), [], total, 0.0, {})
+    if top < total:
+        partitioned = np.argpartition(-fused, top - 1)[:top]
+        # Keep every row tied with the boundary so the tie-break stays stable.
+        pool = np.flatnonzero(fused >= fused[partitioned].min())
+    else:
+        pool = np.arange(total)
+    picked = pool[np.lexsort((pool, -fused[pool]))][:top]
+
+    kth = fused[picked[-1]]
+    if top < total:
+        rest = np.delete(fused, picked)
+        runner_up = rest.max()
+        gap = float((kth - runner_up) / kth) if kth > 0 else 0.0
+    else:
+        gap = 1.0
+    if depth is None:
+        settled = True
+    elif config.method == "rrf":
+        settled = _rrf_settled(fused, picked, aligned, config, depth)
+    else:
+        settled = gap >= config.gap_threshold
+    stats = {
+        "max": float(fused.max()),
+        "p50": float(np.percentile(fused, 50)),
+        "p90": float(np.percentile(fused, 90)),
+        "kth": float(kth),
+    }
+    return FusionResult(
+        ids=[ids[idx] for idx in picked],
+        scores=fused[picked],
+        payloads=[payloads[idx] for idx in picked],
+        candidates=total,
+        gap=gap,
+        stats=stats,
+        settled=settled,
+    )
+
+
+__all__ = [
+    "FUSION_METHODS",
+    "FusionConfig",
+    "FusionResult",
+    "fuse_scores",
+    "get_config",
+    "set_project_config",
+]
@@ -0,0 +1,652 @@
+"""Built-in approximate nearest-neighbour index used when Qdrant is absent.
+
+The index mirrors the ``similarity(query, top, method)`` interface expected by
+:mod:`packages.retrieval.search`, so it can be assigned to
+``search.local_index`` (or ``search.qdrant``) without touching callers.
+
+Vectors live in memory-mapped ``float32`` files, one directory per project
+partition. Small partitions are searched exactly; once a partition grows past
+``train_threshold`` rows an IVF-flat coarse quantizer (spherical k-means) is
+trained and queries only scan the ``nprobe`` closest inverted lists. A
+lightweight BM25 inverted index over payload text serves ``method="bm25"``.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Iterable, Sequence
+
+import numpy as np
+import structlog
+
+from .search import Doc
+
+logger = structlog.get_logger(__name__)
+
+DEFAULT_PARTITION = "__default__"
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SAFE_NAME_RE = re.compile(r"[^0-9a-zA-Z._-]+")
+
+Encoder = Callable[[Sequence[str]], np.ndarray]
+
+
+def _tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN_RE.findall((text or "").lower()) if len(token) > 1]
+
+
+def _partition_dirname(project: str | None) -> str:
+    name = (project or DEFAULT_PARTITION).strip().lower() or DEFAULT_PARTITION
+    safe = _SAFE_NAME_RE.sub("_", name)
+    if safe != name:
+        safe = f"{safe}-{zlib.crc32(name.encode('utf-8')):08x}"
+    return safe
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[None, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_indices(scores: np.ndarray, top: int) -> np.ndarray:
+    """Return indices of the ``top`` highest ``scores`` in descending order."""
+
+    if scores.size == 0 or top <= 0:
+        return np.empty(0, dtype=np.int64)
+    if top < scores.size:
+        candidates = np.argpartition(-scores, top - 1)[:top]
+    else:
+        candidates = np.arange(scores.size)
+    order = np.argsort(-scores[candidates], kind="stable")
+    return candidates[order]
+
+
+class HashingEncoder:
+    """Deterministic hashed bag-of-ngrams encoder.
+
+    Used when no sentence-transformer model is installed (the default
+    Ollama-only runtime) and in offline benchmarks. ``crc32`` keeps vectors
+    stable across processes so persisted partitions remain searchable.
+    """
+
+    def __init__(self, dim: int = 384) -> None:
+        self.dim = int(dim)
+
+    def _features(self, text: str) -> Iterable[str]:
+        tokens = _tokenize(text)
+        yield from tokens
+        for token in tokens:
+            padded = f"#{token}#"
+            for idx in range(len(padded) - 2):
+                yield padded[idx : idx + 3]
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        if isinstance(texts, str):
+            texts = [texts]
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.dim] += sign
+        return _normalize_rows(matrix)
+
+
+def default_encoder() -> Encoder:
+    """Return the sentence-transformer encoder or a hashing fallback."""
+
+    try:
+        from .embedder import encode as st_encode  # noqa: WPS433 - optional heavy dep
+    except Exception:  # pragma: no cover - depends on optional packages
+        logger.info("local_index_hashing_encoder")
+        return HashingEncoder()
+
+    def _encode(texts: Sequence[str]) -> np.ndarray:
+        return np.atleast_2d(np.asarray(st_encode(list(texts)), dtype=np.float32))
+
+    return _encode
+
+
+class _Partition:
+    """Vectors, payloads and inverted lists for a single project."""
+
+    def __init__(
+        self,
+        path: Path,
+        *,
+        dim: int,
+        nlist: int | None,
+        train_threshold: int,
+    ) -> None:
+        self.path = path
+        self.dim = dim
+        self.nlist_hint = nlist
+        self.train_threshold = train_threshold
+        self.count = 0
+        self.capacity = 0
+        self.ids: list[str | None] = []
+        self.payloads: list[dict | None] = []
+        self.row_of: dict[str, int] = {}
+        self.vectors: np.memmap | None = None
+        self.centroids: np.ndarray | None = None
+        self.assign = np.empty(0, dtype=np.int32)
+        self.lists: list[list[int]] = []
+        self.trained_at = 0
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_len: dict[int, int] = {}
+        self.total_len = 0
+        self.version = 0
+        self.dirty = False
+        self.loaded_state: tuple[int, int, int] | None = None
+        self.vectors_name = "vectors.f32"
+        # Vector files replaced by ``compact``; removed once the state no
+        # longer refers to them.
+        self.retired: list[Path] = []
+        self._load()
+
+    # -- persistence -----------------------------------------------------
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / self.vectors_name
+
+    @property
+    def _state_file(self) -> Path:
+        return self.path / "state.json"
+
+    @property
+    def _centroids_file(self) -> Path:
+        return self.path / "centroids.npy"
+
+    def _map(self, capacity: int) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        size = max(capacity, 1) * self.dim * 4
+        with open(self._vectors_file, "ab") as fh:
+            if fh.tell() < size:
+                fh.truncate(size)
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.vectors = np.memmap(
+            self._vectors_file, dtype=np.float32, mode="r+", shape=(max(capacity, 1), self.dim)
+        )
+        self.capacity = capacity
+
+    def _state_stamp(self) -> tuple[int, int, int] | None:
+        try:
+            stat = self._state_file.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def changed_on_disk(self) -> bool:
+        """``True`` when another process saved the partition since it was read."""
+
+        return not self.dirty and self._state_stamp() != self.loaded_state
+
+    def _load(self) -> None:
+        self.loaded_state = self._state_stamp()
+        if self.loaded_state is None:
+            return
+        state = json.loads(self._state_file.read_text(encoding="utf-8"))
+        self.dim = int(state.get("dim", self.dim))
+        self.count = int(state.get("count", 0))
+        self.version = int(state.get("version", 0))
+        self.trained_at = int(state.get("trained_at", 0))
+        self.vectors_name = state.get("vectors", self.vectors_name)
+        self.ids = list(state.get("ids", []))
+        self.payloads = list(state.get("payloads", []))
+        capacity = max(self.count, int(self._vectors_file.stat().st_size // (self.dim * 4)))
+        self._map(capacity)
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids) if doc_id is not None}
+        if self._centroids_file.exists():
+            self.centroids = np.load(self._centroids_file)
+            self._reassign_all()
+        for row, payload in enumerate(self.payloads):
+            if self.ids[row] is not None:
+                self._index_text(row, payload)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.vectors is not None:
+            self.vectors.flush()
+        state = {
+            "dim": self.dim,
+            "count": self.count,
+            "version": self.version,
+            "trained_at": self.trained_at,
+            "vectors": self.vectors_name,
+            "ids": self.ids,
+            "payloads": self.payloads,
+        }
+        if self.centroids is not None:
+            tmp = self._centroids_file.with_suffix(".tmp")
+            with open(tmp, "wb") as fh:
+                np.save(fh, self.centroids)
+            os.replace(tmp, self._centroids_file)
+        elif self._centroids_file.exists():
+            self._centroids_file.unlink()
+        tmp = self._state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self._state_file)
+        self.loaded_state = self._state_stamp()
+        for path in self.retired:
+            path.unlink(missing_ok=True)
+        self.retired = []
+        self.dirty = False
+
+    # -- lexical postings ------------------------------------------------
+    def _index_text(self, row: int, payload: dict | None) -> None:
+        text = (payload or {}).get("text") or ""
+        tokens = _tokenize(text)
+        if not tokens:
+            return
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[row] = tf
+        self.doc_len[row] = len(tokens)
+        self.total_len += len(tokens)
+
+    def _unindex_text(self, row: int, payload: dict | None) -> None:
+        length = self.doc_len.pop(row, None)
+        if length is None:
+            return
+        self.total_len -= length
+        for term in set(_tokenize((payload or {}).get("text") or "")):
+            bucket = self.postings.get(term)
+            if bucket is None:
+                continue
+            bucket.pop(row, None)
+            if not bucket:
+                del self.postings[term]
+
+    # -- IVF -------------------------------------------------------------
+    @property
+    def alive(self) -> int:
+        return len(self.row_of)
+
+    def _nlist(self) -> int:
+        if self.nlist_hint:
+            return int(self.nlist_hint)
+        return max(8, int(math.sqrt(max(self.alive, 1))))
+
+    def _reassign_all(self) -> None:
+        if self.centroids is None or self.vectors is None:
+            self.assign = np.empty(0, dtype=np.int32)
+            self.lists = []
+            return
+        data = np.asarray(self.vectors[: self.count])
+        self.assign = np.argmax(data @ self.centroids.T, axis=1).astype(np.int32) if self.count else np.empty(0, dtype=np.int32)
+        self.lists = [[] for _ in range(len(self.centroids))]
+        for row, list_id in enumerate(self.assign.tolist()):
+            if self.ids[row] is not None:
+                self.lists[list_id].append(row)
+
+    def maybe_train(self) -> None:
+        alive = self.alive
+        if alive < self.train_threshold:
+            if self.centroids is not None and alive < self.train_threshold // 2:
+                self.centroids = None
+                self._reassign_all()
+            return
+        if self.centroids is not None and alive < 2 * max(self.trained_at, 1):
+            return
+        rows = np.fromiter(self.row_of.values(), dtype=np.int64)
+        data = np.asarray(self.vectors[rows])
+        nlist = min(self._nlist(), len(rows))
+        rng = np.random.default_rng(0)
+        sample = data[rng.choice(len(data), size=min(len(data), nlist * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(12):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for idx in range(nlist):
+                members = sample[labels == idx]
+                if len(members):
+                    centroids[idx] = members.sum(axis=0)
+            centroids = _normalize_rows(centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.trained_at = alive
+        self._reassign_all()
+        self.dirty = True
+        logger.info("local_index_trained", path=str(self.path), nlist=nlist, vectors=alive)
+
+    # -- mutation --------------------------------------------------------
+    def upsert(self, ids: Sequence[str], vectors: np.ndarray, payloads: Sequence[dict | None]) -> None:
+        vectors = _normalize_rows(vectors)
+        self.delete([doc_id for doc_id in ids if doc_id in self.row_of])
+        needed = self.count + len(ids)
+        if self.vectors is None or needed > self.capacity:
+            self._map(max(needed, self.capacity * 2, 64))
+        start = self.count
+        self.vectors[start:needed] = vectors
+        for offset, (doc_id, payload) in enumerate(zip(ids, payloads)):
+            row = start + offset
+            self.ids.append(str(doc_id))
+            self.payloads.append(payload)
+            self.row_of[str(doc_id)] = row
+            self._index_text(row, payload)
+        self.count = needed
+        if self.centroids is not None:
+            new_assign = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+            self.assign = np.concatenate([self.assign, new_assign])
+            for offset, list_id in enumerate(new_assign.tolist()):
+                self.lists[list_id].append(start + offset)
+        self.version += 1
+        self.dirty = True
+        self.maybe_train()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        removed = 0
+        for doc_id in ids:
+            row = self.row_of.pop(str(doc_id), None)
+            if row is None:
+                continue
+            self._unindex_text(row, self.payloads[row])
+            if self.centroids is not None and row < len(self.assign):
+                with_list = self.lists[int(self.assign[row])]
+                with_list.remove(row)
+            self.ids[row] = None
+            self.payloads[row] = None
+            removed += 1
+        if removed:
+            self.version += 1
+            self.dirty = True
+            if self.count and self.alive < self.count * 0.75:
+                self.compact()
+        return removed
+
+    def compact(self) -> None:
+        """Drop deleted rows, writing the survivors to a new vectors file.
+
+        Readers in other processes keep mapping the old file with their old
+        row numbers until they reload the saved state, so it is never
+        rewritten in place.
+        """
+
+        rows = sorted(self.row_of.values())
+        data = np.asarray(self.vectors[rows]) if rows else np.empty((0, self.dim), dtype=np.float32)
+        self.ids = [self.ids[row] for row in rows]
+        self.payloads = [self.payloads[row] for row in rows]
+        self.count = len(rows)
+        if self.vectors is not None:
+            self.retired.append(self._vectors_file)
+            self.vectors = None
+            self.vectors_name = f"vectors.{self.version}.f32"
+            self._map(max(self.count, 64))
+            self.vectors[: self.count] = data
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.postings.clear()
+        self.doc_len.clear()
+        self.total_len = 0
+        for row, payload in enumerate(self.payloads):
+            self._index_text(row, payload)
+        self._reassign_all()
+        self.dirty = True
+
+    # -- search ----------------------------------------------------------
+    def candidate_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if self.centroids is None:
+            return np.fromiter(self.row_of.values(), dtype=np.int64)
+        probes = _top_indices(self.centroids @ query, min(nprobe, len(self.centroids)))
+        rows: list[int] = []
+        for list_id in probes.tolist():
+            rows.extend(self.lists[list_id])
+        return np.asarray(rows, dtype=np.int64)
+
+    def dense(self, query: np.ndarray, top: int, nprobe: int, *, exact: bool = False) -> list[tuple[int, float]]:
+        if not self.row_of or self.vectors is None:
+            return []
+        if exact:
+            rows = np.fromiter(self.row_of.values(), dtype=np.int64)
+        else:
+            rows = self.candidate_rows(query, nprobe)
+        if rows.size == 0:
+            return []
+        scores = np.asarray(self.vectors[rows]) @ query
+        picked = _top_indices(scores, top)
+        return [(int(rows[idx]), float(scores[idx])) for idx in picked]
+
+    def bm25(self, text: str, top: int, k1: float = 1.2, b: float = 0.75) -> list[tuple[int, float]]:
+        terms = set(_tokenize(text))
+        if not terms or not self.doc_len:
+            return []
+        total_docs = len(self.doc_len)
+        avg_len = self.total_len / total_docs if total_docs else 1.0
+        scores: dict[int, float] = {}
+        for term in terms:
+            bucket = self.postings.get(term)
+            if not bucket:
+                continue
+            idf = math.log(1 + (total_docs - len(bucket) + 0.5) / (len(bucket) + 0.5))
+            for row, tf in bucket.items():
+                norm = tf + k1 * (1 - b + b * self.doc_len[row] / avg_len)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (k1 + 1) / norm
+        if not scores:
+            return []
+        rows = np.fromiter(scores.keys(), dtype=np.int64)
+        values = np.fromiter(scores.values(), dtype=np.float32)
+        picked = _top_indices(values, top)
+        return [(int(rows[idx]), float(values[idx])) for idx in picked]
+
+
+class LocalVectorIndex:
+    """Per-project IVF-flat/BM25 index persisted under ``path``.
+
+    The Celery worker is the only writer: it indexes documents and purges
+    the passages of deleted ones through its own instance. Other processes
+    only read; a partition is re-read when its state file has been
+    replaced on disk, so long-lived API processes see the worker's changes.
+
+    Parameters
+    ----------
+    path:
+        Directory holding one sub-directory per project partition.
+    encoder:
+        Callable turning a list of texts into a 2-D array of embeddings.
+        Defaults to :func:`default_encoder`.
+    dim:
+        Embedding dimension. Inferred from the encoder when omitted.
+    nlist, nprobe:
+        IVF parameters. ``nlist`` defaults to ``sqrt(n)`` per partition.
+    train_threshold:
+        Partition size at which IVF is trained; smaller partitions are
+        scanned exactly.
+    """
+
+    # ``hybrid_search`` passes ``project=`` only to backends advertising this.
+    supports_projects = True
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        *,
+        encoder: Encoder | None = None,
+        dim: int | None = None,
+        nlist: int | None = None,
+        nprobe: int = 8,
+        train_threshold: int = 2048,
+    ) -> None:
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.encoder = encoder or default_encoder()
+        self._dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self._partitions: dict[str, _Partition] = {}
+        self._lock = threading.RLock()
+
+    @property
+    def dim(self) -> int:
+        if self._dim is None:
+            self._dim = int(self.encoder(["dimension probe"]).shape[1])
+        return self._dim
+
+    def _partition(self, project: str | None) -> _Partition:
+        key = _partition_dirname(project)
+        partition = self._partitions.get(key)
+        if partition is None or partition.changed_on_disk():
+            try:
+                partition = self._open(key)
+            except FileNotFoundError:
+                # A compaction was saved between reading the state and
+                # opening the vectors file it named; read the new state.
+                partition = self._open(key)
+            self._partitions[key] = partition
+        return partition
+
+    def _open(self, key: str) -> _Partition:
+        return _Partition(
+            self.path / key,
+            dim=self.dim,
+            nlist=self.nlist,
+            train_threshold=self.train_threshold,
+        )
+
+    def projects(self) -> list[str]:
+        """Return partition names present on disk or in memory."""
+
+        names = {entry.name for entry in self.path.iterdir() if entry.is_dir()}
+        names.update(self._partitions)
+        return sorted(names)
+
+    def add(
+        self,
+        ids: Sequence[str],
+        *,
+        texts: Sequence[str] | None = None,
+        vectors: np.ndarray | None = None,
+        payloads: Sequence[dict | None] | None = None,
+        project: str | None = None,
+    ) -> None:
+        """Insert or replace ``ids`` in the ``project`` partition.
+
+        Either ``vectors`` or ``texts`` must be supplied. When ``payloads``
+        are omitted, ``texts`` are stored as ``{"text": ...}`` so the BM25
+        leg and payload hydration keep working.
+        """
+
+        if not ids:
+            return
+        if vectors is None:
+            if texts is None:
+                raise ValueError("texts or vectors are required")
+            vectors = self.encoder(list(texts))
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[0] != len(ids):
+            raise ValueError("ids and vectors length mismatch")
+        if payloads is None:
+            payloads = [{"text": text} for text in texts] if texts is not None else [None] * len(ids)
+        with self._lock:
+            self._partition(project).upsert([str(i) for i in ids], vectors, list(payloads))
+
+    def delete(self, ids: Iterable[str], *, project: str | None = None) -> int:
+        """Remove ``ids`` from the ``project`` partition and return the count."""
+
+        with self._lock:
+            return self._partition(project).delete(ids)
+
+    def save(self) -> None:
+        """Flush vectors and partition state to disk."""
+
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.save()
+
+    def version(self, project: str | None = None) -> int:
+        """Return a counter that changes whenever ``project`` is modified."""
+
+        with self._lock:
+            return self._partition(project).version
+
+    def count(self, project: str | None = None) -> int:
+        with self._lock:
+            return self._partition(project).alive
+
+    def get_payloads(self, ids: Iterable[str], *, project: str | None = None) -> dict[str, dict | None]:
+        """Return stored payloads for ``ids`` that exist in the partition."""
+
+        with self._lock:
+            partition = self._partition(project)
+            found: dict[str, dict | None] = {}
+            for doc_id in ids:
+                row = partition.row_of.get(str(doc_id))
+                if row is not None:
+                    found[str(doc_id)] = partition.payloads[row]
+            return found
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return _normalize_rows(self.encoder([query]))[0]
+
+    def similarity(
+        self,
+        query: str,
+        top: int = 10,
+        method: str = "dense",
+        *,
+        project: str | None = None,
+        exact: bool = False,
+    ) -> list[Doc]:
+        """Return up to ``top`` documents for ``query``.
+
+        ``method`` is ``"dense"`` (cosine over embeddings) or ``"bm25"``.
+        ``exact=True`` forces a brute-force scan and is used to measure recall.
+        """
+
+        if method == "bm25":
+            with self._lock:
+                partition = self._partition(project)
+                hits = partition.bm25(query, top)
+                return [Doc(partition.ids[row], partition.payloads[row], score) for row, score in hits]
+        if method != "dense":
+            raise ValueError(f"unsupported method: {method}")
+        vector = self.encode_query(query)
+        return self.search_vector(vector, top, project=project, exact=exact)
+
+    def search_vector(
+        self,
+        vector: np.ndarray,
+        top: int = 10,
+        *,
+        project: str | None = None,
+        exact: bool = False,
+    ) -> list[Doc]:
+        """Dense search with a precomputed query ``vector``."""
+
+        vector = _normalize_rows(vector)[0]
+        with self._lock:
+            partition = self._partition(project)
+            hits = partition.dense(vector, top, self.nprobe, exact=exact)
+            return [Doc(partition.ids[row], partition.payloads[row], score) for row, score in hits]
+
+
+def from_env() -> LocalVectorIndex | None:
+    """Build an index from ``LOCAL_VECTOR_INDEX_*`` variables, if configured."""
+
+    path = os.getenv("LOCAL_VECTOR_INDEX_DIR")
+    if not path:
+        return None
+    try:
+        nprobe = int(os.getenv("LOCAL_VECTOR_INDEX_NPROBE", "8"))
+        threshold = int(os.getenv("LOCAL_VECTOR_INDEX_TRAIN_THRESHOLD", "2048"))
+    except ValueError:
+        nprobe, threshold = 8, 2048
+    return LocalVectorIndex(path, nprobe=nprobe, train_threshold=threshold)
+
+
+__all__ = [
+    "DEFAULT_PARTITION",
+    "HashingEncoder",
+    "LocalVectorIndex",
+    "default_encoder",
+    "from_env",
+]
@@ -0,0 +1,238 @@
+"""In-memory fuzzy matcher for curated QA pairs.
+
+Each project gets a :class:`QAIndex` of word-bounded character trigrams of
+its questions. A lookup concatenates the posting arrays of the query
+trigrams and counts overlaps with :func:`numpy.bincount`, so scoring
+thousands of pairs takes well under a millisecond and never touches Mongo.
+The score is the Dice coefficient of the two trigram sets (``0..1``),
+optionally combined with cosine similarity of question embeddings.
+
+Indexes are built lazily from Mongo, updated in place by
+:class:`~packages.core.mongo.MongoClient` QA writes and dropped on other
+replicas through the cache invalidation channel (``QA_INDEX_TTL`` bounds
+staleness if a message is missed).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+from typing import Any, Awaitable, Callable, Iterable
+
+import numpy as np
+import structlog
+
+from packages.backend.cache import get_local_cache, publish_invalidation
+
+logger = structlog.get_logger(__name__)
+
+QA_INDEX_TTL = float(os.getenv("QA_INDEX_TTL", "600"))
+QA_INDEX_MAX_PROJECTS = int(os.getenv("QA_INDEX_MAX_PROJECTS", "256"))
+QA_MIN_SCORE = float(os.getenv("QA_MIN_SCORE", "0.35"))
+
+Encoder = Callable[[list[str]], np.ndarray]
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Lowercase ``text``, fold ``ё`` and collapse punctuation to spaces."""
+    return _NON_WORD.sub(" ", (text or "").lower().replace("ё", "е")).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    """Return the word-bounded character trigrams of ``text``."""
+    grams: set[str] = set()
+    for word in normalize(text).split():
+        padded = f" {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class QAIndex:
+    """Trigram postings (plus optional embeddings) over one project's pairs.
+
+    Parameters
+    ----------
+    encoder:
+        Optional callable mapping a list of texts to L2-normalised vectors.
+        When set, the score is the larger of trigram Dice and cosine.
+    """
+
+    def __init__(self, encoder: Encoder | None = None) -> None:
+        self.encoder = encoder
+        self._rows: list[dict[str, Any] | None] = []
+        self._row_of: dict[str, int] = {}
+        self._sizes: list[int] = []
+        self._vectors: list[np.ndarray | None] = []
+        self._postings: dict[str, list[int]] = {}
+        self._arrays: dict[str, np.ndarray] = {}
+        self._size_array: np.ndarray | None = None
+        self._dead = 0
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def add(self, pair: dict[str, Any]) -> None:
+        """Insert or replace ``pair`` (needs ``id`` and ``question``)."""
+        qa_id = str(pair.get("id") or "")
+        question = str(pair.get("question") or "")
+        if not qa_id or not question:
+            return
+        self.remove(qa_id)
+        row = len(self._rows)
+        grams = trigrams(question)
+        self._rows.append(dict(pair))
+        self._row_of[qa_id] = row
+        self._sizes.append(len(grams))
+        for gram in grams:
+            self._postings.setdefault(gram, []).append(row)
+            self._arrays.pop(gram, None)
+        if self.encoder is not None:
+            self._vectors.append(np.asarray(self.encoder([question])[0], dtype=np.float32))
+        self._size_array = None
+
+    def extend(self, pairs: Iterable[dict[str, Any]]) -> None:
+        for pair in pairs:
+            self.add(pair)
+
+    def remove(self, qa_id: str) -> None:
+        """Drop the pair ``qa_id`` if present."""
+        row = self._row_of.pop(str(qa_id), None)
+        if row is None:
+            return
+        self._rows[row] = None
+        self._sizes[row] = 0
+        if self.encoder is not None:
+            self._vectors[row] = None
+        self._dead += 1
+        self._size_array = None
+        if self._dead > 64 and self._dead * 2 > len(self._rows):
+            self._compact()
+
+    def _compact(self) -> None:
+        alive = [row for row in self._rows if row is not None]
+        self.__init__(self.encoder)  # type: ignore[misc]
+        self.extend(alive)
+
+    def _postings_array(self, gram: str) -> np.ndarray:
+        array = self._arrays.get(gram)
+        if array is None:
+            array = self._arrays[gram] = np.asarray(self._postings[gram], dtype=np.int32)
+        return array
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        *,
+        min_score: float = QA_MIN_SCORE,
+    ) -> list[dict[str, Any]]:
+        """Return up to ``limit`` pairs scoring at least ``min_score``.
+
+        Results are copies of the stored pairs with a ``score`` key, ordered
+        by score and then ``priority``.
+        """
+        grams = trigrams(query)
+        if not grams or not self._row_of:
+            return []
+        hits = [self._postings_array(gram) for gram in grams if gram in self._postings]
+        total = len(self._rows)
+        if hits:
+            counts = np.bincount(np.concatenate(hits), minlength=total)
+        else:
+            counts = np.zeros(total, dtype=np.int64)
+        if self._size_array is None:
+            self._size_array = np.asarray(self._sizes, dtype=np.float32)
+        sizes = self._size_array
+        scores = np.where(sizes > 0, 2.0 * counts / (sizes + len(grams)), 0.0)
+        if self.encoder is not None:
+            scores = np.maximum(scores, self._cosine(query, total))
+
+        candidates = np.flatnonzero(scores >= min_score)
+        if candidates.size == 0:
+            return []
+        if candidates.size > limit * 4:
+            top = np.argpartition(-scores[candidates], limit * 4)[: limit * 4]
+            candidates = candidates[top]
+        results = [
+            self._rows[row] | {"score": round(float(scores[row]), 4)}  # type: ignore[operator]
+            for row in candidates
+            if self._rows[row] is not None
+        ]
+        results.sort(key=lambda item: (item["score"], item.get("priority") or 0), reverse=True)
+        return results[:limit]
+
+    def _cosine(self, query: str, total: int) -> np.ndarray:
+        scores = np.zeros(total, dtype=np.float32)
+        rows = [row for row, vector in enumerate(self._vectors) if vector is not None]
+        if not rows:
+            return scores
+        matrix = np.stack([self._vectors[row] for row in rows])
+        query_vector = np.asarray(self.encoder([query])[0], dtype=np.float32)  # type: ignore[misc]
+        scores[rows] = matrix @ query_vector
+        return scores
+
+
+_indexes = get_local_cache("qa_index", ttl=QA_INDEX_TTL, maxsize=QA_INDEX_MAX_PROJECTS)
+_locks: dict[str, asyncio.Lock] = {}
+# Builds every index with this encoder (``None`` keeps trigram-only scoring).
+encoder: Encoder | None = None
+
+
+def _key(project: str | None) -> str:
+    return (project or "").strip().lower() or "-"
+
+
+async def get_index(
+    project: str | None,
+    loader: Callable[[], Awaitable[Iterable[dict[str, Any]]]],
+) -> QAIndex:
+    """Return ``project``'s index, building it with ``loader`` on a miss."""
+    key = _key(project)
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = QAIndex(encoder)
+            index.extend(await loader())
+            _indexes.set(key, index)
+            logger.info("qa_index_built", project=key, pairs=len(index))
+    return index
+
+
+async def apply_changes(
+    project: str | None,
+    *,
+    upserted: Iterable[dict[str, Any]] = (),
+    removed: Iterable[str] = (),
+) -> None:
+    """Update the local index of ``project`` in place and notify replicas.
+
+    The all-projects index (``project=None`` lookups) is simply dropped.
+    """
+    key = _key(project)
+    index = _indexes.get(key)
+    if index is not None:
+        index.extend(upserted)
+        for qa_id in removed:
+            index.remove(qa_id)
+    _indexes.pop("-")
+    await publish_invalidation("qa_index", key)
+    await publish_invalidation("qa_index", "-")
+
+
+async def drop(project: str | None) -> None:
+    """Forget ``project``'s index everywhere; it is rebuilt on next use."""
+    key = _key(project)
+    _indexes.pop(key)
+    _indexes.pop("-")
+    await publish_invalidation("qa_index", key)
+    await publish_invalidation("qa_index", "-")
+
+
+__all__ = ["QAIndex", "apply_changes", "drop", "get_index", "normalize", "trigrams"]
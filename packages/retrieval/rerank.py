@@ -1,7 +1,20 @@
-"""Cross-encoder based document reranking."""
+"""Cross-encoder based document reranking.
+
+The model runs on CPU by default, optionally with int8 dynamic quantization
+(``RERANK_QUANTIZE=1``). Document text is cut to the window of
+``RERANK_MAX_TOKENS`` words that overlaps the query most, scores are kept in
+an LRU cache keyed by ``(query hash, doc id, doc version)`` and reranking is
+skipped entirely when the fused scores already separate the top ``k``.
+"""
 
 from __future__ import annotations
 
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
 from typing import List
 
 from sentence_transformers import CrossEncoder
@@ -14,29 +27,197 @@ from .search import Doc
 
 _MODEL_NAME = "sbert_cross_ru"
 _reranker: CrossEncoder | None = None
+_reranker_lock = threading.Lock()
+
+_QUANTIZE = os.getenv("RERANK_QUANTIZE", "0").lower() in {"1", "true", "yes", "on"}
+# Whitespace tokens kept per document; subword count is roughly 1.5x this.
+_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", "256"))
+_MAX_PAIRS = int(os.getenv("RERANK_MAX_PAIRS", "50"))
+_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# Relative gap between the k-th and (k+1)-th fused score above which the
+# cross-encoder is not consulted. ``0`` disables the shortcut.
+_SKIP_GAP = float(os.getenv("RERANK_SKIP_GAP", "0.25"))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _quantize(model: CrossEncoder) -> CrossEncoder:
+    """Apply int8 dynamic quantization to the model's linear layers."""
+    try:
+        import torch
+    except ImportError:  # pragma: no cover - torch ships with sentence_transformers
+        logger.warning("rerank_quantize_unavailable")
+        return model
+    inner = getattr(model, "model", None)
+    if inner is None:
+        return model
+    try:
+        model.model = torch.quantization.quantize_dynamic(
+            inner, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    except Exception as exc:  # noqa: BLE001
+        logger.warning("rerank_quantize_failed", error=str(exc))
+        return model
+    logger.info("reranker quantized", dtype="qint8")
+    return model
 
 
 def get_reranker() -> CrossEncoder:
     """Return cached ``CrossEncoder`` instance."""
     global _reranker
     if _reranker is None:
-        logger.info("loading reranker", model=_MODEL_NAME)
-        _reranker = CrossEncoder(_MODEL_NAME)
+        with _reranker_lock:
+            if _reranker is None:
+                logger.info("loading reranker", model=_MODEL_NAME, quantize=_QUANTIZE)
+                model = CrossEncoder(_MODEL_NAME)
+                _reranker = _quantize(model) if _QUANTIZE else model
     return _reranker
 
 
-def rerank(query: str, docs: List[Doc], top: int = 10) -> List[Doc]:
-    """Return ``docs`` ordered by cross-encoder score."""
+class _ScoreCache:
+    """Thread-safe LRU mapping of ``(query, doc id, version)`` to scores."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple[str, str, str]) -> float | None:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: tuple[str, str, str], value: float) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+_score_cache = _ScoreCache(_CACHE_SIZE)
+
+
+def clear_cache() -> None:
+    """Drop all cached cross-encoder scores."""
+    _score_cache.clear()
+
+
+def _doc_text(doc: Doc) -> str:
+    payload = doc.payload or {}
+    return str(payload.get("text", "") or "")
+
+
+def _doc_version(doc: Doc, text: str) -> str:
+    """Return a version marker so edited documents are rescored."""
+    payload = doc.payload or {}
+    for key in ("version", "content_hash", "updated_at", "ts"):
+        value = payload.get(key)
+        if value is not None:
+            return str(value)
+    return format(zlib.crc32(text.encode("utf-8")), "08x")
+
+
+def truncate_text(query: str, text: str, max_tokens: int = _MAX_TOKENS) -> str:
+    """Return the ``max_tokens`` word window of ``text`` most relevant to ``query``.
+
+    Relevance is the number of query-term hits (matched on a 5 character
+    prefix to tolerate inflection). Short texts are returned unchanged.
+    """
+    words = text.split()
+    if max_tokens <= 0 or len(words) <= max_tokens:
+        return text
+    terms = {w[:5] for w in _WORD_RE.findall(query.lower()) if len(w) > 2}
+    if not terms:
+        return " ".join(words[:max_tokens])
+    hits = [1 if word.lower().strip(".,;:!?()\"'«»")[:5] in terms else 0 for word in words]
+    window = sum(hits[:max_tokens])
+    best, best_start = window, 0
+    for start in range(1, len(words) - max_tokens + 1):
+        window += hits[start + max_tokens - 1] - hits[start - 1]
+        if window > best:
+            best, best_start = window, start
+    return " ".join(words[best_start : best_start + max_tokens])
+
+
+def score_gap(docs: List[Doc], top: int) -> float:
+    """Return the relative gap between the ``top``-th and next fused score."""
+    if len(docs) <= top or top <= 0:
+        return 1.0
+    kth = min(float(doc.score or 0.0) for doc in docs[:top])
+    runner_up = max(float(doc.score or 0.0) for doc in docs[top:])
+    if kth <= 0:
+        return 0.0
+    return (kth - runner_up) / kth
+
+
+def rerank(
+    query: str,
+    docs: List[Doc],
+    top: int = 10,
+    *,
+    skip_gap: float | None = None,
+) -> List[Doc]:
+    """Return ``docs`` ordered by cross-encoder score.
+
+    Parameters
+    ----------
+    query:
+        User query.
+    docs:
+        Candidates ordered by fused score (``Doc.score``).
+    top:
+        Number of documents to return.
+    skip_gap:
+        Override for ``RERANK_SKIP_GAP``; when the fused scores already
+        separate the top ``k`` by at least this relative gap the candidates
+        are returned without running the model.
+    """
     if len(docs) <= top:
         return docs
 
-    model = get_reranker()
-    pairs = [(query, doc.payload.get("text", "") if doc.payload else "") for doc in docs]
-    scores = model.predict(pairs)
+    threshold = _SKIP_GAP if skip_gap is None else skip_gap
+    if threshold > 0:
+        gap = score_gap(docs, top)
+        if gap >= threshold:
+            logger.info("rerank skipped", gap=round(gap, 4), count=len(docs))
+            return docs[:top]
+
+    candidates = docs[: max(_MAX_PAIRS, top)] if _MAX_PAIRS > 0 else docs
+    query_key = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    missing: list[tuple[Doc, tuple[str, str, str], str]] = []
+    for doc in candidates:
+        text = _doc_text(doc)
+        key = (query_key, str(doc.id), _doc_version(doc, text))
+        cached = _score_cache.get(key)
+        if cached is None:
+            missing.append((doc, key, truncate_text(query, text)))
+        else:
+            setattr(doc, "cross_score", cached)
 
-    for doc, score in zip(docs, scores):
-        setattr(doc, "cross_score", float(score))
+    if missing:
+        model = get_reranker()
+        scores = model.predict([(query, text) for _, _, text in missing])
+        for (doc, key, _), score in zip(missing, scores):
+            setattr(doc, "cross_score", float(score))
+            _score_cache.set(key, float(score))
 
-    docs_sorted = sorted(docs, key=lambda d: getattr(d, "cross_score"), reverse=True)
-    logger.info("reranked", count=len(docs_sorted))
+    docs_sorted = sorted(candidates, key=lambda d: getattr(d, "cross_score"), reverse=True)
+    logger.info(
+        "reranked",
+        count=len(docs_sorted),
+        scored=len(missing),
+        cached=len(candidates) - len(missing),
+    )
     return docs_sorted[:top]
@@ -1,14 +1,21 @@
-"""Hybrid search implementation with Reciprocal Rank Fusion."""
+"""Hybrid search combining dense and BM25 retrieval via :mod:`.fusion`."""
 
 from __future__ import annotations
 
-from dataclasses import asdict, dataclass
-from typing import Dict, List
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Sequence
 import asyncio
-import hashlib, json
+import hashlib
+import os
+import struct
+
+import numpy as np
 import structlog
 
-from packages.backend.cache import _get_redis
+from packages.backend.cache import CACHE_TTL, _get_redis, get_cache, get_generation
+from packages.backend.codec import register_type
+from packages.retrieval import fusion
 
 logger = structlog.get_logger(__name__)
 
@@ -22,65 +29,234 @@ class Doc:
     score: float = 0.0
 
 
+register_type(Doc, "Doc")
+
 # Qdrant client instance should be assigned by the application.
 qdrant = None  # type: ignore
+# Optional :class:`packages.retrieval.local_index.LocalVectorIndex` used as a
+# Qdrant-free fallback for small deployments and tests.
+local_index = None  # type: ignore
+
+
+def _vector_backend():
+    """Return the configured similarity backend (Qdrant first, then local)."""
 
+    if qdrant is not None:
+        return qdrant
+    if local_index is not None:
+        return local_index
+    raise RuntimeError("Qdrant not configured")
 
-async def hybrid_search(query: str, k: int = 10) -> List[Doc]:
-    """Return top ``k`` documents ranked by RRF."""
 
-    logger.info("hybrid search", query=query)
-    if qdrant is None:
-        raise RuntimeError("Qdrant not configured")
+async def hybrid_search(
+    query: str,
+    k: int = 10,
+    *,
+    project: str | None = None,
+    config: fusion.FusionConfig | None = None,
+) -> List[Doc]:
+    """Return top ``k`` documents fused from dense and BM25 results.
 
-    # Run blocking Qdrant calls in a separate thread
-    dense_scores, bm25_scores = await asyncio.gather(
-        asyncio.to_thread(qdrant.similarity, query, top=50, method="dense"),
-        asyncio.to_thread(qdrant.similarity, query, top=50, method="bm25"),
+    Parameters
+    ----------
+    query:
+        User query.
+    k:
+        Number of documents to return.
+    project:
+        Optional project used to pick fusion weights and, when the backend
+        supports it, to scope the search.
+    config:
+        Explicit :class:`~packages.retrieval.fusion.FusionConfig` overriding
+        the project/global one.
+    """
+
+    logger.info("hybrid search", query=query, project=project)
+    backend = _vector_backend()
+    config = config or fusion.get_config(project)
+    extra = {"project": project} if project and getattr(backend, "supports_projects", False) else {}
+
+    depth = max(config.min_depth, k)
+    while True:
+        # Run blocking backend calls in a separate thread
+        dense_scores, bm25_scores = await asyncio.gather(
+            asyncio.to_thread(backend.similarity, query, top=depth, method="dense", **extra),
+            asyncio.to_thread(backend.similarity, query, top=depth, method="bm25", **extra),
+        )
+        result = fusion.fuse_scores(
+            {"dense": dense_scores, "bm25": bm25_scores}, k, config, depth=depth
+        )
+        # At most one wider round, and only when deeper hits could still
+        # change the top-k.
+        if result.settled or depth >= config.max_depth:
+            break
+        depth = config.max_depth
+
+    logger.info(
+        "hybrid search done",
+        returned=len(result.ids),
+        candidates=result.candidates,
+        depth=depth,
+        method=config.method,
+        gap=round(result.gap, 4),
+        **{f"fused_{name}": round(value, 6) for name, value in result.stats.items()},
     )
+    return [
+        Doc(doc_id, payload, float(score))
+        for doc_id, payload, score in zip(result.ids, result.payloads, result.scores)
+    ]
+
+
+VECTOR_CACHE_TTL = int(os.getenv("VECTOR_CACHE_TTL", str(CACHE_TTL)))
+_PAYLOAD_CACHE_SIZE = int(os.getenv("VECTOR_PAYLOAD_CACHE_SIZE", "2048"))
+_PACK_MAGIC = b"VS1"
+_MISSING = object()
+
+
+def pack_hits(hits: Sequence[tuple[str, float]]) -> bytes:
+    """Serialize ``(id, score)`` pairs as ``magic | count | float32[] | ids``."""
+
+    scores = np.asarray([score for _, score in hits], dtype="<f4")
+    ids = "\x00".join(str(doc_id) for doc_id, _ in hits).encode("utf-8")
+    return _PACK_MAGIC + struct.pack("<I", len(hits)) + scores.tobytes() + ids
+
 
-    rrf_const = 60
-    results: Dict[str, Doc] = {}
+def unpack_hits(data: bytes) -> list[tuple[str, float]] | None:
+    """Inverse of :func:`pack_hits`; ``None`` for foreign or corrupt data."""
 
-    for rank, doc in enumerate(dense_scores, 1):
-        item = results.setdefault(doc.id, Doc(doc.id, getattr(doc, "payload", None)))
-        item.score += 1 / (rrf_const + rank)
+    if not isinstance(data, (bytes, bytearray)) or data[:3] != _PACK_MAGIC:
+        return None
+    (count,) = struct.unpack_from("<I", data, 3)
+    offset = 7 + 4 * count
+    scores = np.frombuffer(data, dtype="<f4", count=count, offset=7)
+    ids = bytes(data[offset:]).decode("utf-8").split("\x00") if count else []
+    if len(ids) != count:
+        return None
+    return list(zip(ids, scores.tolist()))
 
-    for rank, doc in enumerate(bm25_scores, 1):
-        item = results.setdefault(doc.id, Doc(doc.id, getattr(doc, "payload", None)))
-        item.score += 1 / (rrf_const + rank)
 
-    docs = sorted(results.values(), key=lambda d: d.score, reverse=True)
-    logger.info("hybrid search done", returned=len(docs))
-    return docs[:k]
+class _PayloadLRU:
+    """In-process LRU of payloads keyed by ``(project, version, id)``."""
 
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[str, str, str], Any] = OrderedDict()
 
-async def vector_search(query: str, k: int = 50) -> List[Doc]:
-    """Perform dense vector search for ``query`` and return top ``k`` docs (cached)."""
+    def get(self, key: tuple[str, str, str]) -> Any:
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING:
+            self._data.move_to_end(key)
+        return value
 
-    logger.info("vector search", query=query)
-    if qdrant is None:
-        raise RuntimeError("Qdrant not configured")
-    key = "vector:" + hashlib.sha1(query.lower().encode()).hexdigest()
+    def set(self, key: tuple[str, str, str], value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+_payload_cache = _PayloadLRU(_PAYLOAD_CACHE_SIZE)
+_hits_cache = get_cache("vector", ttl=VECTOR_CACHE_TTL, encode=pack_hits, decode=unpack_hits)
+
+
+async def _index_version(backend, redis, project: str | None) -> str:
+    """Return the current index version for ``project``.
+
+    Backends exposing ``version()`` (the local index) answer directly; for
+    Qdrant the project's cache generation is used, which the worker bumps
+    after reindexing.
+    """
+
+    version = getattr(backend, "version", None)
+    if callable(version):
+        try:
+            value = await asyncio.to_thread(version, project)
+        except Exception as exc:  # noqa: BLE001 - fall back to the Redis counter
+            logger.debug("vector_version_failed", error=str(exc))
+        else:
+            return f"l{value}"
+    return f"g{await get_generation(project, redis=redis)}"
+
+
+async def _hydrate(
+    backend,
+    hits: list[tuple[str, float]],
+    project: str | None,
+    version: str,
+) -> List[Doc] | None:
+    """Attach payloads to cached ``hits``; ``None`` if any id is unknown."""
+
+    scope = (project or "").strip().lower()
+    payloads: dict[str, Any] = {}
+    missing: list[str] = []
+    for doc_id, _ in hits:
+        value = _payload_cache.get((scope, version, doc_id))
+        if value is _MISSING:
+            missing.append(doc_id)
+        else:
+            payloads[doc_id] = value
+    if missing:
+        fetch = getattr(backend, "get_payloads", None)
+        if fetch is None:
+            return None
+        extra = {"project": project} if getattr(backend, "supports_projects", False) else {}
+        fetched = await asyncio.to_thread(fetch, missing, **extra)
+        if len(fetched) != len(missing):
+            return None
+        for doc_id, payload in fetched.items():
+            payloads[doc_id] = payload
+            _payload_cache.set((scope, version, doc_id), payload)
+    return [Doc(doc_id, payloads[doc_id], score) for doc_id, score in hits]
+
+
+async def vector_search(query: str, k: int = 50, *, project: str | None = None) -> List[Doc]:
+    """Perform dense vector search for ``query`` and return top ``k`` docs (cached).
+
+    Only ``(id, score)`` pairs are cached in Redis (see :func:`pack_hits`);
+    payloads are hydrated from an in-process LRU or fetched in one batch from
+    the backend. Backends without ``get_payloads`` cache in-process only.
+    Keys embed the project index version, so reindexing makes stale entries
+    unreachable.
+    """
+
+    logger.info("vector search", query=query, project=project)
+    backend = _vector_backend()
     redis = _get_redis()
-    cached = await redis.get(key)
-    if cached is not None:
-        logger.info("cache hit", key=key)
-        docs_list = json.loads(cached.decode())
-        docs = [Doc(**d) for d in docs_list]
-    else:
-        # ``qdrant.similarity`` is a blocking call; run it in a thread so the
-        # event loop stays responsive. In production consider using an
-        # asynchronous Qdrant client or a dedicated thread pool.
+    version = await _index_version(backend, redis, project)
+    scope = (project or "").strip().lower()
+    digest = hashlib.sha1(query.lower().encode()).hexdigest()
+    key = f"vector:{scope or '-'}:{version}:{k}:{digest}"
+
+    docs: List[Doc] | None = None
+    hits = await _hits_cache.get(key, redis=redis)
+    if hits is not None:
+        docs = await _hydrate(backend, hits, project, version)
+        logger.info("cache hit", key=key, hydrated=docs is not None)
+    if docs is None:
+        extra = {"project": project} if project and getattr(backend, "supports_projects", False) else {}
+        # ``similarity`` is a blocking call; run it in a thread so the
+        # event loop stays responsive.
         results = await asyncio.to_thread(
-            qdrant.similarity, query, top=k, method="dense"
+            backend.similarity, query, top=k, method="dense", **extra
         )
         docs = [
-            Doc(doc.id, getattr(doc, "payload", None), getattr(doc, "score", 0.0))
+            Doc(str(doc.id), getattr(doc, "payload", None), float(getattr(doc, "score", 0.0) or 0.0))
             for doc in results
         ]
-        docs_list = [asdict(doc) for doc in docs]
-        await redis.setex(key, 86400, json.dumps(docs_list, ensure_ascii=False))
+        for doc in docs:
+            _payload_cache.set((scope, version, doc.id), doc.payload)
+        hits = [(doc.id, doc.score) for doc in docs]
+        if callable(getattr(backend, "get_payloads", None)):
+            await _hits_cache.set(key, hits, redis=redis)
+        else:
+            # Without a batch payload fetch (Qdrant) a hit written by another
+            # replica could not be hydrated, so keep the entry in-process.
+            _hits_cache.local.set(key, hits)
         logger.info("cache store", key=key)
     logger.info("vector search done", returned=len(docs))
     return docs
@@ -0,0 +1,231 @@
+"""Streaming tabular exports (CSV, NDJSON, Parquet).
+
+:func:`stream_rows` consumes an async iterator of Mongo documents and yields
+encoded chunks every ``EXPORT_BATCH_ROWS`` rows, so an export of any size is
+sent while the cursor is still being read and memory stays bounded by one
+batch. Parquet output is written one row group per batch and requires
+:mod:`pyarrow` (``pip install .[export]``).
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+from collections.abc import AsyncIterable, AsyncIterator, Sequence
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any
+
+import orjson
+
+try:  # pragma: no cover - optional dependency
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - parquet export disabled
+    pa = None  # type: ignore[assignment]
+    pq = None  # type: ignore[assignment]
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "2000"))
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    """An exported column read from ``field`` of each document.
+
+    ``kind`` is one of ``str``, ``int``, ``datetime``, ``date`` or ``epoch``
+    (seconds since the epoch, exported as a UTC timestamp).
+    """
+
+    name: str
+    field: str
+    kind: str = "str"
+
+
+def available_formats() -> list[str]:
+    """Return the export formats usable in this environment."""
+
+    return [fmt for fmt in EXPORT_MEDIA_TYPES if fmt != "parquet" or pq is not None]
+
+
+def select_columns(columns: Sequence[Column], requested: str | None) -> list[Column]:
+    """Return the columns named in the comma-separated ``requested`` list.
+
+    Raises
+    ------
+    ValueError
+        If a requested column is unknown.
+    """
+
+    if not requested:
+        return list(columns)
+    by_name = {column.name: column for column in columns}
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}")
+    return [by_name[name] for name in dict.fromkeys(names)]
+
+
+def projection(columns: Sequence[Column]) -> dict[str, int]:
+    """Mongo projection returning only the fields behind ``columns``."""
+
+    fields = {column.field: 1 for column in columns}
+    if "_id" not in fields:
+        fields["_id"] = 0
+    return fields
+
+
+def _value(doc: dict[str, Any], column: Column) -> Any:
+    value = doc.get(column.field)
+    if value is None:
+        return None
+    kind = column.kind
+    if kind == "epoch" and isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    if kind in {"datetime", "epoch"} and isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if kind == "date" and isinstance(value, datetime):
+        return value.date()
+    if kind == "int":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    if kind == "str" and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _text(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+def _csv_batch(rows: list[list[Any]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([[_text(value) for value in row] for row in rows])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_batch(columns: Sequence[Column], rows: list[list[Any]]) -> bytes:
+    names = [column.name for column in columns]
+    return b"".join(
+        orjson.dumps(dict(zip(names, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows
+    )
+
+
+class _ByteSink:
+    """Write-only file object handing out what was written since last time."""
+
+    closed = False
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._parts.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        return None
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _arrow_schema(columns: Sequence[Column]):
+    types = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+        "epoch": pa.timestamp("us", tz="UTC"),
+        "date": pa.date32(),
+    }
+    return pa.schema([(column.name, types.get(column.kind, pa.string())) for column in columns])
+
+
+async def stream_rows(
+    docs: AsyncIterable[dict[str, Any]],
+    columns: Sequence[Column],
+    fmt: str = "csv",
+    *,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> AsyncIterator[bytes]:
+    """Yield ``docs`` encoded as ``fmt``, one chunk per ``batch_rows`` rows.
+
+    Raises
+    ------
+    ValueError
+        If ``fmt`` is not one of :func:`available_formats`.
+    """
+
+    if fmt not in available_formats():
+        raise ValueError(f"unsupported export format: {fmt}")
+    batch_rows = max(1, batch_rows)
+
+    writer = sink = schema = None
+    if fmt == "parquet":
+        schema = _arrow_schema(columns)
+        sink = _ByteSink()
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    elif fmt == "csv":
+        yield _csv_batch([[column.name for column in columns]])
+
+    def _encode(rows: list[list[Any]]) -> bytes:
+        if fmt == "csv":
+            return _csv_batch(rows)
+        if fmt == "ndjson":
+            return _ndjson_batch(columns, rows)
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+            schema=schema,
+        )
+        writer.write_table(table)
+        return sink.take()
+
+    rows: list[list[Any]] = []
+    try:
+        async for doc in docs:
+            rows.append([_value(doc, column) for column in columns])
+            if len(rows) >= batch_rows:
+                yield _encode(rows)
+                rows = []
+        if rows:
+            yield _encode(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    if sink is not None:
+        yield sink.take()
+
+
+__all__ = [
+    "Column",
+    "EXPORT_MEDIA_TYPES",
+    "available_formats",
+    "projection",
+    "select_columns",
+    "stream_rows",
+]
@@ -0,0 +1,92 @@
+"""Compare the local ANN index against brute force for recall and latency."""
+
+import argparse
+import json
+import tempfile
+import time
+
+import numpy as np
+import structlog
+
+from packages.retrieval.local_index import LocalVectorIndex
+from packages.utils.observability.logging import configure_logging
+
+configure_logging()
+logger = structlog.get_logger(__name__)
+
+
+def _clustered_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Return ``count`` unit vectors drawn around ``clusters`` random centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    data = centres[labels] + 0.35 * rng.normal(size=(count, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def main() -> None:
+    """Build an index, run queries and print recall@k plus latency as JSON."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--min-recall", type=float, default=0.0)
+    args = parser.parse_args()
+
+    data = _clustered_vectors(args.vectors, args.dim, clusters=64, seed=1)
+    queries = _clustered_vectors(args.queries, args.dim, clusters=64, seed=2)
+    ids = [str(idx) for idx in range(args.vectors)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LocalVectorIndex(
+            tmp,
+            encoder=lambda texts: np.zeros((len(texts), args.dim), dtype=np.float32),
+            dim=args.dim,
+            nprobe=args.nprobe,
+            train_threshold=min(2048, args.vectors),
+        )
+        start = time.perf_counter()
+        for offset in range(0, args.vectors, 1000):
+            index.add(ids[offset : offset + 1000], vectors=data[offset : offset + 1000])
+        build_s = time.perf_counter() - start
+
+        ann_ms: list[float] = []
+        exact_ms: list[float] = []
+        hits = 0
+        for query in queries:
+            t0 = time.perf_counter()
+            approx = index.search_vector(query, args.k)
+            t1 = time.perf_counter()
+            exact = index.search_vector(query, args.k, exact=True)
+            t2 = time.perf_counter()
+            ann_ms.append((t1 - t0) * 1000)
+            exact_ms.append((t2 - t1) * 1000)
+            hits += len({doc.id for doc in approx} & {doc.id for doc in exact})
+
+    recall = hits / float(args.k * len(queries)) if queries.size else 0.0
+    result = {
+        "vectors": args.vectors,
+        "dim": args.dim,
+        "k": args.k,
+        "nprobe": args.nprobe,
+        "build_s": round(build_s, 3),
+        "recall_at_k": round(recall, 4),
+        "ann_p50_ms": round(_percentile(ann_ms, 50), 3),
+        "ann_p95_ms": round(_percentile(ann_ms, 95), 3),
+        "brute_p50_ms": round(_percentile(exact_ms, 50), 3),
+        "brute_p95_ms": round(_percentile(exact_ms, 95), 3),
+    }
+    logger.info("result", **result)
+    print(json.dumps(result, ensure_ascii=False))
+    if recall < args.min_recall:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare cache codecs on representative values.
+
+Encodes and decodes sample payloads (hybrid search ``Doc`` lists, prefilter
+``Document`` lists, an LLM answer) with the legacy ``json`` codec and the
+``binary`` codec and prints one JSON line per payload/codec with the mean
+encode/decode time in microseconds and the stored size in bytes.
+"""
+
+import argparse
+import json
+import time
+
+import structlog
+
+from packages.backend import codec
+from packages.core.models import Document
+from packages.retrieval.search import Doc
+from packages.utils.observability.logging import configure_logging
+
+configure_logging()
+logger = structlog.get_logger(__name__)
+
+_TEXT = (
+    "Договор поставки заключается между покупателем и поставщиком на срок "
+    "не менее одного года, условия оплаты указаны в приложении. "
+)
+
+
+def _payloads(docs: int) -> dict[str, object]:
+    hits = [
+        Doc(
+            id=f"doc-{idx}",
+            payload={"text": _TEXT * 3, "url": f"https://example.com/{idx}", "project": "bench"},
+            score=1.0 / (idx + 1),
+        )
+        for idx in range(docs)
+    ]
+    documents = [
+        Document(
+            name=f"file-{idx}.pdf",
+            description=_TEXT,
+            fileId=f"{idx:024x}",
+            url=f"https://example.com/{idx}.pdf",
+            project="bench",
+            size_bytes=1024 * idx,
+        )
+        for idx in range(docs)
+    ]
+    return {
+        "answer_short": "Да, доставка бесплатная.",
+        "answer_long": _TEXT * 40,
+        "hybrid_docs": hits,
+        "prefilter_documents": documents,
+    }
+
+
+def _measure(encode, decode, value: object, rounds: int) -> dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        raw = encode(value)
+    encode_us = (time.perf_counter() - start) / rounds * 1e6
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode(raw)
+    decode_us = (time.perf_counter() - start) / rounds * 1e6
+    size = len(raw.encode("utf-8") if isinstance(raw, str) else raw)
+    return {"encode_us": round(encode_us, 2), "decode_us": round(decode_us, 2), "bytes": size}
+
+
+def main() -> None:
+    """Print encode/decode cost and size for every payload and codec."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    if codec.zstandard is None:
+        logger.warning("zstandard_missing", note="binary codec runs without compression")
+    for name, value in _payloads(args.docs).items():
+        for codec_name in ("json", "binary"):
+            encode, decode = codec.get_codec(codec_name)
+            row = {"payload": name, "codec": codec_name, **_measure(encode, decode, value, args.rounds)}
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Measure the CPU spent turning Mongo rows into models on the read paths.
+
+For the batches one request reads (prefilter ``Document`` rows, a chat
+history of ``ContextMessage``, a reading preview of ``ReadingPage`` with
+segments) prints one JSON line per batch with the mean time per batch in
+microseconds for:
+
+* ``bson_us`` / ``bson_slim_us``: decoding the raw BSON rows as stored and
+  with the read projection (documents without ``excerpt``);
+* ``validate_us``: building the models with validation (what the code does);
+* ``construct_us``: ``model_construct`` without validation;
+* ``dump_us``: the ``model_dump`` copy per row that the knowledge snippet
+  loop used to make.
+
+With pydantic 2 validation runs in pydantic-core and is cheaper than the
+pure-Python ``model_construct``, so the read paths keep validating and
+save work by projecting fewer fields and skipping ``model_dump`` copies.
+"""
+
+import argparse
+import json
+import time
+
+import bson
+
+from packages.core.models import ContextMessage, Document, ReadingPage
+
+_TEXT = (
+    "Договор поставки заключается между покупателем и поставщиком на срок "
+    "не менее одного года, условия оплаты указаны в приложении. "
+)
+
+
+def _records(docs: int, messages: int, pages: int) -> dict[str, tuple[type, list[dict], set[str]]]:
+    documents = [
+        {
+            "name": f"file-{idx}.pdf",
+            "description": _TEXT,
+            "fileId": f"{idx:024x}",
+            "blobId": f"{idx:024x}",
+            "url": f"https://example.com/{idx}.pdf",
+            "ts": 1_700_000_000.0 + idx,
+            "content_type": "text/plain",
+            "project": "bench",
+            "size_bytes": 1024 * idx,
+            "sha256": "0" * 64,
+            "statusMessage": "indexed",
+            "excerpt": (_TEXT * 16)[:2000],
+        }
+        for idx in range(docs)
+    ]
+    history = [
+        {
+            "sessionId": "6c94282b-708e-40f2-ac9c-6f5fc8fe0b7e",
+            "role": "user" if idx % 2 == 0 else "assistant",
+            "number": idx,
+            "text": _TEXT,
+            "project": "bench",
+        }
+        for idx in range(messages)
+    ]
+    reading = [
+        {
+            "url": f"https://example.com/book/{idx}",
+            "order": idx,
+            "title": f"Глава {idx}",
+            "project": "bench",
+            "text": _TEXT * 4,
+            "segments": [{"index": seg, "text": _TEXT, "chars": len(_TEXT)} for seg in range(8)],
+            "images": [{"url": f"https://example.com/book/{idx}.png", "fileId": f"{idx:024x}"}],
+            "segmentCount": 8,
+            "imageCount": 1,
+            "updatedAt": 1_700_000_000.0,
+        }
+        for idx in range(pages)
+    ]
+    return {
+        "search_documents": (Document, documents, {"excerpt"}),
+        "session_history": (ContextMessage, history, set()),
+        "reading_pages": (ReadingPage, reading, set()),
+    }
+
+
+def _measure(build, rows: list, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        [build(row) for row in rows]
+    return round((time.perf_counter() - start) / rounds * 1e6, 2)
+
+
+def main() -> None:
+    """Print the per-batch cost of every way of reading the rows."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    for name, (model, records, skipped) in _records(args.docs, args.messages, args.pages).items():
+        raw = [bson.encode(record) for record in records]
+        slim = [bson.encode({k: v for k, v in record.items() if k not in skipped}) for record in records]
+        rows = [bson.decode(item) for item in slim]
+        models = [model(**row) for row in rows]
+        row = {
+            "batch": name,
+            "rows": len(records),
+            "bytes": sum(map(len, raw)),
+            "slim_bytes": sum(map(len, slim)),
+            "bson_us": _measure(bson.decode, raw, args.rounds),
+            "bson_slim_us": _measure(bson.decode, slim, args.rounds),
+            "validate_us": _measure(lambda item, model=model: model(**item), rows, args.rounds),
+            "construct_us": _measure(lambda item, model=model: model.model_construct(**item), rows, args.rounds),
+            "dump_us": _measure(lambda item: item.model_dump(), models, args.rounds),
+        }
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
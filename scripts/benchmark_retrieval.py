@@ -0,0 +1,156 @@
+"""Benchmark retrieval quality and latency against the local index.
+
+Runs every configuration from :func:`packages.retrieval.evaluation.default_configs`
+(plus reranking when ``--rerank`` is given) and prints one JSON line per
+configuration with recall@k, MRR, per-stage p50/p95 and memory use. The
+dataset is synthetic by default, can be loaded from JSONL (``--dataset``) or
+built from a project's QA pairs in MongoDB (``--mongo-project``).
+
+``--min-recall``/``--min-mrr`` gate the best configuration and
+``--baseline`` compares every configuration with a previous run, so the
+script can fail CI on regressions.
+"""
+
+import argparse
+import asyncio
+import json
+import resource
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+import structlog
+
+from packages.retrieval import evaluation
+from packages.retrieval.local_index import HashingEncoder
+from packages.utils.observability.logging import configure_logging
+
+configure_logging()
+logger = structlog.get_logger(__name__)
+
+
+async def _load_dataset(args: argparse.Namespace) -> evaluation.Dataset:
+    if args.dataset:
+        return evaluation.load_dataset(args.dataset)
+    if args.mongo_project:
+        from packages.core.mongo import MongoClient
+        from packages.core.settings import MongoSettings
+
+        cfg = MongoSettings()
+        mongo = MongoClient(cfg.host, cfg.port, cfg.username, cfg.password, cfg.database, cfg.auth)
+        try:
+            return await evaluation.qa_dataset(mongo, args.mongo_project)
+        finally:
+            await mongo.close()
+    return evaluation.synthetic_dataset(args.docs, args.queries, seed=args.seed)
+
+
+def _snippet_stage():
+    """Return ``_collect_knowledge_snippets`` bound to a Mongo-less request."""
+    try:
+        from apps.api.main import _collect_knowledge_snippets
+    except Exception as exc:  # noqa: BLE001 - API deps are optional here
+        logger.warning("snippets_stage_unavailable", error=str(exc))
+        return None
+    request = SimpleNamespace(state=SimpleNamespace())
+
+    async def run(question: str, project: str | None, limit: int):
+        return await _collect_knowledge_snippets(request, question, project, limit=limit)
+
+    return run
+
+
+def _regressions(results: list[dict], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = {
+            row["config"]: row for row in (json.loads(line) for line in fh if line.strip())
+        }
+    failed = []
+    for row in results:
+        previous = baseline.get(row["config"])
+        if not previous:
+            continue
+        for metric in ("recall_at_k", "mrr"):
+            if row[metric] < previous[metric] - tolerance:
+                failed.append(f"{row['config']}:{metric}")
+    return failed
+
+
+async def main() -> None:
+    """Evaluate all configurations and print metrics as JSON lines."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", help="JSONL dataset (see evaluation.load_dataset)")
+    parser.add_argument("--mongo-project", help="build the dataset from this project's QA pairs")
+    parser.add_argument("--save-dataset", help="write the dataset used to this JSONL path")
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--rerank", action="store_true", help="also run reranked configurations")
+    parser.add_argument("--no-snippets", action="store_true")
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="trace Python allocations (slows every stage, so latencies are not comparable)",
+    )
+    parser.add_argument("--min-recall", type=float, default=0.0)
+    parser.add_argument("--min-mrr", type=float, default=0.0)
+    parser.add_argument(
+        "--max-hybrid-p95-ms", type=float, default=0.0, help="fail if any config's hybrid p95 exceeds this"
+    )
+    parser.add_argument("--baseline", help="previous output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.02)
+    args = parser.parse_args()
+
+    dataset = await _load_dataset(args)
+    if args.save_dataset:
+        evaluation.dump_dataset(dataset, args.save_dataset)
+    configs = evaluation.default_configs(args.k)
+    if args.rerank:
+        configs += [
+            evaluation.RetrievalConfig(f"{cfg.name}-rerank", cfg.fusion, cfg.k, rerank=True)
+            for cfg in configs
+            if cfg.name.endswith("balanced-d50")
+        ]
+    snippets = None if args.no_snippets else _snippet_stage()
+
+    if args.memory:
+        tracemalloc.start()
+    results: list[dict] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        index = evaluation.build_index(dataset, tmp, encoder=HashingEncoder(dim=args.dim), dim=args.dim)
+        index_kb = round(tracemalloc.get_traced_memory()[1] / 1024, 1) if args.memory else None
+        for config in configs:
+            row = await evaluation.evaluate(index, dataset.queries, config, snippets=snippets)
+            row["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if index_kb is not None:
+                row["index_mem_kb"] = index_kb
+            results.append(row)
+            logger.info("result", config=config.name, recall=row["recall_at_k"], mrr=row["mrr"])
+            print(json.dumps(row, ensure_ascii=False))
+    if args.memory:
+        tracemalloc.stop()
+
+    failed: list[str] = []
+    best_recall = max((row["recall_at_k"] for row in results), default=0.0)
+    best_mrr = max((row["mrr"] for row in results), default=0.0)
+    if best_recall < args.min_recall:
+        failed.append("min_recall")
+    if best_mrr < args.min_mrr:
+        failed.append("min_mrr")
+    if args.max_hybrid_p95_ms > 0:
+        failed += [
+            f"{row['config']}:hybrid_p95"
+            for row in results
+            if row["stages"]["hybrid"]["p95_ms"] > args.max_hybrid_p95_ms
+        ]
+    if args.baseline:
+        failed += _regressions(results, args.baseline, args.tolerance)
+    if failed:
+        logger.error("benchmark_gate_failed", failed=failed)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""Compare Mongo round trips per chat turn for both session layouts.
+
+A turn is what the chat endpoint does: read the history, then append the
+user question and the assistant answer. Every command sent to MongoDB is
+counted with a :mod:`pymongo.monitoring` listener. Prints one JSON line per
+layout with commands per turn and turn latency percentiles. Needs a running
+MongoDB (``MONGO_*`` settings); scratch collections are dropped afterwards.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import numpy as np
+import structlog
+from pymongo import monitoring
+
+from packages.core.mongo import MongoClient, NotFound
+from packages.core.settings import MongoSettings
+from packages.utils.observability.logging import configure_logging
+
+configure_logging()
+logger = structlog.get_logger(__name__)
+
+
+class _CommandCounter(monitoring.CommandListener):
+    def __init__(self) -> None:
+        self.count = 0
+
+    def started(self, event) -> None:
+        self.count += 1
+
+    def succeeded(self, event) -> None:
+        pass
+
+    def failed(self, event) -> None:
+        pass
+
+
+async def _turn(mongo: MongoClient, collection: str, session: str, keep: int, idx: int) -> None:
+    try:
+        [message async for message in mongo.get_sessions(collection, session)]
+    except NotFound:
+        pass
+    await mongo.append_session_message(collection, session, "user", f"question {idx}", keep=keep)
+    await mongo.append_session_message(collection, session, "assistant", f"answer {idx}", keep=keep)
+
+
+async def main() -> None:
+    """Run ``--turns`` turns over ``--sessions`` sessions for each layout."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=15)
+    parser.add_argument("--keep", type=int, default=10)
+    args = parser.parse_args()
+
+    counter = _CommandCounter()
+    monitoring.register(counter)
+    cfg = MongoSettings()
+    mongo = MongoClient(cfg.host, cfg.port, cfg.username, cfg.password, cfg.database, cfg.auth)
+    try:
+        for layout in ("message", "document"):
+            mongo.session_layout = layout
+            collection = f"bench_contexts_{layout}"
+            await mongo.db[collection].drop()
+            if layout == "message":
+                await mongo.db[collection].create_index([("sessionId", 1), ("number", 1)])
+            sessions = [str(uuid.uuid4()) for _ in range(args.sessions)]
+            latencies: list[float] = []
+            counter.count = 0
+            for idx in range(args.turns):
+                for session in sessions:
+                    start = time.perf_counter()
+                    await _turn(mongo, collection, session, args.keep, idx)
+                    latencies.append((time.perf_counter() - start) * 1000)
+            row = {
+                "layout": layout,
+                "turns": len(latencies),
+                "commands_per_turn": round(counter.count / max(len(latencies), 1), 2),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+                "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            }
+            logger.info("result", **row)
+            print(json.dumps(row))
+            await mongo.db[collection].drop()
+    finally:
+        await mongo.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""Migrate chat sessions to the single-document layout.
+
+Groups the per-message ``contexts`` documents into one capped document per
+session (see ``MONGO_SESSION_LAYOUT=document``). Run it before switching the
+layout; re-running is safe because session documents that are already ahead
+of the message documents (live sessions) are left untouched. Pass
+``--delete`` once the new layout is live to drop the old message documents.
+"""
+
+import argparse
+import asyncio
+import json
+
+import structlog
+
+from packages.core.mongo import MongoClient
+from packages.core.settings import MongoSettings
+from packages.utils.observability.logging import configure_logging
+
+configure_logging()
+logger = structlog.get_logger(__name__)
+
+
+async def main() -> None:
+    """Run the migration and print its counters as JSON."""
+    cfg = MongoSettings()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", default=cfg.contexts)
+    parser.add_argument("--target", help="write session documents here (default: same collection)")
+    parser.add_argument("--keep", type=int, default=10, help="messages kept per session")
+    parser.add_argument("--delete", action="store_true", help="remove migrated message documents")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    mongo = MongoClient(cfg.host, cfg.port, cfg.username, cfg.password, cfg.database, cfg.auth)
+    try:
+        summary = await mongo.migrate_sessions_to_documents(
+            args.collection,
+            target=args.target,
+            keep=args.keep,
+            delete=args.delete,
+            batch_size=args.batch_size,
+        )
+    finally:
+        await mongo.close()
+    logger.info("sessions_migrated", **summary)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
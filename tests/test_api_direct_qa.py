@@ -0,0 +1,105 @@
+"""Direct FAQ answers streamed by ``/chat`` without calling the LLM."""
+
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from apps.api import main as api_main
+from packages.core.models import Project
+
+
+class _FakeMongo:
+    def __init__(self, project: Project):
+        self.project = project
+        self.thresholds: list[float] = []
+        self.messages: list[tuple[str, str]] = []
+        self.stats: list[dict] = []
+
+    async def get_project(self, name):
+        return self.project
+
+    async def get_sessions(self, collection, session_id):
+        for _ in ():
+            yield _
+
+    async def append_session_message(self, collection, session_id, role, text, **kwargs):
+        self.messages.append((role, text))
+
+    async def match_qa_pair(self, question, project, *, min_score):
+        self.thresholds.append(min_score)
+        if "доставк" not in question:
+            return None
+        return {"id": "qa1", "question": "Сколько стоит доставка?", "answer": "Доставка бесплатная.", "score": 0.93}
+
+    async def log_request_stat(self, **kwargs):
+        self.stats.append(kwargs)
+
+
+def _client(mongo: _FakeMongo) -> TestClient:
+    app = FastAPI()
+
+    @app.middleware("http")
+    async def _state(request: Request, call_next):
+        request.state.mongo = mongo
+        return await call_next(request)
+
+    app.include_router(api_main.llm_router)
+    return TestClient(app)
+
+
+def _events(body: str) -> list[tuple[str | None, str]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        name = None
+        data = ""
+        for line in block.splitlines():
+            if line.startswith("event: "):
+                name = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = line[len("data: "):]
+        events.append((name, data))
+    return events
+
+
+def test_confident_match_is_streamed_without_llm(monkeypatch) -> None:
+    async def _no_llm(*args, **kwargs):
+        raise AssertionError("LLM must not be called")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(api_main.llm_client, "generate", _no_llm)
+    mongo = _FakeMongo(Project(name="shop", qa_direct_enabled=True, qa_direct_threshold=0.9))
+
+    response = _client(mongo).get("/llm/chat", params={"question": "сколько стоит доставка", "project": "shop"})
+
+    assert response.headers["X-Model-Name"] == "qa"
+    events = _events(response.text)
+    assert events[0][0] == "meta"
+    meta = json.loads(events[0][1])
+    assert meta["source"] == "qa" and meta["qa"]["id"] == "qa1"
+    assert json.loads(events[1][1]) == {"text": "Доставка бесплатная.", "role": "assistant", "meta": {"source": "qa"}}
+    assert events[-1] == ("end", "[DONE]")
+    assert mongo.thresholds == [0.9]
+    assert mongo.messages[-1] == ("assistant", "Доставка бесплатная.")
+    assert mongo.stats[0]["prompt_chars"] == 0
+
+
+def test_paraphrase_streams_llm_tokens(monkeypatch) -> None:
+    prompts: list[str] = []
+
+    async def _generate(prompt, model=None):
+        prompts.append(prompt)
+        for token in ("Доставим ", "бесплатно."):
+            yield token
+
+    monkeypatch.setattr(api_main.llm_client, "generate", _generate)
+    mongo = _FakeMongo(Project(name="shop", qa_direct_enabled=True, qa_direct_paraphrase=True))
+
+    response = _client(mongo).get("/llm/chat", params={"question": "доставка", "project": "shop"})
+
+    events = _events(response.text)
+    assert json.loads(events[0][1])["paraphrased"] is True
+    assert [json.loads(data)["text"] for name, data in events[1:3]] == ["Доставим ", "бесплатно."]
+    assert "Доставка бесплатная." in prompts[0]
+    assert mongo.thresholds == [api_main._QA_DIRECT_THRESHOLD]
+    assert mongo.messages[-1] == ("assistant", "Доставим бесплатно.")
@@ -0,0 +1,196 @@
+"""Tests for GridFS payload compression."""
+
+import random
+import types
+
+import pytest
+from bson import ObjectId
+
+from packages.core import blobs
+from packages.core.mongo import MongoClient
+
+_WORDS = "привет мир это проверка сжатия текста документ страница поиск ответ".split()
+_RNG = random.Random(7)
+TEXT = " ".join(_RNG.choice(_WORDS) for _ in range(40_000)).encode("utf-8")
+
+
+def test_text_payloads_are_compressed_and_round_trip():
+    data, metadata = blobs.encode_payload(TEXT, "text/plain; charset=utf-8")
+
+    assert metadata["codec"] in {"zstd", "zlib"}
+    assert metadata["raw_length"] == len(TEXT)
+    assert len(data) < len(TEXT) // 4
+    chunks = [data[i : i + 100] for i in range(0, len(data), 100)]
+    assert b"".join(blobs.iter_decoded(chunks, metadata["codec"])) == TEXT
+
+
+def test_binary_and_small_payloads_are_stored_plain():
+    assert blobs.encode_payload(TEXT, "application/pdf") == (TEXT, {})
+    assert blobs.encode_payload(b"short text", "text/plain") == (b"short text", {})
+
+
+@pytest.mark.asyncio
+async def test_get_gridfs_file_decompresses_head_reads():
+    data, metadata = blobs.encode_payload(TEXT, "text/plain")
+    chunk_size = 4096
+
+    class _Stream:
+        def __init__(self):
+            self.metadata = metadata
+            self.offset = 0
+
+        async def readchunk(self):
+            chunk = data[self.offset : self.offset + chunk_size]
+            self.offset += len(chunk)
+            return chunk
+
+        def close(self):
+            pass
+
+    streams = []
+
+    async def _open(file_id):
+        streams.append(_Stream())
+        return streams[-1]
+
+    mc = MongoClient.__new__(MongoClient)
+    mc.gridfs = types.SimpleNamespace(open_download_stream=_open)
+
+    assert await mc.get_gridfs_file(str(ObjectId())) == TEXT
+    assert await mc.get_gridfs_file(str(ObjectId()), max_bytes=100) == TEXT[:100]
+    assert streams[1].offset < len(data)
+
+
+class _GridOut:
+    """Motor ``GridOut`` stand-in serving ``data`` in fixed-size chunks."""
+
+    def __init__(self, data, metadata=None, chunk_size=4096):
+        self.data = data
+        self.metadata = metadata or {}
+        self.chunk_size = chunk_size
+        self.position = 0
+        self.closed = False
+
+    def seek(self, position):
+        self.position = position
+
+    async def readchunk(self):
+        end = (self.position // self.chunk_size + 1) * self.chunk_size
+        chunk = self.data[self.position : end]
+        self.position += len(chunk)
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+async def _collect(iterator):
+    return b"".join([chunk async for chunk in iterator])
+
+
+@pytest.mark.asyncio
+async def test_iter_gridfs_file_serves_ranges_of_plain_and_compressed_files():
+    data, metadata = blobs.encode_payload(TEXT, "text/plain")
+    mc = MongoClient.__new__(MongoClient)
+
+    for stored, meta in ((TEXT, {}), (data, metadata)):
+        assert await _collect(mc.iter_gridfs_file(_GridOut(stored, meta))) == TEXT
+        grid_out = _GridOut(stored, meta)
+        ranged = await _collect(mc.iter_gridfs_file(grid_out, start=5000, stop=9001))
+        assert ranged == TEXT[5000:9001]
+        assert grid_out.closed
+
+
+@pytest.mark.asyncio
+async def test_put_blob_stream_uploads_chunks_and_reuses_existing_blob():
+    class _GridIn:
+        def __init__(self, metadata):
+            self._id = ObjectId()
+            self.metadata = metadata
+            self.parts = []
+
+        async def write(self, data):
+            self.parts.append(data)
+
+        async def close(self):
+            pass
+
+    class _Bucket:
+        def __init__(self):
+            self.uploads = []
+            self.deleted = []
+
+        def open_upload_stream(self, filename, metadata=None):
+            self.uploads.append(_GridIn(metadata))
+            return self.uploads[-1]
+
+        async def delete(self, file_id):
+            self.deleted.append(file_id)
+
+    class _Records:
+        def __init__(self):
+            self.records = {}
+
+        async def find_one_and_update(self, filter, update, projection=None):
+            record = self.records.get(filter["_id"])
+            if record:
+                record["refs"] += 1
+            return record
+
+        async def insert_one(self, doc):
+            self.records[doc["_id"]] = doc
+
+        async def update_one(self, filter, update):
+            pass
+
+    async def _chunks():
+        for offset in range(0, len(TEXT), 65536):
+            yield TEXT[offset : offset + 65536]
+
+    records = _Records()
+    mc = MongoClient.__new__(MongoClient)
+    mc.gridfs = _Bucket()
+    mc.db = {"blobs": records, "fs.files": records}
+
+    blob_id, digest, size = await mc.put_blob_stream(_chunks(), filename="a.txt", content_type="text/plain")
+    assert size == len(TEXT) and digest == blobs.payload_sha256(TEXT)
+    upload = mc.gridfs.uploads[0]
+    assert b"".join(blobs.iter_decoded(upload.parts, upload.metadata["codec"])) == TEXT
+
+    again, _, _ = await mc.put_blob_stream(_chunks(), filename="b.txt", content_type="text/plain")
+    assert again == blob_id
+    assert mc.gridfs.deleted == [mc.gridfs.uploads[1]._id]
+    assert records.records[digest]["refs"] == 2
+
+    # A failed blob record leaves nothing behind in GridFS.
+    async def _insert_failed(doc):
+        raise RuntimeError("mongo down")
+
+    async def _other():
+        yield b"other payload"
+
+    records.insert_one = _insert_failed
+    with pytest.raises(RuntimeError):
+        await mc.put_blob_stream(_other(), filename="c.txt", content_type="text/plain")
+    assert mc.gridfs.deleted[-1] == mc.gridfs.uploads[2]._id
+
+
+def test_crawler_keeps_the_replaced_blob_until_the_document_is_written(monkeypatch):
+    from packages.crawler import run_crawl
+
+    released = []
+    monkeypatch.setattr(run_crawl, "put_blob_sync", lambda *args, **kwargs: ("new-blob", "digest"))
+    monkeypatch.setattr(run_crawl, "release_blob_sync", lambda db, gridfs, blob_id: released.append(blob_id))
+
+    class _Documents:
+        def find_one(self, query, projection=None):
+            return {"fileId": "f1", "blobId": "old-blob", "sha256": "stale"}
+
+    file_id, fields, previous, replaced = run_crawl._store_blob(
+        {}, None, _Documents(), {"url": "u"}, b"changed", filename="u.txt", content_type="text/plain"
+    )
+    assert (file_id, fields["blobId"], replaced) == ("f1", "new-blob", "old-blob")
+    assert released == []
+
+    run_crawl._release_blobs({}, None, [replaced])
+    assert released == ["old-blob"]
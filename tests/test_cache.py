@@ -8,7 +8,7 @@ import json
 from dataclasses import dataclass
 import pytest
 
-module_path = Path(__file__).resolve().parents[1] / "backend" / "cache.py"
+module_path = Path(__file__).resolve().parents[1] / "packages" / "backend" / "cache.py"
 spec = importlib.util.spec_from_file_location("backend.cache", module_path)
 cache = importlib.util.module_from_spec(spec)
 sys.modules[spec.name] = cache
@@ -44,7 +44,9 @@ class FakeRedis:
 
     async def get(self, key):
         val = self.store.get(key)
-        return None if val is None else val.encode()
+        if val is None or isinstance(val, bytes):
+            return val
+        return val.encode()
 
     async def setex(self, key, ttl, value):
         self.store[key] = value
@@ -101,3 +103,151 @@ async def test_cache_serializes_dataclass(monkeypatch):
     data = json.loads(stored)
     assert data["__cls__"].endswith("Sample")
     assert data["x"] == 1
+
+
+class CountingRedis(FakeRedis):
+    """FakeRedis recording reads and published messages."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+        self.published = []
+
+    async def get(self, key):
+        self.reads += 1
+        return await super().get(key)
+
+    async def delete(self, key):
+        self.store.pop(key, None)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
+
+
+@pytest.mark.asyncio
+async def test_local_tier_serves_hot_keys(monkeypatch):
+    """Repeated lookups are answered in-process without touching Redis."""
+    redis = CountingRedis()
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    tier = cache.TwoTierCache("test-hot", local_ttl=60, local_maxsize=2)
+
+    await tier.set("k", {"a": 1})
+    assert await tier.get("k") == {"a": 1}
+    assert await tier.get("k") == {"a": 1}
+    assert redis.reads == 0
+
+    tier.local.clear()
+    assert await tier.get("k") == {"a": 1}
+    assert redis.reads == 1
+    hits = cache.cache_requests.labels("test-hot", "local", "hit")._value.get()
+    assert hits == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_is_broadcast_and_applied(monkeypatch):
+    """Deletes publish a message; messages from other replicas evict locally."""
+    redis = CountingRedis()
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    tier = cache.get_cache("test-inval")
+
+    await tier.set("k", "v")
+    await tier.delete("k")
+    channel, message = redis.published[-1]
+    assert channel == cache.INVALIDATION_CHANNEL
+    assert message["ns"] == "test-inval" and message["key"] == "k"
+    assert await tier.get("k") is None
+
+    tier.local.set("other", "stale")
+    remote = json.dumps({"ns": "test-inval", "key": None, "origin": "replica-2"})
+    cache._apply_invalidation(remote.encode())
+    assert len(tier.local) == 0
+
+
+class GenerationRedis(CountingRedis):
+    """CountingRedis with ``incr`` for generation counters."""
+
+    async def get(self, key):
+        self.reads += 1
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+    async def incr(self, key):
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode()
+        return value
+
+
+@pytest.mark.asyncio
+async def test_generation_bump_rotates_project_keys(monkeypatch):
+    """Bumping a project changes its keys and the global ones, not others."""
+    redis = GenerationRedis()
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    cache.clear_local_caches()
+
+    shop = await cache.scoped_key("rewrite", "Shop", "abc")
+    other = await cache.scoped_key("rewrite", "other", "abc")
+    unscoped = await cache.scoped_key("rewrite", None, "abc")
+    assert shop == "rewrite:shop:g0:abc"
+
+    await cache.bump_generation("shop")
+
+    assert await cache.scoped_key("rewrite", "shop", "abc") == "rewrite:shop:g1:abc"
+    assert await cache.scoped_key("rewrite", None, "abc") != unscoped
+    assert await cache.scoped_key("rewrite", "other", "abc") == other
+    assert {msg["key"] for _, msg in redis.published} == {"cache:gen:shop", "cache:gen:-"}
+
+
+def test_generation_bump_sync_publishes():
+    """The worker helper increments counters and notifies replicas."""
+
+    class SyncRedis:
+        def __init__(self):
+            self.incremented = []
+            self.published = []
+
+        def incr(self, key):
+            self.incremented.append(key)
+
+        def publish(self, channel, message):
+            self.published.append(json.loads(message)["key"])
+
+    client = SyncRedis()
+    cache.bump_generations_sync(client, {"Shop"})
+
+    assert sorted(client.incremented) == ["cache:gen:-", "cache:gen:shop"]
+    assert sorted(client.published) == sorted(client.incremented)
+
+
+@pytest.mark.asyncio
+async def test_generation_bump_invalidates_only_that_projects_responses(monkeypatch):
+    """Responses cached under ``current_project`` follow its generation."""
+    redis = GenerationRedis()
+    monkeypatch.setattr(cache, "_get_redis", lambda: redis)
+    cache.clear_local_caches()
+
+    calls: list[tuple[str | None, str]] = []
+
+    @cache.cache_response
+    async def answer(q):
+        calls.append((cache.current_project.get(), q))
+        return q + "!"
+
+    async def ask(project):
+        token = cache.current_project.set(project)
+        try:
+            return await answer("hi")
+        finally:
+            cache.current_project.reset(token)
+
+    await ask("a")
+    await ask("b")
+    await ask("a")
+    await ask("b")
+    assert calls == [("a", "hi"), ("b", "hi")]
+
+    await cache.bump_generation("a")
+    await ask("a")
+    await ask("b")
+    assert calls == [("a", "hi"), ("b", "hi"), ("a", "hi")]
@@ -0,0 +1,59 @@
+"""Tests for the cache value codecs."""
+
+import json
+from collections import namedtuple
+from dataclasses import dataclass
+
+import pytest
+
+from packages.backend import codec
+
+
+Pair = namedtuple("Pair", ["speaker", "text"])
+codec.register_type(Pair, "test.Pair")
+
+
+@dataclass
+class Hit:
+    id: str
+    score: float = 0.0
+
+
+codec.register_type(Hit, "test.Hit")
+
+
+@dataclass
+class Unregistered:
+    x: int
+
+
+def test_registered_types_round_trip():
+    value = {"answer": Pair("bot", "hi"), "hits": [Hit("a", 0.5), Hit("b")]}
+    raw = codec.encode(value)
+
+    assert json.loads(raw)["answer"] == {"__t": "test.Pair", "v": ["bot", "hi"]}
+    assert codec.decode(raw) == value
+    assert isinstance(codec.decode(raw)["answer"], Pair)
+
+
+def test_unregistered_and_legacy_values_decode():
+    raw = codec.encode(Unregistered(3))
+    assert json.loads(raw)["__cls__"].endswith("Unregistered")
+    assert codec.decode(raw) == Unregistered(3)
+    # Entries written by the json codec stay readable after switching.
+    assert codec.decode(codec.json_encode([Unregistered(4)])) == [Unregistered(4)]
+    assert codec.decode(b'{"text": "plain"}') == {"text": "plain"}
+
+
+def test_large_values_are_compressed(monkeypatch):
+    if codec.zstandard is None:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setattr(codec, "ZSTD_THRESHOLD", 256)
+    text = "ответ " * 200
+
+    raw = codec.encode(text)
+
+    assert raw[:4] == codec._ZSTD_MAGIC
+    assert len(raw) < len(text)
+    assert codec.decode(raw) == text
+    assert codec.encode("short")[:1] == b'"'
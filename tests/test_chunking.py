@@ -0,0 +1,109 @@
+"""Tests for passage chunking of indexed documents."""
+
+from langchain_core.embeddings import Embeddings
+
+from apps.worker.main import purge_deleted_chunks, replace_document_chunks
+from packages.core.models import Document
+from packages.core.vectors import CachedEmbeddings
+from packages.knowledge.chunking import split_passages
+
+
+def test_passages_cover_text_with_offsets():
+    paragraphs = [f"Paragraph {n}. " + "word " * 60 for n in range(10)]
+    text = "\n\n".join(paragraphs)
+
+    passages = split_passages("doc", text, size=500, overlap=80)
+
+    assert len(passages) > 3
+    assert [p.id for p in passages] == [f"doc#{i}" for i in range(len(passages))]
+    for passage in passages:
+        assert len(passage.text) <= 500
+        assert text[passage.offset : passage.offset + len(passage.text)] == passage.text
+    assert passages[-1].text.endswith(text.strip()[-20:])
+
+
+def test_short_tail_is_folded_into_previous_passage():
+    text = "a" * 90 + " " + "b" * 90 + " tail"
+
+    passages = split_passages("doc", text, size=100, overlap=0, min_chars=10)
+
+    assert passages[-1].text.endswith("tail")
+    assert all(len(p.text) >= 10 for p in passages)
+
+
+def test_zero_size_keeps_whole_document_id():
+    passages = split_passages("doc", "some text", size=0)
+    assert [(p.id, p.text) for p in passages] == [("doc", "some text")]
+    assert split_passages("doc", "   ") == []
+
+
+class _CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+    def embed_query(self, text):
+        return [0.0]
+
+
+def test_cached_embeddings_embed_repeated_passages_once():
+    inner = _CountingEmbeddings()
+    cached = CachedEmbeddings(inner, maxsize=10)
+
+    assert cached.embed_documents(["menu", "body", "menu"]) == [[4.0], [4.0], [4.0]]
+    assert cached.embed_documents(["menu", "footer"]) == [[4.0], [6.0]]
+    assert inner.calls == [["menu", "body"], ["footer"]]
+    assert cached.hits == 2
+
+
+class _FakeChunks:
+    def __init__(self, ids):
+        self.records = {record_id: {"_id": record_id, "docId": "f1"} for record_id in ids}
+
+    def find(self, query, projection=None):
+        return [r for r in self.records.values() if all(r.get(key) == value for key, value in query.items())]
+
+    def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            self.records[op._filter["_id"]] = op._doc
+
+    def delete_many(self, query):
+        for record_id in query["_id"]["$in"]:
+            self.records.pop(record_id, None)
+
+
+def test_replace_document_chunks_reports_stale_vectors():
+    document = Document(name="a.txt", description="", fileId="f1", url="https://x", project="p")
+    passages = split_passages("f1", "alpha " * 40, size=100, overlap=0)
+    assert len(passages) >= 2
+
+    assert replace_document_chunks(_FakeChunks([]), document, passages) == {"f1"}
+
+    chunks = _FakeChunks(["f1#0", "f1#1", "f1#7"])
+    stale = replace_document_chunks(chunks, document, passages[:1])
+    assert stale == {"f1#1", "f1#7"}
+    assert set(chunks.records) == {"f1#0"}
+    assert chunks.records["f1#0"]["project"] == "p"
+
+
+def test_purge_deleted_chunks_removes_vectors_then_records():
+    class _VectorStore:
+        def __init__(self):
+            self.deleted = []
+
+        def delete_vectors(self, ids, *, project=None):
+            self.deleted.append((project, sorted(ids)))
+
+    chunks = _FakeChunks(["f1#0", "f1#1", "f2#0"])
+    chunks.records["f2#0"]["docId"] = "f2"
+    for record_id in ("f1#0", "f1#1"):
+        chunks.records[record_id].update(deleted=True, project="p")
+    chunks.records["f1"] = {"_id": "f1", "docId": "f1", "project": "p", "deleted": True}
+    store = _VectorStore()
+
+    assert purge_deleted_chunks(chunks, store) == 3
+    assert store.deleted == [("p", ["f1", "f1#0", "f1#1"])]
+    assert set(chunks.records) == {"f2#0"}
@@ -50,7 +50,7 @@ class _FakeMongo:
     async def list_projects(self):
         return []
 
-    async def aggregate_request_stats(self, *, project=None, start=None, end=None, channel=None):
+    async def aggregate_request_stats(self, *, project=None, start=None, end=None, channel=None, granularity="day"):
         return [
             {
                 "date": "2024-05-01",
@@ -60,7 +60,7 @@ class _FakeMongo:
             }
         ]
 
-    async def iter_request_stats(self, *, project=None, start=None, end=None, channel=None):
+    async def iter_request_stats(self, *, project=None, start=None, end=None, channel=None, projection=None, include_archive=False):
         for item in self._stats:
             yield item
 
@@ -0,0 +1,70 @@
+"""Tests for streaming tabular exports."""
+
+import io
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from packages.utils import export
+from packages.utils.export import Column, projection, select_columns, stream_rows
+
+COLUMNS = (
+    Column("timestamp", "ts", "datetime"),
+    Column("hits", "hits", "int"),
+    Column("updated_at", "updated_at", "epoch"),
+    Column("question", "question"),
+)
+
+
+async def _docs(count):
+    for n in range(count):
+        yield {
+            "ts": datetime(2024, 5, 1, tzinfo=timezone.utc),
+            "hits": n,
+            "updated_at": 1714521600.0,
+            "question": None if n == 1 else f"q{n}",
+        }
+
+
+async def _collect(fmt, columns=COLUMNS, count=5, batch_rows=2):
+    return [chunk async for chunk in stream_rows(_docs(count), columns, fmt, batch_rows=batch_rows)]
+
+
+@pytest.mark.asyncio
+async def test_csv_is_streamed_per_batch():
+    chunks = await _collect("csv")
+
+    assert len(chunks) == 4  # header + 3 batches
+    lines = b"".join(chunks).decode().splitlines()
+    assert lines[0] == "timestamp,hits,updated_at,question"
+    assert lines[1] == "2024-05-01T00:00:00+00:00,0,2024-05-01T00:00:00+00:00,q0"
+    assert lines[2].endswith(",1,2024-05-01T00:00:00+00:00,")
+
+
+@pytest.mark.asyncio
+async def test_ndjson_uses_selected_columns():
+    columns = select_columns(COLUMNS, "question,hits")
+    rows = [json.loads(line) for line in b"".join(await _collect("ndjson", columns)).splitlines()]
+
+    assert rows[0] == {"question": "q0", "hits": 0}
+    assert rows[1] == {"question": None, "hits": 1}
+    assert projection(columns) == {"question": 1, "hits": 1, "_id": 0}
+    with pytest.raises(ValueError):
+        select_columns(COLUMNS, "question,secret")
+
+
+@pytest.mark.asyncio
+async def test_parquet_writes_one_row_group_per_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+    if "parquet" not in export.available_formats():
+        pytest.skip("pyarrow unavailable")
+
+    data = b"".join(await _collect("parquet"))
+
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.num_row_groups == 3
+    table = parquet.read()
+    assert table.column_names == ["timestamp", "hits", "updated_at", "question"]
+    assert table.column("hits").to_pylist() == [0, 1, 2, 3, 4]
+    assert table.column("question").to_pylist()[1] is None
@@ -0,0 +1,113 @@
+"""Tests for the vectorized hybrid retrieval fusion stage."""
+
+import asyncio
+
+import pytest
+
+from packages.retrieval import fusion, search
+from packages.retrieval.search import Doc
+
+
+def _docs(*ids, scores=None):
+    scores = scores or [0.0] * len(ids)
+    return [Doc(doc_id, {"text": doc_id}, score) for doc_id, score in zip(ids, scores)]
+
+
+def test_rrf_matches_reference_order():
+    legs = {"dense": _docs("A", "B", "C"), "bm25": _docs("C", "A", "D")}
+    result = fusion.fuse_scores(legs, 4, fusion.FusionConfig())
+    assert result.ids == ["A", "C", "B", "D"]
+    assert result.scores[0] == pytest.approx(1 / 61 + 1 / 62)
+    assert result.payloads[0] == {"text": "A"}
+
+
+def test_weights_shift_ranking_towards_leg():
+    legs = {"dense": _docs("A", "B"), "bm25": _docs("B", "A")}
+    config = fusion.FusionConfig(weights={"dense": 1.0, "bm25": 3.0})
+    assert fusion.fuse_scores(legs, 2, config).ids == ["B", "A"]
+
+
+def test_score_fusion_normalises_each_leg():
+    legs = {
+        "dense": _docs("A", "B", scores=[0.9, 0.1]),
+        "bm25": _docs("B", "C", scores=[40.0, 20.0]),
+    }
+    result = fusion.fuse_scores(legs, 3, fusion.FusionConfig(method="score"))
+    assert result.ids == ["A", "B", "C"]
+    assert list(result.scores) == pytest.approx([1.0, 1.0, 0.0])
+
+
+def test_gap_and_project_config():
+    legs = {"dense": _docs("A", "B", "C")}
+    result = fusion.fuse_scores(legs, 1)
+    assert result.candidates == 3
+    assert result.gap == pytest.approx((1 / 61 - 1 / 62) / (1 / 61))
+
+    fusion.set_project_config("Shop", {"method": "score", "min_depth": 5})
+    try:
+        assert fusion.get_config("shop").method == "score"
+        assert fusion.get_config("shop").min_depth == 5
+        assert fusion.get_config("other") is fusion.get_config()
+    finally:
+        fusion.set_project_config("shop", None)
+    with pytest.raises(ValueError):
+        fusion.FusionConfig.from_mapping({"method": "bogus"})
+
+
+class _DeepBackend:
+    """Backend whose ranking is only separable once enough depth is fetched."""
+
+    def __init__(self):
+        self.depths = []
+
+    def similarity(self, query, top, method):
+        self.depths.append(top)
+        ids = [f"d{i}" for i in range(200)]
+        if method == "bm25":
+            ids = list(reversed(ids))
+        return _docs(*ids[:top])
+
+
+def test_hybrid_search_expands_depth_on_small_gap(monkeypatch):
+    backend = _DeepBackend()
+    monkeypatch.setattr(search, "qdrant", backend)
+    config = fusion.FusionConfig(min_depth=10, max_depth=40, gap_threshold=0.5)
+
+    docs = asyncio.run(search.hybrid_search("q", k=2, config=config))
+
+    assert len(docs) == 2
+    assert backend.depths == [10, 10, 40, 40]
+
+
+class _AgreeingBackend:
+    """Both legs return the same ranking."""
+
+    def __init__(self):
+        self.depths = []
+
+    def similarity(self, query, top, method):
+        self.depths.append(top)
+        return _docs(*[f"d{i}" for i in range(top)])
+
+
+def test_hybrid_search_default_config_runs_single_round(monkeypatch):
+    backend = _AgreeingBackend()
+    monkeypatch.setattr(search, "qdrant", backend)
+    monkeypatch.setattr(fusion, "get_config", lambda project=None: fusion.FusionConfig())
+
+    docs = asyncio.run(search.hybrid_search("q", k=10))
+
+    assert [doc.id for doc in docs] == [f"d{i}" for i in range(10)]
+    assert backend.depths == [50, 50]
+
+
+def test_rrf_settled_accounts_for_hits_beyond_depth():
+    config = fusion.FusionConfig()
+    agreeing = {"dense": _docs("A", "B", "C"), "bm25": _docs("A", "B", "C")}
+    assert fusion.fuse_scores(agreeing, 1, config, depth=3).settled
+
+    # "C" ties with "A" and could still gain 1/63 from a deeper dense leg.
+    split = {"dense": _docs("A", "B"), "bm25": _docs("C", "D")}
+    assert not fusion.fuse_scores(split, 1, config, depth=2).settled
+    # Legs shorter than the requested depth have nothing more to return.
+    assert fusion.fuse_scores(split, 1, config, depth=5).settled
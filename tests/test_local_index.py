@@ -0,0 +1,162 @@
+"""Tests for the built-in local ANN index."""
+
+import asyncio
+
+import numpy as np
+
+from packages.retrieval import search
+from packages.retrieval.local_index import HashingEncoder, LocalVectorIndex
+
+
+def _unit(rows):
+    data = np.asarray(rows, dtype=np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def test_dense_search_returns_nearest(tmp_path):
+    index = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=64))
+    index.add(
+        ["a", "b", "c"],
+        texts=["доставка по москве", "оплата картой", "возврат товара"],
+    )
+    result = index.similarity("доставка москва", top=2, method="dense")
+    assert result[0].id == "a"
+    assert result[0].payload == {"text": "доставка по москве"}
+    assert len(result) == 2
+
+
+def test_bm25_and_projects_are_isolated(tmp_path):
+    index = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=64))
+    index.add(["x"], texts=["часы работы офиса"], project="alpha")
+    index.add(["y"], texts=["часы работы склада"], project="beta")
+
+    alpha = index.similarity("офиса", top=5, method="bm25", project="alpha")
+    beta = index.similarity("офиса", top=5, method="bm25", project="beta")
+
+    assert [doc.id for doc in alpha] == ["x"]
+    assert beta == []
+
+
+def test_delete_and_persistence(tmp_path):
+    index = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=32))
+    index.add(["a", "b"], texts=["первый документ", "второй документ"])
+    version = index.version()
+    assert index.delete(["a"]) == 1
+    assert index.version() > version
+    index.save()
+
+    reloaded = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=32))
+    ids = [doc.id for doc in reloaded.similarity("документ", top=5)]
+    assert ids == ["b"]
+    assert reloaded.get_payloads(["a", "b"]) == {"b": {"text": "второй документ"}}
+
+
+def test_ivf_recall_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(16, 24))
+    data = _unit(centres[rng.integers(0, 16, size=600)] + 0.2 * rng.normal(size=(600, 24)))
+    index = LocalVectorIndex(
+        tmp_path,
+        encoder=HashingEncoder(dim=24),
+        dim=24,
+        nprobe=4,
+        train_threshold=256,
+    )
+    index.add([str(i) for i in range(600)], vectors=data)
+
+    hits = 0
+    for query in data[:20]:
+        approx = {doc.id for doc in index.search_vector(query, 5)}
+        exact = {doc.id for doc in index.search_vector(query, 5, exact=True)}
+        hits += len(approx & exact)
+    assert hits / 100 >= 0.9
+
+
+def test_hybrid_search_falls_back_to_local_index(tmp_path, monkeypatch):
+    index = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=64))
+    index.add(["a", "b"], texts=["доставка по москве", "оплата картой"])
+    monkeypatch.setattr(search, "qdrant", None)
+    monkeypatch.setattr(search, "local_index", index)
+
+    docs = asyncio.run(search.hybrid_search("доставка", k=1))
+
+    assert [doc.id for doc in docs] == ["a"]
+
+
+def test_partitions_reload_after_another_process_saves(tmp_path):
+    reader = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=32))
+    assert reader.similarity("документ", top=5) == []
+
+    writer = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=32))
+    writer.add(["a"], texts=["новый документ"])
+    writer.save()
+    assert [doc.id for doc in reader.similarity("документ", top=5)] == ["a"]
+
+    assert writer.delete(["a"]) == 1
+    writer.save()
+    assert reader.get_payloads(["a"]) == {}
+
+
+def test_compaction_keeps_mapped_vectors_of_readers(tmp_path):
+    writer = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=4))
+    ids = [f"d{n}" for n in range(8)]
+    writer.add(ids, vectors=np.eye(8, 4, dtype=np.float32) + 0.01)
+    writer.save()
+    reader = LocalVectorIndex(tmp_path, encoder=HashingEncoder(dim=4))
+    query = np.asarray([[0.0, 0.0, 0.0, 1.0]], dtype=np.float32)
+    assert reader.search_vector(query, top=1)[0].id == "d3"
+
+    # Deleting most rows compacts; the reader's rows must stay intact.
+    writer.delete(ids[:2] + ids[4:])
+    partition = writer._partitions["__default__"]
+    assert partition.count == 2
+    assert reader._partitions["__default__"].changed_on_disk() is False
+    assert reader.search_vector(query, top=1)[0].id == "d3"
+
+    writer.save()
+    assert [path.name for path in (tmp_path / "__default__").glob("vectors*.f32")] == [partition.vectors_name]
+    assert [doc.id for doc in reader.search_vector(query, top=5)] == ["d3", "d2"]
+
+
+def test_mongo_delete_document_leaves_local_index_to_the_worker(tmp_path, monkeypatch):
+    from packages.core.mongo import MongoClient
+
+    class _ReadOnlyIndex:
+        def delete(self, *args, **kwargs):
+            raise AssertionError("only the worker writes the local index")
+
+    monkeypatch.setattr(search, "local_index", _ReadOnlyIndex())
+
+    class _Records:
+        async def update_many(self, query, update):
+            self.tombstoned = (query, update)
+
+        async def bulk_write(self, requests, ordered=True):
+            self.markers = [(op._filter["_id"], op._doc["$set"]) for op in requests]
+
+    class _Documents:
+        async def find_one_and_delete(self, query, projection=None):
+            return {"fileId": query["fileId"], "project": "shop"}
+
+    bumped = []
+
+    async def _noop(*args, **kwargs):
+        return 0
+
+    async def _bump(project):
+        bumped.append(project)
+
+    mc = MongoClient.__new__(MongoClient)
+    mc.chunks_collection = "chunks"
+    chunks = _Records()
+    mc.db = {"documents": _Documents(), "chunks": chunks}
+    mc.release_blobs = _noop
+    mc.increment_project_storage = _noop
+    mc._bump_cache_generation = _bump
+
+    asyncio.run(mc.delete_document("documents", "f1"))
+
+    # Chunk records stay as tombstones until the worker purges the vectors.
+    assert chunks.tombstoned == ({"docId": {"$in": ["f1"]}}, {"$set": {"deleted": True}})
+    assert chunks.markers == [("f1", {"docId": "f1", "project": "shop", "deleted": True})]
+    assert bumped == ["shop"]
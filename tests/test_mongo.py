@@ -34,10 +34,17 @@ class _FakeCollection:
         self.inserted = None
         self.updated = None
         self.existing: dict | None = None
+        self.bulk: list = []
 
     async def insert_one(self, doc: dict):  # pragma: no cover - simple stub
         self.inserted = doc
 
+    async def find_one_and_update(self, *_args, **_kwargs):  # pragma: no cover - no stored blob
+        return None
+
+    async def bulk_write(self, requests, ordered=True):  # pragma: no cover - simple stub
+        self.bulk.extend(requests)
+
     async def find_one(self, _filter: dict, _projection: dict | None = None):  # pragma: no cover
         return self.existing
 
@@ -69,6 +76,39 @@ class _AsyncCursor:
         return value
 
 
+class _Blobs:
+    """In-memory ``blobs`` collection."""
+
+    def __init__(self):
+        self.records: dict[str, dict] = {}
+
+    def _by(self, filter):
+        if "_id" in filter:
+            return self.records.get(filter["_id"])
+        return next((r for r in self.records.values() if r["blobId"] == filter["blobId"]), None)
+
+    async def find_one_and_update(self, filter, update, projection=None, return_document=False):
+        record = self._by(filter)
+        if record is None:
+            return None
+        record["refs"] += update["$inc"]["refs"]
+        return dict(record)
+
+    async def insert_one(self, doc):
+        self.records[doc["_id"]] = dict(doc)
+
+    def find(self, filter, _projection=None):
+        wanted = filter["blobId"]["$in"]
+        return _AsyncCursor(dict(r) for r in self.records.values() if r["blobId"] in wanted)
+
+    async def delete_one(self, filter):
+        record = self.records.get(filter["_id"])
+        removed = record is not None and record["refs"] <= 0
+        if removed:
+            del self.records[filter["_id"]]
+        return types.SimpleNamespace(deleted_count=int(removed))
+
+
 class _OllamaCollection:
     def __init__(self):
         self.items: dict[str, dict] = {}
@@ -127,10 +167,13 @@ async def test_upload_document_returns_str() -> None:
     )
 
     assert isinstance(result, str)
-    assert result == str(f_id)
-    assert collection.inserted["fileId"] == str(f_id)
+    assert collection.inserted["fileId"] == result
+    assert collection.inserted["blobId"] == str(f_id)
     assert collection.inserted["project"] == "demo"
     assert collection.inserted["size_bytes"] == len(b"data")
+    [counters] = collection.bulk
+    assert counters._filter == {"_id": "demo"}
+    assert counters._doc["$inc"] == {"documents_bytes": 4, "document_count": 1}
 
 
 @pytest.mark.asyncio
@@ -153,7 +196,7 @@ async def test_upsert_text_document_sets_domain_and_description() -> None:
         url="https://example.com/doc",
     )
 
-    assert file_id == str(f_id)
+    assert ObjectId.is_valid(file_id)
     assert collection.updated is not None
     filter_doc, update_doc, upsert_flag = collection.updated
     assert filter_doc == {"name": "note.txt", "project": "demo"}
@@ -166,6 +209,8 @@ async def test_upsert_text_document_sets_domain_and_description() -> None:
     assert stored["url"] == "https://example.com/doc"
     assert "ts" in stored
     assert stored["size_bytes"] == len("hello world".encode("utf-8"))
+    assert stored["fileId"] == file_id
+    assert stored["blobId"] == str(f_id)
 
 
 @pytest.mark.asyncio
@@ -282,3 +327,472 @@ async def test_ollama_server_crud() -> None:
     deleted = await MongoClient.delete_ollama_server(mc, 'primary')
     assert deleted is True
     assert await MongoClient.list_ollama_servers(mc) == []
+
+
+@pytest.mark.asyncio
+async def test_cache_generation_bumped_on_prompt_change(monkeypatch) -> None:
+    import packages.core.mongo as mongo_module
+
+    bumped: list[str | None] = []
+
+    async def _bump(project):
+        bumped.append(project)
+
+    monkeypatch.setattr(mongo_module, "bump_generation", _bump)
+
+    class _Projects:
+        def __init__(self):
+            self.stored = {"name": "demo", "llm_prompt": "old"}
+
+        async def find_one(self, filter, projection=None):
+            return dict(self.stored)
+
+        async def update_one(self, filter, update, upsert=False):
+            self.stored.update(update["$set"])
+
+    projects = _Projects()
+    mc = MongoClient.__new__(MongoClient)
+    mc.projects_collection = "projects"
+    mc.db = {"projects": projects}
+
+    await MongoClient.upsert_project(mc, Project(name="demo", llm_prompt="old", llm_emotions_enabled=None))
+    assert bumped == []
+    await MongoClient.upsert_project(mc, Project(name="demo", llm_prompt="new", llm_emotions_enabled=None))
+    assert bumped == ["demo"]
+
+
+class _SessionDocs:
+    """In-memory collection applying the session-document update operators."""
+
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+
+    async def find_one(self, filter, projection=None):
+        doc = self.docs.get(filter["_id"])
+        return dict(doc) if doc else None
+
+    async def find_one_and_update(self, filter, update, projection=None, upsert=False, return_document=False):
+        doc = self.docs.setdefault(filter["_id"], dict(update.get("$setOnInsert", {})))
+        doc["seq"] = doc.get("seq", 0) + update["$inc"]["seq"]
+        push = update["$push"]["messages"]
+        messages = doc.get("messages", []) + push["$each"]
+        doc["messages"] = messages[push["$slice"]:] if "$slice" in push else messages
+        return {"seq": doc["seq"]}
+
+
+@pytest.mark.asyncio
+async def test_document_session_layout_caps_and_numbers_messages() -> None:
+    mc = MongoClient.__new__(MongoClient)
+    mc.session_layout = "document"
+    collection = _SessionDocs()
+    mc.db = _FakeDB(collection)
+
+    numbers = []
+    for idx in range(4):
+        message = await mc.append_session_message("contexts", "shop::abc", "user", f"q{idx}", keep=3)
+        numbers.append(message.number)
+
+    assert numbers == [0, 1, 2, 3]
+    assert len(collection.docs["shop::abc"]["messages"]) == 3
+    history = [m async for m in mc.get_sessions("contexts", "shop::abc")]
+    assert [(m.number, m.text) for m in history] == [(1, "q1"), (2, "q2"), (3, "q3")]
+
+
+@pytest.mark.asyncio
+async def test_get_project_is_cached_until_upsert(monkeypatch) -> None:
+    import packages.core.mongo as mongo_module
+
+    async def _noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(mongo_module, "publish_invalidation", _noop)
+    mongo_module._project_cache.clear()
+
+    class _Projects:
+        def __init__(self):
+            self.reads = 0
+            self.doc = {"name": "cached", "title": "Old"}
+
+        async def find_one(self, filter, projection=None):
+            self.reads += 1
+            return dict(self.doc) if filter.get("name") == "cached" else None
+
+        async def update_one(self, filter, update, upsert=False):
+            self.doc.update(update["$set"])
+
+    projects = _Projects()
+    mc = MongoClient.__new__(MongoClient)
+    mc.projects_collection = "projects"
+    mc.db = {"projects": projects}
+
+    first = await mc.get_project("cached")
+    first.title = "mutated"
+    second = await mc.get_project("cached")
+    assert projects.reads == 1
+    assert second.title == "Old"
+
+    await mc.upsert_project(Project(name="cached", title="New"))
+    assert (await mc.get_project("cached")).title == "New"
+
+
+@pytest.mark.asyncio
+async def test_search_qa_pairs_falls_back_to_qa_index(monkeypatch) -> None:
+    from packages.retrieval import qa_index
+
+    async def _noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(qa_index, "publish_invalidation", _noop)
+    qa_index._indexes.clear()
+
+    class _TextCursor:
+        def sort(self, *_args):
+            return self
+
+        def limit(self, _n):
+            return self
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            raise RuntimeError("text index required for $text query")
+
+    class _QA:
+        def __init__(self):
+            self.scans = 0
+
+        def find(self, filter, projection=None):
+            if "$and" in filter:
+                return _TextCursor()
+            self.scans += 1
+            return _AsyncCursor(
+                [
+                    {"_id": ObjectId(), "project": "shop", "question": "Как вернуть товар?", "answer": "В течение 14 дней"},
+                    {"_id": ObjectId(), "project": "shop", "question": "Где забрать заказ?", "answer": "В пункте выдачи"},
+                ]
+            )
+
+    collection = _QA()
+    mc = MongoClient.__new__(MongoClient)
+    mc.qa_collection = "qa"
+    mc.db = {"qa": collection}
+
+    first = await mc.search_qa_pairs("как вернуть товар", "shop")
+    second = await mc.search_qa_pairs("где забрать мой заказ", "shop")
+    assert first[0]["answer"] == "В течение 14 дней"
+    assert second[0]["answer"] == "В пункте выдачи"
+    assert collection.scans == 1
+
+
+@pytest.mark.asyncio
+async def test_get_documents_with_content_batches_reads() -> None:
+    import asyncio
+
+    class _Docs:
+        def __init__(self):
+            self.queries = []
+
+        def find(self, filter, projection=None):
+            self.queries.append(filter)
+            docs = [
+                {"fileId": "a", "name": "a.txt"},
+                {"fileId": "b", "name": "b.txt", "excerpt": "cached head"},
+                {"fileId": "c", "name": "c.txt"},
+                {"fileId": "d", "name": "d.txt"},
+            ]
+            return _AsyncCursor([doc for doc in docs if doc["fileId"] in filter["fileId"]["$in"]])
+
+    reads: list[tuple[str, int | None]] = []
+    active = 0
+    peak = 0
+
+    async def _read(file_id, *, max_bytes=None):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0)
+        active -= 1
+        reads.append((file_id, max_bytes))
+        if file_id == "d":
+            raise RuntimeError("chunk missing")
+        return f"payload {file_id}".encode()
+
+    docs = _Docs()
+    mc = MongoClient.__new__(MongoClient)
+    mc.db = {"documents": docs}
+    mc.get_gridfs_file = _read
+
+    result = await mc.get_documents_with_content(
+        "documents",
+        ["c", "a", "b", "missing", "a", "d"],
+        max_bytes=1024,
+        excerpt_field="excerpt",
+        concurrency=2,
+    )
+
+    assert len(docs.queries) == 1
+    assert list(result) == ["c", "a", "b"]
+    assert result["b"][1] == b"cached head"
+    assert result["c"] == ({"fileId": "c", "name": "c.txt"}, b"payload c")
+    assert sorted(reads) == [("a", 1024), ("c", 1024), ("d", 1024)]
+    assert peak <= 2
+
+
+@pytest.mark.asyncio
+async def test_insert_request_stats_updates_rollups() -> None:
+    from datetime import datetime, timezone
+
+    class _Stats:
+        def __init__(self):
+            self.inserted = []
+            self.writes = []
+
+        async def insert_many(self, docs, ordered=True):
+            self.inserted.extend(docs)
+
+        async def bulk_write(self, operations, ordered=True):
+            self.writes.extend(operations)
+
+    raw, daily, hourly = _Stats(), _Stats(), _Stats()
+    mc = MongoClient.__new__(MongoClient)
+    mc.stats_collection = "request_stats"
+    mc.stats_daily_collection = "request_stats_daily"
+    mc.stats_hourly_collection = "request_stats_hourly"
+    mc.db = {"request_stats": raw, "request_stats_daily": daily, "request_stats_hourly": hourly}
+
+    ts = datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)
+    docs = [
+        {"ts": ts, "project": "shop", "channel": "web", "response_chars": 10, "attachments": 1},
+        {"ts": ts.replace(hour=11), "project": "shop", "channel": "web", "response_chars": 5, "error": "x"},
+    ]
+    await mc.insert_request_stats(docs)
+
+    assert len(raw.inserted) == 2
+    [day] = daily.writes
+    assert day._filter == {"_id": "shop|web|2024-05-01"}
+    assert day._doc["$inc"] == {"count": 2, "attachments": 1, "response_chars": 15, "prompt_chars": 0, "errors": 1}
+    assert day._doc["$setOnInsert"]["date"] == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert sorted(op._filter["_id"] for op in hourly.writes) == ["shop|web|2024-05-01T10", "shop|web|2024-05-01T11"]
+
+
+@pytest.mark.asyncio
+async def test_deduplicate_documents_backfills_hashes_and_deletes_in_bulk(monkeypatch) -> None:
+    from gridfs.errors import NoFile
+
+    from packages.core.mongo import document_content_hash
+
+    ids = [str(ObjectId()) for _ in range(4)]
+    docs = [
+        {"fileId": ids[0], "project": "p", "content_type": "text/plain", "content_hash": None},
+        {"fileId": ids[1], "project": "p", "content_type": "text/plain"},
+        {"fileId": ids[2], "project": "p", "content_hash": "abc"},
+        {"fileId": ids[3], "project": "p"},
+    ]
+    payloads = {ids[0]: b"Hello   World", ids[1]: b"hello world"}
+
+    class _Docs:
+        def __init__(self):
+            self.updates = []
+            self.deleted = []
+
+        def find(self, query, projection=None):
+            if "content_hash" in query:
+                return _AsyncCursor(d for d in docs if not d.get("content_hash"))
+            return _AsyncCursor(d for d in docs if d["fileId"] in query["fileId"]["$in"])
+
+        async def bulk_write(self, operations, ordered=True):
+            for op in operations:
+                self.updates.append(op._filter["fileId"])
+                for doc in docs:
+                    if doc["fileId"] == op._filter["fileId"]:
+                        doc["content_hash"] = op._doc["$set"]["content_hash"]
+
+        async def count_documents(self, query):
+            return len(docs)
+
+        def aggregate(self, pipeline, allowDiskUse=False):
+            groups = {}
+            for doc in docs:
+                if doc.get("content_hash"):
+                    groups.setdefault(doc["content_hash"], []).append(doc["fileId"])
+            return _AsyncCursor(
+                {"fileIds": file_ids, "count": len(file_ids)} for file_ids in groups.values() if len(file_ids) > 1
+            )
+
+        async def delete_many(self, query):
+            key = next(iter(query))
+            self.deleted.append((key, list(query[key]["$in"])))
+            if key == "fileId":
+                docs[:] = [d for d in docs if d["fileId"] not in query["fileId"]["$in"]]
+
+    async def _gridfs_file(file_id, *, max_bytes=None):
+        if file_id not in payloads:
+            raise NoFile(file_id)
+        return payloads[file_id]
+
+    async def _bump(project):
+        return None
+
+    documents = _Docs()
+    mc = MongoClient.__new__(MongoClient)
+    mc.db = {
+        "documents": documents,
+        "blobs": _Blobs(),
+        "fs.files": _Docs(),
+        "fs.chunks": _Docs(),
+        "document_chunks": _Docs(),
+    }
+    monkeypatch.setattr(mc, "get_gridfs_file", _gridfs_file)
+    monkeypatch.setattr(mc, "_bump_cache_generation", _bump)
+    progress = []
+
+    async def _progress(state):
+        progress.append(state["phase"])
+
+    summary = await mc.deduplicate_documents("documents", "p", progress=_progress)
+
+    assert document_content_hash(b"Hello   World", "text/plain") == document_content_hash(b"hello world\n", "text/plain")
+    assert sorted(documents.updates) == sorted(ids[:2])
+    assert summary["removed_ids"] == [ids[3], ids[1]]
+    assert summary["groups"] == 1 and summary["hashed"] == 2
+    assert [d["fileId"] for d in docs] == [ids[0], ids[2]]
+    assert progress == ["hashing", "deleting"]
+    assert mc.db["fs.chunks"].deleted == [("files_id", [ObjectId(ids[3])]), ("files_id", [ObjectId(ids[1])])]
+
+
+@pytest.mark.asyncio
+async def test_put_blob_stores_identical_payloads_once() -> None:
+    class _Bucket:
+        def __init__(self):
+            self.uploads = []
+
+        async def upload_from_stream(self, filename, payload, metadata=None):
+            self.uploads.append(payload)
+            return ObjectId()
+
+    class _Files:
+        def __init__(self):
+            self.deleted = []
+
+        async def delete_many(self, query):
+            key = next(iter(query))
+            self.deleted.extend(query[key]["$in"])
+
+    blobs, files, chunks = _Blobs(), _Files(), _Files()
+    mc = MongoClient.__new__(MongoClient)
+    mc.gridfs = _Bucket()
+    mc.db = {"blobs": blobs, "fs.files": files, "fs.chunks": chunks}
+
+    first, digest = await mc.put_blob(b"same bytes", filename="a.txt")
+    second, _ = await mc.put_blob(b"same bytes", filename="b.txt")
+    assert first == second
+    assert mc.gridfs.uploads == [b"same bytes"]
+    assert blobs.records[digest]["refs"] == 2
+
+    assert await mc.release_blobs([first]) == 0
+    assert files.deleted == []
+    legacy = str(ObjectId())
+    assert await mc.release_blobs([first, legacy]) == 2
+    assert sorted(map(str, files.deleted)) == sorted([first, legacy])
+    assert blobs.records == {}
+
+
+@pytest.mark.asyncio
+async def test_get_sessions_reads_only_message_fields() -> None:
+    session_id = str(uuid.uuid4())
+
+    class _Messages:
+        def __init__(self):
+            self.projection = None
+
+        async def count_documents(self, query):
+            return 1
+
+        def find(self, query, projection):
+            self.projection = projection
+            cursor = _AsyncCursor([{"sessionId": session_id, "role": "user", "number": 0, "text": "hi"}])
+            cursor.sort = lambda order: cursor
+            return cursor
+
+    messages = _Messages()
+    mc = MongoClient.__new__(MongoClient)
+    mc.db = {"contexts": messages}
+
+    history = [m async for m in mc.get_sessions("contexts", session_id)]
+    assert [(m.number, m.text) for m in history] == [(0, "hi")]
+    assert messages.projection["_id"] is False
+    assert {key for key, value in messages.projection.items() if value is True} == {
+        "sessionId",
+        "role",
+        "number",
+        "text",
+        "project",
+    }
+
+
+@pytest.mark.asyncio
+async def test_migrate_sessions_rerun_keeps_turns_written_after_switch() -> None:
+    from pymongo.errors import BulkWriteError
+
+    class _Contexts(_SessionDocs):
+        """Message rows and session documents sharing one collection."""
+
+        def __init__(self, rows):
+            super().__init__()
+            self.rows = rows
+
+        def aggregate(self, pipeline, allowDiskUse=False):
+            groups: dict = {}
+            for row in sorted(self.rows, key=lambda r: (r["sessionId"], r["number"])):
+                group = groups.setdefault(
+                    row["sessionId"], {"_id": row["sessionId"], "last": -1, "count": 0, "messages": []}
+                )
+                group.update(project=row.get("project"), last=max(group["last"], row["number"]))
+                group["count"] += 1
+                group["messages"].append({"role": row["role"], "text": row["text"], "project": row.get("project")})
+
+            async def _cursor():
+                for group in groups.values():
+                    yield group
+
+            return _cursor()
+
+        async def bulk_write(self, requests, ordered=True):
+            errors = []
+            for index, op in enumerate(requests):
+                session_id, seq = op._filter["_id"], op._filter["seq"]["$not"]["$gte"]
+                current = self.docs.get(session_id)
+                if current is not None and current.get("seq", 0) >= seq:
+                    errors.append({"index": index, "code": 11000})
+                    continue
+                self.docs[session_id] = {"_id": session_id, **op._doc["$set"]}
+            if errors:
+                raise BulkWriteError({"writeErrors": errors})
+
+        async def delete_many(self, query):
+            ids = set(query["sessionId"]["$in"])
+            before = len(self.rows)
+            self.rows = [row for row in self.rows if row["sessionId"] not in ids]
+            return types.SimpleNamespace(deleted_count=before - len(self.rows))
+
+    rows = [
+        {"sessionId": "s1", "role": "user" if n % 2 == 0 else "assistant", "number": n, "text": f"m{n}"}
+        for n in range(3)
+    ]
+    contexts = _Contexts(rows)
+    mc = MongoClient.__new__(MongoClient)
+    mc.db = _FakeDB(contexts)
+
+    first = await mc.migrate_sessions_to_documents("contexts")
+    assert first["sessions"] == 1
+    assert contexts.docs["s1"]["seq"] == 3
+
+    mc.session_layout = "document"
+    message = await mc.append_session_message("contexts", "s1", "user", "after switch", keep=10)
+    assert message.number == 3
+
+    rerun = await mc.migrate_sessions_to_documents("contexts", delete=True)
+    assert rerun == {"sessions": 0, "messages": 3, "skipped": 1, "deleted": 3}
+    assert contexts.docs["s1"]["seq"] == 4
+    assert contexts.docs["s1"]["messages"][-1]["text"] == "after switch"
@@ -0,0 +1,88 @@
+"""Tests for the in-memory QA pair matcher."""
+
+import numpy as np
+import pytest
+
+from packages.retrieval import qa_index
+from packages.retrieval.qa_index import QAIndex
+
+
+def _pair(qa_id, question, priority=0):
+    return {"id": qa_id, "question": question, "answer": f"answer {qa_id}", "priority": priority}
+
+
+def test_search_ranks_fuzzy_matches_and_skips_unrelated():
+    index = QAIndex()
+    index.extend(
+        [
+            _pair("1", "Как оформить возврат товара?"),
+            _pair("2", "Сколько стоит доставка по Москве?"),
+            _pair("3", "Какие способы оплаты вы принимаете?"),
+        ]
+    )
+
+    results = index.search("как оформит возврат", limit=5)
+    assert [item["id"] for item in results] == ["1"]
+    assert 0.35 <= results[0]["score"] <= 1.0
+    assert index.search("погода завтра") == []
+
+
+def test_updates_and_removals_apply_in_place():
+    index = QAIndex()
+    index.extend([_pair(str(n), f"question number {n} about shipping") for n in range(200)])
+    index.add(_pair("7", "refund policy for damaged items", priority=5))
+
+    assert index.search("refund policy")[0]["id"] == "7"
+    assert all(item["id"] != "7" for item in index.search("question number 7 shipping", limit=200))
+
+    for n in range(150):
+        index.remove(str(n))
+    assert len(index) == 50
+    assert {item["id"] for item in index.search("question about shipping", limit=100)} == {
+        str(n) for n in range(150, 200)
+    }
+
+
+def test_encoder_scores_paraphrases():
+    vocabulary = {"refund": 0, "money": 0, "back": 0, "delivery": 1}
+
+    def encoder(texts):
+        vectors = np.zeros((len(texts), 2), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in qa_index.normalize(text).split():
+                if word in vocabulary:
+                    vectors[row, vocabulary[word]] = 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    index = QAIndex(encoder)
+    index.extend([_pair("a", "refund"), _pair("b", "delivery")])
+    assert [item["id"] for item in index.search("money back")] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_get_index_loads_once_and_tracks_changes(monkeypatch):
+    async def _noop(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(qa_index, "publish_invalidation", _noop)
+    qa_index._indexes.clear()
+    loads = 0
+
+    async def loader():
+        nonlocal loads
+        loads += 1
+        return [_pair("1", "opening hours of the store")]
+
+    index = await qa_index.get_index("Shop", loader)
+    assert await qa_index.get_index("shop", loader) is index
+    assert loads == 1
+
+    await qa_index.apply_changes("shop", upserted=[_pair("2", "parking near the store")])
+    assert index.search("parking")[0]["id"] == "2"
+    await qa_index.apply_changes("shop", removed=["1"])
+    assert index.search("opening hours") == []
+
+    await qa_index.drop("shop")
+    await qa_index.get_index("shop", loader)
+    assert loads == 2
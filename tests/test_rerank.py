@@ -5,17 +5,11 @@ import sys
 import types
 from pathlib import Path
 
-module_search = Path(__file__).resolve().parents[1] / "retrieval" / "search.py"
-spec_search = importlib.util.spec_from_file_location(
-    "retrieval.search", module_search
-)
-search = importlib.util.module_from_spec(spec_search)
-sys.modules[spec_search.name] = search
-spec_search.loader.exec_module(search)
+from packages.retrieval import search
 
-module_rerank = Path(__file__).resolve().parents[1] / "retrieval" / "rerank.py"
+module_rerank = Path(__file__).resolve().parents[1] / "packages" / "retrieval" / "rerank.py"
 spec_rerank = importlib.util.spec_from_file_location(
-    "retrieval.rerank", module_rerank
+    "packages.retrieval.rerank", module_rerank
 )
 rerank = importlib.util.module_from_spec(spec_rerank)
 sys.modules[spec_rerank.name] = rerank
@@ -62,3 +56,51 @@ def test_rerank_noop_for_small_list():
     result = rerank.rerank("q", docs, top=2)
     assert result is docs
 
+
+
+def test_rerank_caches_scores_per_doc_version():
+    """Repeated queries reuse cached scores until the document changes."""
+    model = FakeCrossEncoder([0.5, 0.4, 0.3])
+    sys.modules["sentence_transformers"].CrossEncoder = lambda name: model
+    spec_rerank.loader.exec_module(rerank)
+
+    def docs():
+        return [
+            search.Doc("A", {"text": "a"}),
+            search.Doc("B", {"text": "b"}),
+            search.Doc("C", {"text": "c"}),
+        ]
+
+    rerank.rerank("q", docs(), top=2)
+    rerank.rerank("q", docs(), top=2)
+    assert len(model.calls) == 1
+
+    changed = docs()
+    changed[1].payload = {"text": "b", "version": 2}
+    rerank.rerank("q", changed, top=2)
+    assert [pair[1] for pair in model.calls[1]] == ["b"]
+
+
+def test_rerank_skipped_when_fused_gap_is_clear():
+    """A clear fused-score gap at ``top`` bypasses the cross-encoder."""
+    model = FakeCrossEncoder([0.1, 0.9, 0.5])
+    sys.modules["sentence_transformers"].CrossEncoder = lambda name: model
+    spec_rerank.loader.exec_module(rerank)
+
+    docs = [search.Doc("A", score=1.0), search.Doc("B", score=0.9), search.Doc("C", score=0.2)]
+    result = rerank.rerank("q", docs, top=2, skip_gap=0.5)
+
+    assert [d.id for d in result] == ["A", "B"]
+    assert model.calls == []
+
+
+def test_truncate_text_keeps_query_window():
+    """Long documents are cut to the window mentioning the query."""
+    sys.modules["sentence_transformers"].CrossEncoder = lambda name: FakeCrossEncoder([])
+    spec_rerank.loader.exec_module(rerank)
+
+    text = " ".join(["шум"] * 50 + ["доставка", "курьером"] + ["шум"] * 50)
+    window = rerank.truncate_text("доставкой курьера", text, max_tokens=4)
+
+    assert "доставка курьером" in window
+    assert len(window.split()) == 4
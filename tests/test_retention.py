@@ -0,0 +1,166 @@
+"""Tests for retention tiers and the cold archive."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+from packages.core import retention
+from packages.core.retention import RetentionPolicy, archive_expired, iter_archived
+
+
+def _value(doc, field):
+    return doc.get(field)
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        value = _value(doc, field)
+        if isinstance(condition, dict):
+            if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                return False
+            if "$gte" in condition and not (value is not None and value >= condition["$gte"]):
+                return False
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = list(docs)
+
+    def sort(self, field, direction=1):
+        self._docs.sort(key=lambda doc: doc[field], reverse=direction == -1)
+        return self
+
+    def limit(self, count):
+        self._docs = self._docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self._docs)
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Collection:
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, query=None, projection=None):
+        return _Cursor(doc for doc in self.docs.values() if _matches(doc, query or {}))
+
+    async def delete_many(self, query):
+        for doc_id in query["_id"]["$in"]:
+            self.docs.pop(doc_id, None)
+
+    async def bulk_write(self, operations, ordered=True):
+        for op in operations:
+            self.docs[op._filter["_id"]] = op._doc
+
+
+class _DB(dict):
+    def __missing__(self, name):
+        self[name] = _Collection()
+        return self[name]
+
+
+NOW = datetime(2024, 6, 15, tzinfo=timezone.utc)
+
+
+def _stat(days_ago, project="shop"):
+    ts = NOW - timedelta(days=days_ago)
+    return {"_id": ObjectId(), "ts": ts, "date": ts.replace(hour=0), "project": project, "question": f"q{days_ago}"}
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_archived_and_readable():
+    db = _DB(request_stats=_Collection([_stat(n) for n in (1, 5, 20, 40)] + [_stat(30, "other")]))
+    policy = RetentionPolicy("request_stats", "ts", "date", 3, "ts")
+
+    removed = await archive_expired(db, policy, now=NOW, batch_size=2)
+
+    assert removed == 4
+    assert [doc["question"] for doc in db["request_stats"].docs.values()] == ["q1"]
+    assert {bucket["month"] for bucket in db["archive"].docs.values()} == {"2024-06", "2024-05"}
+
+    rows = [
+        row
+        async for row in iter_archived(
+            db,
+            "request_stats",
+            start=NOW - timedelta(days=35),
+            match={"project": "shop", "date": {"$gte": NOW - timedelta(days=35)}},
+            projection={"question": 1, "ts": 1, "_id": 0},
+        )
+    ]
+    assert [row["question"] for row in rows] == ["q20", "q5"]
+    assert rows[0]["ts"] == NOW - timedelta(days=20)
+    assert set(rows[0]) == {"question", "ts"}
+
+
+@pytest.mark.asyncio
+async def test_retried_batch_replaces_its_bucket():
+    docs = [_stat(10), _stat(11)]
+    db = _DB(request_stats=_Collection(docs))
+    policy = RetentionPolicy("request_stats", "ts", "date", 3)
+
+    await archive_expired(db, policy, now=NOW)
+    db["request_stats"] = _Collection(docs)  # the delete was lost
+    await archive_expired(db, policy, now=NOW)
+
+    assert len(db["archive"].docs) == 1
+    assert sum(bucket["count"] for bucket in db["archive"].docs.values()) == 2
+
+
+@pytest.mark.asyncio
+async def test_epoch_policy_and_delete_without_archive():
+    old = {"_id": ObjectId(), "updated_at": (NOW - timedelta(days=40)).timestamp(), "question": "old"}
+    new = {"_id": ObjectId(), "updated_at": NOW.timestamp(), "question": "new"}
+    db = _DB(unanswered=_Collection([old, new]))
+    policy = RetentionPolicy("unanswered", "updated_at", "epoch", 30)
+
+    assert await archive_expired(db, policy, now=NOW, archive=False) == 1
+    assert [doc["question"] for doc in db["unanswered"].docs.values()] == ["new"]
+    assert "archive" not in db
+
+
+def test_objectid_cutoff_and_policies():
+    policy = RetentionPolicy("contexts", "_id", "objectid", 7)
+    cutoff = policy.cutoff(NOW)
+    assert ObjectId.from_datetime(NOW - timedelta(days=8)) < cutoff < ObjectId.from_datetime(NOW)
+
+    class _Mongo:
+        stats_collection = "request_stats"
+        contexts_collection = "contexts"
+        unanswered_collection = "unanswered_questions"
+        session_layout = "document"
+
+    fields = {p.collection: p.field for p in retention.policies_for(_Mongo())}
+    assert fields == {"request_stats": "ts", "contexts": "updated_at", "unanswered_questions": "updated_at"}
+
+
+@pytest.mark.asyncio
+async def test_large_rows_are_split_into_buckets_under_the_byte_budget():
+    docs = [{**_stat(4 + n), "answer": "x" * 4000} for n in range(6)]
+    db = _DB(request_stats=_Collection(docs))
+    policy = RetentionPolicy("request_stats", "ts", "date", 3)
+
+    assert await archive_expired(db, policy, now=NOW, bucket_bytes=10_000) == 6
+
+    buckets = list(db["archive"].docs.values())
+    assert [bucket["count"] for bucket in buckets] == [2, 2, 2]
+    assert all(bucket["month"] == "2024-06" for bucket in buckets)
+    rows = [row async for row in iter_archived(db, "request_stats")]
+    assert sorted(row["question"] for row in rows) == sorted(doc["question"] for doc in docs)
@@ -0,0 +1,41 @@
+"""Tests for the offline retrieval evaluation helpers."""
+
+import asyncio
+
+import pytest
+
+from packages.retrieval import evaluation
+from packages.retrieval.local_index import HashingEncoder
+
+
+def test_metrics():
+    assert evaluation.recall_at_k(["a", "b", "c"], {"c", "d"}, 2) == 0.0
+    assert evaluation.recall_at_k(["a", "b", "c"], {"c", "d"}, 3) == 0.5
+    assert evaluation.reciprocal_rank(["a", "b", "c"], {"b"}) == pytest.approx(0.5)
+    assert evaluation.reciprocal_rank(["a"], {"z"}) == 0.0
+
+
+def test_dataset_roundtrip(tmp_path):
+    dataset = evaluation.synthetic_dataset(docs=20, queries=5, seed=3)
+    path = tmp_path / "dataset.jsonl"
+    evaluation.dump_dataset(dataset, path)
+
+    loaded = evaluation.load_dataset(path)
+
+    assert loaded.corpus == dataset.corpus
+    assert [(q.question, q.relevant) for q in loaded.queries] == [
+        (q.question, q.relevant) for q in dataset.queries
+    ]
+
+
+def test_evaluate_reports_quality_and_stages(tmp_path):
+    dataset = evaluation.synthetic_dataset(docs=60, queries=15, seed=1)
+    index = evaluation.build_index(dataset, tmp_path, encoder=HashingEncoder(dim=64), dim=64)
+    config = evaluation.RetrievalConfig("balanced", k=5)
+
+    result = asyncio.run(evaluation.evaluate(index, dataset.queries, config))
+
+    assert result["queries"] == 15
+    assert result["recall_at_k"] >= 0.8
+    assert 0 < result["mrr"] <= 1
+    assert {"dense", "bm25", "fusion", "hybrid"} <= set(result["stages"])
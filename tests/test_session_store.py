@@ -0,0 +1,183 @@
+"""Tests for the Redis-backed chat session store."""
+
+import pytest
+
+from packages.core.models import ContextMessage
+from packages.core.mongo import NotFound
+from packages.core.sessions import SessionStore
+
+
+class _FakePipeline:
+    def __init__(self, redis):
+        self._redis = redis
+        self._ops = []
+        self._watching = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, *keys):
+        self._watching = True
+
+    def multi(self):
+        self._watching = False
+
+    def __getattr__(self, name):
+        if self._watching:
+            async def run(*args, **kwargs):
+                return getattr(self._redis, name)(*args, **kwargs)
+
+            return run
+
+        def queue(*args, **kwargs):
+            self._ops.append((name, args, kwargs))
+
+        return queue
+
+    async def execute(self):
+        self._redis.round_trips += 1
+        return [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in self._ops]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def lrange(self, key, start, end):
+        return list(self.data.get(key, []))
+
+    def get(self, key):
+        value = self.data.get(key)
+        return None if value is None else str(value).encode()
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        return len(self.data[key])
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def ltrim(self, key, start, end):
+        items = self.data.get(key, [])
+        self.data[key] = items[start:] if end == -1 else items[start : end + 1]
+
+    def expire(self, key, ttl):
+        return True
+
+
+class _FakeMongo:
+    def __init__(self, stored=None):
+        self.stored = list(stored or [])
+        self.batches = []
+
+    async def get_sessions(self, collection, session_id):
+        if not self.stored:
+            raise NotFound
+        for message in self.stored:
+            yield message
+
+    async def append_session_messages(self, collection, messages, *, keep=10):
+        self.batches.append((collection, list(messages), keep))
+        return len(messages)
+
+
+@pytest.mark.asyncio
+async def test_append_and_read_are_single_round_trips():
+    redis = _FakeRedis()
+    mongo = _FakeMongo()
+    store = SessionStore(mongo, keep=3, redis=redis)
+
+    with pytest.raises(NotFound):
+        await store.history("contexts", "shop::abc")
+    for idx in range(5):
+        await store.append_session_message(
+            "contexts", "shop::abc", "user", f"q{idx}", project="shop", keep=3
+        )
+
+    redis.round_trips = 0
+    history = await store.history("contexts", "shop::abc")
+    assert redis.round_trips == 1
+    assert [(m.number, m.text) for m in history] == [(2, "q2"), (3, "q3"), (4, "q4")]
+
+    assert await store.flush() == 5
+    (collection, messages, keep), = mongo.batches
+    assert collection == "contexts" and keep == 3
+    assert [m.number for m in messages] == [0, 1, 2, 3, 4]
+    assert messages[0].model_dump(by_alias=True)["sessionId"] == "shop::abc"
+
+
+@pytest.mark.asyncio
+async def test_cold_session_is_loaded_from_mongo_and_continues_numbering():
+    stored = [
+        ContextMessage(sessionId="6c94282b-708e-40f2-ac9c-6f5fc8fe0b7e", role="user", number=n, text=f"m{n}")
+        for n in range(4)
+    ]
+    redis = _FakeRedis()
+    store = SessionStore(_FakeMongo(stored), keep=10, redis=redis)
+    session = "6c94282b-708e-40f2-ac9c-6f5fc8fe0b7e"
+
+    assert [m.text for m in await store.history("contexts", session)] == ["m0", "m1", "m2", "m3"]
+    message = await store.append_session_message("contexts", session, "assistant", "a")
+    assert message.number == 4
+    assert [m.number for m in await store.history("contexts", session)] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried():
+    class FlakyMongo(_FakeMongo):
+        fail = True
+
+        async def append_session_messages(self, collection, messages, *, keep=10):
+            if self.fail:
+                self.fail = False
+                raise RuntimeError("mongo down")
+            return await super().append_session_messages(collection, messages, keep=keep)
+
+    mongo = FlakyMongo()
+    store = SessionStore(mongo, redis=_FakeRedis())
+    await store.append_session_message("contexts", "s", "user", "hello")
+
+    assert await store.flush() == 0
+    assert await store.flush() == 1
+    assert mongo.batches[0][1][0].text == "hello"
+
+
+@pytest.mark.asyncio
+async def test_warm_never_moves_the_sequence_back_over_pending_messages():
+    session = "6c94282b-708e-40f2-ac9c-6f5fc8fe0b7e"
+    stored = [
+        ContextMessage(sessionId=session, role="user", number=n, text=f"m{n}") for n in range(4)
+    ]
+    redis = _FakeRedis()
+    first = SessionStore(_FakeMongo(stored), keep=10, redis=redis)
+    second = SessionStore(_FakeMongo(stored), keep=10, redis=redis)
+
+    await first.history("contexts", session)
+    assert (await first.append_session_message("contexts", session, "assistant", "a")).number == 4
+    # A concurrent cold read warms from the Mongo history, which lacks the
+    # unflushed message.
+    await second._warm("contexts", session, stored)
+    assert (await second.append_session_message("contexts", session, "user", "b")).number == 5
+    assert [m.text for m in await first.history("contexts", session)][-2:] == ["a", "b"]
+
+    # Only the sequence was evicted: unflushed numbers are not handed out again.
+    del redis.data[f"session:contexts:{session}:seq"]
+    await second.history("contexts", session)
+    assert (await second.append_session_message("contexts", session, "user", "c")).number == 6
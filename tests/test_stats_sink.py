@@ -0,0 +1,113 @@
+"""Tests for the buffered request stats writer."""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from packages.core.stats_sink import StatsSink
+
+
+class _FakeMongo:
+    def __init__(self):
+        self.batches: list[list[dict]] = []
+        self.fail = False
+
+    async def insert_request_stats(self, docs):
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.batches.append(list(docs))
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.lists: dict[str, list[bytes]] = {}
+
+    async def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+
+    async def lpop(self, key, count):
+        items = self.lists.get(key, [])
+        popped, self.lists[key] = items[:count], items[count:]
+        return popped or None
+
+
+def _doc(n):
+    return {"ts": datetime(2024, 1, 1, tzinfo=timezone.utc), "project": "p", "n": n}
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_batch_size_and_drains_on_close():
+    mongo = _FakeMongo()
+    sink = StatsSink(mongo, flush_interval=60, flush_batch=3)
+    sink.start()
+
+    for n in range(4):
+        sink.put(_doc(n))
+    await asyncio.sleep(0.01)
+    assert [len(batch) for batch in mongo.batches] == [3, 1]
+
+    sink.put(_doc(4))
+    await sink.close()
+    assert [doc["n"] for batch in mongo.batches for doc in batch] == [0, 1, 2, 3, 4]
+    assert len(sink) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_entries_and_drops_overflow():
+    mongo = _FakeMongo()
+    mongo.fail = True
+    sink = StatsSink(mongo, flush_batch=10, max_pending=3, overflow="drop")
+
+    for n in range(5):
+        sink.put(_doc(n))
+    assert len(sink) == 3
+    assert await sink.flush() == 0
+    assert len(sink) == 3
+
+    mongo.fail = False
+    assert await sink.flush() == 3
+    assert [doc["n"] for doc in mongo.batches[0]] == [0, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_overflow_spills_to_redis_and_is_restored():
+    mongo = _FakeMongo()
+    redis = _FakeRedis()
+    sink = StatsSink(mongo, flush_batch=10, max_pending=2, overflow="redis", redis=redis)
+
+    for n in range(4):
+        sink.put(_doc(n))
+    await asyncio.sleep(0)
+    assert len(redis.lists["stats:spill"]) == 2
+
+    await sink.flush()
+    written = [doc for batch in mongo.batches for doc in batch]
+    assert sorted(doc["n"] for doc in written) == [0, 1, 2, 3]
+    assert all(isinstance(doc["ts"], datetime) for doc in written)
+    assert redis.lists["stats:spill"] == []
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_with_assigned_ids_is_spilled_not_dropped():
+    from bson import ObjectId
+
+    mongo = _FakeMongo()
+    mongo.fail = True
+    redis = _FakeRedis()
+    sink = StatsSink(mongo, flush_batch=10, max_pending=1, overflow="redis", redis=redis)
+    # ``insert_many`` sets ``_id`` on every entry before it raises.
+    ids = [ObjectId() for _ in range(3)]
+    sink._pending.extend({**_doc(n), "_id": ids[n]} for n in range(3))
+
+    assert await sink.flush() == 0
+    await asyncio.gather(*sink._spills)
+    assert len(sink) == 1
+    assert len(redis.lists["stats:spill"]) == 2
+
+    mongo.fail = False
+    while sink._spilled:
+        await sink.flush()
+    written = [doc for batch in mongo.batches for doc in batch]
+    assert sorted(doc["n"] for doc in written) == [0, 1, 2]
+    assert sorted(doc["_id"] for doc in written) == sorted(ids)
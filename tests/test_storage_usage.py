@@ -0,0 +1,117 @@
+"""Tests for the per-project storage counters."""
+
+from collections import Counter
+
+import pytest
+
+from packages.core.mongo import MongoClient
+from packages.core.storage_usage import (
+    StorageReconciler,
+    add_usage,
+    document_usage,
+    increment_requests,
+    project_key,
+)
+
+
+def test_document_usage_and_increment_requests():
+    deltas: dict[str, Counter] = {}
+    pdf = {"project": "Shop", "size_bytes": 100, "content_type": "application/pdf"}
+    old_text = {"domain": "shop", "size_bytes": 40, "content_type": "text/plain"}
+    new_text = {"domain": "shop", "size_bytes": 25, "content_type": "text/plain"}
+
+    add_usage(deltas, project_key(pdf), document_usage(pdf))
+    add_usage(deltas, project_key(new_text), document_usage(new_text))
+    add_usage(deltas, project_key(old_text), document_usage(old_text, -1))
+    add_usage(deltas, "empty", document_usage(None))
+
+    [request] = increment_requests(deltas)
+    assert request._filter == {"_id": "shop"}
+    assert request._doc["$inc"] == {"documents_bytes": 85, "document_count": 1, "binary_bytes": 100}
+    assert project_key({}) == "__default__"
+
+
+@pytest.mark.asyncio
+async def test_reconciler_replaces_counters(monkeypatch):
+    from packages.core import storage_usage
+
+    class _Counters:
+        def __init__(self):
+            self.requests = []
+
+        async def bulk_write(self, requests, ordered=True):
+            self.requests.extend(requests)
+
+    async def _aggregate(documents, contexts):
+        assert (documents, contexts) == ("docs", "ctx")
+        return {"shop": {"documents_bytes": 10, "document_count": 1, "context_bytes": 5, "context_count": 2}}
+
+    async def _redis_usage():
+        return {"blog": {"redis_bytes": 64.0, "redis_keys": 1}}
+
+    counters = _Counters()
+    mc = MongoClient.__new__(MongoClient)
+    mc.storage_collection = "project_storage"
+    mc.db = {"project_storage": counters}
+    mc.aggregate_project_storage = _aggregate
+    monkeypatch.setattr(storage_usage, "redis_project_usage", _redis_usage)
+
+    reconciler = StorageReconciler(mc, documents_collection="docs", contexts_collection="ctx")
+    assert await reconciler.reconcile() == 2
+
+    replaced = {op._filter["_id"]: op._doc for op in counters.requests if hasattr(op, "_doc")}
+    assert replaced["shop"]["documents_bytes"] == 10
+    assert replaced["shop"]["context_count"] == 2
+    assert replaced["shop"]["redis_keys"] == 0
+    assert replaced["blog"]["redis_bytes"] == 64.0
+    assert replaced["blog"]["document_count"] == 0
+    [prune] = [op for op in counters.requests if not hasattr(op, "_doc")]
+    assert sorted(prune._filter["_id"]["$nin"]) == ["blog", "shop"]
+
+
+@pytest.mark.asyncio
+async def test_reconciler_leaves_counters_alone_when_a_scan_fails(monkeypatch):
+    from packages.core import storage_usage
+
+    class _Counters:
+        def __init__(self):
+            self.requests = []
+
+        async def bulk_write(self, requests, ordered=True):
+            self.requests.extend(requests)
+
+    class _Failing:
+        def with_options(self, **kwargs):
+            return self
+
+        def aggregate(self, pipeline):
+            raise RuntimeError("secondary unavailable")
+
+    class _Rows:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def with_options(self, **kwargs):
+            return self
+
+        async def aggregate(self, pipeline):
+            for row in self.rows:
+                yield row
+
+    async def _redis_usage():
+        return {}
+
+    counters = _Counters()
+    mc = MongoClient.__new__(MongoClient)
+    mc.storage_collection = "project_storage"
+    mc.db = {
+        "project_storage": counters,
+        "docs": _Rows([{"_id": "shop", "documents_bytes": 10, "document_count": 1}]),
+        "ctx": _Failing(),
+    }
+    monkeypatch.setattr(storage_usage, "redis_project_usage", _redis_usage)
+
+    reconciler = StorageReconciler(mc, documents_collection="docs", contexts_collection="ctx")
+    with pytest.raises(RuntimeError):
+        await reconciler.reconcile()
+    assert counters.requests == []
@@ -0,0 +1,99 @@
+"""Tests for the compact ID-only vector search cache."""
+
+import asyncio
+
+from packages.backend import cache
+from packages.retrieval import search
+from packages.retrieval.local_index import HashingEncoder, LocalVectorIndex
+
+
+class FakeRedis:
+    """Minimal in-memory Redis replacement used in tests."""
+
+    def __init__(self):
+        self.store = {}
+
+    async def get(self, key):
+        return self.store.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.store[key] = value.encode() if isinstance(value, str) else value
+
+    async def incr(self, key):
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode()
+        return value
+
+    async def publish(self, channel, message):
+        return 0
+
+
+class CountingIndex(LocalVectorIndex):
+    """Local index recording how often ``similarity`` runs."""
+
+    calls = 0
+
+    def similarity(self, *args, **kwargs):
+        type(self).calls += 1
+        return super().similarity(*args, **kwargs)
+
+
+def test_pack_roundtrip():
+    hits = [("a", 0.5), ("идентификатор", 0.25)]
+    data = search.pack_hits(hits)
+    assert search.unpack_hits(data) == hits
+    assert search.unpack_hits(search.pack_hits([])) == []
+    assert search.unpack_hits(b'[{"id": "a"}]') is None
+
+
+def test_cached_ids_are_hydrated_and_versioned(tmp_path, monkeypatch):
+    redis = FakeRedis()
+    index = CountingIndex(tmp_path, encoder=HashingEncoder(dim=32))
+    index.add(["a", "b"], texts=["доставка по москве", "оплата картой"], project="shop")
+    monkeypatch.setattr(search, "_get_redis", lambda: redis)
+    monkeypatch.setattr(search, "qdrant", None)
+    monkeypatch.setattr(search, "local_index", index)
+    CountingIndex.calls = 0
+
+    first = asyncio.run(search.vector_search("доставка", k=1, project="shop"))
+    (stored,) = redis.store.values()
+    assert "москве".encode() not in stored
+    assert search.unpack_hits(stored)[0][0] == "a"
+
+    search._payload_cache.clear()
+    second = asyncio.run(search.vector_search("доставка", k=1, project="shop"))
+    assert CountingIndex.calls == 1
+    assert [(d.id, d.payload) for d in second] == [(d.id, d.payload) for d in first]
+    assert second[0].payload == {"text": "доставка по москве"}
+
+    index.add(["c"], texts=["доставка за город"], project="shop")
+    asyncio.run(search.vector_search("доставка", k=1, project="shop"))
+    assert CountingIndex.calls == 2
+
+
+class PlainBackend:
+    """Backend without ``version``/``get_payloads`` (like Qdrant)."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def similarity(self, query, top, method):
+        self.calls += 1
+        return [search.Doc("A", {"text": "a"}, 1.0)]
+
+
+def test_generation_bump_invalidates(monkeypatch):
+    redis = FakeRedis()
+    backend = PlainBackend()
+    monkeypatch.setattr(search, "_get_redis", lambda: redis)
+    monkeypatch.setattr(search, "qdrant", backend)
+
+    asyncio.run(search.vector_search("hi", k=1))
+    asyncio.run(search.vector_search("hi", k=1))
+    assert backend.calls == 1
+    # Hits could not be hydrated on another replica, so Redis is skipped.
+    assert not [key for key in redis.store if key.startswith("vector:")]
+
+    asyncio.run(cache.bump_generation("shop", redis=redis))
+    asyncio.run(search.vector_search("hi", k=1))
+    assert backend.calls == 2
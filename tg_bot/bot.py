@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import asyncio
+import os
 import re
 import time
 from contextlib import suppress
@@ -32,7 +33,9 @@ except ModuleNotFoundError:  # pragma: no cover - degrade gracefully when unavai
 logger = structlog.get_logger(__name__)
 
 _FEATURE_CACHE: dict[str, tuple[float, dict[str, bool]]] = {}
-_FEATURE_CACHE_TTL = 0.0
+# The API serves project-config from its own invalidated cache, so this only
+# saves the HTTP hop; keep it short so admin toggles apply quickly.
+_FEATURE_CACHE_TTL = float(os.getenv("BOT_FEATURE_CACHE_TTL", "10"))
 _FEATURE_CACHE_LOCK = asyncio.Lock()
 
 POSITIVE_REPLIES = {
@@ -413,6 +416,9 @@ async def _get_project_features(project: str | None) -> dict[str, bool]:
 
     key = project.lower()
     now = time.time()
+    cached = _FEATURE_CACHE.get(key)
+    if cached and now - cached[0] < _FEATURE_CACHE_TTL:
+        return cached[1].copy()
 
     settings = get_settings()
     api_url = f"{settings.api_base_url}/api/v1/llm/project-config"